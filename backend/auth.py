@@ -5,12 +5,20 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import time
+import hashlib
+
+from database import get_web_db
 
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
 
+# Cache en proceso de resolución sesión → user_id
+SESSION_CACHE_TTL_SECONDS = int(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+SESSION_CACHE_MAX_ENTRIES = 10000
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
@@ -57,38 +65,124 @@ async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depend
     return user_id
 
 
+# ==================== SESSION CACHE ====================
+# Solo se cachea session_token → user_id: el documento del usuario se lee
+# en cada petición (get_current_user), así que estado, suscripción o borrado
+# se ven al instante en todos los workers.
+# session_token → (cached_until, user_id, session_expires_at)
+_session_cache = {}
+
+# Logouts recientes guardados en el usuario (users.revoked_sessions), para
+# que los demás workers rechacen la sesión aunque la tengan en cache. Basta
+# con recordar los de los últimos SESSION_CACHE_TTL_SECONDS.
+REVOKED_SESSIONS_KEPT = 20
+
+
+def _cache_get(cache: dict, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        cache.pop(key, None)
+        return None
+    return entry
+
+
+def _cache_put(cache: dict, key, *values):
+    if len(cache) >= SESSION_CACHE_MAX_ENTRIES:
+        # Purgar expirados; si sigue lleno, vaciar (caso degenerado)
+        now = time.monotonic()
+        for stale_key in [k for k, v in cache.items() if v[0] < now]:
+            cache.pop(stale_key, None)
+        if len(cache) >= SESSION_CACHE_MAX_ENTRIES:
+            cache.clear()
+    cache[key] = (time.monotonic() + SESSION_CACHE_TTL_SECONDS, *values)
+
+
+def session_token_hash(session_token: str) -> str:
+    return hashlib.sha256(session_token.encode("utf-8")).hexdigest()
+
+
+def invalidate_session(session_token: Optional[str]):
+    """Invalida un session_token en la cache de este proceso"""
+    if session_token:
+        _session_cache.pop(session_token, None)
+
+
+def invalidate_user(user_id: str):
+    """Invalida todas las sesiones cacheadas del usuario en este proceso (borrado)"""
+    for token in [t for t, entry in _session_cache.items() if entry[1] == user_id]:
+        _session_cache.pop(token, None)
+
+
+async def revoke_session(session_token: str):
+    """
+    Logout: borra la sesión y la marca como revocada en el usuario para que
+    los workers que la tengan en cache la rechacen en su siguiente petición.
+    """
+    db = get_web_db()
+    session = await db.user_sessions.find_one_and_delete(
+        {"session_token": session_token},
+        {"user_id": 1}
+    )
+    invalidate_session(session_token)
+    if session:
+        await db.users.update_one(
+            {"_id": session["user_id"]},
+            {"$push": {"revoked_sessions": {
+                "$each": [session_token_hash(session_token)],
+                "$slice": -REVOKED_SESSIONS_KEPT
+            }}}
+        )
+
+
+def check_session_not_revoked(request: Request, user: dict):
+    """
+    Rechaza la petición si su session_token está en user.revoked_sessions
+    (logout hecho en otro worker). Quita revoked_sessions del documento.
+    """
+    revoked = user.pop("revoked_sessions", None)
+    session_token = request.cookies.get("session_token")
+    if revoked and session_token and session_token_hash(session_token) in revoked:
+        invalidate_session(session_token)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+
+
 # For session and JWT authentication
 async def get_current_user_id_flexible(request: Request):
     """
     Check for authentication from either:
-    1. session_token cookie
+    1. session_token cookie (cached for SESSION_CACHE_TTL_SECONDS)
     2. Authorization header (JWT)
     """
-    from motor.motor_asyncio import AsyncIOMotorClient
-    from dotenv import load_dotenv
-    from pathlib import Path
-    
-    ROOT_DIR = Path(__file__).parent
-    load_dotenv(ROOT_DIR / '.env')
-    
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
-    
     # Check for session_token cookie first
     session_token = request.cookies.get("session_token")
     
     if session_token:
-        # Validate session token from database
-        session = await db.user_sessions.find_one({"session_token": session_token})
-        if session:
-            # Convert expires_at to timezone-aware if it isn't already
-            expires_at = session["expires_at"]
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=timezone.utc)
-            
-            if expires_at > datetime.now(timezone.utc):
-                return session["user_id"]
+        cached = _cache_get(_session_cache, session_token)
+        if cached is not None:
+            _, user_id, expires_at = cached
+        else:
+            # Validate session token from database
+            db = get_web_db()
+            session = await db.user_sessions.find_one(
+                {"session_token": session_token},
+                {"user_id": 1, "expires_at": 1}
+            )
+            user_id, expires_at = None, None
+            if session:
+                user_id = session["user_id"]
+                # Convert expires_at to timezone-aware if it isn't already
+                expires_at = session["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                _cache_put(_session_cache, session_token, user_id, expires_at)
+        
+        if user_id and expires_at > datetime.now(timezone.utc):
+            return user_id
     
     # Fallback to JWT token from Authorization header
     auth_header = request.headers.get("Authorization")
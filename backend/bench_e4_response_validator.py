@@ -0,0 +1,173 @@
+"""
+Benchmark del validador de respuestas E4 (e4_response_validator.py)
+
+Corpus:
+- Con un directorio como argumento: todos los *.json del directorio. Cada
+  fichero puede ser una respuesta de E4, una lista de respuestas o un
+  documento con la respuesta en "e4_response".
+- Sin argumento: respuestas sintéticas construidas con la taxonomía del K1
+  (válidas, con términos inválidos y con bloques A/C/D) más
+  plan_weider_avanzado_full.json como respuesta en formato legacy.
+
+Mide por respuesta:
+- validate_full_response (mensajes formateados)
+- collect_issues (mismo recorrido, sin formatear)
+- should_retry_response (recorrido con salida temprana)
+
+y comprueba que should_retry_response coincide con
+should_retry(validate_full_response(...)).
+
+Ejecución:
+    python /app/backend/bench_e4_response_validator.py [directorio]
+"""
+
+import copy
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from e4_response_validator import E4ResponseValidator
+from k1_knowledge_base import get_taxonomia
+
+LEGACY_PLAN_PATH = Path(__file__).parent / "plan_weider_avanzado_full.json"
+SYNTHETIC_RESPONSES = 200
+REPEAT = 5
+
+
+def _load_directory(directory: Path) -> list:
+    corpus = []
+    for path in sorted(directory.glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                corpus.append(item.get("e4_response", item))
+    return corpus
+
+
+def _synthetic_response(index: int, taxonomia: dict) -> dict:
+    """Respuesta de E4 válida de 3 a 6 sesiones con 4 a 8 ejercicios"""
+    def pick(name, offset=0):
+        values = taxonomia[name]
+        return values[(index + offset) % len(values)]
+
+    sessions = []
+    for session_idx in range(3 + index % 4):
+        exercises = []
+        for ex_idx in range(4 + (index + session_idx) % 5):
+            exercises.append({
+                "order": ex_idx + 1,
+                "exercise_id": f"ejercicio_{session_idx}_{ex_idx}",
+                "patron": pick("patrones_movimiento", ex_idx),
+                "tipo": pick("tipos_ejercicio", ex_idx),
+                "volumen_abstracto": pick("categorias_volumen", ex_idx),
+                "series_abstracto": "medias",
+                "reps_abstracto": "medias",
+                "intensidad_abstracta": pick("categorias_intensidad_carga", ex_idx),
+                "proximidad_fallo_abstracta": pick("categorias_proximidad_fallo", ex_idx),
+                "notas_tecnicas": "Control del rango",
+                "k1_justification": {
+                    "por_que_este_ejercicio": "Patrón principal",
+                    "por_que_este_volumen": "Nivel intermedio",
+                    "por_que_esta_intensidad": "Objetivo hipertrofia"
+                }
+            })
+        sessions.append({
+            "id": f"D{session_idx + 1}",
+            "name": f"Sesión {session_idx + 1}",
+            "blocks": [{
+                "id": "B",
+                "exercises": exercises,
+                "volumen_total_bloque": pick("categorias_volumen"),
+                "densidad": pick("categorias_densidad"),
+                "metodo_entrenamiento": pick("categorias_metodos")
+            }],
+            "core_mobility_block": {"include": False, "details": ""},
+            "k1_decisions": {
+                "reglas_aplicadas": ["nivel_intermedio"],
+                "volumen_justificacion": "medio",
+                "intensidad_justificacion": "moderada",
+                "metodos_usados": [pick("categorias_metodos")],
+                "patrones_cubiertos": [pick("patrones_movimiento")]
+            }
+        })
+
+    return {
+        "training_plan": {
+            "training_type": "upper_lower",
+            "days_per_week": len(sessions),
+            "weeks": 4,
+            "goal": "hipertrofia",
+            "sessions": sessions
+        }
+    }
+
+
+def _synthetic_corpus() -> list:
+    taxonomia = get_taxonomia()
+    corpus = []
+    for index in range(SYNTHETIC_RESPONSES):
+        response = _synthetic_response(index, taxonomia)
+        sessions = response["training_plan"]["sessions"]
+        if index % 3 == 1:
+            # Términos inventados en el último ejercicio
+            exercise = sessions[-1]["blocks"][0]["exercises"][-1]
+            exercise["intensidad_abstracta"] = "alta_moderada"
+            exercise["patron"] = "empuje_diagonal"
+        if index % 5 == 2:
+            # Bloques que E4 no debe generar
+            sessions[0]["blocks"].insert(0, {"id": "A", "exercises": []})
+            sessions[0]["core_mobility_block"] = {"include": True}
+        corpus.append(response)
+
+    if LEGACY_PLAN_PATH.exists():
+        legacy = json.loads(LEGACY_PLAN_PATH.read_text(encoding="utf-8"))
+        corpus.append({"training_plan": copy.deepcopy(legacy["plan"])})
+    return corpus
+
+
+def _time_per_response(func, corpus):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        results = [func(response) for response in corpus]
+    return (time.perf_counter() - start) / (REPEAT * len(corpus)), results
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    if len(sys.argv) > 1:
+        source = Path(sys.argv[1])
+        corpus = _load_directory(source)
+    else:
+        source = "corpus sintético"
+        corpus = _synthetic_corpus()
+    print(f"📄 {source}: {len(corpus)} respuestas")
+
+    validator = E4ResponseValidator()
+
+    full, results = _time_per_response(validator.validate_full_response, corpus)
+    collect, _ = _time_per_response(validator.collect_issues, corpus)
+    fast, retries = _time_per_response(validator.should_retry_response, corpus)
+
+    print(f"⏱️  validate_full_response: {full * 1000:8.3f} ms/respuesta")
+    print(f"⏱️  collect_issues:         {collect * 1000:8.3f} ms/respuesta")
+    print(f"⏱️  should_retry_response:  {fast * 1000:8.3f} ms/respuesta")
+
+    valid = sum(1 for result in results if result.valido)
+    print(f"\n✅ Válidas: {valid}/{len(corpus)} · 🔁 Reintento: {sum(retries)}/{len(corpus)}")
+
+    mismatches = [
+        index for index, (result, retry) in enumerate(zip(results, retries))
+        if validator.should_retry(result) != retry
+    ]
+    print(f"🔍 should_retry distinto en salida temprana: {len(mismatches)}")
+    for index in mismatches:
+        print(f"   - respuesta #{index}")
+
+
+if __name__ == "__main__":
+    main()
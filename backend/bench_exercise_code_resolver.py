@@ -0,0 +1,92 @@
+"""
+Benchmark de resolución de códigos de ejercicio (exercise_code_resolver.py)
+
+Toma los códigos de ejercicio de plan_weider_avanzado_full.json
+(exercise_code / exercise_types) y compara la latencia por código de:
+
+- difflib.get_close_matches contra todo el catálogo (versión anterior)
+- ExerciseCodeResolver en frío (índice de trigramas, sin memo)
+- ExerciseCodeResolver con memo (resoluciones ya conocidas)
+
+y comprueba que ambos devuelven el mismo código.
+
+Ejecución:
+    python /app/backend/bench_exercise_code_resolver.py
+"""
+
+import json
+import logging
+import sys
+import time
+from difflib import get_close_matches
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from exercise_catalog_loader import get_all_exercise_codes
+from exercise_code_resolver import FUZZY_CUTOFF, LEGACY_CODE_MAPPING, ExerciseCodeResolver
+
+PLAN_PATH = Path(__file__).parent / "plan_weider_avanzado_full.json"
+CODE_KEYS = ("exercise_code", "exercise_types")
+
+
+def _plan_codes(obj, key=None):
+    if isinstance(obj, dict):
+        for child_key, value in obj.items():
+            yield from _plan_codes(value, child_key)
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from _plan_codes(item, key)
+    elif key in CODE_KEYS and isinstance(obj, str):
+        yield obj
+
+
+def legacy_resolve(generic_code: str, catalog_codes: list) -> str:
+    """Algoritmo anterior de map_generic_to_catalog_code"""
+    normalized_code = generic_code.lower().strip()
+    if normalized_code in LEGACY_CODE_MAPPING:
+        return LEGACY_CODE_MAPPING[normalized_code]
+    close_matches = get_close_matches(normalized_code, catalog_codes, n=1, cutoff=FUZZY_CUTOFF)
+    return close_matches[0] if close_matches else normalized_code
+
+
+def _time_per_code(func, codes):
+    start = time.perf_counter()
+    results = [func(code) for code in codes]
+    return (time.perf_counter() - start) / len(codes), results
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    catalog_codes = get_all_exercise_codes()
+    codes = list(_plan_codes(json.loads(PLAN_PATH.read_text(encoding="utf-8"))))
+    unique = sorted(set(codes))
+    print(f"📄 {PLAN_PATH.name}: {len(codes)} códigos ({len(unique)} distintos), catálogo: {len(catalog_codes)}")
+
+    start = time.perf_counter()
+    resolver = ExerciseCodeResolver(catalog_codes)
+    build = time.perf_counter() - start
+
+    legacy, expected = _time_per_code(lambda code: legacy_resolve(code, catalog_codes), codes)
+    cold, results = _time_per_code(resolver.resolve, unique)
+    warm, _ = _time_per_code(resolver.resolve, codes)
+
+    print(f"🏗️  Índice de trigramas:  {build * 1000:8.2f} ms (una vez por proceso)")
+    print(f"⏱️  get_close_matches:    {legacy * 1000:8.3f} ms/código")
+    print(f"⏱️  Resolver (en frío):   {cold * 1000:8.3f} ms/código")
+    print(f"⏱️  Resolver (memo):      {warm * 1000:8.3f} ms/código")
+
+    expected_by_code = dict(zip(codes, expected))
+    mismatches = [
+        (code, expected_by_code[code], result)
+        for code, result in zip(unique, results)
+        if expected_by_code[code] != result
+    ]
+    print(f"\n🔍 Resoluciones distintas: {len(mismatches)}")
+    for code, before, after in mismatches:
+        print(f"   - {code}: {before} → {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark de la traducción de planes (plan_translation.py)
+
+Compara la versión anterior (una regex por término, recompilada para cada
+string, y reconstrucción del plan) con el motor compilado en una pasada
+sobre plan_weider_avanzado_full.json, y lista los strings cuya traducción
+cambia entre ambas.
+
+Ejecución:
+    python /app/backend/bench_plan_translation.py [repeticiones]
+"""
+
+import copy
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from plan_translation import TRAINING_TRANSLATIONS, translate_plan_in_place, translate_text
+
+PLAN_PATH = Path(__file__).parent / "plan_weider_avanzado_full.json"
+
+
+def legacy_translate(plan):
+    """Algoritmo anterior de _translate_training_plan_to_spanish"""
+    def translate(text):
+        for eng, esp in TRAINING_TRANSLATIONS.items():
+            text = re.compile(re.escape(eng), re.IGNORECASE).sub(esp, text)
+        return text
+
+    def recursive(obj):
+        if isinstance(obj, dict):
+            return {key: recursive(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [recursive(item) for item in obj]
+        if isinstance(obj, str):
+            return translate(obj)
+        return obj
+
+    return recursive(plan)
+
+
+def _strings(obj):
+    if isinstance(obj, dict):
+        for value in obj.values():
+            yield from _strings(value)
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from _strings(item)
+    elif isinstance(obj, str):
+        yield obj
+
+
+def main(repeat: int = 20):
+    plan = json.loads(PLAN_PATH.read_text(encoding="utf-8"))
+    strings = list(_strings(plan))
+    print(f"📄 {PLAN_PATH.name}: {len(strings)} strings ({len(set(strings))} distintos)")
+
+    # Copias preparadas fuera de la medición (la versión nueva modifica in place)
+    copies = [copy.deepcopy(plan) for _ in range(repeat)]
+
+    legacy = timeit.timeit(lambda: legacy_translate(plan), number=repeat) / repeat
+
+    translate_text.cache_clear()
+    cold = timeit.timeit(lambda: translate_plan_in_place(copy.deepcopy(plan)), number=1)
+    iterator = iter(copies)
+    warm = timeit.timeit(lambda: translate_plan_in_place(next(iterator)), number=repeat) / repeat
+
+    print(f"⏱️  Anterior:            {legacy * 1000:8.2f} ms/plan")
+    print(f"⏱️  Compilado (en frío): {cold * 1000:8.2f} ms/plan (incluye deepcopy)")
+    print(f"⏱️  Compilado (caché):   {warm * 1000:8.2f} ms/plan  → x{legacy / warm:.0f}")
+    print(f"📦 Caché: {translate_text.cache_info()}")
+
+    changed = sorted({s for s in strings if legacy_translate(s) != translate_text(s)})
+    print(f"\n🔍 Strings con traducción distinta: {len(changed)}")
+    for text in changed:
+        print(f"   - {text[:70]!r}")
+        print(f"       antes: {legacy_translate(text)[:70]!r}")
+        print(f"       ahora: {translate_text(text)[:70]!r}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
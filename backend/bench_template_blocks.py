@@ -0,0 +1,118 @@
+"""
+Benchmark de los bloques A/C/D (templates.block_cache)
+
+Simula _integrate_template_blocks sobre planes sintéticos (combinaciones de
+nivel, objetivo, lesiones, días por semana y focus de sesión) y mide por
+sesión:
+- generate_* (sin caché, como antes)
+- get_* en frío (caché vacía)
+- get_* en caliente (después de warm_template_cache)
+
+y comprueba que thaw(get_*) coincide con generate_* para cada combinación.
+
+Ejecución:
+    python /app/backend/bench_template_blocks.py
+"""
+
+import logging
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from k1_knowledge_base import get_taxonomia
+from templates.block_a_warmup import generate_warmup_block
+from templates.block_c_core import generate_core_block
+from templates.block_d_cardio import generate_cardio_block
+from templates.block_cache import (
+    clear_template_cache,
+    get_cardio_block,
+    get_core_block,
+    get_warmup_block,
+    template_cache_stats,
+    thaw,
+    warm_template_cache
+)
+
+INJURY_SETS = ([], ['shoulder'], ['low_back'], ['shoulder', 'low_back'])
+# Focus de las sesiones de un plan upper/lower de 4 días
+SESSION_FOCUS = (('upper', 'medio'), ('lower', 'alto'), ('upper', 'alto'), ('lower', 'medio'))
+
+
+def _sessions() -> list:
+    taxonomia = get_taxonomia()
+    sessions = []
+    for nivel, objetivo, injuries, dias in product(
+        taxonomia['niveles_usuario'], taxonomia['objetivos_principales'], INJURY_SETS, (3, 4, 5)
+    ):
+        for focus, volumen_b in SESSION_FOCUS:
+            sessions.append((focus, nivel, objetivo, volumen_b, injuries, dias))
+    return sessions
+
+
+def _direct(session):
+    focus, nivel, objetivo, volumen_b, injuries, dias = session
+    return (
+        generate_warmup_block(focus, nivel, injuries, 'gym', 60),
+        generate_core_block(nivel, objetivo, volumen_b, injuries, 'gym'),
+        generate_cardio_block(objetivo, nivel, volumen_b, injuries, 60, dias)
+    )
+
+
+def _cached(session):
+    focus, nivel, objetivo, volumen_b, injuries, dias = session
+    block_d = get_cardio_block(objetivo, nivel, volumen_b, injuries, 60, dias)
+    # Lo que copia _integrate_template_blocks al plan
+    thaw(block_d.get('recommendations', []))
+    thaw(block_d.get('general_notes', []))
+    return (
+        get_warmup_block(focus, nivel, injuries, 'gym', 60),
+        get_core_block(nivel, objetivo, volumen_b, injuries, 'gym'),
+        block_d
+    )
+
+
+def _time_per_session(func, sessions):
+    start = time.perf_counter()
+    results = [func(session) for session in sessions]
+    return (time.perf_counter() - start) / len(sessions), results
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    sessions = _sessions()
+    print(f"📄 {len(sessions)} sesiones sintéticas")
+
+    direct, expected = _time_per_session(_direct, sessions)
+    clear_template_cache()
+    cold, _ = _time_per_session(_cached, sessions)
+
+    clear_template_cache()
+    start = time.perf_counter()
+    warmed = warm_template_cache()
+    warm_seconds = time.perf_counter() - start
+    warm, results = _time_per_session(_cached, sessions)
+
+    print(f"⏱️  generate_* (sin caché): {direct * 1e6:8.1f} µs/sesión")
+    print(f"⏱️  get_* en frío:          {cold * 1e6:8.1f} µs/sesión")
+    print(f"⏱️  get_* en caliente:      {warm * 1e6:8.1f} µs/sesión")
+    print(f"🔥 Precálculo: {warmed} bloques en {warm_seconds * 1000:.0f} ms")
+
+    for name, stats in template_cache_stats().items():
+        print(f"   - Bloque {name}: {stats['size']}/{stats['maxsize']} "
+              f"(aciertos {stats['hits']}, fallos {stats['misses']})")
+
+    mismatches = [
+        index for index, (cached, blocks) in enumerate(zip(results, expected))
+        if [thaw(block) for block in cached] != list(blocks)
+    ]
+    print(f"\n🔍 Bloques distintos de generate_*: {len(mismatches)}")
+    for index in mismatches:
+        print(f"   - sesión #{index}: {sessions[index]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Client Purge - Hard delete de un cliente en segundo plano
+
+Borra todos los datos de un usuario en la BD Web y en edn360_app:
+- Descubre las colecciones de ambas BDs y borra en paralelo los documentos
+  con user_id / client_id del usuario (y los de las colecciones cuyo _id
+  es el user_id).
+- Borra sus PDFs con delete_pdf_document y suma los bytes liberados.
+- Registra el progreso en purge_jobs. El documento users se borra al final
+  y solo si todo lo demás ha ido bien.
+- Los jobs llevan un lease: resume_stale_purges relanza al arrancar los que
+  quedaron a medias por un reinicio.
+
+Configuración: PURGE_CONCURRENCY, PURGE_LEASE_SECONDS, PURGE_MAX_ATTEMPTS
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from document_store import delete_pdf_document
+
+logger = logging.getLogger(__name__)
+
+PURGE_CONCURRENCY = int(os.getenv('PURGE_CONCURRENCY', '8'))
+PURGE_LEASE_SECONDS = int(os.getenv('PURGE_LEASE_SECONDS', '60'))
+PURGE_MAX_ATTEMPTS = int(os.getenv('PURGE_MAX_ATTEMPTS', '3'))
+
+# Dueño de los purges lanzados por este proceso
+PURGE_OWNER = f"{socket.gethostname()}-{os.getpid()}"
+
+# Campos que referencian al usuario en cualquier colección
+USER_FIELDS = ("user_id", "client_id")
+
+# Colecciones cuyo _id ES el user_id
+ID_KEYED_COLLECTIONS = {
+    "web": ("conversations",),
+    "edn360_app": ("training_state_summaries",),
+}
+
+# No se tocan: registros contables y colecciones internas
+RETAINED_COLLECTIONS = {
+    "payment_transactions",
+    "manual_payments",
+    "purge_jobs",
+    "document_blobs",
+    "job_workers",
+}
+
+# Colecciones con tratamiento propio (no entran en el borrado genérico)
+SPECIAL_COLLECTIONS = {"users", "pdfs"}
+
+# Tasks en curso (evita que el GC las recoja)
+_running: Dict[str, asyncio.Task] = {}
+
+
+async def discover_targets(web_db, edn360_db) -> List[Tuple[str, object, dict]]:
+    """
+    Colecciones a purgar de ambas BDs
+
+    Returns:
+        [(label, collection, filtro)] – label "web:<col>" o "edn360_app:<col>"
+    """
+    targets = []
+    for db_label, database in (("web", web_db), ("edn360_app", edn360_db)):
+        id_keyed = ID_KEYED_COLLECTIONS.get(db_label, ())
+        for name in sorted(await database.list_collection_names()):
+            if name.startswith("system.") or name in RETAINED_COLLECTIONS:
+                continue
+            if db_label == "web" and name in SPECIAL_COLLECTIONS:
+                continue
+            targets.append((f"{db_label}:{name}", database[name], None if name in id_keyed else USER_FIELDS))
+    return targets
+
+
+def _target_filter(user_id: str, fields: Optional[tuple]) -> dict:
+    if fields is None:
+        return {"_id": user_id}
+    return {"$or": [{field: user_id} for field in fields]}
+
+
+async def _update_job(web_db, job_id: str, update: dict):
+    await web_db.purge_jobs.update_one({"_id": job_id}, update)
+
+
+def _lease_until() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=PURGE_LEASE_SECONDS)
+
+
+async def _lease_heartbeat(web_db, job_id: str):
+    """Renueva el lease del purge mientras se ejecuta"""
+    interval = max(PURGE_LEASE_SECONDS / 3, 1)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await web_db.purge_jobs.update_one(
+                {"_id": job_id, "owner": PURGE_OWNER},
+                {"$set": {"lease_expires_at": _lease_until()}}
+            )
+        except Exception as e:
+            logger.error(f"❌ Purge {job_id}: error renovando el lease: {e}")
+
+
+async def _run_purge(web_db, edn360_db, job_id: str, user_id: str):
+    """Ejecuta el purge y va registrando el progreso en purge_jobs"""
+    semaphore = asyncio.Semaphore(PURGE_CONCURRENCY)
+    errors = {}
+    heartbeat = asyncio.create_task(_lease_heartbeat(web_db, job_id))
+
+    try:
+        targets = await discover_targets(web_db, edn360_db)
+        pdfs = await web_db.pdfs.find({"user_id": user_id}, {"_id": 1}).to_list(None)
+
+        await _update_job(web_db, job_id, {"$set": {
+            "status": "running",
+            "progress.total": len(targets) + len(pdfs) + 1,
+            "started_at": datetime.now(timezone.utc)
+        }})
+
+        async def purge_collection(label: str, collection, fields: Optional[tuple]):
+            async with semaphore:
+                try:
+                    result = await collection.delete_many(_target_filter(user_id, fields))
+                    update = {"$inc": {"progress.done": 1}}
+                    if result.deleted_count:
+                        update["$set"] = {f"deleted.{label}": result.deleted_count}
+                    await _update_job(web_db, job_id, update)
+                except Exception as e:
+                    errors[label] = str(e)
+                    logger.error(f"❌ Purge {user_id}: error en {label}: {e}")
+
+        async def purge_pdf(pdf_id: str):
+            async with semaphore:
+                try:
+                    freed = await delete_pdf_document(web_db, pdf_id)
+                    await _update_job(web_db, job_id, {"$inc": {
+                        "progress.done": 1,
+                        "deleted.web:pdfs": 1,
+                        "bytes_reclaimed": freed
+                    }})
+                except Exception as e:
+                    errors[f"web:pdfs/{pdf_id}"] = str(e)
+                    logger.error(f"❌ Purge {user_id}: error borrando PDF {pdf_id}: {e}")
+
+        await asyncio.gather(
+            *(purge_collection(label, collection, fields) for label, collection, fields in targets),
+            *(purge_pdf(pdf["_id"]) for pdf in pdfs)
+        )
+
+        if errors:
+            await _update_job(web_db, job_id, {"$set": {
+                "status": "failed",
+                "errors": errors,
+                "finished_at": datetime.now(timezone.utc)
+            }})
+            logger.error(f"❌ Purge {user_id} incompleto ({len(errors)} errores); el usuario se conserva")
+            return
+
+        # FINALMENTE el usuario
+        await web_db.users.delete_one({"_id": user_id})
+        from auth import invalidate_user
+        invalidate_user(user_id)
+
+        job = await web_db.purge_jobs.find_one_and_update(
+            {"_id": job_id},
+            {
+                "$inc": {"progress.done": 1},
+                "$set": {"status": "completed", "finished_at": datetime.now(timezone.utc)}
+            },
+            projection={"deleted": 1, "bytes_reclaimed": 1}
+        )
+        total = sum((job or {}).get("deleted", {}).values())
+        logger.info(
+            f"✅ Purge {user_id} completado: {total} documentos, "
+            f"{(job or {}).get('bytes_reclaimed', 0) / 1024:.0f} KB en disco"
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Purge {user_id} falló: {e}")
+        await _update_job(web_db, job_id, {"$set": {
+            "status": "failed",
+            "errors": {"purge": str(e)},
+            "finished_at": datetime.now(timezone.utc)
+        }})
+    finally:
+        heartbeat.cancel()
+        _running.pop(job_id, None)
+
+
+def _launch(web_db, edn360_db, job_id: str, user_id: str):
+    _running[job_id] = asyncio.create_task(_run_purge(web_db, edn360_db, job_id, user_id))
+
+
+async def start_purge(web_db, edn360_db, user_id: str, requested_by: Optional[str] = None) -> str:
+    """
+    Registra un job de purge y lo lanza en background
+
+    Returns:
+        job_id
+    """
+    job_id = str(uuid.uuid4())
+    await web_db.purge_jobs.insert_one({
+        "_id": job_id,
+        "user_id": user_id,
+        "requested_by": requested_by,
+        "status": "pending",
+        "progress": {"done": 0, "total": None},
+        "deleted": {},
+        "bytes_reclaimed": 0,
+        "owner": PURGE_OWNER,
+        "lease_expires_at": _lease_until(),
+        "attempts": 1,
+        "created_at": datetime.now(timezone.utc)
+    })
+    _launch(web_db, edn360_db, job_id, user_id)
+    logger.info(f"🗑️ Purge {job_id} lanzado para usuario {user_id} (por {requested_by})")
+    return job_id
+
+
+async def resume_stale_purges(web_db, edn360_db) -> int:
+    """
+    Relanza los purges que quedaron a medias (proceso caído): jobs pending /
+    running con el lease expirado. Los que agotaron PURGE_MAX_ATTEMPTS se
+    marcan como failed.
+
+    Returns:
+        Número de purges relanzados
+    """
+    now = datetime.now(timezone.utc)
+    stale = {
+        "status": {"$in": ["pending", "running"]},
+        "$or": [{"lease_expires_at": {"$lt": now}}, {"lease_expires_at": {"$exists": False}}]
+    }
+
+    abandoned = await web_db.purge_jobs.update_many(
+        {**stale, "attempts": {"$gte": PURGE_MAX_ATTEMPTS}},
+        {"$set": {
+            "status": "failed",
+            "errors": {"purge": f"Interrumpido {PURGE_MAX_ATTEMPTS} veces; relanzar el borrado"},
+            "finished_at": now
+        }}
+    )
+    if abandoned.modified_count:
+        logger.error(f"❌ {abandoned.modified_count} purges interrumpidos marcados como failed")
+
+    resumed = 0
+    while True:
+        job = await web_db.purge_jobs.find_one_and_update(
+            {**stale, "attempts": {"$not": {"$gte": PURGE_MAX_ATTEMPTS}}},
+            {
+                "$set": {
+                    "status": "pending",
+                    "owner": PURGE_OWNER,
+                    "lease_expires_at": _lease_until(),
+                    "progress.done": 0
+                },
+                "$inc": {"attempts": 1}
+            },
+            projection={"user_id": 1}
+        )
+        if not job:
+            break
+        _launch(web_db, edn360_db, job["_id"], job["user_id"])
+        resumed += 1
+        logger.warning(f"♻️ Purge {job['_id']} interrumpido: relanzado para usuario {job['user_id']}")
+
+    return resumed
+
+
+async def wait_for_purge(web_db, job_id: str, timeout: float) -> Optional[dict]:
+    """
+    Espera hasta `timeout` segundos a que termine el purge (si corre en este
+    proceso) y devuelve el documento del job.
+    """
+    task = _running.get(job_id)
+    if task is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return await get_purge_job(web_db, job_id)
+
+
+async def get_purge_job(web_db, job_id: str) -> Optional[dict]:
+    return await web_db.purge_jobs.find_one({"_id": job_id})
@@ -0,0 +1,194 @@
+"""
+Conversation Store - Historial del chat admin ↔ cliente
+
+- Mensajes con ID monótono por conversación ("<user_id>-<seq>").
+- Historial paginado por keyset sobre (timestamp, _id): últimos mensajes,
+  página anterior (before) o solo los nuevos (since).
+- Contadores de no leídos por lado en la colección conversations.
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PREVIEW_LENGTH = 120
+
+# Conversaciones con mensajes sin leer por el admin
+ADMIN_UNREAD_FILTER = {"unread_by_admin": {"$gt": 0}}
+
+
+def encode_cursor(message: dict) -> str:
+    """Cursor opaco (timestamp, _id) de un mensaje"""
+    timestamp = message["timestamp"]
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    raw = json.dumps([timestamp, str(message["_id"])]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Returns (timestamp, _id). Raises ValueError si el cursor no es válido.
+    """
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except Exception:
+        raise ValueError("Cursor de mensajes inválido")
+
+
+def _keyset(operator: str, cursor: str) -> dict:
+    """Condición estricta antes ($lt) / después ($gt) del cursor"""
+    timestamp, message_id = decode_cursor(cursor)
+    return {"$or": [
+        {"timestamp": {operator: timestamp}},
+        {"timestamp": timestamp, "_id": {operator: message_id}}
+    ]}
+
+
+def history_query(user_id: str, before: Optional[str] = None, since: Optional[str] = None) -> tuple:
+    """
+    (filtro, sort) de get_history: con since, los posteriores al cursor en
+    orden ascendente; si no, los últimos (o los anteriores a before) en
+    orden descendente
+    """
+    query = {"user_id": user_id}
+    if since:
+        query.update(_keyset("$gt", since))
+        return query, [("timestamp", 1), ("_id", 1)]
+    if before:
+        query.update(_keyset("$lt", before))
+    return query, [("timestamp", -1), ("_id", -1)]
+
+
+async def append_message(
+    db,
+    user_id: str,
+    sender_id: str,
+    sender_name: Optional[str],
+    text: str,
+    is_admin: bool
+) -> dict:
+    """
+    Guarda un mensaje en la conversación del cliente user_id
+
+    Reserva el siguiente seq y suma 1 al contador de no leídos del otro
+    lado en una sola operación atómica.
+    """
+    now = datetime.now(timezone.utc)
+    unread_field = "unread_by_user" if is_admin else "unread_by_admin"
+
+    conversation = await db.conversations.find_one_and_update(
+        {"_id": user_id},
+        {
+            "$inc": {"last_seq": 1, unread_field: 1},
+            "$set": {
+                "last_message_at": now,
+                "last_message_preview": text[:PREVIEW_LENGTH],
+                "last_sender_is_admin": is_admin
+            }
+        },
+        projection={"last_seq": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    seq = conversation["last_seq"]
+
+    message = {
+        "_id": f"{user_id}-{seq:08d}",
+        "seq": seq,
+        "user_id": user_id,
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "message": text,
+        "is_admin": is_admin,
+        "timestamp": now,
+        "created_at": now
+    }
+    await db.messages.insert_one(message)
+    message["id"] = message["_id"]
+    return message
+
+
+async def get_history(
+    db,
+    user_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    before: Optional[str] = None,
+    since: Optional[str] = None
+) -> dict:
+    """
+    Página de la conversación, siempre en orden cronológico ascendente
+
+    Returns:
+        {
+            "messages": [...],
+            "has_more": hay mensajes más antiguos (o más nuevos con since),
+            "next_cursor": cursor para la página anterior (before),
+            "newest_cursor": cursor del último mensaje (para since)
+        }
+    Raises ValueError si before/since no son cursores válidos.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query, sort = history_query(user_id, before, since)
+
+    messages = await db.messages.find(query).sort(sort).limit(limit + 1).to_list(limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not since:
+        # Delta (since) ya va en orden ascendente
+        messages.reverse()
+
+    for message in messages:
+        message["id"] = str(message["_id"])
+
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(messages[0]) if messages and has_more and not since else None,
+        "newest_cursor": encode_cursor(messages[-1]) if messages else since
+    }
+
+
+async def mark_read(db, user_id: str, reader_is_admin: bool):
+    """Pone a 0 los no leídos del lado que abre la conversación"""
+    unread_field = "unread_by_admin" if reader_is_admin else "unread_by_user"
+    await db.conversations.update_one(
+        {"_id": user_id, unread_field: {"$gt": 0}},
+        {"$set": {unread_field: 0, f"{unread_field}_reset_at": datetime.now(timezone.utc)}}
+    )
+
+
+async def get_unread_summary(db, user_id: Optional[str] = None) -> dict:
+    """
+    No leídos desde el punto de vista del lector
+
+    - user_id indicado (cliente): {"count": n}
+    - sin user_id (admin): total y conversaciones con pendientes
+    """
+    if user_id:
+        conversation = await db.conversations.find_one({"_id": user_id}, {"unread_by_user": 1}) or {}
+        return {"count": conversation.get("unread_by_user", 0)}
+
+    conversations = await db.conversations.find(
+        ADMIN_UNREAD_FILTER,
+        {"unread_by_admin": 1, "last_message_at": 1, "last_message_preview": 1}
+    ).sort("last_message_at", -1).to_list(length=MAX_PAGE_SIZE)
+
+    return {
+        "count": sum(c["unread_by_admin"] for c in conversations),
+        "conversations": [
+            {
+                "user_id": c["_id"],
+                "unread": c["unread_by_admin"],
+                "last_message_at": c.get("last_message_at"),
+                "last_message_preview": c.get("last_message_preview")
+            }
+            for c in conversations
+        ]
+    }
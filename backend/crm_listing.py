@@ -0,0 +1,242 @@
+"""
+CRM Listing - Listados paginados del CRM de admin
+
+Cada listado declara un CrmListing (colección, filtro base, proyección y
+campo de orden). list_page() devuelve una página ordenada por (campo, _id)
+con cursor keyset y búsqueda por el índice de texto de la colección;
+facet_counts() calcula los contadores del listado en una sola agregación.
+
+page_query() construye la consulta de list_page(); db_indexes.hot_queries()
+la usa para comprobar los índices con los mismos filtros.
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# Orden de tipos BSON (de menor a mayor) para el keyset sobre campos con
+# tipos mezclados (p.ej. created_at guardado como date o como string ISO)
+_TYPE_ORDER = ("null", "number", "string", "date")
+_BSON_TYPES = {"number": ["int", "long", "double", "decimal"], "string": ["string"], "date": ["date"]}
+
+
+@dataclass(frozen=True)
+class CrmListing:
+    """Definición de un listado del CRM"""
+    collection: str
+    base_filter: Dict = field(default_factory=dict)
+    projection: Optional[Dict] = None
+    sort_field: str = "created_at"
+    sort_direction: int = -1
+
+
+# ============================================
+# LISTADOS DEL CRM DE ADMIN
+# ============================================
+
+CLIENTS_LISTING = CrmListing(
+    collection="users",
+    base_filter={"role": "user"},
+    projection={"password": 0, "verification_token": 0, "verification_token_expires": 0, "revoked_sessions": 0}
+)
+
+TEAM_CLIENTS_LISTING = CrmListing(
+    collection="users",
+    base_filter={"role": "user", "subscription.plan": "team"},
+    projection={
+        "name": 1, "username": 1, "email": 1, "phone": 1,
+        "created_at": 1, "client_status": 1, "subscription": 1
+    }
+)
+
+PROSPECTS_LISTING = CrmListing(
+    collection="questionnaire_responses",
+    base_filter={"converted_to_client": False},
+    projection={
+        "nombre": 1, "email": 1, "whatsapp": 1, "objetivo": 1, "presupuesto": 1,
+        "stage_id": 1, "stage_name": 1, "submitted_at": 1, "converted_to_client": 1
+    },
+    sort_field="submitted_at"
+)
+
+EXTERNAL_CLIENTS_LISTING = CrmListing(
+    collection="external_clients",
+    base_filter={"moved_to_team": {"$ne": True}},
+    projection={"notes": 0, "payment_history": 0}
+)
+
+WAITLIST_LISTING = CrmListing(
+    collection="waitlist_leads",
+    projection={
+        "nombre_apellidos": 1, "email": 1, "telefono": 1, "edad": 1, "ciudad_pais": 1,
+        "como_conociste": 1, "score_total": 1, "prioridad": 1, "estado": 1,
+        "capacidad_economica": 1, "objetivo": 1, "motivacion": 1, "nivel_compromiso": 1,
+        "submitted_at": 1, "notas_admin": 1
+    },
+    sort_field="submitted_at"
+)
+
+
+def _type_of(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number"
+    return "string"
+
+
+def encode_cursor(value, item_id) -> str:
+    """Cursor opaco (tipo, valor del campo de orden, _id)"""
+    value_type = _type_of(value)
+    if value_type == "date":
+        value = value.isoformat()
+    elif value_type == "string":
+        value = str(value)
+    raw = json.dumps([value_type, value, item_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Returns (valor, _id). Raises ValueError si el cursor no es válido."""
+    try:
+        value_type, value, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if value_type == "date":
+            value = datetime.fromisoformat(value)
+        elif value_type not in _TYPE_ORDER:
+            raise ValueError(value_type)
+        return value, item_id
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+
+def _type_filter(field_name: str, value_type: str) -> dict:
+    if value_type == "null":
+        return {field_name: None}
+    return {field_name: {"$type": _BSON_TYPES[value_type]}}
+
+
+def keyset_filter(field_name: str, direction: int, value, item_id) -> dict:
+    """
+    Documentos estrictamente después de (value, item_id) en el orden
+    (field_name, _id) con la dirección indicada.
+    """
+    operator = "$lt" if direction < 0 else "$gt"
+    value_type = _type_of(value)
+
+    clauses = [{field_name: value, "_id": {operator: item_id}}]
+    if value_type != "null":
+        clauses.append({field_name: {operator: value}})
+
+    # Los tipos que van después en el orden (más bajos si es descendente)
+    position = _TYPE_ORDER.index(value_type)
+    following = _TYPE_ORDER[:position] if direction < 0 else _TYPE_ORDER[position + 1:]
+    clauses.extend(_type_filter(field_name, other) for other in following)
+
+    return {"$or": clauses}
+
+
+def page_query(
+    listing: CrmListing,
+    extra_filter: Optional[dict] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> Tuple[dict, list]:
+    """
+    (filtro, sort) de una página del listado
+
+    Raises ValueError si el cursor no es válido.
+    """
+    conditions = [listing.base_filter] if listing.base_filter else []
+    if extra_filter:
+        conditions.append(extra_filter)
+    if search and search.strip():
+        conditions.append({"$text": {"$search": search.strip()}})
+    if cursor:
+        value, item_id = decode_cursor(cursor)
+        conditions.append(keyset_filter(listing.sort_field, listing.sort_direction, value, item_id))
+
+    query = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+    sort = [(listing.sort_field, listing.sort_direction), ("_id", listing.sort_direction)]
+    return query, sort
+
+
+async def list_page(
+    db,
+    listing: CrmListing,
+    extra_filter: Optional[dict] = None,
+    search: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> dict:
+    """
+    Una página de un listado del CRM
+
+    Returns:
+        {"items": [...], "next_cursor": str | None, "has_more": bool}
+    Raises ValueError si el cursor no es válido.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query, sort = page_query(listing, extra_filter, search, cursor)
+
+    items = await db[listing.collection].find(query, listing.projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(_get_path(last, listing.sort_field), last["_id"])
+
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+async def facet_counts(db, collection: str, base_filter: dict, buckets: Dict[str, dict]) -> dict:
+    """
+    Contadores en una sola agregación
+
+    Args:
+        buckets: {"nombre": filtro adicional} – "total" se añade siempre
+
+    Returns:
+        {"total": n, "<nombre>": n, ...}
+    """
+    facets = {"total": [{"$count": "n"}]}
+    for name, bucket_filter in buckets.items():
+        facets[name] = [{"$match": bucket_filter}, {"$count": "n"}]
+
+    result = await db[collection].aggregate([
+        {"$match": base_filter},
+        {"$facet": facets}
+    ]).to_list(1)
+
+    counts = result[0] if result else {}
+    return {name: (counts.get(name) or [{"n": 0}])[0]["n"] for name in facets}
+
+
+async def group_counts(db, collection: str, base_filter: dict, field_name: str) -> dict:
+    """
+    Contadores por valor de un campo en una sola agregación
+
+    Returns:
+        {valor: n, ...}
+    """
+    result = await db[collection].aggregate([
+        {"$match": base_filter},
+        {"$group": {"_id": f"${field_name}", "n": {"$sum": 1}}}
+    ]).to_list(None)
+    return {str(row["_id"]): row["n"] for row in result if row["_id"] is not None}
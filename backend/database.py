@@ -0,0 +1,59 @@
+"""
+Database - Conexión MongoDB compartida
+
+Un único AsyncIOMotorClient (con pool de conexiones) para todo el backend:
+server.py, auth.py, repositories/*, services/* y e4_decision_logger.py.
+
+Configuración: MONGO_URL, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+MONGO_EDN360_APP_DB_NAME
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_EDN360_APP_DB_NAME = os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Devuelve el cliente Motor compartido (se crea en el primer uso)"""
+    global _client
+
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URL,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE
+        )
+
+    return _client
+
+
+def get_web_db() -> AsyncIOMotorDatabase:
+    """BD Web (users, sessions, forms, ...) - definida por DB_NAME"""
+    return get_client()[os.environ.get('DB_NAME', 'test_database')]
+
+
+def get_edn360_db() -> AsyncIOMotorDatabase:
+    """BD EDN360_APP (client_drawers, edn360_snapshots, ...)"""
+    return get_client()[MONGO_EDN360_APP_DB_NAME]
+
+
+def close_client():
+    """Cierra el cliente compartido (shutdown del servidor/worker)"""
+    global _client
+
+    if _client is not None:
+        _client.close()
+        _client = None
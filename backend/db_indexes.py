@@ -0,0 +1,383 @@
+"""
+DB Indexes - Registro declarativo de índices de la BD Web
+
+- WEB_INDEXES: índices que necesita cada colección.
+- reconcile_indexes(): crea al arrancar los que faltan (nunca borra los no
+  declarados, solo los registra en el log).
+- hot_queries(): consultas de los endpoints calientes, construidas con los
+  mismos filtros que usan los endpoints (crm_listing, job_queries,
+  review_queue, conversation_store, email_outbox). test_index_coverage.py
+  comprueba que tienen índice declarado (find_unindexed_queries, sin
+  Mongo) y que explain() no hace COLLSCAN (con Mongo).
+
+Los índices de la BD edn360_app siguen en sus repositorios.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Índice requerido: claves [(campo, dirección)] + opciones"""
+    keys: Tuple[Tuple[str, object], ...]  # dirección 1 / -1 o "text"
+    unique: bool = False
+    sparse: bool = False
+
+    @property
+    def name(self) -> str:
+        # Mismo nombre que genera MongoDB por defecto (campo_dir_campo_dir)
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def to_model(self) -> IndexModel:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        return IndexModel(list(self.keys), **options)
+
+
+def _idx(*keys, unique: bool = False, sparse: bool = False) -> IndexSpec:
+    """Atajo: _idx("user_id", ("date", -1)) → IndexSpec"""
+    normalized = tuple(key if isinstance(key, tuple) else (key, 1) for key in keys)
+    return IndexSpec(normalized, unique=unique, sparse=sparse)
+
+
+def _text_idx(*fields) -> IndexSpec:
+    """Índice de texto (búsqueda del CRM). MongoDB admite uno por colección."""
+    return IndexSpec(tuple((field, "text") for field in sorted(fields)))
+
+
+# ============================================
+# ÍNDICES DECLARADOS (BD Web)
+# ============================================
+
+WEB_INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        _idx("role", ("created_at", -1), ("_id", -1)),
+        _idx("role", "subscription.plan", ("created_at", -1), ("_id", -1)),
+        _idx("subscription.plan", "nutrition_plan"),
+        _text_idx("name", "email", "phone", "username"),
+        _idx("email"),
+        _idx("verification_token", sparse=True),
+    ],
+    "user_sessions": [
+        _idx("session_token"),
+    ],
+    "password_resets": [
+        _idx("token"),
+    ],
+    "sessions": [
+        _idx("user_id", ("date", -1)),
+        _idx("date"),
+    ],
+    "forms": [
+        _idx("user_id", "completed"),
+    ],
+    "alerts": [
+        _idx("user_id"),
+    ],
+    "messages": [
+        _idx("user_id", "timestamp", "_id"),
+    ],
+    "review_queue": [
+        _idx("due_at", "_id"),
+        _idx("status", "due_at", "_id"),
+    ],
+    "conversations": [
+        _idx("unread_by_admin", ("last_message_at", -1)),
+    ],
+    "pdfs": [
+        _idx("user_id", "content_hash"),
+    ],
+    "generation_jobs": [
+        _idx("status", "created_at"),
+        _idx("user_id", "created_at"),
+    ],
+    "nutrition_questionnaire_submissions": [
+        _idx("user_id", ("submitted_at", -1)),
+    ],
+    "follow_up_submissions": [
+        _idx("user_id", ("submission_date", -1)),
+        _idx("user_id", "created_at"),
+        _idx("status", ("submission_date", -1)),
+    ],
+    "training_plans": [
+        _idx("user_id", ("generated_at", -1)),
+    ],
+    "nutrition_plans": [
+        _idx("user_id", ("generated_at", -1)),
+    ],
+    "user_subscriptions": [
+        _idx("user_id", "status"),
+        _idx("status"),
+    ],
+    "payment_transactions": [
+        _idx(("created_at", -1), ("transaction_id", -1)),
+        _idx("payment_status", ("created_at", -1), ("transaction_id", -1)),
+        _idx("session_id"),
+    ],
+    "manual_payments": [
+        _idx(("fecha", -1), ("_id", -1)),
+    ],
+    "email_outbox": [
+        _idx("status", "next_attempt_at"),
+    ],
+    "questionnaire_responses": [
+        _idx("converted_to_client", ("submitted_at", -1), ("_id", -1)),
+        _text_idx("nombre", "email", "whatsapp"),
+    ],
+    "external_clients": [
+        _idx(("created_at", -1), ("_id", -1)),
+        _text_idx("nombre", "email", "whatsapp"),
+    ],
+    "waitlist_leads": [
+        _idx(("submitted_at", -1), ("_id", -1)),
+        _text_idx("nombre_apellidos", "email", "telefono"),
+    ],
+    "team_client_notes": [
+        _idx("client_id"),
+    ],
+    "prospect_notes": [
+        _idx("prospect_id"),
+    ],
+    "calendar_config": [
+        _idx("admin_email"),
+    ],
+}
+
+
+# ============================================
+# CONSULTAS CALIENTES (harness de explain)
+# ============================================
+
+HotQuery = Tuple[str, dict, Optional[list], str]  # (colección, filtro, sort, descripción)
+
+
+def hot_queries() -> List[HotQuery]:
+    """
+    Consultas de los endpoints calientes
+
+    Las compuestas salen de los builders que usan los endpoints, así que un
+    cambio de forma en el endpoint llega al test. Las búsquedas por un solo
+    campo van escritas aquí. Los valores son de ejemplo: el plan elegido
+    depende de la forma de la consulta, no del valor.
+    """
+    from conversation_store import ADMIN_UNREAD_FILTER, encode_cursor as message_cursor, history_query
+    from crm_listing import (
+        CLIENTS_LISTING, TEAM_CLIENTS_LISTING, PROSPECTS_LISTING, EXTERNAL_CLIENTS_LISTING, WAITLIST_LISTING,
+        encode_cursor, page_query
+    )
+    from email_outbox import OUTBOX_CLAIM_SORT, claimable_emails_filter
+    from job_queries import JOB_CLAIM_SORT, claimable_jobs_filter, jobs_created_since_filter, stuck_jobs_filter
+    from review_queue import REVIEW_CANDIDATES_FILTER, REVIEW_QUEUE_SORT, due_reviews_filter
+
+    now = datetime.now(timezone.utc)
+    listing_cursor = encode_cursor(now, "id_1")
+    messages_cursor = message_cursor({"timestamp": now, "_id": "u1-1"})
+    max_attempts = 3
+
+    def listing(crm_listing, description, **kwargs) -> HotQuery:
+        return (crm_listing.collection, *page_query(crm_listing, **kwargs), description)
+
+    def messages(description, **kwargs) -> HotQuery:
+        return ("messages", *history_query("u1", **kwargs), description)
+
+    return [
+        listing(CLIENTS_LISTING, "GET /admin/clients"),
+        listing(CLIENTS_LISTING, "GET /admin/clients?cursor=", cursor=listing_cursor),
+        listing(CLIENTS_LISTING, "GET /admin/clients?search=", search="ana"),
+        listing(CLIENTS_LISTING, "GET /admin/clients?archived=", extra_filter={"subscription.archived": True}),
+        listing(TEAM_CLIENTS_LISTING, "GET /admin/team-clients"),
+        listing(TEAM_CLIENTS_LISTING, "GET /admin/team-clients?cursor=", cursor=listing_cursor),
+        listing(PROSPECTS_LISTING, "GET /admin/prospects"),
+        listing(PROSPECTS_LISTING, "GET /admin/prospects?cursor=", cursor=listing_cursor),
+        listing(PROSPECTS_LISTING, "GET /admin/prospects?search=", search="ana"),
+        listing(EXTERNAL_CLIENTS_LISTING, "GET /admin/external-clients"),
+        listing(EXTERNAL_CLIENTS_LISTING, "GET /admin/external-clients?cursor=", cursor=listing_cursor),
+        listing(WAITLIST_LISTING, "GET /admin/waitlist/all"),
+        listing(WAITLIST_LISTING, "GET /admin/waitlist/all?cursor=", cursor=listing_cursor),
+        listing(WAITLIST_LISTING, "GET /admin/waitlist/all?search=", search="ana"),
+        ("users", REVIEW_CANDIDATES_FILTER, None, "backfill_review_queue"),
+        ("review_queue", due_reviews_filter(now), REVIEW_QUEUE_SORT, "GET /admin/pending-reviews"),
+        ("review_queue", due_reviews_filter(now, "pending"), REVIEW_QUEUE_SORT, "GET /admin/pending-reviews?status="),
+        ("users", {"email": "user@example.com"}, None, "POST /auth/login"),
+        ("users", {"verification_token": "token"}, None, "GET /auth/verify-email"),
+        ("user_sessions", {"session_token": "token"}, None, "get_current_user"),
+        ("password_resets", {"token": "token"}, None, "POST /auth/reset-password"),
+        ("sessions", {"user_id": "u1"}, [("date", 1)], "GET /sessions/user/{id}"),
+        ("sessions", {}, [("date", 1)], "GET /admin/sessions"),
+        ("forms", {"user_id": "u1"}, None, "GET /users/dashboard"),
+        ("alerts", {"user_id": "u1"}, None, "GET /users/dashboard"),
+        messages("GET /messages/{id}"),
+        messages("GET /messages/{id}?before=", before=messages_cursor),
+        messages("GET /messages/{id}?since=", since=messages_cursor),
+        ("conversations", ADMIN_UNREAD_FILTER, [("last_message_at", -1)], "GET /messages/unread (admin)"),
+        ("pdfs", {"user_id": "u1"}, None, "GET /users/dashboard"),
+        ("pdfs", {"user_id": "u1", "content_hash": "hash"}, None, "pdf_render_service.find_cached_pdf"),
+        ("generation_jobs", claimable_jobs_filter(now, max_attempts), JOB_CLAIM_SORT, "claim_generation_job"),
+        ("generation_jobs", stuck_jobs_filter(now, now - timedelta(minutes=30), max_attempts), None, "job_worker timeout_watchdog"),
+        ("generation_jobs", jobs_created_since_filter("u1", now, "full"), None, "rate limit de generación"),
+        ("nutrition_questionnaire_submissions", {"user_id": "u1"}, [("submitted_at", -1)], "GET /admin/users/{id}/nutrition"),
+        ("follow_up_submissions", {"user_id": "u1"}, [("submission_date", -1)], "GET /admin/users/{id}/follow-ups"),
+        ("follow_up_submissions", {"user_id": "u1"}, [("created_at", 1)], "historial de seguimientos"),
+        ("follow_up_submissions", {"status": "pending_analysis"}, [("submission_date", -1)], "GET /admin/pending-reviews"),
+        ("training_plans", {"user_id": "u1"}, [("generated_at", -1)], "GET /admin/users/{id}/training"),
+        ("nutrition_plans", {"user_id": "u1"}, [("generated_at", -1)], "GET /admin/users/{id}/nutrition"),
+        ("user_subscriptions", {"user_id": "u1", "status": "active"}, None, "webhook de Stripe"),
+        ("payment_transactions", {}, [("created_at", -1), ("transaction_id", -1)], "GET /admin/all-payments"),
+        ("payment_transactions", {"payment_status": "succeeded"}, [("created_at", -1), ("transaction_id", -1)], "GET /admin/all-payments?status="),
+        ("payment_transactions", {"session_id": "cs_test"}, None, "GET /payments/status/{session_id}"),
+        ("manual_payments", {}, [("fecha", -1), ("_id", -1)], "GET /admin/all-payments (manuales)"),
+        ("email_outbox", claimable_emails_filter(now), OUTBOX_CLAIM_SORT, "email_outbox sender"),
+    ]
+
+
+def _key_tuple(index_info: dict) -> Tuple[Tuple[str, object], ...]:
+    # Los índices de texto se guardan como _fts/_ftsx + weights
+    if "weights" in index_info:
+        return tuple((field, "text") for field in sorted(index_info["weights"]))
+    return tuple((field, int(direction)) for field, direction in index_info["key"])
+
+
+async def reconcile_indexes(db, specs: Dict[str, List[IndexSpec]] = WEB_INDEXES) -> dict:
+    """
+    Crea los índices declarados que faltan en la BD
+
+    La comparación es por claves (no por nombre): un índice equivalente
+    creado antes con otro nombre cuenta como existente.
+
+    Returns:
+        {"created": [...], "existing": n, "undeclared": [...], "errors": {...}}
+    """
+    report = {"created": [], "existing": 0, "undeclared": [], "errors": {}}
+
+    for collection_name, collection_specs in specs.items():
+        collection = db[collection_name]
+        try:
+            current = await collection.index_information()
+            current_keys = {_key_tuple(info): name for name, info in current.items()}
+
+            missing = [spec for spec in collection_specs if spec.keys not in current_keys]
+            report["existing"] += len(collection_specs) - len(missing)
+
+            if missing:
+                await collection.create_indexes([spec.to_model() for spec in missing])
+                report["created"].extend(f"{collection_name}.{spec.name}" for spec in missing)
+
+            declared_keys = {spec.keys for spec in collection_specs}
+            for keys, name in current_keys.items():
+                if name != "_id_" and keys not in declared_keys:
+                    report["undeclared"].append(f"{collection_name}.{name}")
+
+        except Exception as e:
+            # Un fallo en una colección no impide reconciliar el resto
+            report["errors"][collection_name] = str(e)
+            logger.error(f"❌ Error reconciliando índices de {collection_name}: {e}")
+
+    if report["created"]:
+        logger.info(f"✅ Índices creados ({len(report['created'])}): {', '.join(report['created'])}")
+    logger.info(f"✅ Índices verificados: {report['existing']} existentes, {len(report['created'])} nuevos")
+    if report["undeclared"]:
+        logger.info(f"ℹ️ Índices no declarados (se conservan): {', '.join(report['undeclared'])}")
+
+    return report
+
+
+def find_collscan(plan: dict) -> bool:
+    """True si el plan de explain() contiene una etapa COLLSCAN"""
+    if not isinstance(plan, dict):
+        return False
+    if plan.get("stage") == "COLLSCAN":
+        return True
+    for key in ("inputStage", "queryPlan", "winningPlan"):
+        if find_collscan(plan.get(key)):
+            return True
+    return any(find_collscan(stage) for stage in plan.get("inputStages", []))
+
+
+_NEGATIONS = ("$ne", "$nin", "$not")
+
+
+def _constrained(value) -> bool:
+    """True si la condición sobre un campo acota un rango del índice"""
+    if isinstance(value, dict) and value and all(key.startswith("$") for key in value):
+        if value.get("$exists") is False:
+            return False
+        return any(key not in _NEGATIONS for key in value)
+    return True
+
+
+def _uses_index(specs: List[IndexSpec], query_filter: dict, sort: Optional[list]) -> bool:
+    """
+    Aproximación del planner: hay índice si restringe su primer campo, si
+    da el orden pedido, o si cada rama de un $or (o alguna condición de un
+    $and) lo tiene
+    """
+    if "$text" in query_filter:
+        return any(all(direction == "text" for _, direction in spec.keys) for spec in specs)
+
+    if sort:
+        sort_keys = tuple((field, int(direction)) for field, direction in sort)
+        reverse = tuple((field, -direction) for field, direction in sort_keys)
+        for spec in specs:
+            prefix = spec.keys[:len(sort_keys)]
+            if prefix in (sort_keys, reverse):
+                return True
+
+    rest = {key: value for key, value in query_filter.items() if key not in ("$or", "$and")}
+    leading = {spec.keys[0][0] for spec in specs if spec.keys[0][1] != "text"}
+    if any(field in leading and _constrained(value) for field, value in rest.items()):
+        return True
+
+    if "$and" in query_filter and any(_uses_index(specs, part, None) for part in query_filter["$and"]):
+        return True
+
+    if "$or" in query_filter:
+        return all(_uses_index(specs, {**rest, **branch}, None) for branch in query_filter["$or"])
+
+    return False
+
+
+def find_unindexed_queries(
+    queries: Optional[List[HotQuery]] = None,
+    specs: Dict[str, List[IndexSpec]] = WEB_INDEXES
+) -> List[HotQuery]:
+    """
+    Consultas calientes sin índice declarado en specs (sin consultar Mongo)
+    """
+    queries = hot_queries() if queries is None else queries
+    return [
+        query for query in queries
+        if not _uses_index(specs.get(query[0], []), query[1], query[2])
+    ]
+
+
+async def explain_hot_queries(db, queries: Optional[List[HotQuery]] = None) -> List[dict]:
+    """
+    Ejecuta explain() sobre cada consulta caliente
+
+    Returns:
+        [{"collection", "description", "collscan"}] por consulta
+    """
+    queries = hot_queries() if queries is None else queries
+    results = []
+    for collection_name, query_filter, sort, description in queries:
+        cursor = db[collection_name].find(query_filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        results.append({
+            "collection": collection_name,
+            "description": description,
+            "collscan": find_collscan(winning_plan)
+        })
+    return results
@@ -0,0 +1,331 @@
+"""
+Document Store - Almacenamiento de PDFs y documentos por contenido
+
+Cada fichero se escribe una vez en disco, direccionado por su SHA-256, y
+db.pdfs solo guarda la referencia (blob_id) y el tamaño:
+- Deduplicación con contador de referencias (colección document_blobs).
+  El fichero se escribe antes de sumar la referencia, y el borrado marca el
+  blob como `deleting` para que ninguna subida lo resucite a medio borrar.
+- Escrituras por chunks en un thread, con renombrado atómico.
+- Descargas en streaming con soporte de Range.
+
+Configuración: DOCUMENT_STORE_DIR
+
+Estructura en disco:
+    DOCUMENT_STORE_DIR/ab/cd/abcd1234...   (sha256 hex)
+"""
+
+import os
+import re
+import uuid
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_STORE_DIR = Path(os.getenv(
+    'DOCUMENT_STORE_DIR',
+    str(Path(__file__).parent / 'uploads' / 'blobs')
+))
+CHUNK_SIZE = 256 * 1024
+
+# Un blob marcado `deleting` más tiempo que esto es de un borrado interrumpido
+DELETING_STALE_SECONDS = 60
+ADD_REFERENCE_RETRIES = 50
+ADD_REFERENCE_RETRY_DELAY = 0.1
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def blob_path(blob_id: str) -> Path:
+    """Ruta en disco de un blob"""
+    return DOCUMENT_STORE_DIR / blob_id[:2] / blob_id[2:4] / blob_id
+
+
+def _write_blob_file(blob_id: str, data: bytes):
+    """Escribe un blob completo (se ejecuta en un thread)"""
+    path = blob_path(blob_id)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{blob_id}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _link_tmp_file(tmp_path: Path, blob_id: str):
+    """Enlaza un temporal en su ruta final si el blob no está en disco (el temporal se conserva)"""
+    path = blob_path(blob_id)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+
+
+async def _add_reference(db, blob_id: str, size: int) -> bool:
+    """
+    Suma una referencia al blob (el fichero ya debe estar en disco).
+
+    Returns:
+        False si el blob se está borrando: el fichero puede desaparecer y
+        hay que reescribirlo antes de reintentar.
+    """
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=DELETING_STALE_SECONDS)
+    try:
+        await db.document_blobs.update_one(
+            {
+                "_id": blob_id,
+                "$or": [
+                    {"deleting": {"$ne": True}},
+                    {"deleting_at": {"$lt": stale_before}}
+                ]
+            },
+            {
+                "$inc": {"ref_count": 1},
+                "$unset": {"deleting": "", "deleting_at": ""},
+                "$setOnInsert": {"size": size, "created_at": datetime.now(timezone.utc)}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # El filtro no casa porque el blob está marcado `deleting`
+        return False
+    return True
+
+
+async def _store_with_reference(db, blob_id: str, size: int, write_file):
+    """
+    Escribe el fichero y suma la referencia, reintentando mientras el blob se borra.
+
+    write_file debe ser idempotente (no hace nada si el blob ya está en disco):
+    se vuelve a llamar tras sumar la referencia por si un borrado quitó el
+    fichero entre la escritura y el upsert.
+    """
+    for _ in range(ADD_REFERENCE_RETRIES):
+        await asyncio.to_thread(write_file)
+        if await _add_reference(db, blob_id, size):
+            await asyncio.to_thread(write_file)
+            return
+        await asyncio.sleep(ADD_REFERENCE_RETRY_DELAY)
+    raise RuntimeError(f"Blob {blob_id} bloqueado por un borrado en curso")
+
+
+async def put_bytes(db, data: bytes) -> dict:
+    """
+    Guarda bytes en el store (deduplicado por hash)
+
+    Returns:
+        {"blob_id": sha256, "size": bytes}
+    """
+    blob_id = hashlib.sha256(data).hexdigest()
+    await _store_with_reference(db, blob_id, len(data), lambda: _write_blob_file(blob_id, data))
+    return {"blob_id": blob_id, "size": len(data)}
+
+
+async def put_upload(db, upload: UploadFile) -> dict:
+    """
+    Guarda un UploadFile leyéndolo por chunks (hash incremental, escritura en thread)
+
+    Returns:
+        {"blob_id": sha256, "size": bytes}
+    """
+    DOCUMENT_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = DOCUMENT_STORE_DIR / f".upload.{uuid.uuid4().hex}.tmp"
+    hasher = hashlib.sha256()
+    size = 0
+
+    tmp_file = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+            await asyncio.to_thread(tmp_file.write, chunk)
+    except BaseException:
+        tmp_file.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(tmp_file.close)
+
+    blob_id = hasher.hexdigest()
+    try:
+        await _store_with_reference(db, blob_id, size, lambda: _link_tmp_file(tmp_path, blob_id))
+    finally:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+    return {"blob_id": blob_id, "size": size}
+
+
+async def read_bytes(blob_id: str) -> Optional[bytes]:
+    """Lee un blob completo (None si no existe en disco)"""
+    path = blob_path(blob_id)
+    try:
+        return await asyncio.to_thread(path.read_bytes)
+    except FileNotFoundError:
+        logger.warning(f"⚠️ Blob no encontrado en disco: {blob_id}")
+        return None
+
+
+async def release_blob(db, blob_id: Optional[str]) -> int:
+    """
+    Quita una referencia a un blob y lo borra de disco si ya no se usa
+
+    Returns:
+        Bytes liberados en disco (0 si el blob sigue referenciado)
+    """
+    if not blob_id:
+        return 0
+
+    blob = await db.document_blobs.find_one_and_update(
+        {"_id": blob_id},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob or blob.get("ref_count", 0) > 0:
+        return 0
+
+    # Tombstone: a partir de aquí _add_reference no puede sumar referencias
+    tombstone = await db.document_blobs.find_one_and_update(
+        {"_id": blob_id, "ref_count": {"$lte": 0}, "deleting": {"$ne": True}},
+        {"$set": {"deleting": True, "deleting_at": datetime.now(timezone.utc)}}
+    )
+    if not tombstone:
+        return 0
+
+    path = blob_path(blob_id)
+    try:
+        await asyncio.to_thread(path.unlink)
+        bytes_freed = blob.get("size", 0)
+    except FileNotFoundError:
+        bytes_freed = 0
+
+    await db.document_blobs.delete_one({"_id": blob_id, "deleting": True})
+    return bytes_freed
+
+
+async def delete_pdf_document(db, pdf_id: str) -> int:
+    """
+    Borra un documento de db.pdfs y libera su binario
+    (blob del document store, o fichero legacy en file_path)
+
+    Returns:
+        Bytes liberados en disco
+    """
+    pdf = await db.pdfs.find_one_and_delete({"_id": pdf_id}, {"blob_id": 1, "file_path": 1})
+    if not pdf:
+        return 0
+
+    bytes_freed = await release_blob(db, pdf.get("blob_id"))
+
+    # Backwards compatibility: ficheros subidos antes del document store
+    if pdf.get("file_path"):
+        file_path = Path(pdf["file_path"])
+        try:
+            size = (await asyncio.to_thread(file_path.stat)).st_size
+            await asyncio.to_thread(file_path.unlink)
+            bytes_freed += size
+        except FileNotFoundError:
+            pass
+
+    return bytes_freed
+
+
+async def _iter_file_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Lee [start, end] (inclusive) por chunks sin bloquear el event loop"""
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """
+    Interpreta un header Range de un único rango.
+    Returns (start, end) inclusive, None si no hay Range válido.
+    Raises HTTPException 416 si el rango no es satisfacible.
+    """
+    if not range_header:
+        return None
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    if not match.group(1):
+        # Sufijo: últimos N bytes
+        length = int(match.group(2))
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        end = min(end, size - 1)
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Rango no satisfacible",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def blob_response(
+    request: Request,
+    blob_id: str,
+    filename: str,
+    media_type: str = "application/pdf"
+) -> Response:
+    """
+    Respuesta en streaming de un blob, con soporte de Range.
+    """
+    path = blob_path(blob_id)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "ETag": f'"{blob_id}"'
+    }
+
+    byte_range = _parse_range(request.headers.get("range"), size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            _iter_file_range(path, 0, size - 1),
+            media_type=media_type,
+            headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
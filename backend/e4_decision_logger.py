@@ -16,10 +16,10 @@ Los logs se persisten en MongoDB para auditoría y mejora continua.
 import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 from pydantic import BaseModel
 
+from database import get_edn360_db
+
 logger = logging.getLogger(__name__)
 
 class E4DecisionLog(BaseModel):
@@ -54,16 +54,13 @@ class E4DecisionLogger:
     """Logger para decisiones del E4"""
     
     def __init__(self):
-        self.mongo_client = None
         self.db = None
         self.collection_name = "e4_decision_logs"
         
     async def _get_collection(self):
-        """Obtiene la colección de logs"""
-        if self.mongo_client is None:
-            mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-            self.mongo_client = AsyncIOMotorClient(mongo_url)
-            self.db = self.mongo_client['edn360_app']
+        """Obtiene la colección de logs (cliente MongoDB compartido)"""
+        if self.db is None:
+            self.db = get_edn360_db()
         
         return self.db[self.collection_name]
     
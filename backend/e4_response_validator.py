@@ -13,15 +13,93 @@ Verifica:
 7. Cumplimiento de reglas de seguridad
 
 Si la validación falla, retorna errores detallados para reintentar.
+
+Benchmark:
+    python /app/backend/bench_e4_response_validator.py [directorio_de_respuestas]
 """
 
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, NamedTuple, Optional, Any, Tuple, Mapping, Sequence
 from pydantic import BaseModel, ValidationError
-from k1_knowledge_base import get_taxonomia, load_k1
+from k1_knowledge_base import get_taxonomia, get_taxonomy_sets, load_k1
 
 logger = logging.getLogger(__name__)
 
+ERROR = "error"
+WARNING = "warning"
+
+# Score mínimo para considerar válida una respuesta
+SCORE_THRESHOLD = 70
+
+# Comprobaciones (clave en ValidationResult.detalles) y penalización si tienen errores
+CHECK_PENALTIES = {
+    'estructura_valida': 30,
+    'solo_bloque_b': 20,
+    'terminos_k1_validos': 25,
+    'ejercicios_validos': 15,
+    'coherencia_logica': 5,
+    'k1_decisions_presentes': 5,
+}
+
+# Plantillas de los mensajes (se formatean solo al construir el resultado)
+ISSUE_MESSAGES = {
+    # Estructura
+    'missing_training_plan': "❌ Falta clave 'training_plan' en respuesta",
+    'missing_plan_field': "❌ Falta campo requerido: '{field}'",
+    'invalid_weeks': "❌ Weeks debe ser 4, recibido: {value}",
+    'empty_sessions': "❌ 'sessions' debe ser un array no vacío",
+    # Solo Bloque B
+    'forbidden_block': "❌ Sesión {session}: E4 no debe generar bloques A/C/D. Encontrado: Bloque {block_id}",
+    'core_block_included': "❌ Sesión {session}: 'core_mobility_block.include' debe ser False",
+    # Términos K1
+    'invalid_block_volume': "❌ Sesión {session}, Bloque {block}: 'volumen_total_bloque' inválido: '{value}'. Válidos: {validos}",
+    'invalid_block_density': "❌ Sesión {session}, Bloque {block}: 'densidad' inválida: '{value}'. Válidos: {validos}",
+    'invalid_block_method': "❌ Sesión {session}, Bloque {block}: 'metodo_entrenamiento' inválido: '{value}'. Válidos: {validos}",
+    'invalid_exercise_volume': "❌ Ejercicio '{exercise}': 'volumen_abstracto' inválido: '{value}'",
+    'invalid_exercise_intensity': "❌ Ejercicio '{exercise}': 'intensidad_abstracta' inválida: '{value}'",
+    'invalid_exercise_failure': "❌ Ejercicio '{exercise}': 'proximidad_fallo_abstracta' inválida: '{value}'",
+    'non_abstract_series': "⚠️ Ejercicio '{exercise}': 'series_abstracto' debería ser bajas/medias/altas",
+    'non_abstract_reps': "⚠️ Ejercicio '{exercise}': 'reps_abstracto' debería ser bajas/medias/altas",
+    # Ejercicios
+    'missing_exercise_id': "❌ Ejercicio #{number}: Falta 'exercise_id'",
+    'invalid_exercise_id': "❌ Ejercicio '{exercise}': ID debe ser slug válido (lowercase, underscores)",
+    'missing_pattern': "❌ Ejercicio '{exercise}': Falta campo 'patron'",
+    'invalid_pattern': "❌ Ejercicio '{exercise}': Patrón inválido '{value}'. Válidos: {validos}",
+    'missing_type': "❌ Ejercicio '{exercise}': Falta campo 'tipo'",
+    'invalid_type': "❌ Ejercicio '{exercise}': Tipo inválido '{value}'. Válidos: {validos}",
+    'justification_not_object': "⚠️ Ejercicio '{exercise}': 'k1_justification' debería ser objeto",
+    'missing_justification': "⚠️ Ejercicio '{exercise}': Falta justificación '{field}'",
+    # Coherencia lógica
+    'unusual_session_count': "⚠️ Número de sesiones inusual: {count}. Típicamente debería ser 2-6 sesiones/semana",
+    'session_without_exercises': "⚠️ Sesión {session}: No tiene ejercicios",
+    'session_too_many_exercises': "⚠️ Sesión {session}: Demasiados ejercicios ({count}). Podría ser excesivo para una sesión",
+    # Decisiones K1
+    'missing_k1_decisions': "⚠️ Sesión {session}: Falta 'k1_decisions' para auditoría",
+    'missing_k1_decision_field': "⚠️ Sesión {session}: Falta '{field}' en k1_decisions",
+}
+
+# Errores que fuerzan reintento aunque el score llegue al umbral (los que
+# antes se detectaban buscando 'training_plan' o 'inválido' en el mensaje)
+CRITICAL_CODES = frozenset({
+    'missing_training_plan',
+    'invalid_block_volume',
+    'invalid_block_method',
+    'invalid_exercise_volume',
+    'invalid_pattern',
+    'invalid_type',
+})
+
+ABSTRACT_LEVELS = frozenset({'bajas', 'medias', 'altas'})
+REQUIRED_PLAN_FIELDS = ('training_type', 'days_per_week', 'weeks', 'sessions', 'goal')
+REQUIRED_JUSTIFICATION_FIELDS = ('por_que_este_ejercicio', 'por_que_este_volumen', 'por_que_esta_intensidad')
+REQUIRED_K1_DECISION_FIELDS = (
+    'reglas_aplicadas',
+    'volumen_justificacion',
+    'intensidad_justificacion',
+    'metodos_usados',
+    'patrones_cubiertos'
+)
+
 class ValidationResult(BaseModel):
     """Resultado de validación"""
     valido: bool
@@ -29,364 +107,443 @@ class ValidationResult(BaseModel):
     advertencias: List[str] = []
     score: int = 0  # 0-100
     detalles: Dict[str, Any] = {}
+    incidencias: List[Dict[str, Any]] = []  # {code, check, severity, path} de cada error/advertencia
 
-class E4ResponseValidator:
-    """Validador de respuestas del E4"""
-    
-    def __init__(self):
-        self.k1 = load_k1()
-        self.taxonomia = get_taxonomia()
-        
-    def validate_full_response(self, e4_response: Dict) -> ValidationResult:
-        """
-        Validación completa de la respuesta de E4
-        
-        Args:
-            e4_response: Respuesta completa del E4
-            
-        Returns:
-            ValidationResult con errores, advertencias y score
-        """
-        errores = []
-        advertencias = []
-        score = 100
-        detalles = {}
-        
-        # 1. Validar estructura básica
-        estructura_ok, estructura_errores = self._validate_structure(e4_response)
-        if not estructura_ok:
-            errores.extend(estructura_errores)
-            score -= 30
-        
-        # 2. Validar que solo incluya Bloque B
-        bloques_ok, bloques_errores = self._validate_only_block_b(e4_response)
-        if not bloques_ok:
-            errores.extend(bloques_errores)
-            score -= 20
-        
-        # 3. Validar términos abstractos K1
-        terminos_ok, terminos_errores, terminos_warns = self._validate_k1_terms(e4_response)
-        if not terminos_ok:
-            errores.extend(terminos_errores)
-            score -= 25
-        advertencias.extend(terminos_warns)
-        
-        # 4. Validar ejercicios (IDs, patrones, tipos)
-        ejercicios_ok, ejercicios_errores, ejercicios_warns = self._validate_exercises(e4_response)
-        if not ejercicios_ok:
-            errores.extend(ejercicios_errores)
-            score -= 15
-        advertencias.extend(ejercicios_warns)
-        
-        # 5. Validar coherencia lógica
-        coherencia_ok, coherencia_warns = self._validate_logical_coherence(e4_response)
-        if not coherencia_ok:
-            score -= 5
-        advertencias.extend(coherencia_warns)
-        
-        # 6. Validar decisiones K1
-        k1_decisions_ok, k1_decisions_warns = self._validate_k1_decisions(e4_response)
-        if not k1_decisions_ok:
-            score -= 5
-        advertencias.extend(k1_decisions_warns)
-        
-        detalles = {
-            'estructura_valida': estructura_ok,
-            'solo_bloque_b': bloques_ok,
-            'terminos_k1_validos': terminos_ok,
-            'ejercicios_validos': ejercicios_ok,
-            'coherencia_logica': coherencia_ok,
-            'k1_decisions_presentes': k1_decisions_ok
+
+class ValidationIssue(NamedTuple):
+    """Incidencia de validación (el mensaje se formatea solo en render())"""
+    check: str
+    severity: str
+    code: str
+    path: Tuple
+    params: Mapping[str, Any]
+
+    @property
+    def critical(self) -> bool:
+        return self.severity == ERROR and self.code in CRITICAL_CODES
+
+    @property
+    def path_str(self) -> str:
+        parts = []
+        for part in self.path:
+            if isinstance(part, int):
+                parts.append(f"[{part}]")
+            else:
+                parts.append(f".{part}" if parts else part)
+        return "".join(parts)
+
+    def render(self) -> str:
+        params = {
+            key: set(value) if isinstance(value, frozenset) else value
+            for key, value in self.params.items()
         }
-        
-        return ValidationResult(
-            valido=(score >= 70),  # Threshold: 70/100
-            errores=errores,
-            advertencias=advertencias,
-            score=max(0, score),
-            detalles=detalles
-        )
-    
-    def _validate_structure(self, response: Dict) -> Tuple[bool, List[str]]:
-        """Valida estructura básica de la respuesta"""
-        errores = []
-        
+        return ISSUE_MESSAGES[self.code].format(**params)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "check": self.check, "severity": self.severity, "path": list(self.path)}
+
+
+class _RetryDecided(Exception):
+    """Corta el recorrido en modo fail-fast"""
+
+
+class IssueCollector:
+    """
+    Acumula las incidencias del recorrido
+
+    En modo fail_fast no guarda advertencias y corta el recorrido en cuanto
+    hay un error crítico o el score baja del umbral.
+    """
+
+    def __init__(self, fail_fast: bool = False):
+        self.fail_fast = fail_fast
+        self.issues: List[ValidationIssue] = []
+        self.failed_checks = set()
+        self.penalty = 0
+
+    def error(self, check: str, code: str, path: Tuple, **params):
+        issue = ValidationIssue(check, ERROR, code, path, params)
+        self.issues.append(issue)
+        if check not in self.failed_checks:
+            self.failed_checks.add(check)
+            self.penalty += CHECK_PENALTIES.get(check, 0)
+        if self.fail_fast and (issue.critical or 100 - self.penalty < SCORE_THRESHOLD):
+            raise _RetryDecided()
+
+    def warning(self, check: str, code: str, path: Tuple, **params):
+        if not self.fail_fast:
+            self.issues.append(ValidationIssue(check, WARNING, code, path, params))
+
+
+class E4Rule:
+    """
+    Regla del validador: implementa solo los visit_* que necesita
+
+    Rutas: tuplas ('training_plan', 'sessions', 0, 'blocks', 1, ...).
+    Las reglas con warnings_only no se ejecutan en should_retry_response.
+    """
+    check = ''
+    warnings_only = False
+
+    def __init__(self, validator: 'E4ResponseValidator'):
+        self.taxonomy_sets = validator.taxonomy_sets
+
+    def visit_response(self, issues: IssueCollector, response: Dict, plan: Dict, sessions: List):
+        pass
+
+    def visit_session(self, issues: IssueCollector, session_idx: int, session: Dict, path: Tuple):
+        pass
+
+    def visit_block(self, issues: IssueCollector, session_idx: int, block_idx: int, block: Dict, path: Tuple):
+        pass
+
+    def visit_exercise(self, issues: IssueCollector, ex_idx: int, exercise: Dict, block_path: Tuple):
+        """block_path: ruta del bloque (la del ejercicio solo se construye si hay incidencia)"""
+
+    def end_session(self, issues: IssueCollector, session_idx: int, session: Dict, path: Tuple):
+        pass
+
+
+def _exercise_path(block_path: Tuple, ex_idx: int, *fields) -> Tuple:
+    return block_path + ('exercises', ex_idx) + fields
+
+
+class StructureRule(E4Rule):
+    """Estructura básica de la respuesta"""
+    check = 'estructura_valida'
+
+    def visit_response(self, issues, response, plan, sessions):
         if 'training_plan' not in response:
-            errores.append("❌ Falta clave 'training_plan' en respuesta")
-            return False, errores
-        
-        plan = response['training_plan']
-        
+            issues.error(self.check, 'missing_training_plan', ('training_plan',))
+            return
+
         # Campos requeridos
-        required_fields = ['training_type', 'days_per_week', 'weeks', 'sessions', 'goal']
-        for field in required_fields:
+        for field in REQUIRED_PLAN_FIELDS:
             if field not in plan:
-                errores.append(f"❌ Falta campo requerido: '{field}'")
-        
+                issues.error(self.check, 'missing_plan_field', ('training_plan', field), field=field)
+
         # Weeks debe ser 4
         if plan.get('weeks') != 4:
-            errores.append(f"❌ Weeks debe ser 4, recibido: {plan.get('weeks')}")
-        
+            issues.error(self.check, 'invalid_weeks', ('training_plan', 'weeks'), value=plan.get('weeks'))
+
         # Sessions debe ser array no vacío
         if 'sessions' not in plan or not isinstance(plan['sessions'], list) or len(plan['sessions']) == 0:
-            errores.append("❌ 'sessions' debe ser un array no vacío")
-        
-        return (len(errores) == 0), errores
-    
-    def _validate_only_block_b(self, response: Dict) -> Tuple[bool, List[str]]:
-        """Valida que E4 solo generó Bloque B"""
-        errores = []
-        
-        plan = response.get('training_plan', {})
-        sessions = plan.get('sessions', [])
-        
-        for session_idx, session in enumerate(sessions):
-            blocks = session.get('blocks', [])
-            
-            for block in blocks:
-                block_id = block.get('id', '')
-                
-                # Solo debe haber Bloque B
-                if block_id != 'B':
-                    errores.append(
-                        f"❌ Sesión {session_idx + 1}: E4 no debe generar bloques A/C/D. "
-                        f"Encontrado: Bloque {block_id}"
+            issues.error(self.check, 'empty_sessions', ('training_plan', 'sessions'))
+
+
+class OnlyBlockBRule(E4Rule):
+    """E4 solo genera el Bloque B y deja core_mobility_block desactivado"""
+    check = 'solo_bloque_b'
+
+    def visit_block(self, issues, session_idx, block_idx, block, path):
+        block_id = block.get('id', '')
+        if block_id != 'B':
+            issues.error(self.check, 'forbidden_block', path + ('id',), session=session_idx + 1, block_id=block_id)
+
+    def end_session(self, issues, session_idx, session, path):
+        core_block = session.get('core_mobility_block', {})
+        if core_block.get('include', False) != False:
+            issues.error(
+                self.check, 'core_block_included', path + ('core_mobility_block', 'include'),
+                session=session_idx + 1
+            )
+
+
+class K1TermsRule(E4Rule):
+    """Términos abstractos K1 válidos en bloques y ejercicios"""
+    check = 'terminos_k1_validos'
+
+    def __init__(self, validator):
+        super().__init__(validator)
+        self.categorias_volumen = self.taxonomy_sets['categorias_volumen']
+        self.categorias_intensidad = self.taxonomy_sets['categorias_intensidad_carga']
+        self.categorias_fallo = self.taxonomy_sets['categorias_proximidad_fallo']
+        self.categorias_densidad = self.taxonomy_sets['categorias_densidad']
+        self.categorias_metodos = self.taxonomy_sets['categorias_metodos']
+
+    def visit_block(self, issues, session_idx, block_idx, block, path):
+        vol_bloque = block.get('volumen_total_bloque')
+        if vol_bloque and vol_bloque not in self.categorias_volumen:
+            issues.error(
+                self.check, 'invalid_block_volume', path + ('volumen_total_bloque',),
+                session=session_idx + 1, block=block_idx + 1, value=vol_bloque, validos=self.categorias_volumen
+            )
+
+        densidad = block.get('densidad')
+        if densidad and densidad not in self.categorias_densidad:
+            issues.error(
+                self.check, 'invalid_block_density', path + ('densidad',),
+                session=session_idx + 1, block=block_idx + 1, value=densidad, validos=self.categorias_densidad
+            )
+
+        metodo = block.get('metodo_entrenamiento')
+        if metodo and metodo not in self.categorias_metodos:
+            issues.error(
+                self.check, 'invalid_block_method', path + ('metodo_entrenamiento',),
+                session=session_idx + 1, block=block_idx + 1, value=metodo, validos=self.categorias_metodos
+            )
+
+    def visit_exercise(self, issues, ex_idx, exercise, block_path):
+        vol_abs = exercise.get('volumen_abstracto')
+        if vol_abs and vol_abs not in self.categorias_volumen:
+            issues.error(
+                self.check, 'invalid_exercise_volume', _exercise_path(block_path, ex_idx, 'volumen_abstracto'),
+                exercise=self._name(ex_idx, exercise), value=vol_abs
+            )
+
+        int_abs = exercise.get('intensidad_abstracta')
+        if int_abs and int_abs not in self.categorias_intensidad:
+            issues.error(
+                self.check, 'invalid_exercise_intensity', _exercise_path(block_path, ex_idx, 'intensidad_abstracta'),
+                exercise=self._name(ex_idx, exercise), value=int_abs
+            )
+
+        prox_fallo = exercise.get('proximidad_fallo_abstracta')
+        if prox_fallo and prox_fallo not in self.categorias_fallo:
+            issues.error(
+                self.check, 'invalid_exercise_failure',
+                _exercise_path(block_path, ex_idx, 'proximidad_fallo_abstracta'),
+                exercise=self._name(ex_idx, exercise), value=prox_fallo
+            )
+
+        # Series y reps abstractas
+        series_abs = exercise.get('series_abstracto')
+        if series_abs and series_abs not in ABSTRACT_LEVELS:
+            issues.warning(
+                self.check, 'non_abstract_series', _exercise_path(block_path, ex_idx, 'series_abstracto'),
+                exercise=self._name(ex_idx, exercise)
+            )
+
+        reps_abs = exercise.get('reps_abstracto')
+        if reps_abs and reps_abs not in ABSTRACT_LEVELS:
+            issues.warning(
+                self.check, 'non_abstract_reps', _exercise_path(block_path, ex_idx, 'reps_abstracto'),
+                exercise=self._name(ex_idx, exercise)
+            )
+
+    @staticmethod
+    def _name(ex_idx: int, exercise: Dict):
+        return exercise.get('exercise_id', f'ejercicio_{ex_idx + 1}')
+
+
+class ExercisesRule(E4Rule):
+    """Ejercicios: IDs, patrones, tipos y justificaciones"""
+    check = 'ejercicios_validos'
+
+    def __init__(self, validator):
+        super().__init__(validator)
+        self.patrones_validos = self.taxonomy_sets['patrones_movimiento']
+        self.tipos_validos = self.taxonomy_sets['tipos_ejercicio']
+
+    def visit_exercise(self, issues, ex_idx, exercise, block_path):
+        # Validar exercise_id existe
+        ex_id = exercise.get('exercise_id')
+        if not ex_id:
+            issues.error(
+                self.check, 'missing_exercise_id', _exercise_path(block_path, ex_idx, 'exercise_id'),
+                number=ex_idx + 1
+            )
+            return
+
+        # Validar exercise_id es string válido (slug)
+        if not isinstance(ex_id, str) or not ex_id.replace('_', '').isalnum():
+            issues.error(
+                self.check, 'invalid_exercise_id', _exercise_path(block_path, ex_idx, 'exercise_id'),
+                exercise=ex_id
+            )
+
+        # Validar patrón
+        patron = exercise.get('patron')
+        if not patron:
+            issues.error(self.check, 'missing_pattern', _exercise_path(block_path, ex_idx, 'patron'), exercise=ex_id)
+        elif patron not in self.patrones_validos:
+            issues.error(
+                self.check, 'invalid_pattern', _exercise_path(block_path, ex_idx, 'patron'),
+                exercise=ex_id, value=patron, validos=self.patrones_validos
+            )
+
+        # Validar tipo
+        tipo = exercise.get('tipo')
+        if not tipo:
+            issues.error(self.check, 'missing_type', _exercise_path(block_path, ex_idx, 'tipo'), exercise=ex_id)
+        elif tipo not in self.tipos_validos:
+            issues.error(
+                self.check, 'invalid_type', _exercise_path(block_path, ex_idx, 'tipo'),
+                exercise=ex_id, value=tipo, validos=self.tipos_validos
+            )
+
+        # Las justificaciones solo generan advertencias
+        if issues.fail_fast:
+            return
+
+        # Validar k1_justification
+        justif = exercise.get('k1_justification', {})
+        if not isinstance(justif, dict):
+            issues.warning(
+                self.check, 'justification_not_object', _exercise_path(block_path, ex_idx, 'k1_justification'),
+                exercise=ex_id
+            )
+        else:
+            for field in REQUIRED_JUSTIFICATION_FIELDS:
+                if field not in justif or not justif[field]:
+                    issues.warning(
+                        self.check, 'missing_justification',
+                        _exercise_path(block_path, ex_idx, 'k1_justification', field),
+                        exercise=ex_id, field=field
                     )
-                
-            # Validar que core_mobility_block esté desactivado
-            core_block = session.get('core_mobility_block', {})
-            if core_block.get('include', False) != False:
-                errores.append(
-                    f"❌ Sesión {session_idx + 1}: 'core_mobility_block.include' debe ser False"
+
+
+class LogicalCoherenceRule(E4Rule):
+    """Coherencia lógica del plan (solo advertencias)"""
+    check = 'coherencia_logica'
+    warnings_only = True
+
+    def visit_response(self, issues, response, plan, sessions):
+        # Validar que hay un número razonable de sesiones
+        if len(sessions) < 2 or len(sessions) > 7:
+            issues.warning(self.check, 'unusual_session_count', ('training_plan', 'sessions'), count=len(sessions))
+
+    def visit_session(self, issues, session_idx, session, path):
+        # Validar que cada sesión tiene ejercicios
+        total_exercises = sum(len(block.get('exercises', [])) for block in session.get('blocks', []))
+        if total_exercises == 0:
+            issues.warning(self.check, 'session_without_exercises', path, session=session_idx + 1)
+        elif total_exercises > 15:
+            issues.warning(
+                self.check, 'session_too_many_exercises', path,
+                session=session_idx + 1, count=total_exercises
+            )
+
+
+class K1DecisionsRule(E4Rule):
+    """Decisiones K1 por sesión para auditoría (solo advertencias)"""
+    check = 'k1_decisions_presentes'
+    warnings_only = True
+
+    def visit_session(self, issues, session_idx, session, path):
+        k1_decisions = session.get('k1_decisions', {})
+        if not k1_decisions:
+            issues.warning(self.check, 'missing_k1_decisions', path + ('k1_decisions',), session=session_idx + 1)
+            return
+
+        for field in REQUIRED_K1_DECISION_FIELDS:
+            if field not in k1_decisions or not k1_decisions[field]:
+                issues.warning(
+                    self.check, 'missing_k1_decision_field', path + ('k1_decisions', field),
+                    session=session_idx + 1, field=field
                 )
-        
-        return (len(errores) == 0), errores
+
+
+DEFAULT_RULES = (
+    StructureRule,
+    OnlyBlockBRule,
+    K1TermsRule,
+    ExercisesRule,
+    LogicalCoherenceRule,
+    K1DecisionsRule,
+)
+
+
+class _Hooks:
+    """Métodos visit_* que cada regla sobrescribe (el resto no se llama)"""
+
+    def __init__(self, rules: Sequence[E4Rule]):
+        for name in ('visit_response', 'visit_session', 'visit_block', 'visit_exercise', 'end_session'):
+            setattr(self, name, [
+                getattr(rule, name) for rule in rules
+                if getattr(type(rule), name) is not getattr(E4Rule, name)
+            ])
+
+
+class E4ResponseValidator:
+    """Validador de respuestas del E4"""
     
-    def _validate_k1_terms(self, response: Dict) -> Tuple[bool, List[str], List[str]]:
-        """Valida que se usen términos abstractos K1 válidos"""
-        errores = []
-        advertencias = []
-        
-        # Obtener categorías válidas de K1
-        categorias_volumen = set(self.taxonomia['categorias_volumen'])
-        categorias_intensidad = set(self.taxonomia['categorias_intensidad_carga'])
-        categorias_fallo = set(self.taxonomia['categorias_proximidad_fallo'])
-        categorias_densidad = set(self.taxonomia['categorias_densidad'])
-        categorias_metodos = set(self.taxonomia['categorias_metodos'])
-        
-        plan = response.get('training_plan', {})
-        sessions = plan.get('sessions', [])
-        
-        for session_idx, session in enumerate(sessions):
-            blocks = session.get('blocks', [])
-            
-            for block_idx, block in enumerate(blocks):
-                # Validar bloque
-                vol_bloque = block.get('volumen_total_bloque')
-                if vol_bloque and vol_bloque not in categorias_volumen:
-                    errores.append(
-                        f"❌ Sesión {session_idx + 1}, Bloque {block_idx + 1}: "
-                        f"'volumen_total_bloque' inválido: '{vol_bloque}'. "
-                        f"Válidos: {categorias_volumen}"
-                    )
-                
-                densidad = block.get('densidad')
-                if densidad and densidad not in categorias_densidad:
-                    errores.append(
-                        f"❌ Sesión {session_idx + 1}, Bloque {block_idx + 1}: "
-                        f"'densidad' inválida: '{densidad}'. "
-                        f"Válidos: {categorias_densidad}"
-                    )
-                
-                metodo = block.get('metodo_entrenamiento')
-                if metodo and metodo not in categorias_metodos:
-                    errores.append(
-                        f"❌ Sesión {session_idx + 1}, Bloque {block_idx + 1}: "
-                        f"'metodo_entrenamiento' inválido: '{metodo}'. "
-                        f"Válidos: {categorias_metodos}"
-                    )
-                
-                # Validar ejercicios
-                exercises = block.get('exercises', [])
-                for ex_idx, exercise in enumerate(exercises):
-                    ex_name = exercise.get('exercise_id', f'ejercicio_{ex_idx + 1}')
-                    
-                    # Volumen abstracto
-                    vol_abs = exercise.get('volumen_abstracto')
-                    if vol_abs and vol_abs not in categorias_volumen:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_name}': 'volumen_abstracto' inválido: '{vol_abs}'"
-                        )
-                    
-                    # Intensidad abstracta
-                    int_abs = exercise.get('intensidad_abstracta')
-                    if int_abs and int_abs not in categorias_intensidad:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_name}': 'intensidad_abstracta' inválida: '{int_abs}'"
-                        )
-                    
-                    # Proximidad fallo
-                    prox_fallo = exercise.get('proximidad_fallo_abstracta')
-                    if prox_fallo and prox_fallo not in categorias_fallo:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_name}': 'proximidad_fallo_abstracta' inválida: '{prox_fallo}'"
-                        )
-                    
-                    # Series y reps abstractas
-                    series_abs = exercise.get('series_abstracto')
-                    if series_abs and series_abs not in ['bajas', 'medias', 'altas']:
-                        advertencias.append(
-                            f"⚠️ Ejercicio '{ex_name}': 'series_abstracto' debería ser bajas/medias/altas"
-                        )
-                    
-                    reps_abs = exercise.get('reps_abstracto')
-                    if reps_abs and reps_abs not in ['bajas', 'medias', 'altas']:
-                        advertencias.append(
-                            f"⚠️ Ejercicio '{ex_name}': 'reps_abstracto' debería ser bajas/medias/altas"
-                        )
+    def __init__(self, rules: Optional[Sequence[type]] = None):
+        self.k1 = load_k1()
+        self.taxonomia = get_taxonomia()
+        # Conjuntos precompilados por el engine K1 (compartidos, no se copian)
+        self.taxonomy_sets = get_taxonomy_sets()
         
-        return (len(errores) == 0), errores, advertencias
+        self.rules = [rule(self) for rule in (rules or DEFAULT_RULES)]
+        self._hooks = _Hooks(self.rules)
+        self._fail_fast_hooks = _Hooks([rule for rule in self.rules if not rule.warnings_only])
     
-    def _validate_exercises(self, response: Dict) -> Tuple[bool, List[str], List[str]]:
-        """Valida ejercicios (IDs, patrones, tipos)"""
-        errores = []
-        advertencias = []
-        
-        # Obtener patrones y tipos válidos
-        patrones_validos = set(self.taxonomia['patrones_movimiento'])
-        tipos_validos = set(self.taxonomia['tipos_ejercicio'])
-        
-        plan = response.get('training_plan', {})
+    def _walk(self, e4_response: Dict, issues: IssueCollector):
+        """Un solo recorrido de training_plan.sessions[].blocks[].exercises[]"""
+        hooks = self._fail_fast_hooks if issues.fail_fast else self._hooks
+        plan = e4_response.get('training_plan', {})
         sessions = plan.get('sessions', [])
         
+        for hook in hooks.visit_response:
+            hook(issues, e4_response, plan, sessions)
+        
+        on_block, on_exercise = hooks.visit_block, hooks.visit_exercise
         for session_idx, session in enumerate(sessions):
-            blocks = session.get('blocks', [])
+            session_path = ('training_plan', 'sessions', session_idx)
+            for hook in hooks.visit_session:
+                hook(issues, session_idx, session, session_path)
             
-            for block in blocks:
-                exercises = block.get('exercises', [])
-                
-                for ex_idx, exercise in enumerate(exercises):
-                    # Validar exercise_id existe
-                    ex_id = exercise.get('exercise_id')
-                    if not ex_id:
-                        errores.append(
-                            f"❌ Ejercicio #{ex_idx + 1}: Falta 'exercise_id'"
-                        )
-                        continue
-                    
-                    # Validar exercise_id es string válido (slug)
-                    if not isinstance(ex_id, str) or not ex_id.replace('_', '').isalnum():
-                        errores.append(
-                            f"❌ Ejercicio '{ex_id}': ID debe ser slug válido (lowercase, underscores)"
-                        )
-                    
-                    # Validar patrón
-                    patron = exercise.get('patron')
-                    if not patron:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_id}': Falta campo 'patron'"
-                        )
-                    elif patron not in patrones_validos:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_id}': Patrón inválido '{patron}'. "
-                            f"Válidos: {patrones_validos}"
-                        )
-                    
-                    # Validar tipo
-                    tipo = exercise.get('tipo')
-                    if not tipo:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_id}': Falta campo 'tipo'"
-                        )
-                    elif tipo not in tipos_validos:
-                        errores.append(
-                            f"❌ Ejercicio '{ex_id}': Tipo inválido '{tipo}'. "
-                            f"Válidos: {tipos_validos}"
-                        )
-                    
-                    # Validar k1_justification
-                    justif = exercise.get('k1_justification', {})
-                    if not isinstance(justif, dict):
-                        advertencias.append(
-                            f"⚠️ Ejercicio '{ex_id}': 'k1_justification' debería ser objeto"
-                        )
-                    else:
-                        required_justif_fields = [
-                            'por_que_este_ejercicio',
-                            'por_que_este_volumen',
-                            'por_que_esta_intensidad'
-                        ]
-                        for field in required_justif_fields:
-                            if field not in justif or not justif[field]:
-                                advertencias.append(
-                                    f"⚠️ Ejercicio '{ex_id}': Falta justificación '{field}'"
-                                )
-        
-        return (len(errores) == 0), errores, advertencias
+            if on_block or on_exercise:
+                for block_idx, block in enumerate(session.get('blocks', [])):
+                    block_path = session_path + ('blocks', block_idx)
+                    for hook in on_block:
+                        hook(issues, session_idx, block_idx, block, block_path)
+                    if on_exercise:
+                        for ex_idx, exercise in enumerate(block.get('exercises', [])):
+                            for hook in on_exercise:
+                                hook(issues, ex_idx, exercise, block_path)
+            
+            for hook in hooks.end_session:
+                hook(issues, session_idx, session, session_path)
     
-    def _validate_logical_coherence(self, response: Dict) -> Tuple[bool, List[str]]:
-        """Valida coherencia lógica del plan"""
-        advertencias = []
-        
-        plan = response.get('training_plan', {})
-        sessions = plan.get('sessions', [])
-        
-        # Validar que hay un número razonable de sesiones
-        if len(sessions) < 2 or len(sessions) > 7:
-            advertencias.append(
-                f"⚠️ Número de sesiones inusual: {len(sessions)}. "
-                "Típicamente debería ser 2-6 sesiones/semana"
-            )
+    def collect_issues(self, e4_response: Dict) -> List[ValidationIssue]:
+        """Incidencias sin formatear (errores y advertencias) de una respuesta"""
+        issues = IssueCollector()
+        self._walk(e4_response, issues)
+        return issues.issues
+    
+    def validate_full_response(self, e4_response: Dict) -> ValidationResult:
+        """
+        Validación completa de la respuesta de E4
         
-        # Validar que cada sesión tiene ejercicios
-        for session_idx, session in enumerate(sessions):
-            blocks = session.get('blocks', [])
-            total_exercises = sum(len(block.get('exercises', [])) for block in blocks)
+        Args:
+            e4_response: Respuesta completa del E4
             
-            if total_exercises == 0:
-                advertencias.append(
-                    f"⚠️ Sesión {session_idx + 1}: No tiene ejercicios"
-                )
-            elif total_exercises > 15:
-                advertencias.append(
-                    f"⚠️ Sesión {session_idx + 1}: Demasiados ejercicios ({total_exercises}). "
-                    "Podría ser excesivo para una sesión"
-                )
-        
-        return True, advertencias
-    
-    def _validate_k1_decisions(self, response: Dict) -> Tuple[bool, List[str]]:
-        """Valida que existan las decisiones K1 para auditoría"""
-        advertencias = []
+        Returns:
+            ValidationResult con errores, advertencias y score
+        """
+        issues = IssueCollector()
+        self._walk(e4_response, issues)
         
-        plan = response.get('training_plan', {})
-        sessions = plan.get('sessions', [])
+        # Mensajes agrupados por comprobación (mismo orden que CHECK_PENALTIES)
+        by_check = {check: [] for check in CHECK_PENALTIES}
+        for issue in issues.issues:
+            by_check.setdefault(issue.check, []).append(issue)
+        ordered = [issue for check_issues in by_check.values() for issue in check_issues]
         
-        for session_idx, session in enumerate(sessions):
-            k1_decisions = session.get('k1_decisions', {})
-            
-            if not k1_decisions:
-                advertencias.append(
-                    f"⚠️ Sesión {session_idx + 1}: Falta 'k1_decisions' para auditoría"
-                )
-                continue
-            
-            # Validar campos de k1_decisions
-            required_fields = [
-                'reglas_aplicadas',
-                'volumen_justificacion',
-                'intensidad_justificacion',
-                'metodos_usados',
-                'patrones_cubiertos'
-            ]
-            
-            for field in required_fields:
-                if field not in k1_decisions or not k1_decisions[field]:
-                    advertencias.append(
-                        f"⚠️ Sesión {session_idx + 1}: Falta '{field}' en k1_decisions"
-                    )
+        score = 100 - issues.penalty
         
-        return True, advertencias
+        return ValidationResult(
+            valido=(score >= SCORE_THRESHOLD),  # Threshold: 70/100
+            errores=[issue.render() for issue in ordered if issue.severity == ERROR],
+            advertencias=[issue.render() for issue in ordered if issue.severity == WARNING],
+            score=max(0, score),
+            detalles={check: check not in issues.failed_checks for check in by_check},
+            incidencias=[issue.to_dict() for issue in ordered]
+        )
+    
+    def should_retry_response(self, e4_response: Dict) -> bool:
+        """
+        Igual que should_retry(validate_full_response(e4_response)), pero
+        sin formatear mensajes y parando en cuanto la decisión es segura
+        (primer error crítico o score por debajo del umbral).
+        """
+        issues = IssueCollector(fail_fast=True)
+        try:
+            self._walk(e4_response, issues)
+        except _RetryDecided:
+            return True
+        return False
     
     def should_retry(self, validation_result: ValidationResult) -> bool:
         """
@@ -404,7 +561,13 @@ class E4ResponseValidator:
             return True
         
         # Si hay errores críticos en estructura o términos K1, reintentar
-        errores_criticos = [e for e in validation_result.errores if 'training_plan' in e or 'inválido' in e]
+        if validation_result.incidencias:
+            errores_criticos = [
+                i for i in validation_result.incidencias
+                if i['severity'] == ERROR and i['code'] in CRITICAL_CODES
+            ]
+        else:
+            errores_criticos = [e for e in validation_result.errores if 'training_plan' in e or 'inválido' in e]
         if errores_criticos:
             logger.warning(f"⚠️ Errores críticos detectados: {len(errores_criticos)}")
             return True
@@ -0,0 +1,406 @@
+"""
+Email Outbox - Envío de emails en background con pool SMTP
+
+Los endpoints encolan los emails en la colección email_outbox y un sender en
+background los envía por un pool de conexiones SMTP persistentes, con rate
+limit y reintentos con backoff. Fuera del servidor (scripts) email_utils
+envía directamente, reutilizando el mismo pool.
+
+Configuración: EMAIL_SMTP_POOL_SIZE, EMAIL_BATCH_SIZE,
+EMAIL_RATE_PER_SECOND, EMAIL_MAX_ATTEMPTS
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+from database import get_web_db
+
+logger = logging.getLogger(__name__)
+
+EMAIL_SMTP_POOL_SIZE = int(os.getenv('EMAIL_SMTP_POOL_SIZE', '2'))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '20'))
+EMAIL_RATE_PER_SECOND = float(os.getenv('EMAIL_RATE_PER_SECOND', '5'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '5'))
+
+# Espera del sender cuando el outbox está vacío (se despierta antes al encolar)
+OUTBOX_IDLE_POLL_SECONDS = 30
+# Tiempo tras el cual un lote "sending" se considera abandonado (proceso caído)
+OUTBOX_LOCK_SECONDS = 300
+# Gmail cierra conexiones inactivas; no reutilizar conexiones más viejas que esto
+SMTP_MAX_IDLE_SECONDS = 240
+
+
+def get_smtp_settings() -> dict:
+    """Configuración SMTP (leída en cada uso, como antes)"""
+    return {
+        "host": os.environ.get('SMTP_HOST', 'smtp.gmail.com'),
+        "port": int(os.environ.get('SMTP_PORT', 587)),
+        "user": os.environ.get('SMTP_USER', ''),
+        "password": os.environ.get('SMTP_PASSWORD', ''),
+        "from_name": os.environ.get('SMTP_FROM_NAME', 'Jorge Calcerrada'),
+    }
+
+
+def build_message(settings: dict, to_email: str, subject: str, html_body: str, text_body: str = None) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['From'] = f"{settings['from_name']} <{settings['user']}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    # Add plain text and HTML parts
+    if text_body:
+        msg.attach(MIMEText(text_body, 'plain'))
+    msg.attach(MIMEText(html_body, 'html'))
+
+    return msg
+
+
+# ==================== POOL SMTP ====================
+
+class _RateLimiter:
+    """Rate limit global thread-safe (espaciado uniforme entre envíos)"""
+
+    def __init__(self, rate_per_second: float):
+        self._interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexiones SMTP persistentes (ya con STARTTLS + login).
+    Las conexiones se usan desde threads (smtplib es bloqueante).
+    """
+
+    def __init__(self, size: int):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+
+    def _connect(self, settings: dict) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings["host"], settings["port"], timeout=30)
+        server.starttls()
+        server.login(settings["user"], settings["password"])
+        return server
+
+    def _acquire(self, settings: dict):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server, last_used, key = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                fresh = time.monotonic() - last_used < SMTP_MAX_IDLE_SECONDS
+                if fresh and key == (settings["host"], settings["user"]):
+                    return server
+                self._quietly_close(server)
+            return self._connect(settings)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server: Optional[smtplib.SMTP], settings: dict):
+        if server is not None:
+            self._idle.put((server, time.monotonic(), (settings["host"], settings["user"])))
+        self._slots.release()
+
+    @staticmethod
+    def _quietly_close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send_messages(self, settings: dict, messages: list, rate_limiter: Optional[_RateLimiter] = None) -> list:
+        """
+        Envía una lista de MIME messages por UNA conexión del pool.
+        Reconecta una vez si el servidor cerró la conexión.
+
+        Returns:
+            Lista de errores (None si el mensaje se envió)
+        """
+        errors = []
+        server = self._acquire(settings)
+        try:
+            for msg in messages:
+                if rate_limiter:
+                    rate_limiter.wait()
+                try:
+                    if server is None:
+                        server = self._connect(settings)
+                    try:
+                        server.send_message(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        # Conexión cerrada por el servidor (idle): reconectar una vez
+                        self._quietly_close(server)
+                        server = None
+                        server = self._connect(settings)
+                        server.send_message(msg)
+                    errors.append(None)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                    # Error del mensaje concreto: la conexión sigue siendo válida
+                    errors.append(str(e))
+                except Exception as e:
+                    errors.append(str(e))
+                    if server is not None:
+                        self._quietly_close(server)
+                        server = None
+        finally:
+            self._release(server, settings)
+        return errors
+
+    def close_all(self):
+        while True:
+            try:
+                server, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quietly_close(server)
+
+
+_pool = SMTPConnectionPool(EMAIL_SMTP_POOL_SIZE)
+_rate_limiter = _RateLimiter(EMAIL_RATE_PER_SECOND)
+
+
+def send_now(to_email: str, subject: str, html_body: str, text_body: str = None):
+    """Envío síncrono inmediato por el pool (scripts / fallback). Lanza excepción si falla."""
+    settings = get_smtp_settings()
+    msg = build_message(settings, to_email, subject, html_body, text_body)
+    error = _pool.send_messages(settings, [msg], _rate_limiter)[0]
+    if error:
+        raise RuntimeError(error)
+
+
+# ==================== OUTBOX ====================
+
+_sender_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_background_tasks = set()
+
+
+def _outbox_doc(to_email: str, subject: str, html_body: str, text_body: str = None) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": str(uuid.uuid4()),
+        "to_email": to_email,
+        "subject": subject,
+        "html_body": html_body,
+        "text_body": text_body,
+        "status": "pending",  # pending | sending | sent | failed
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "sent_at": None,
+        "last_error": None
+    }
+
+
+def is_outbox_running() -> bool:
+    return _sender_task is not None and not _sender_task.done()
+
+
+def _wake_sender():
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def enqueue_email(to_email: str, subject: str, html_body: str, text_body: str = None) -> str:
+    """Guarda el email en el outbox y despierta al sender. Devuelve el ID del outbox."""
+    doc = _outbox_doc(to_email, subject, html_body, text_body)
+    await get_web_db().email_outbox.insert_one(doc)
+    _wake_sender()
+    return doc["_id"]
+
+
+def enqueue_email_nowait(to_email: str, subject: str, html_body: str, text_body: str = None) -> bool:
+    """
+    Encola desde código síncrono que se ejecuta dentro de un event loop (las
+    funciones de email_utils). No bloquea: con el outbox corriendo en este
+    proceso lo guarda en el outbox; si no (p.ej. job_worker.py), lo envía
+    en un thread.
+
+    Returns:
+        False si no hay event loop corriendo (scripts: enviar directamente)
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    async def _enqueue():
+        if is_outbox_running():
+            try:
+                await enqueue_email(to_email, subject, html_body, text_body)
+                return
+            except Exception as e:
+                # Si Mongo falla, no perder el email: envío directo
+                logger.error(f"❌ Error encolando email para {to_email}, enviando directamente: {e}")
+        try:
+            await asyncio.to_thread(send_now, to_email, subject, html_body, text_body)
+            logger.info(f"Email sent successfully to {to_email}")
+        except Exception as send_error:
+            logger.error(f"Failed to send email to {to_email}: {send_error}")
+
+    task = loop.create_task(_enqueue())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return True
+
+
+# Los más antiguos primero
+OUTBOX_CLAIM_SORT = [("next_attempt_at", 1)]
+
+
+def claimable_emails_filter(now: datetime) -> dict:
+    """Emails listos para enviar, o en "sending" con el lock expirado (sender caído)"""
+    return {
+        "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lt": now}}
+        ]
+    }
+
+
+async def _claim_batch() -> List[dict]:
+    """
+    Reclama hasta EMAIL_BATCH_SIZE emails listos para enviar en tres
+    consultas, sea cual sea el tamaño del lote
+
+    El update_many repite el filtro, así que cada email lo reclama un solo
+    sender aunque otro haya leído los mismos candidatos; el claim_token
+    identifica los que ganó este.
+    """
+    outbox = get_web_db().email_outbox
+    now = datetime.now(timezone.utc)
+    candidates = await outbox.find(claimable_emails_filter(now), {"_id": 1}).sort(
+        OUTBOX_CLAIM_SORT
+    ).limit(EMAIL_BATCH_SIZE).to_list(EMAIL_BATCH_SIZE)
+    if not candidates:
+        return []
+
+    ids = [doc["_id"] for doc in candidates]
+    claim_token = str(uuid.uuid4())
+    await outbox.update_many(
+        {"_id": {"$in": ids}, **claimable_emails_filter(now)},
+        {"$set": {
+            "status": "sending",
+            "locked_until": now + timedelta(seconds=OUTBOX_LOCK_SECONDS),
+            "claim_token": claim_token
+        }}
+    )
+    return await outbox.find({"_id": {"$in": ids}, "claim_token": claim_token}).sort(
+        OUTBOX_CLAIM_SORT
+    ).to_list(EMAIL_BATCH_SIZE)
+
+
+async def _send_batch(batch: List[dict]):
+    settings = get_smtp_settings()
+
+    # Repartir el lote entre las conexiones del pool
+    chunks = [batch[i::EMAIL_SMTP_POOL_SIZE] for i in range(min(EMAIL_SMTP_POOL_SIZE, len(batch)))]
+
+    async def deliver(chunk):
+        messages = [
+            build_message(settings, d["to_email"], d["subject"], d["html_body"], d.get("text_body"))
+            for d in chunk
+        ]
+        try:
+            errors = await asyncio.to_thread(_pool.send_messages, settings, messages, _rate_limiter)
+        except Exception as e:
+            errors = [str(e)] * len(chunk)
+        return list(zip(chunk, errors))
+
+    results = [item for chunk_result in await asyncio.gather(*(deliver(c) for c in chunks)) for item in chunk_result]
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    for doc, error in results:
+        if error is None:
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"status": "sent", "sent_at": now, "last_error": None}, "$unset": {"locked_until": "", "claim_token": ""}}
+            ))
+            logger.info(f"Email sent successfully to {doc['to_email']}")
+            continue
+
+        attempts = doc.get("attempts", 0) + 1
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update = {"status": "failed", "attempts": attempts, "last_error": error}
+            logger.error(f"Failed to send email to {doc['to_email']} after {attempts} attempts: {error}")
+        else:
+            backoff = timedelta(seconds=30 * 2 ** (attempts - 1))
+            update = {"status": "pending", "attempts": attempts, "last_error": error, "next_attempt_at": now + backoff}
+            logger.warning(f"Email to {doc['to_email']} failed (attempt {attempts}), retrying in {backoff}: {error}")
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update, "$unset": {"locked_until": "", "claim_token": ""}}))
+
+    if operations:
+        await get_web_db().email_outbox.bulk_write(operations, ordered=False)
+
+
+async def _sender_loop():
+    logger.info("📬 Email outbox sender iniciado")
+    while True:
+        try:
+            batch = await _claim_batch()
+            if batch:
+                await _send_batch(batch)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error en email outbox sender: {e}")
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_IDLE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_email_outbox():
+    """Arranca el sender en background (startup del servidor)"""
+    global _sender_task, _wakeup
+
+    if is_outbox_running():
+        return
+    _wakeup = asyncio.Event()
+    _sender_task = asyncio.create_task(_sender_loop())
+
+
+async def stop_email_outbox():
+    """Detiene el sender y cierra las conexiones SMTP (shutdown del servidor)"""
+    global _sender_task
+
+    if _sender_task is not None:
+        _sender_task.cancel()
+        try:
+            await _sender_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _sender_task = None
+    _pool.close_all()
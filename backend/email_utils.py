@@ -1,10 +1,9 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import os
 import logging
 
+from email_outbox import get_smtp_settings, enqueue_email_nowait, send_now
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,44 +11,34 @@ def send_email(to_email: str, subject: str, html_body: str, text_body: str = Non
     """
     Send email using Gmail SMTP
     
+    Inside the server the email is queued in the durable outbox and sent in
+    background through pooled SMTP connections (see email_outbox.py), so the
+    caller never waits for SMTP. In other processes with an event loop it is
+    sent from a thread; only synchronous scripts send it inline through the
+    same pool.
+    
     Args:
         to_email: Recipient email address
         subject: Email subject
         html_body: HTML content of the email
         text_body: Plain text fallback (optional)
+    
+    Returns:
+        True if the email was queued or sent
     """
-    smtp_host = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
-    smtp_port = int(os.environ.get('SMTP_PORT', 587))
-    smtp_user = os.environ.get('SMTP_USER', '')
-    smtp_password = os.environ.get('SMTP_PASSWORD', '')
-    smtp_from_name = os.environ.get('SMTP_FROM_NAME', 'Jorge Calcerrada')
+    settings = get_smtp_settings()
     
     # Check if SMTP credentials are configured
-    if not smtp_user or not smtp_password:
+    if not settings["user"] or not settings["password"]:
         logger.warning("SMTP credentials not configured. Email not sent.")
         return False
     
+    if enqueue_email_nowait(to_email, subject, html_body, text_body):
+        logger.info(f"Email queued for {to_email}")
+        return True
+    
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['From'] = f"{smtp_from_name} <{smtp_user}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add plain text and HTML parts
-        if text_body:
-            text_part = MIMEText(text_body, 'plain')
-            msg.attach(text_part)
-        
-        html_part = MIMEText(html_body, 'html')
-        msg.attach(html_part)
-        
-        # Connect to SMTP server and send
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
-        
+        send_now(to_email, subject, html_body, text_body)
         logger.info(f"Email sent successfully to {to_email}")
         return True
         
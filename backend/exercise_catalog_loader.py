@@ -8,12 +8,22 @@ Archivos fuente:
 - exercise_variants_edn360.json: Variantes concretas con nombres y videos
 - substitution_rules_edn360.json: Reglas de sustitución inteligente
 
+Índice en memoria (se construye una vez, en el primer uso):
+- Diccionario por exercise_code (búsqueda O(1))
+- Variantes agrupadas por exercise_code + mejor variante precalculada
+- Índices invertidos (movement_pattern, difficulty, environment, load_type,
+  health flags) → conjuntos de posiciones del catálogo. filter_exercises
+  resuelve las facetas por intersección de conjuntos en lugar de recorrer
+  los ~1.200 ejercicios en cada llamada.
+
 Autor: E1 Agent
 Fecha: Diciembre 2025
 """
 
 import json
 import os
+import sys
+import time
 from typing import Dict, List, Optional, Any
 import logging
 
@@ -29,6 +39,14 @@ SUBSTITUTION_RULES_PATH = os.path.join(CATALOG_DIR, 'substitution_rules_edn360.j
 _catalog_cache = None
 _variants_cache = None
 _substitution_rules_cache = None
+_catalog_index = None
+
+# Lesión → clave en health_flags
+HEALTH_FLAG_MAP = {
+    'shoulder': 'shoulder_unstable',
+    'low_back': 'low_back_sensitive',
+    'knee': 'knee_sensitive'
+}
 
 
 def load_exercise_catalog() -> List[Dict]:
@@ -97,6 +115,126 @@ def load_substitution_rules() -> Dict:
         raise
 
 
+def _deep_sizeof(obj, seen=None) -> int:
+    """Tamaño aproximado en bytes de las estructuras del índice"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def _build_catalog_index() -> Dict:
+    """
+    Construye el índice del catálogo (diccionario por código + índices invertidos)
+    
+    Returns:
+        Diccionario con las estructuras del índice y sus métricas de construcción
+    """
+    started = time.perf_counter()
+    catalog = load_exercise_catalog()
+    variants = load_exercise_variants()
+    
+    by_code = {}
+    usable = set()
+    facets = {
+        'movement_pattern': {},
+        'difficulty': {},
+        'environment': {},
+        'load_type': {},
+    }
+    # (flag_key, valor) → posiciones
+    health = {}
+    
+    for position, exercise in enumerate(catalog):
+        code = exercise.get('exercise_code')
+        if code is not None:
+            by_code.setdefault(code, exercise)
+        
+        if exercise.get('usable_for_plans', False):
+            usable.add(position)
+        
+        facets['movement_pattern'].setdefault(exercise.get('movement_pattern'), set()).add(position)
+        facets['difficulty'].setdefault(exercise.get('difficulty_clean'), set()).add(position)
+        for env in exercise.get('environments', []):
+            facets['environment'].setdefault(env, set()).add(position)
+        for load in exercise.get('load_type_clean', []):
+            facets['load_type'].setdefault(load, set()).add(position)
+        
+        health_flags = exercise.get('health_flags', {})
+        for flag_key in HEALTH_FLAG_MAP.values():
+            value = health_flags.get(flag_key, "seguro")
+            health.setdefault((flag_key, value), set()).add(position)
+    
+    variants_by_code = {}
+    for variant in variants:
+        variants_by_code.setdefault(variant.get('exercise_code'), []).append(variant)
+    
+    # Mejor variante (primera usable, si no la primera)
+    best_variant_by_code = {}
+    for code, code_variants in variants_by_code.items():
+        best_variant_by_code[code] = next(
+            (v for v in code_variants if v.get('usable_for_plans', False)),
+            code_variants[0]
+        )
+    
+    index = {
+        'catalog': catalog,
+        'by_code': by_code,
+        'codes': tuple(by_code.keys()),
+        'usable': frozenset(usable),
+        'facets': {name: {k: frozenset(v) for k, v in values.items()} for name, values in facets.items()},
+        'health': {k: frozenset(v) for k, v in health.items()},
+        'variants_by_code': variants_by_code,
+        'best_variant_by_code': best_variant_by_code,
+    }
+    
+    build_ms = (time.perf_counter() - started) * 1000
+    # Solo la sobrecarga del índice: los dicts de ejercicios/variantes son compartidos
+    shared = {id(item) for item in catalog} | {id(item) for item in variants}
+    index_bytes = _deep_sizeof({k: v for k, v in index.items() if k != 'catalog'}, shared)
+    index['build_ms'] = round(build_ms, 2)
+    index['index_bytes'] = index_bytes
+    
+    logger.info(
+        f"✅ Índice del catálogo construido: {len(by_code)} códigos, "
+        f"{len(variants_by_code)} con variantes en {build_ms:.1f} ms "
+        f"(~{index_bytes / 1024:.0f} KB)"
+    )
+    return index
+
+
+def get_catalog_index() -> Dict:
+    """
+    Devuelve el índice del catálogo (se construye en el primer uso)
+    
+    Returns:
+        Diccionario con by_code, facets, health, variants_by_code, ...
+    """
+    global _catalog_index
+    
+    if _catalog_index is None:
+        _catalog_index = _build_catalog_index()
+    
+    return _catalog_index
+
+
+def get_all_exercise_codes() -> List[str]:
+    """
+    Lista de códigos del catálogo (orden original, sin duplicados)
+    
+    Returns:
+        Lista de exercise_code
+    """
+    return list(get_catalog_index()['codes'])
+
+
 def get_exercise_by_code(exercise_code: str) -> Optional[Dict]:
     """
     Busca un ejercicio por su código
@@ -107,11 +245,9 @@ def get_exercise_by_code(exercise_code: str) -> Optional[Dict]:
     Returns:
         Diccionario con datos del ejercicio o None si no existe
     """
-    catalog = load_exercise_catalog()
-    
-    for exercise in catalog:
-        if exercise.get('exercise_code') == exercise_code:
-            return exercise
+    exercise = get_catalog_index()['by_code'].get(exercise_code)
+    if exercise is not None:
+        return exercise
     
     logger.warning(f"⚠️ Ejercicio no encontrado: {exercise_code}")
     return None
@@ -127,14 +263,7 @@ def get_variants_by_code(exercise_code: str) -> List[Dict]:
     Returns:
         Lista de variantes del ejercicio
     """
-    variants = load_exercise_variants()
-    
-    matching_variants = [
-        v for v in variants 
-        if v.get('exercise_code') == exercise_code
-    ]
-    
-    return matching_variants
+    return list(get_catalog_index()['variants_by_code'].get(exercise_code, []))
 
 
 def filter_exercises(
@@ -142,10 +271,11 @@ def filter_exercises(
     difficulty: Optional[str] = None,
     environment: Optional[str] = None,
     load_type: Optional[str] = None,
-    usable_for_plans: bool = True
+    usable_for_plans: bool = True,
+    safe_for: Optional[List[str]] = None
 ) -> List[Dict]:
     """
-    Filtra ejercicios por criterios
+    Filtra ejercicios por criterios (intersección de índices invertidos)
     
     Args:
         movement_pattern: Patrón de movimiento (ej: "empuje_horizontal")
@@ -153,29 +283,50 @@ def filter_exercises(
         environment: Entorno (gym, home)
         load_type: Tipo de carga (barra, mancuernas, maquina, etc.)
         usable_for_plans: Solo ejercicios usables en planes
+        safe_for: Lesiones (shoulder, low_back, knee) para las que el
+            ejercicio debe ser "seguro"
     
     Returns:
-        Lista de ejercicios que cumplen los criterios
+        Lista de ejercicios que cumplen los criterios (en orden del catálogo)
     """
-    catalog = load_exercise_catalog()
-    filtered = catalog
+    index = get_catalog_index()
+    facets = index['facets']
+    
+    candidate_sets = []
     
     if usable_for_plans:
-        filtered = [e for e in filtered if e.get('usable_for_plans', False)]
+        candidate_sets.append(index['usable'])
     
     if movement_pattern:
-        filtered = [e for e in filtered if e.get('movement_pattern') == movement_pattern]
+        candidate_sets.append(facets['movement_pattern'].get(movement_pattern, frozenset()))
     
     if difficulty:
-        filtered = [e for e in filtered if e.get('difficulty_clean') == difficulty]
+        candidate_sets.append(facets['difficulty'].get(difficulty, frozenset()))
     
     if environment:
-        filtered = [e for e in filtered if environment in e.get('environments', [])]
+        candidate_sets.append(facets['environment'].get(environment, frozenset()))
     
     if load_type:
-        filtered = [e for e in filtered if load_type in e.get('load_type_clean', [])]
+        candidate_sets.append(facets['load_type'].get(load_type, frozenset()))
+    
+    for injury_type in safe_for or []:
+        flag_key = HEALTH_FLAG_MAP.get(injury_type)
+        if flag_key:
+            candidate_sets.append(index['health'].get((flag_key, "seguro"), frozenset()))
+    
+    catalog = index['catalog']
+    if not candidate_sets:
+        return list(catalog)
+    
+    # Intersección empezando por el conjunto más pequeño
+    candidate_sets.sort(key=len)
+    positions = set(candidate_sets[0])
+    for candidates in candidate_sets[1:]:
+        if not positions:
+            break
+        positions &= candidates
     
-    return filtered
+    return [catalog[position] for position in sorted(positions)]
 
 
 def check_health_safety(exercise: Dict, injury_type: str) -> str:
@@ -191,13 +342,7 @@ def check_health_safety(exercise: Dict, injury_type: str) -> str:
     """
     health_flags = exercise.get('health_flags', {})
     
-    flag_map = {
-        'shoulder': 'shoulder_unstable',
-        'low_back': 'low_back_sensitive',
-        'knee': 'knee_sensitive'
-    }
-    
-    flag_key = flag_map.get(injury_type)
+    flag_key = HEALTH_FLAG_MAP.get(injury_type)
     if not flag_key:
         return "seguro"
     
@@ -218,17 +363,8 @@ def enrich_exercise_with_variant(exercise_code: str) -> Dict:
     if not exercise:
         return None
     
-    variants = get_variants_by_code(exercise_code)
-    
-    # Seleccionar la mejor variante (primera usable)
-    best_variant = None
-    for variant in variants:
-        if variant.get('usable_for_plans', False):
-            best_variant = variant
-            break
-    
-    if not best_variant and variants:
-        best_variant = variants[0]
+    # Mejor variante (primera usable) precalculada en el índice
+    best_variant = get_catalog_index()['best_variant_by_code'].get(exercise_code)
     
     # Combinar datos
     enriched = {
@@ -246,32 +382,29 @@ def get_catalog_stats() -> Dict:
     Obtiene estadísticas del catálogo
     
     Returns:
-        Diccionario con estadísticas
+        Diccionario con estadísticas (incluye métricas del índice)
     """
-    catalog = load_exercise_catalog()
-    variants = load_exercise_variants()
-    
-    # Contar por patrón de movimiento
-    patterns = {}
-    for ex in catalog:
-        pattern = ex.get('movement_pattern', 'unknown')
-        patterns[pattern] = patterns.get(pattern, 0) + 1
+    index = get_catalog_index()
+    facets = index['facets']
     
-    # Contar por dificultad
-    difficulties = {}
-    for ex in catalog:
-        diff = ex.get('difficulty_clean', 'unknown')
-        difficulties[diff] = difficulties.get(diff, 0) + 1
-    
-    # Contar usables
-    usable_count = len([e for e in catalog if e.get('usable_for_plans', False)])
+    # Contar por patrón de movimiento / dificultad (desde los índices invertidos)
+    patterns = {
+        (pattern if pattern is not None else 'unknown'): len(positions)
+        for pattern, positions in facets['movement_pattern'].items()
+    }
+    difficulties = {
+        (diff if diff is not None else 'unknown'): len(positions)
+        for diff, positions in facets['difficulty'].items()
+    }
     
     return {
-        'total_exercises': len(catalog),
-        'total_variants': len(variants),
-        'usable_for_plans': usable_count,
+        'total_exercises': len(index['catalog']),
+        'total_variants': len(load_exercise_variants()),
+        'usable_for_plans': len(index['usable']),
         'by_movement_pattern': patterns,
-        'by_difficulty': difficulties
+        'by_difficulty': difficulties,
+        'index_build_ms': index['build_ms'],
+        'index_bytes': index['index_bytes']
     }
 
 
@@ -300,3 +433,4 @@ if __name__ == "__main__":
     # Estadísticas
     stats = get_catalog_stats()
     print(f"✅ Estadísticas: {stats['total_exercises']} ejercicios, {stats['usable_for_plans']} usables")
+    print(f"✅ Índice: {stats['index_build_ms']} ms, ~{stats['index_bytes'] / 1024:.0f} KB")
@@ -0,0 +1,221 @@
+"""
+Exercise Code Resolver - Resolución de códigos genéricos de E4 al catálogo
+
+Resuelve un código de ejercicio de E4 a un código del catálogo: mapeo
+manual legacy, código exacto o, como último recurso, el más parecido según
+un índice de trigramas (mismo criterio que difflib.get_close_matches). Las
+resoluciones se memorizan y se persisten en disco.
+
+Configuración: EXERCISE_CODE_MEMO_PATH
+
+Benchmark:
+    python /app/backend/bench_exercise_code_resolver.py
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXERCISE_CODE_MEMO_PATH = Path(os.getenv(
+    'EXERCISE_CODE_MEMO_PATH',
+    str(Path(__file__).parent / 'uploads' / 'cache' / 'exercise_code_memo.json')
+))
+
+# Similitud mínima (la misma que usaba get_close_matches)
+FUZZY_CUTOFF = 0.6
+# Candidatos (por trigramas en común) que se puntúan con SequenceMatcher
+FUZZY_CANDIDATES = 256
+
+# Mapeo manual explícito de códigos legacy (prioridad sobre el fuzzy).
+# E4 v2 CANÓNICO ya está 100% alineado con el catálogo backend; este mapeo
+# se mantiene solo para retrocompatibilidad con planes antiguos.
+LEGACY_CODE_MAPPING = {
+    # Press variants
+    'press_mancuernas': 'press_suelo_mancuernas',
+    'press_polea': 'press_pecho_cable',
+    'fonds_triceps_suelo': 'fondos_triceps_suelo_pies_elevados',
+
+    # Aperturas
+    'aperturas_polea': 'aperturas_medias_poleas',
+
+    # Jalones y remos
+    'jalon_supino_maquina': 'jalon_agarre_supino',
+    'remo_bajo_maquina': 'remo_bajo_agarre_neutro',
+    'jalon_banda': 'jalon_banda_elastica',
+
+    # Dominadas
+    'dominadas': 'dominadas_barra_fija',
+
+    # Curl
+    'curl_biceps': 'curl_biceps_barra',
+
+    # Piernas
+    'sentadilla_barra': 'sentadilla_barra_high_bar',
+    'hip_thrust_smith': 'hip_thrust_maquina_smith',
+    'sentadilla_bulgara': 'sentadilla_bulgara_peso_corporal',
+    'peso_muerto_smith': 'peso_muerto_rumano_smith',
+    'gemelos': 'gemelos_de_pie_unipodal',
+
+    # Elevaciones
+    'elevaciones_laterales_maquina': 'elevaciones_laterales_maquina_convergente',
+
+    # Core
+    'core_antiextension': 'plancha_frontal',
+    'core_antirotacion': 'plancha_lateral',
+}
+
+
+def _trigrams(text: str) -> List[str]:
+    """Trigramas con relleno (los extremos del código también cuentan)"""
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class ExerciseCodeResolver:
+    """Resuelve códigos genéricos a códigos del catálogo"""
+
+    def __init__(
+        self,
+        codes: Iterable[str],
+        manual_mapping: Optional[Dict[str, str]] = None,
+        memo_path: Optional[Path] = None,
+        cutoff: float = FUZZY_CUTOFF,
+        candidates: int = FUZZY_CANDIDATES
+    ):
+        self.codes = list(dict.fromkeys(codes))
+        self.code_set = set(self.codes)
+        self.manual_mapping = LEGACY_CODE_MAPPING if manual_mapping is None else manual_mapping
+        self.memo_path = memo_path
+        self.cutoff = cutoff
+        self.candidates = candidates
+
+        # trigrama → posiciones de los códigos que lo contienen
+        self._index: Dict[str, List[int]] = {}
+        for position, code in enumerate(self.codes):
+            for gram in set(_trigrams(code)):
+                self._index.setdefault(gram, []).append(position)
+
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [self.codes, sorted(self.manual_mapping.items()), self.cutoff]
+        ).encode('utf-8')).hexdigest()
+
+        self._memo: Dict[str, str] = {}
+        self._dirty = False
+        self._load_memo()
+
+    # ---------- memo persistente ----------
+
+    def _load_memo(self):
+        if not self.memo_path or not self.memo_path.exists():
+            return
+        try:
+            data = json.loads(self.memo_path.read_text(encoding='utf-8'))
+            if data.get('fingerprint') == self.fingerprint:
+                self._memo = data.get('resolutions', {})
+                logger.info(f"✅ Memo de códigos cargado: {len(self._memo)} resoluciones")
+            else:
+                logger.info("♻️ Catálogo o mapeo cambiado: memo de códigos descartado")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo leer el memo de códigos {self.memo_path}: {e}")
+
+    def save_memo(self):
+        """Escribe el memo en disco si hay resoluciones nuevas (escritura atómica)"""
+        if not self._dirty or not self.memo_path:
+            return
+        try:
+            self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.memo_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({
+                'fingerprint': self.fingerprint,
+                'resolutions': self._memo
+            }, ensure_ascii=False, indent=0), encoding='utf-8')
+            os.replace(tmp_path, self.memo_path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo guardar el memo de códigos {self.memo_path}: {e}")
+
+    # ---------- resolución ----------
+
+    def fuzzy_match(self, code: str) -> Optional[str]:
+        """
+        Código del catálogo más parecido (None si ninguno llega al cutoff)
+
+        Puntúa como difflib.get_close_matches(code, codes, n=1, cutoff), pero
+        solo sobre los códigos con más trigramas en común.
+        """
+        shared = Counter()
+        for gram in set(_trigrams(code)):
+            for position in self._index.get(gram, ()):
+                shared[position] += 1
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(code)
+        best = None
+        for position, _ in shared.most_common(self.candidates):
+            candidate = self.codes[position]
+            matcher.set_seq1(candidate)
+            # Las cotas superiores descartan sin calcular ratio() a los que no
+            # pueden alcanzar el cutoff ni empatar con el mejor hasta ahora
+            threshold = best[0] if best else self.cutoff
+            if (matcher.real_quick_ratio() >= threshold
+                    and matcher.quick_ratio() >= threshold):
+                score = matcher.ratio()
+                # Mismo desempate que get_close_matches (score, código)
+                if score >= self.cutoff and (best is None or (score, candidate) > best):
+                    best = (score, candidate)
+
+        return best[1] if best else None
+
+    def resolve(self, generic_code: str) -> str:
+        """
+        Mapea un código genérico de E4 a un código del catálogo
+
+        Estrategia:
+        1. Normalizar código (lowercase, strip)
+        2. Mapeo manual explícito para códigos legacy (prioridad alta)
+        3. Código exacto del catálogo
+        4. Memo de resoluciones anteriores
+        5. Fuzzy matching por trigramas como fallback para planes antiguos
+        Sin match devuelve el código normalizado (se enriquece con fallback).
+        """
+        normalized_code = generic_code.lower().strip()
+
+        if normalized_code in self.manual_mapping:
+            return self.manual_mapping[normalized_code]
+        if normalized_code in self.code_set:
+            return normalized_code
+        if normalized_code in self._memo:
+            return self._memo[normalized_code]
+
+        matched_code = self.fuzzy_match(normalized_code)
+        if matched_code:
+            logger.info(f"  🔍 Fuzzy match (legacy): {generic_code} → {matched_code}")
+        else:
+            logger.warning(f"  ⚠️ Sin match para: {generic_code} (normalizado: {normalized_code})")
+            matched_code = normalized_code
+
+        self._memo[normalized_code] = matched_code
+        self._dirty = True
+        return matched_code
+
+
+_resolver: Optional[ExerciseCodeResolver] = None
+
+
+def get_exercise_code_resolver() -> ExerciseCodeResolver:
+    """Resolver del catálogo EDN360 (se construye en el primer uso)"""
+    global _resolver
+
+    if _resolver is None:
+        from exercise_catalog_loader import get_all_exercise_codes
+        _resolver = ExerciseCodeResolver(get_all_exercise_codes(), memo_path=EXERCISE_CODE_MEMO_PATH)
+        logger.info(f"✅ Resolver de códigos construido: {len(_resolver.codes)} códigos")
+
+    return _resolver
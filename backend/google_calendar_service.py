@@ -1,23 +1,60 @@
 """
 Google Calendar Integration Service
 Gestión de eventos de calendario para revisiones con clientes
+
+Las llamadas al cliente síncrono de Google se ejecutan en un pool de
+threads; el servicio y las credenciales se cachean por admin.
+
+Configuración: CALENDAR_MAX_WORKERS, CALENDAR_HTTP_TIMEOUT
 """
 import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import httplib2
+import httpx
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request as GoogleRequest
-import requests
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI")
 
+CALENDAR_MAX_WORKERS = int(os.getenv("CALENDAR_MAX_WORKERS", "4"))
+CALENDAR_HTTP_TIMEOUT = int(os.getenv("CALENDAR_HTTP_TIMEOUT", "30"))
+
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+_executor = ThreadPoolExecutor(max_workers=CALENDAR_MAX_WORKERS, thread_name_prefix="gcal")
+
+# {admin: {"refresh_token", "service", "creds", "lock"}}: una entrada por
+# admin, que se reemplaza si cambia su refresh_token (reconexión)
+_services: Dict[str, dict] = {}
+
+
+async def _run(func, *args):
+    """Ejecuta una llamada bloqueante en el pool de Google Calendar"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _authorized_http(creds: Credentials) -> AuthorizedHttp:
+    return AuthorizedHttp(creds, http=httplib2.Http(timeout=CALENDAR_HTTP_TIMEOUT))
+
+
+async def _execute(request, creds: Credentials):
+    """request.execute() en el pool con un Http propio"""
+    return await _run(lambda: request.execute(http=_authorized_http(creds)))
+
 
 def get_authorization_url():
     """
@@ -41,13 +78,14 @@ async def exchange_code_for_tokens(code: str) -> dict:
     """
     token_url = "https://oauth2.googleapis.com/token"
     
-    response = requests.post(token_url, data={
-        'code': code,
-        'client_id': GOOGLE_CLIENT_ID,
-        'client_secret': GOOGLE_CLIENT_SECRET,
-        'redirect_uri': GOOGLE_REDIRECT_URI,
-        'grant_type': 'authorization_code'
-    })
+    async with httpx.AsyncClient(timeout=CALENDAR_HTTP_TIMEOUT) as client:
+        response = await client.post(token_url, data={
+            'code': code,
+            'client_id': GOOGLE_CLIENT_ID,
+            'client_secret': GOOGLE_CLIENT_SECRET,
+            'redirect_uri': GOOGLE_REDIRECT_URI,
+            'grant_type': 'authorization_code'
+        })
     
     if response.status_code != 200:
         raise Exception(f"Error getting tokens: {response.text}")
@@ -55,55 +93,64 @@ async def exchange_code_for_tokens(code: str) -> dict:
     return response.json()
 
 
-async def get_calendar_service(tokens: dict):
+def _build_service(creds: Credentials):
+    # cache_discovery=False: el discovery estático va incluido en la librería
+    return build('calendar', 'v3', credentials=creds, cache_discovery=False)
+
+
+async def get_calendar_service(tokens: dict, admin_key: str):
     """
-    Crea servicio de Google Calendar con tokens
-    Maneja refresh automático si es necesario
+    Servicio de Google Calendar cacheado por admin
+    Maneja refresh automático si es necesario (en el pool de threads)
     """
-    creds = Credentials(
-        token=tokens.get('access_token'),
-        refresh_token=tokens.get('refresh_token'),
-        token_uri='https://oauth2.googleapis.com/token',
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        scopes=SCOPES
-    )
+    refresh_token = tokens.get('refresh_token') or tokens.get('access_token')
+    entry = _services.get(admin_key)
     
-    # Refresh si es necesario
-    if creds.expired and creds.refresh_token:
-        creds.refresh(GoogleRequest())
-        # Actualizar token en BD es responsabilidad del caller
+    if entry is None or entry["refresh_token"] != refresh_token:
+        creds = Credentials(
+            token=tokens.get('access_token'),
+            refresh_token=tokens.get('refresh_token'),
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET,
+            scopes=SCOPES
+        )
+        entry = {"refresh_token": refresh_token, "creds": creds, "service": None, "lock": asyncio.Lock()}
+        _services[admin_key] = entry
     
-    return build('calendar', 'v3', credentials=creds), creds
+    async with entry["lock"]:
+        creds = entry["creds"]
+        # Refresh si es necesario
+        if creds.expired and creds.refresh_token:
+            await _run(creds.refresh, GoogleRequest())
+            logger.info("🔄 Token de Google Calendar refrescado")
+            # Actualizar token en BD es responsabilidad del caller
+        if entry["service"] is None:
+            entry["service"] = await _run(_build_service, creds)
+    
+    return entry["service"], creds
 
 
-async def create_calendar_event(
-    tokens: dict,
+def _updated_tokens(creds: Credentials, tokens: dict) -> Optional[dict]:
+    """Tokens nuevos a persistir si el access_token se refrescó"""
+    if creds.token == tokens.get('access_token'):
+        return None
+    return {
+        'access_token': creds.token,
+        'refresh_token': creds.refresh_token
+    }
+
+
+def _event_body(
     summary: str,
     start_datetime: datetime,
     end_datetime: datetime,
     attendee_email: str = None,
     description: str = None,
-    location: str = None
+    location: str = None,
+    repeat_weeks: int = 1
 ) -> dict:
-    """
-    Crea un evento en Google Calendar
-    
-    Args:
-        tokens: Tokens de autenticación de Google
-        summary: Título del evento
-        start_datetime: Fecha/hora de inicio
-        end_datetime: Fecha/hora de fin
-        attendee_email: Email del cliente (opcional)
-        description: Descripción del evento
-        location: Ubicación (opcional)
-        
-    Returns:
-        dict: Datos del evento creado
-    """
-    service, updated_creds = await get_calendar_service(tokens)
-    
-    # Construir evento
+    """Cuerpo de un evento de Google Calendar"""
     event = {
         'summary': summary,
         'description': description or '',
@@ -124,6 +171,12 @@ async def create_calendar_event(
         },
     }
     
+    # Sesión semanal: un único evento recurrente. Google expande la regla en
+    # la zona horaria del evento, así que la hora local se mantiene al
+    # cambiar el horario de verano y el cliente recibe una sola invitación
+    if repeat_weeks > 1:
+        event['recurrence'] = [f'RRULE:FREQ=WEEKLY;COUNT={repeat_weeks}']
+    
     # Añadir ubicación si existe
     if location:
         event['location'] = location
@@ -133,62 +186,105 @@ async def create_calendar_event(
         event['attendees'] = [
             {'email': attendee_email, 'responseStatus': 'needsAction'}
         ]
-        event['sendUpdates'] = 'all'  # Enviar invitación por email
     
-    # Crear evento
-    created_event = service.events().insert(
-        calendarId='primary',
-        body=event,
-        sendUpdates='all' if attendee_email else 'none'
-    ).execute()
+    return event
+
+
+async def create_calendar_event(
+    tokens: dict,
+    admin_key: str,
+    summary: str,
+    start_datetime: datetime,
+    end_datetime: datetime,
+    attendee_email: str = None,
+    description: str = None,
+    location: str = None,
+    repeat_weeks: int = 1
+) -> dict:
+    """
+    Crea un evento en Google Calendar
+    
+    Args:
+        tokens: Tokens de autenticación de Google
+        admin_key: Admin dueño del calendario (clave de la caché del servicio)
+        summary: Título del evento
+        start_datetime: Fecha/hora de inicio
+        end_datetime: Fecha/hora de fin
+        attendee_email: Email del cliente (opcional)
+        description: Descripción del evento
+        location: Ubicación (opcional)
+        repeat_weeks: Nº de semanas si la sesión es recurrente
+        
+    Returns:
+        dict: Datos del evento creado
+    """
+    service, updated_creds = await get_calendar_service(tokens, admin_key)
+    
+    event = _event_body(
+        summary, start_datetime, end_datetime, attendee_email, description, location, repeat_weeks
+    )
+    
+    # Crear evento (sendUpdates='all' envía la invitación al cliente)
+    created_event = await _execute(
+        service.events().insert(
+            calendarId='primary',
+            body=event,
+            sendUpdates='all' if attendee_email else 'none'
+        ),
+        updated_creds
+    )
     
     return {
         'event': created_event,
-        'updated_tokens': {
-            'access_token': updated_creds.token,
-            'refresh_token': updated_creds.refresh_token
-        } if updated_creds.token != tokens.get('access_token') else None
+        'updated_tokens': _updated_tokens(updated_creds, tokens)
     }
 
 
-async def list_upcoming_events(tokens: dict, max_results: int = 50) -> list:
+async def list_upcoming_events(tokens: dict, admin_key: str, max_results: int = 50) -> list:
     """
     Lista eventos próximos del calendario
     """
-    service, _ = await get_calendar_service(tokens)
+    service, creds = await get_calendar_service(tokens, admin_key)
     
     now = datetime.now(timezone.utc).isoformat()
     
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        maxResults=max_results,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
+    events_result = await _execute(
+        service.events().list(
+            calendarId='primary',
+            timeMin=now,
+            maxResults=max_results,
+            singleEvents=True,
+            orderBy='startTime'
+        ),
+        creds
+    )
     
     return events_result.get('items', [])
 
 
-async def delete_calendar_event(tokens: dict, event_id: str) -> bool:
+async def delete_calendar_event(tokens: dict, admin_key: str, event_id: str) -> bool:
     """
     Elimina un evento del calendario
     """
     try:
-        service, _ = await get_calendar_service(tokens)
-        service.events().delete(
-            calendarId='primary',
-            eventId=event_id,
-            sendUpdates='all'
-        ).execute()
+        service, creds = await get_calendar_service(tokens, admin_key)
+        await _execute(
+            service.events().delete(
+                calendarId='primary',
+                eventId=event_id,
+                sendUpdates='all'
+            ),
+            creds
+        )
         return True
     except Exception as e:
-        print(f"Error deleting event: {e}")
+        logger.error(f"Error deleting event: {e}")
         return False
 
 
 async def update_calendar_event(
     tokens: dict,
+    admin_key: str,
     event_id: str,
     summary: str = None,
     start_datetime: datetime = None,
@@ -198,10 +294,10 @@ async def update_calendar_event(
     """
     Actualiza un evento existente
     """
-    service, _ = await get_calendar_service(tokens)
+    service, creds = await get_calendar_service(tokens, admin_key)
     
     # Obtener evento actual
-    event = service.events().get(calendarId='primary', eventId=event_id).execute()
+    event = await _execute(service.events().get(calendarId='primary', eventId=event_id), creds)
     
     # Actualizar campos
     if summary:
@@ -220,11 +316,19 @@ async def update_calendar_event(
         }
     
     # Actualizar evento
-    updated_event = service.events().update(
-        calendarId='primary',
-        eventId=event_id,
-        body=event,
-        sendUpdates='all'
-    ).execute()
+    updated_event = await _execute(
+        service.events().update(
+            calendarId='primary',
+            eventId=event_id,
+            body=event,
+            sendUpdates='all'
+        ),
+        creds
+    )
     
     return updated_event
+
+
+def shutdown_calendar_executor():
+    """Cierra el pool de threads (shutdown del servidor)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
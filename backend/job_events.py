@@ -0,0 +1,175 @@
+"""
+Job Events - Bus de eventos de progreso de los generation_jobs
+
+JobStateWriter y add_job_log publican los eventos de un job y
+GET /jobs/{job_id}/events los reenvía por SSE:
+
+    progress          {"status"?, "progress": {...}}
+    agent_completed   {"event", "details"}
+    log               resto de eventos del execution_log
+    completed         {"result"}
+    failed            {"error_message"}
+
+Sin JOB_EVENTS_URL el bus es en memoria (solo el mismo proceso); con
+redis://... usa pub/sub de Redis y llega a los eventos de job_worker.py.
+
+Configuración: JOB_EVENTS_URL, JOB_EVENTS_CHANNEL,
+JOB_STREAM_RESYNC_SECONDS, JOB_STREAM_POLL_SECONDS
+"""
+
+import os
+import json
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_URL = os.getenv('JOB_EVENTS_URL', '')
+JOB_EVENTS_CHANNEL = os.getenv('JOB_EVENTS_CHANNEL', 'edn360-job-events')
+JOB_STREAM_RESYNC_SECONDS = float(os.getenv('JOB_STREAM_RESYNC_SECONDS', '15'))
+JOB_STREAM_POLL_SECONDS = float(os.getenv('JOB_STREAM_POLL_SECONDS', '3'))
+
+# Eventos por suscriptor antes de descartar (el snapshot periódico resincroniza)
+JOB_EVENT_QUEUE_SIZE = 256
+
+TERMINAL_EVENTS = ("completed", "failed")
+
+# Campos de GET /jobs/{job_id} (sin execution_log ni token_usage)
+JOB_STATUS_PROJECTION = {
+    "user_id": 1, "type": 1, "status": 1, "progress": 1, "result": 1,
+    "error_message": 1, "created_at": 1, "started_at": 1, "completed_at": 1
+}
+
+_LOG_EVENT_TYPES = {
+    "agent_completed": "agent_completed",
+    "completed": "completed",
+    "failed": "failed",
+    "timeout": "failed",
+}
+
+
+def job_event(event_type: str, job_id: str, **fields) -> dict:
+    """Evento serializable a JSON"""
+    return {
+        "type": event_type,
+        "job_id": job_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        **fields
+    }
+
+
+def log_event(job_id: str, entry: dict) -> dict:
+    """Evento a partir de una entrada del execution_log"""
+    event_type = _LOG_EVENT_TYPES.get(entry["event"], "log")
+    fields = {"event": entry["event"], "details": entry.get("details", "")}
+    if event_type == "failed":
+        fields["error_message"] = entry.get("details", "")
+    return job_event(event_type, job_id, **fields)
+
+
+class JobEventBus:
+    """Bus en memoria (un solo proceso)"""
+
+    # Sin bus compartido los eventos de job_worker.py no llegan: el stream
+    # depende del snapshot periódico, que va a la cadencia del polling
+    resync_seconds = JOB_STREAM_POLL_SECONDS
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, job_id: str, event: dict):
+        self._dispatch(job_id, event)
+
+    def _dispatch(self, job_id: str, event: dict):
+        for queue in list(self._subscribers.get(job_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # Suscriptor lento: lo recupera el snapshot periódico
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str):
+        """Cola con los eventos del job mientras dure el contexto"""
+        queue = asyncio.Queue(maxsize=JOB_EVENT_QUEUE_SIZE)
+        self._subscribers[job_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[job_id].discard(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    async def start(self):
+        """Arranca la escucha del bus (solo el proceso de la API)"""
+
+    async def close(self):
+        """Libera las conexiones del bus"""
+
+
+class RedisJobEventBus(JobEventBus):
+    """Bus sobre pub/sub de Redis (varios procesos)"""
+
+    resync_seconds = JOB_STREAM_RESYNC_SECONDS
+
+    def __init__(self, url: str, channel: str = JOB_EVENTS_CHANNEL):
+        super().__init__()
+        import redis.asyncio as aioredis
+
+        self.channel = channel
+        self._redis = aioredis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, job_id: str, event: dict):
+        await self._redis.publish(self.channel, json.dumps({"job_id": job_id, "event": event}, default=str))
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        payload = json.loads(message["data"])
+                        self._dispatch(payload["job_id"], payload["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Bus de eventos de jobs: conexión con Redis perdida ({e}), reintentando")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        await self._redis.aclose()
+
+
+def create_job_event_bus(url: Optional[str] = None) -> JobEventBus:
+    """
+    Bus según la URL (None → JOB_EVENTS_URL)
+
+    Sin URL devuelve el bus en memoria (un solo proceso).
+    """
+    url = JOB_EVENTS_URL if url is None else url
+
+    if not url:
+        logger.warning(
+            "⚠️ Eventos de jobs en memoria: sin JOB_EVENTS_URL los eventos de "
+            "job_worker.py no llegan a la API y cada stream SSE relee el job de "
+            f"Mongo cada {JOB_STREAM_POLL_SECONDS:g} s (misma carga que el polling)"
+        )
+        return JobEventBus()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info(f"📡 Eventos de jobs por Redis (canal {JOB_EVENTS_CHANNEL})")
+        return RedisJobEventBus(url)
+
+    raise ValueError(f"JOB_EVENTS_URL no soportada: {url}")
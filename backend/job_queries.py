@@ -0,0 +1,66 @@
+"""
+Job Queries - Filtros de la cola de generation_jobs
+
+Los mismos filtros los usan server.py (claim_generation_job, rate limit),
+job_worker.py (watchdog, monitor) y db_indexes.hot_queries(), para que el
+test de índices compruebe las consultas reales.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+# Estados pendientes de reclamar ("queued" es el estado legacy)
+PENDING_JOB_STATUSES = ["pending", "queued"]
+
+# Los jobs se reclaman por orden de llegada
+JOB_CLAIM_SORT = [("created_at", 1)]
+
+
+def pending_jobs_filter() -> dict:
+    """Jobs en cola"""
+    return {"status": {"$in": PENDING_JOB_STATUSES}}
+
+
+def claimable_jobs_filter(now: datetime, max_attempts: int, job_id: Optional[str] = None) -> dict:
+    """
+    Jobs que un worker puede reclamar: pendientes, o en "running" con el
+    lease expirado (worker caído) sin agotar max_attempts
+    """
+    query = {
+        "$or": [
+            pending_jobs_filter(),
+            {
+                "status": "running",
+                "lease_expires_at": {"$lt": now},
+                "attempts": {"$not": {"$gte": max_attempts}}
+            }
+        ]
+    }
+    if job_id:
+        query["_id"] = job_id
+    return query
+
+
+def stuck_jobs_filter(now: datetime, cutoff_time: datetime, max_attempts: int) -> dict:
+    """
+    Jobs en "running" que el watchdog marca como failed: arrancados antes
+    de cutoff_time, o con el lease expirado y los intentos agotados
+    """
+    return {
+        "status": "running",
+        "$or": [
+            {"started_at": {"$lt": cutoff_time}},
+            {
+                "lease_expires_at": {"$lt": now},
+                "attempts": {"$gte": max_attempts}
+            }
+        ]
+    }
+
+
+def jobs_created_since_filter(user_id: str, since: datetime, job_type: Optional[str] = None) -> dict:
+    """Jobs de un usuario creados desde since (rate limit de generación)"""
+    query = {"user_id": user_id, "created_at": {"$gte": since}}
+    if job_type:
+        query["type"] = job_type
+    return query
@@ -0,0 +1,148 @@
+"""
+Job State - Escrituras agrupadas del estado de un generation_job
+
+JobStateWriter acumula en memoria progreso, tokens y eventos del log de un
+job y los escribe con un solo update_one por fase (flush). Con publish,
+cada flush publica también los eventos en el bus de job_events.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from job_events import TERMINAL_EVENTS, job_event, log_event
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELDS = (
+    ("prompt_tokens", "total_prompt_tokens"),
+    ("completion_tokens", "total_completion_tokens"),
+    ("total_tokens", "total_tokens"),
+)
+
+
+class JobStateWriter:
+    """Buffer de escrituras de un job (generation_jobs)"""
+
+    def __init__(
+        self,
+        collection,
+        job_id: str,
+        token_usage: Optional[dict] = None,
+        progress: Optional[dict] = None,
+        publish: Optional[Callable[[str, dict], Awaitable[None]]] = None
+    ):
+        self.collection = collection
+        self.job_id = job_id
+        self.publish = publish
+        self._set = {}
+        self._inc = {}
+        self._log = []
+        # Totales ya acumulados en el documento (p.ej. intentos anteriores)
+        token_usage = token_usage or {}
+        self.token_totals = {total: token_usage.get(total, 0) for _, total in TOKEN_FIELDS}
+        # Progreso completo (los eventos llevan el estado entero, no solo lo cambiado)
+        self.progress_state = dict(progress or {})
+        self._progress_changed = False
+
+    def set(self, fields: dict):
+        """$set de campos (notación con puntos)"""
+        self._set.update(fields)
+        for key, value in fields.items():
+            if key.startswith("progress."):
+                self.progress_state[key[len("progress."):]] = value
+                self._progress_changed = True
+
+    def log(self, event: str, details: str = ""):
+        """Evento del execution_log (con la hora en que ocurre, no la del flush)"""
+        self._log.append({
+            "timestamp": datetime.now(timezone.utc),
+            "event": event,
+            "details": details
+        })
+
+    def progress(self, phase: str, current_agent: str, completed: int, total: int, message: str):
+        """Progreso después de cada agente (solo cuenta el último antes del flush)"""
+        percentage = int((completed / total) * 100)
+        self.set({
+            "progress.phase": phase,
+            "progress.current_agent": current_agent,
+            "progress.completed_steps": completed,
+            "progress.total_steps": total,
+            "progress.percentage": percentage,
+            "progress.message": message
+        })
+        logger.info(f"  📊 Progreso: {current_agent} completado ({percentage}%)")
+
+    def add_token_usage(self, agent_id: str, token_usage: dict):
+        """Suma los tokens de un agente a los totales y guarda su detalle"""
+        for source, total in TOKEN_FIELDS:
+            amount = token_usage.get(source, 0)
+            self._inc[f"token_usage.{total}"] = self._inc.get(f"token_usage.{total}", 0) + amount
+            self.token_totals[total] += amount
+        self._set[f"token_usage.by_agent.{agent_id}"] = token_usage
+
+    def record_executions(
+        self,
+        executions: list,
+        phase: str,
+        agent_prefix: str,
+        first_agent_index: int,
+        base_steps: int,
+        total_steps: int
+    ):
+        """Tokens, progreso y log de las executions devueltas por un pipeline"""
+        for idx, execution in enumerate(executions):
+            agent_id = execution.get("agent_id", f"{agent_prefix}{idx + first_agent_index}")
+            token_usage = execution.get("token_usage")
+            if token_usage:
+                self.add_token_usage(agent_id, token_usage)
+            self.progress(phase, agent_id, base_steps + idx + 1, total_steps, f"Agente {agent_id} completado")
+            self.log("agent_completed", f"{agent_id} ejecutado exitosamente")
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._set or self._inc or self._log)
+
+    async def flush(self):
+        """Escribe todo lo acumulado en un solo update_one"""
+        if not self.pending:
+            return
+
+        update = {}
+        if self._set:
+            update["$set"] = self._set
+        if self._inc:
+            update["$inc"] = self._inc
+        if self._log:
+            update["$push"] = {"execution_log": {"$each": self._log}}
+
+        events = self._events() if self.publish else []
+        self._set, self._inc, self._log = {}, {}, []
+        self._progress_changed = False
+        await self.collection.update_one({"_id": self.job_id}, update)
+
+        for event in events:
+            try:
+                await self.publish(self.job_id, event)
+            except Exception as e:
+                logger.warning(f"⚠️ Job {self.job_id}: no se pudo publicar el evento {event['type']}: {e}")
+
+    def _events(self) -> list:
+        """Eventos del flush: log, progreso y, al final, completed / failed"""
+        events = [log_event(self.job_id, entry) for entry in self._log]
+        terminal = [event for event in events if event["type"] in TERMINAL_EVENTS]
+        events = [event for event in events if event["type"] not in TERMINAL_EVENTS]
+
+        if self._progress_changed or "status" in self._set:
+            fields = {"progress": dict(self.progress_state)}
+            if "status" in self._set:
+                fields["status"] = self._set["status"]
+            events.append(job_event("progress", self.job_id, **fields))
+
+        for event in terminal:
+            if event["type"] == "completed":
+                event["result"] = self._set.get("result")
+            elif "error_message" in self._set:
+                event["error_message"] = self._set["error_message"]
+        return events + terminal
@@ -1,19 +1,20 @@
 """
 Job Worker - Proceso separado para ejecutar jobs de generación E.D.N.360
 
-⚠️ DESACTIVADO TEMPORALMENTE (Enero 2025)
+Pool de workers async que reclaman jobs de forma atómica (con lease y
+heartbeat), re-reclaman los de workers caídos, marcan como failed los que
+exceden el timeout y publican sus métricas en la colección job_workers.
 
-Motivo: Migración de arquitectura AS-IS → TO-BE (client_drawer)
-Estado: El worker sigue corriendo pero NO procesa jobs de generación
+Los jobs solo se reclaman con JOB_GENERATION_ENABLED=true: el orquestador
+E1-E9 / N0-N8 sigue desactivado por la migración a client_drawer, y sin
+el flag el worker solo monitoriza los jobs pendientes.
 
-Este worker ahora solo:
-1. Monitorea jobs pendientes
-2. Registra logs informativos
-3. Mantiene el sistema estable sin procesar generación legacy
+Configuración: JOB_GENERATION_ENABLED, JOB_WORKER_CONCURRENCY,
+JOB_POLL_INTERVAL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
 
 Ejecutar:
     python job_worker.py
-    
+
 O con supervisor:
     sudo supervisorctl start job_worker
 """
@@ -21,22 +22,32 @@ O con supervisor:
 import asyncio
 import sys
 import os
+import socket
+import time
 import logging
+from dataclasses import dataclass, field, asdict
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
+from typing import Optional
 
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from motor.motor_asyncio import AsyncIOMotorClient
-
-# Get MongoDB URL and DB name from environment (set by supervisor or default)
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.getenv('DB_NAME', 'test_database')
+from server import (
+    db,
+    process_generation_job,
+    claim_generation_job,
+    add_job_log,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_GENERATION_ENABLED
+)
+from job_queries import pending_jobs_filter, stuck_jobs_filter
+from templates.block_cache import TEMPLATE_CACHE_WARM, warm_template_cache
 
-# MongoDB setup
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '2'))
+POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_INTERVAL', '5'))
+JOB_TIMEOUT_MINUTES = 30
 
 # Logging setup
 logging.basicConfig(
@@ -45,117 +56,227 @@ logging.basicConfig(
 )
 logger = logging.getLogger('job_worker')
 
-# ⚠️ NO importamos process_generation_job porque el orquestador fue eliminado
-# from server import (
-#     process_generation_job,
-#     add_job_log,
-#     check_job_concurrency,
-#     update_job_progress
-# )
 
-async def process_pending_jobs():
-    """
-    ⚠️ DESACTIVADO - Solo monitorea jobs pendientes sin procesarlos.
-    
-    La generación de planes está temporalmente deshabilitada mientras
-    migramos al nuevo sistema EDN360 con arquitectura client_drawer.
-    """
+@dataclass
+class WorkerStats:
+    """Métricas de throughput de un worker"""
+    worker_id: str
+    host: str
+    pid: int
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    jobs_claimed: int = 0
+    jobs_completed: int = 0
+    jobs_failed: int = 0
+    busy_seconds: float = 0.0
+    current_job_id: Optional[str] = None
+    last_job_id: Optional[str] = None
+    last_job_seconds: Optional[float] = None
+
+    def record(self, job_id: str, status: str, elapsed: float):
+        self.busy_seconds += elapsed
+        self.last_job_id = job_id
+        self.last_job_seconds = round(elapsed, 2)
+        if status == "completed":
+            self.jobs_completed += 1
+        else:
+            self.jobs_failed += 1
+
+    def to_doc(self) -> dict:
+        doc = asdict(self)
+        doc["_id"] = doc.pop("worker_id")
+        uptime = (datetime.now(timezone.utc) - self.started_at).total_seconds()
+        doc["uptime_seconds"] = round(uptime, 1)
+        doc["busy_seconds"] = round(self.busy_seconds, 1)
+        doc["utilization"] = round(self.busy_seconds / uptime, 3) if uptime > 0 else 0.0
+        doc["jobs_per_hour"] = round(self.jobs_completed * 3600 / uptime, 2) if uptime > 0 else 0.0
+        doc["avg_job_seconds"] = (
+            round(self.busy_seconds / (self.jobs_completed + self.jobs_failed), 2)
+            if (self.jobs_completed + self.jobs_failed) else None
+        )
+        doc["last_seen"] = datetime.now(timezone.utc)
+        return doc
+
+
+async def publish_stats(stats: WorkerStats):
+    """Publica las métricas del worker en la colección job_workers"""
     try:
-        # Buscar jobs pendientes (solo para monitoreo)
-        pending_jobs = await db.generation_jobs.find(
-            {"status": "pending"}
-        ).sort("created_at", 1).to_list(length=10)
-        
-        if pending_jobs:
-            logger.info(f"📊 Monitoreo: {len(pending_jobs)} job(s) pendientes (NO se procesarán - sistema en migración)")
-            
-            for job in pending_jobs:
-                job_id = job["_id"]
-                user_id = job.get("user_id", "unknown")
-                job_type = job.get("type", "unknown")
-                created_at = job.get("created_at", "")
-                
-                logger.info(f"   - Job {job_id}: user={user_id}, type={job_type}, created={created_at}")
-                logger.info(f"     ⚠️ NO PROCESADO: La generación está deshabilitada temporalmente")
-    
+        await db.job_workers.replace_one({"_id": stats.worker_id}, stats.to_doc(), upsert=True)
     except Exception as e:
-        logger.error(f"❌ Error en process_pending_jobs: {e}")
+        logger.error(f"❌ Error publicando métricas de {stats.worker_id}: {e}")
+
+
+async def worker_loop(stats: WorkerStats, stop_event: asyncio.Event):
+    """
+    Loop de un worker: reclama un job, lo ejecuta y repite.
+    Si no hay jobs disponibles, espera POLL_INTERVAL_SECONDS.
+    """
+    logger.info(f"🧵 Worker {stats.worker_id} iniciado")
 
-async def timeout_watchdog():
+    while not stop_event.is_set():
+        try:
+            job = await claim_generation_job(stats.worker_id)
+        except Exception as e:
+            logger.error(f"❌ Worker {stats.worker_id}: error reclamando job: {e}")
+            job = None
+
+        if not job:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_id = job["_id"]
+        stats.jobs_claimed += 1
+        stats.current_job_id = job_id
+        await publish_stats(stats)
+        logger.info(f"📥 Worker {stats.worker_id} reclamó job {job_id} (intento {job.get('attempts', 1)})")
+
+        started = time.monotonic()
+        try:
+            await process_generation_job(job_id, worker_id=stats.worker_id)
+        except Exception as e:
+            logger.error(f"❌ Worker {stats.worker_id}: error no controlado en job {job_id}: {e}")
+        elapsed = time.monotonic() - started
+
+        final = await db.generation_jobs.find_one({"_id": job_id}, {"status": 1})
+        final_status = final.get("status") if final else "failed"
+        stats.record(job_id, final_status, elapsed)
+        stats.current_job_id = None
+        await publish_stats(stats)
+
+        logger.info(f"📤 Worker {stats.worker_id}: job {job_id} → {final_status} ({elapsed:.1f}s)")
+
+    logger.info(f"⛔ Worker {stats.worker_id} detenido")
+
+
+async def pending_jobs_monitor(stop_event: asyncio.Event):
     """
-    Watchdog que marca jobs stuck como failed después de 30 minutos.
+    Con JOB_GENERATION_ENABLED desactivado: solo registra los jobs
+    pendientes, sin reclamarlos (quedan en cola hasta activar la generación).
     """
-    timeout_minutes = 30
-    
-    while True:
+    while not stop_event.is_set():
         try:
-            cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=timeout_minutes)
-            
+            pending = await db.generation_jobs.count_documents(pending_jobs_filter())
+            if pending:
+                logger.info(f"📊 Monitoreo: {pending} job(s) pendientes (NO se procesan: JOB_GENERATION_ENABLED desactivado)")
+        except Exception as e:
+            logger.error(f"❌ Error monitorizando jobs pendientes: {e}")
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def stats_publisher(all_stats: list, stop_event: asyncio.Event):
+    """Publica periódicamente las métricas de todos los workers (last_seen)"""
+    interval = max(JOB_LEASE_SECONDS / 3, 1)
+    while not stop_event.is_set():
+        for stats in all_stats:
+            await publish_stats(stats)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def timeout_watchdog(stop_event: asyncio.Event):
+    """
+    Watchdog que marca como failed:
+    - Jobs en running durante más de JOB_TIMEOUT_MINUTES
+    - Jobs con lease expirado que ya agotaron JOB_MAX_ATTEMPTS
+    """
+    while not stop_event.is_set():
+        try:
+            now = datetime.now(timezone.utc)
+            cutoff_time = now - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+
             # Buscar jobs stuck
-            stuck_jobs = await db.generation_jobs.find({
-                "status": "running",
-                "started_at": {"$lt": cutoff_time}
-            }).to_list(length=100)
-            
+            stuck_jobs = await db.generation_jobs.find(
+                stuck_jobs_filter(now, cutoff_time, JOB_MAX_ATTEMPTS),
+                {"_id": 1, "attempts": 1, "started_at": 1}
+            ).to_list(length=100)
+
             for job in stuck_jobs:
                 job_id = job["_id"]
-                logger.warning(f"⚠️ Timeout: Job {job_id} excedió {timeout_minutes} min")
-                
-                await db.generation_jobs.update_one(
-                    {"_id": job_id},
+                timed_out = job.get("started_at") and job["started_at"].replace(tzinfo=timezone.utc) < cutoff_time
+                if timed_out:
+                    message = f"Job excedió timeout de {JOB_TIMEOUT_MINUTES} minutos"
+                else:
+                    message = f"Job abandonado tras {job.get('attempts')} intentos (lease expirado)"
+                logger.warning(f"⚠️ Watchdog: Job {job_id}: {message}")
+
+                result = await db.generation_jobs.update_one(
+                    {"_id": job_id, "status": "running"},
                     {
                         "$set": {
                             "status": "failed",
-                            "error_message": f"Job excedió timeout de {timeout_minutes} minutos",
+                            "error_message": message,
                             "error_reason": "timeout",
-                            "completed_at": datetime.now(timezone.utc)
+                            "completed_at": now
                         }
                     }
                 )
-                
-                try:
-                    await add_job_log(job_id, "timeout", f"Marcado como failed por timeout ({timeout_minutes} min)")
-                except:
-                    pass
-            
+
+                if result.modified_count:
+                    try:
+                        await add_job_log(job_id, "timeout", message)
+                    except Exception:
+                        pass  # Si falla el log, no bloquear
+
             if stuck_jobs:
                 logger.info(f"✅ Timeout watchdog: {len(stuck_jobs)} job(s) marcados como failed")
-        
+
         except Exception as e:
             logger.error(f"❌ Error en timeout_watchdog: {e}")
-        
+
         # Check cada 5 minutos
-        await asyncio.sleep(300)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=300)
+        except asyncio.TimeoutError:
+            pass
+
 
-async def worker_main():
+async def worker_main(concurrency: int = WORKER_CONCURRENCY):
     """
-    Loop principal del worker.
-    
-    ⚠️ MODO MONITOREO: Solo observa jobs pendientes sin procesarlos.
+    Arranca el pool de workers, el publicador de métricas y el watchdog.
     """
+    host = socket.gethostname()
+    pid = os.getpid()
+
     logger.info("🚀 Job Worker iniciado")
-    logger.info("⚠️  MODO: MONITOREO (generación deshabilitada)")
     logger.info("📊 Configuración:")
-    logger.info(f"   - MongoDB: {MONGO_URL}")
-    logger.info(f"   - Database: {DB_NAME}")
-    logger.info(f"   - Intervalo de polling: 30 segundos")
-    logger.info(f"   - Estado: Migración EDN360 en progreso (AS-IS → TO-BE)")
-    logger.info("")
-    logger.info("ℹ️  El worker NO procesará jobs de generación hasta que se implemente")
-    logger.info("   la nueva arquitectura client_drawer según DOCUMENTO_2_VFINAL")
-    
-    # Iniciar watchdog en background
-    asyncio.create_task(timeout_watchdog())
-    
-    # Loop principal
-    while True:
-        try:
-            await process_pending_jobs()
-        except Exception as e:
-            logger.error(f"❌ Error en worker_main: {e}")
-        
-        # Esperar 30 segundos antes del próximo ciclo (antes era 5s)
-        await asyncio.sleep(30)
+    logger.info(f"   - Workers: {concurrency}")
+    logger.info(f"   - Intervalo de polling: {POLL_INTERVAL_SECONDS} segundos")
+    logger.info(f"   - Lease: {JOB_LEASE_SECONDS} segundos (máx {JOB_MAX_ATTEMPTS} intentos)")
+    logger.info(f"   - Timeout: {JOB_TIMEOUT_MINUTES} minutos")
+    logger.info(f"   - Generación: {'activada' if JOB_GENERATION_ENABLED else 'DESACTIVADA'}")
+
+    if TEMPLATE_CACHE_WARM:
+        await asyncio.to_thread(warm_template_cache)
+
+    stop_event = asyncio.Event()
+    all_stats = [
+        WorkerStats(worker_id=f"{host}-{pid}-w{i}", host=host, pid=pid)
+        for i in range(concurrency)
+    ]
+
+    if JOB_GENERATION_ENABLED:
+        tasks = [asyncio.create_task(worker_loop(stats, stop_event)) for stats in all_stats]
+    else:
+        logger.warning("⚠️ Generación desactivada (JOB_GENERATION_ENABLED=false): los jobs no se reclaman")
+        tasks = [asyncio.create_task(pending_jobs_monitor(stop_event))]
+    tasks.append(asyncio.create_task(stats_publisher(all_stats, stop_event)))
+    tasks.append(asyncio.create_task(timeout_watchdog(stop_event)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stop_event.set()
+        for stats in all_stats:
+            await publish_stats(stats)
+
 
 if __name__ == "__main__":
     try:
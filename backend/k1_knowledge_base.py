@@ -4,51 +4,244 @@ K1 Knowledge Base Module
 Módulo para consultar y aplicar reglas del K1_ENTRENAMIENTO_ABSTRACTO
 
 Este módulo proporciona funciones para:
-- Cargar el K1 desde archivo JSON
+- Cargar el K1 desde archivo JSON (compilado en un K1Engine, que se
+  recompila si cambia el fichero)
 - Consultar reglas por nivel de usuario, objetivo, etc.
 - Aplicar lógica de decisión basada en el K1
 - NO contiene ejercicios concretos, solo lógica abstracta
+
+Configuración: K1_CONTEXT_CACHE_SIZE
 """
 
 import json
 import os
-from typing import Dict, List, Optional, Any
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional, Any, Mapping, FrozenSet
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Cache del K1 en memoria
-_K1_CACHE: Optional[Dict] = None
+K1_PATH = Path(__file__).parent / 'k1_entrenamiento_abstracto.json'
+K1_CONTEXT_CACHE_SIZE = int(os.getenv('K1_CONTEXT_CACHE_SIZE', '64'))
 
-def load_k1() -> Dict:
+NIVEL_POR_DEFECTO = 'intermedio'
+OBJETIVO_POR_DEFECTO = 'mantenimiento_salud'
+
+AJUSTE_FATIGA_POR_DEFECTO = {
+    'ajustar_volumen_por_sesion': 'mantener',
+    'ajustar_intensidad_carga': 'mantener',
+    'ajustar_proximidad_fallo': 'mantener'
+}
+
+
+def _first_by(rules: List[Dict], key) -> Dict[str, Dict]:
+    """Primera regla por valor de key (mismo criterio que el bucle con break)"""
+    table = {}
+    for regla in rules:
+        value = key(regla)
+        if value is not None:
+            table.setdefault(value, regla)
+    return table
+
+
+class K1Engine:
+    """K1 compilado: tablas de consulta precalculadas a partir del JSON"""
+
+    def __init__(self, data: Dict, mtime: float = 0.0):
+        self.data = data
+        self.mtime = mtime
+
+        self.taxonomy_sets: Mapping[str, FrozenSet[str]] = MappingProxyType({
+            name: frozenset(values)
+            for name, values in data['taxonomia'].items()
+            if isinstance(values, list)
+        })
+
+        reglas_metodos = data['reglas_metodos_entrenamiento']
+        volumen_intensidad = data['reglas_volumen_intensidad']
+
+        self.reglas_nivel = {
+            nivel: regla['entonces']
+            for nivel, regla in _first_by(
+                data['modelo_usuario']['reglas_generales'],
+                lambda regla: regla['si'].get('nivel_experiencia')
+            ).items()
+        }
+        self._metodos_nivel = _first_by(reglas_metodos['reglas_por_nivel'], lambda r: r['nivel_experiencia'])
+        self._metodos_objetivo = _first_by(reglas_metodos['reglas_por_objetivo'], lambda r: r['objetivo'])
+        self._volumen_nivel = _first_by(volumen_intensidad['mapa_volumen_por_nivel'], lambda r: r['nivel_experiencia'])
+        self.intensidad_objetivo = {
+            objetivo: {
+                'intensidad_carga': regla['intensidad_carga_preferente'],
+                'proximidad_fallo': regla['proximidad_fallo_preferente'],
+                'comentarios': regla['comentarios']
+            }
+            for objetivo, regla in _first_by(
+                volumen_intensidad['mapa_intensidad_por_objetivo'], lambda r: r['objetivo']
+            ).items()
+        }
+        self.ajuste_fatiga = {
+            estado: regla['entonces']
+            for estado, regla in _first_by(
+                volumen_intensidad['reglas_ajuste_fatiga'],
+                lambda regla: regla['si'].get('estado_fatiga')
+            ).items()
+        }
+
+        # Tablas (nivel, objetivo) para todos los valores conocidos
+        niveles = set(data['taxonomia'].get('niveles_usuario', [])) | set(self.reglas_nivel) \
+            | set(self._metodos_nivel) | set(self._volumen_nivel)
+        objetivos = set(data['taxonomia'].get('objetivos_principales', [])) | set(data['reglas_objetivo']) \
+            | set(self._metodos_objetivo)
+        self.metodos = {}
+        self.volumen = {}
+        for nivel in niveles:
+            for objetivo in objetivos:
+                self.metodos[(nivel, objetivo)] = self._build_metodos(nivel, objetivo)
+                self.volumen[(nivel, objetivo)] = self._build_volumen(nivel, objetivo)
+
+        self.contexto_e4 = lru_cache(maxsize=K1_CONTEXT_CACHE_SIZE)(self._build_contexto_e4)
+
+    def _build_metodos(self, nivel: str, objetivo: str) -> Dict:
+        metodos_nivel = self._metodos_nivel.get(nivel, {})
+        metodos_objetivo = self._metodos_objetivo.get(objetivo, {})
+        return {
+            'permitidas_por_nivel': metodos_nivel.get('permitir_categorias', []),
+            'evitar_por_nivel': metodos_nivel.get('evitar_categorias', []),
+            'priorizar_por_objetivo': metodos_objetivo.get('priorizar_categorias', []),
+            'usar_con_moderacion': metodos_objetivo.get('usar_con_moderacion', []),
+            'evitar_por_objetivo': metodos_objetivo.get('evitar', [])
+        }
+
+    def _build_volumen(self, nivel: str, objetivo: str) -> Dict:
+        volumen_nivel = self._volumen_nivel.get(nivel, {})
+        volumen_objetivo = self.data['reglas_objetivo'].get(objetivo, {}).get('tendencias', {})
+        return {
+            'volumen_por_sesion': volumen_objetivo.get('volumen_por_sesion', volumen_nivel.get('volumen_por_sesion')),
+            'series_por_ejercicio': volumen_nivel.get('series_por_ejercicio'),
+            'series_semanales_por_musculo': volumen_nivel.get('series_totales_por_musculo_en_semana')
+        }
+
+    def get_metodos(self, nivel: str, objetivo: str) -> Dict:
+        metodos = self.metodos.get((nivel, objetivo))
+        return dict(metodos) if metodos is not None else self._build_metodos(nivel, objetivo)
+
+    def get_volumen(self, nivel: str, objetivo: str) -> Dict:
+        volumen = self.volumen.get((nivel, objetivo))
+        return dict(volumen) if volumen is not None else self._build_volumen(nivel, objetivo)
+
+    def _build_contexto_e4(self, nivel: str, objetivo: str) -> str:
+        k1 = self.data
+        reglas_nivel = self.reglas_nivel.get(nivel, {})
+        reglas_objetivo = k1['reglas_objetivo'].get(objetivo, {})
+        metodos = self.get_metodos(nivel, objetivo)
+        volumen = self.get_volumen(nivel, objetivo)
+        intensidad = self.intensidad_objetivo.get(objetivo, {})
+
+        return f"""
+# CONTEXTO K1 PARA USUARIO
+
+## Perfil del Usuario
+- Nivel de experiencia: {nivel}
+- Objetivo principal: {objetivo}
+
+## Principios Fundamentales a Respetar
+{json.dumps(k1['principios_fundamentales']['principios_generales'], indent=2, ensure_ascii=False)}
+
+## Reglas para Nivel {nivel.upper()}
+{json.dumps(reglas_nivel, indent=2, ensure_ascii=False)}
+
+## Reglas para Objetivo {objetivo.upper()}
+{json.dumps(reglas_objetivo, indent=2, ensure_ascii=False)}
+
+## Métodos de Entrenamiento
+{json.dumps(metodos, indent=2, ensure_ascii=False)}
+
+## Volumen Recomendado (Abstracto)
+{json.dumps(volumen, indent=2, ensure_ascii=False)}
+
+## Intensidad Recomendada (Abstracta)
+{json.dumps(intensidad, indent=2, ensure_ascii=False)}
+
+## Estructura de Sesión
+{json.dumps(k1['reglas_diseno_sesion'], indent=2, ensure_ascii=False)}
+
+## Reglas de Seguridad
+{json.dumps(k1['reglas_seguridad_y_restricciones'], indent=2, ensure_ascii=False)}
+
+## Taxonomía de Patrones y Tipos
+- Patrones de Movimiento: {', '.join(k1['taxonomia']['patrones_movimiento'])}
+- Tipos de Ejercicio: {', '.join(k1['taxonomia']['tipos_ejercicio'])}
+"""
+
+
+# Engine compilado en memoria (se recompila si cambia el mtime del JSON)
+_K1_ENGINE: Optional[K1Engine] = None
+_K1_LOCK = threading.Lock()
+
+
+def get_k1_engine() -> K1Engine:
     """
-    Carga el K1 desde archivo JSON
+    K1 compilado, recargado si el fichero JSON ha cambiado
     
     Returns:
-        Dict con toda la estructura del K1
+        K1Engine con las tablas de consulta
     """
-    global _K1_CACHE
-    
-    if _K1_CACHE is not None:
-        return _K1_CACHE
-    
-    k1_path = Path(__file__).parent / 'k1_entrenamiento_abstracto.json'
+    global _K1_ENGINE
     
     try:
-        with open(k1_path, 'r', encoding='utf-8') as f:
-            _K1_CACHE = json.load(f)
-        logger.info(f"✅ K1 v{_K1_CACHE['metadata']['version']} cargado correctamente")
-        return _K1_CACHE
-    except Exception as e:
-        logger.error(f"❌ Error cargando K1: {e}")
+        mtime = K1_PATH.stat().st_mtime
+    except OSError:
+        # Sin fichero: se sigue usando el engine cargado (si lo hay)
+        if _K1_ENGINE is not None:
+            return _K1_ENGINE
         raise
+    
+    engine = _K1_ENGINE
+    if engine is not None and engine.mtime == mtime:
+        return engine
+    
+    with _K1_LOCK:
+        if _K1_ENGINE is not None and _K1_ENGINE.mtime == mtime:
+            return _K1_ENGINE
+        try:
+            with open(K1_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            new_engine = K1Engine(data, mtime)
+        except Exception as e:
+            if _K1_ENGINE is not None:
+                # JSON a medio escribir o inválido: mantener la versión anterior
+                logger.error(f"❌ Error recargando K1, se mantiene v{_K1_ENGINE.data['metadata']['version']}: {e}")
+                return _K1_ENGINE
+            logger.error(f"❌ Error cargando K1: {e}")
+            raise
+        
+        action = "recargado" if _K1_ENGINE is not None else "cargado"
+        _K1_ENGINE = new_engine
+        logger.info(f"✅ K1 v{data['metadata']['version']} {action} correctamente")
+        return new_engine
+
+def load_k1() -> Dict:
+    """
+    Carga el K1 desde archivo JSON
+    
+    Returns:
+        Dict con toda la estructura del K1
+    """
+    return get_k1_engine().data
 
 def get_taxonomia() -> Dict:
     """Retorna la taxonomía completa del K1"""
     k1 = load_k1()
     return k1['taxonomia']
 
+def get_taxonomy_sets() -> Mapping[str, FrozenSet[str]]:
+    """Taxonomía del K1 como conjuntos congelados (para validar términos)"""
+    return get_k1_engine().taxonomy_sets
+
 def get_principios_fundamentales() -> List[Dict]:
     """Retorna los principios fundamentales del entrenamiento"""
     k1 = load_k1()
@@ -64,14 +257,7 @@ def get_reglas_por_nivel(nivel: str) -> Dict:
     Returns:
         Dict con reglas del modelo_usuario para ese nivel
     """
-    k1 = load_k1()
-    reglas_generales = k1['modelo_usuario']['reglas_generales']
-    
-    for regla in reglas_generales:
-        if regla['si'].get('nivel_experiencia') == nivel:
-            return regla['entonces']
-    
-    return {}
+    return get_k1_engine().reglas_nivel.get(nivel, {})
 
 def get_reglas_por_objetivo(objetivo: str) -> Dict:
     """
@@ -97,30 +283,7 @@ def get_metodos_permitidos(nivel: str, objetivo: str) -> Dict:
     Returns:
         Dict con categorías permitidas, evitar, priorizar
     """
-    k1 = load_k1()
-    reglas_metodos = k1['reglas_metodos_entrenamiento']
-    
-    # Reglas por nivel
-    metodos_nivel = {}
-    for regla in reglas_metodos['reglas_por_nivel']:
-        if regla['nivel_experiencia'] == nivel:
-            metodos_nivel = regla
-            break
-    
-    # Reglas por objetivo
-    metodos_objetivo = {}
-    for regla in reglas_metodos['reglas_por_objetivo']:
-        if regla['objetivo'] == objetivo:
-            metodos_objetivo = regla
-            break
-    
-    return {
-        'permitidas_por_nivel': metodos_nivel.get('permitir_categorias', []),
-        'evitar_por_nivel': metodos_nivel.get('evitar_categorias', []),
-        'priorizar_por_objetivo': metodos_objetivo.get('priorizar_categorias', []),
-        'usar_con_moderacion': metodos_objetivo.get('usar_con_moderacion', []),
-        'evitar_por_objetivo': metodos_objetivo.get('evitar', [])
-    }
+    return get_k1_engine().get_metodos(nivel, objetivo)
 
 def get_volumen_recomendado(nivel: str, objetivo: str) -> Dict:
     """
@@ -133,24 +296,7 @@ def get_volumen_recomendado(nivel: str, objetivo: str) -> Dict:
     Returns:
         Dict con categorías abstractas de volumen
     """
-    k1 = load_k1()
-    
-    # Volumen por nivel
-    volumen_nivel = {}
-    for regla in k1['reglas_volumen_intensidad']['mapa_volumen_por_nivel']:
-        if regla['nivel_experiencia'] == nivel:
-            volumen_nivel = regla
-            break
-    
-    # Tendencias por objetivo
-    objetivo_data = get_reglas_por_objetivo(objetivo)
-    volumen_objetivo = objetivo_data.get('tendencias', {})
-    
-    return {
-        'volumen_por_sesion': volumen_objetivo.get('volumen_por_sesion', volumen_nivel.get('volumen_por_sesion')),
-        'series_por_ejercicio': volumen_nivel.get('series_por_ejercicio'),
-        'series_semanales_por_musculo': volumen_nivel.get('series_totales_por_musculo_en_semana')
-    }
+    return get_k1_engine().get_volumen(nivel, objetivo)
 
 def get_intensidad_recomendada(objetivo: str) -> Dict:
     """
@@ -162,17 +308,8 @@ def get_intensidad_recomendada(objetivo: str) -> Dict:
     Returns:
         Dict con categorías abstractas de intensidad
     """
-    k1 = load_k1()
-    
-    for regla in k1['reglas_volumen_intensidad']['mapa_intensidad_por_objetivo']:
-        if regla['objetivo'] == objetivo:
-            return {
-                'intensidad_carga': regla['intensidad_carga_preferente'],
-                'proximidad_fallo': regla['proximidad_fallo_preferente'],
-                'comentarios': regla['comentarios']
-            }
-    
-    return {}
+    intensidad = get_k1_engine().intensidad_objetivo.get(objetivo)
+    return dict(intensidad) if intensidad is not None else {}
 
 def ajustar_por_fatiga(estado_fatiga: str, volumen_base: str, intensidad_base: str) -> Dict:
     """
@@ -186,18 +323,8 @@ def ajustar_por_fatiga(estado_fatiga: str, volumen_base: str, intensidad_base: s
     Returns:
         Dict con ajustes recomendados
     """
-    k1 = load_k1()
-    reglas_fatiga = k1['reglas_volumen_intensidad']['reglas_ajuste_fatiga']
-    
-    for regla in reglas_fatiga:
-        if regla['si'].get('estado_fatiga') == estado_fatiga:
-            return regla['entonces']
-    
-    return {
-        'ajustar_volumen_por_sesion': 'mantener',
-        'ajustar_intensidad_carga': 'mantener',
-        'ajustar_proximidad_fallo': 'mantener'
-    }
+    ajuste = get_k1_engine().ajuste_fatiga.get(estado_fatiga)
+    return ajuste if ajuste is not None else dict(AJUSTE_FATIGA_POR_DEFECTO)
 
 def get_estructura_sesion() -> Dict:
     """Retorna la estructura básica recomendada para una sesión"""
@@ -236,7 +363,7 @@ def validate_user_profile(perfil_usuario: Dict) -> Dict:
             errores.append(f"Campo requerido faltante: {field}")
     
     # Validar valores contra taxonomía
-    taxonomia = get_taxonomia()
+    taxonomia = get_taxonomy_sets()
     
     if perfil_usuario.get('nivel_experiencia') not in taxonomia['niveles_usuario']:
         errores.append(f"Nivel de experiencia inválido: {perfil_usuario.get('nivel_experiencia')}")
@@ -253,60 +380,18 @@ def generar_contexto_para_e4(perfil_usuario: Dict) -> str:
     """
     Genera el contexto completo del K1 que debe usarse en el prompt de E4
     
+    Solo depende del nivel y el objetivo del perfil, así que se memoriza
+    por (nivel, objetivo) en el LRU del engine.
+    
     Args:
         perfil_usuario: Perfil del usuario (nivel, objetivo, etc.)
         
     Returns:
         String con el contexto formateado para E4
     """
-    k1 = load_k1()
-    nivel = perfil_usuario.get('nivel_experiencia', 'intermedio')
-    objetivo = perfil_usuario.get('objetivo_principal', 'mantenimiento_salud')
-    
-    # Obtener reglas relevantes
-    reglas_nivel = get_reglas_por_nivel(nivel)
-    reglas_objetivo = get_reglas_por_objetivo(objetivo)
-    metodos = get_metodos_permitidos(nivel, objetivo)
-    volumen = get_volumen_recomendado(nivel, objetivo)
-    intensidad = get_intensidad_recomendada(objetivo)
-    
-    contexto = f"""
-# CONTEXTO K1 PARA USUARIO
-
-## Perfil del Usuario
-- Nivel de experiencia: {nivel}
-- Objetivo principal: {objetivo}
-
-## Principios Fundamentales a Respetar
-{json.dumps(k1['principios_fundamentales']['principios_generales'], indent=2, ensure_ascii=False)}
-
-## Reglas para Nivel {nivel.upper()}
-{json.dumps(reglas_nivel, indent=2, ensure_ascii=False)}
-
-## Reglas para Objetivo {objetivo.upper()}
-{json.dumps(reglas_objetivo, indent=2, ensure_ascii=False)}
-
-## Métodos de Entrenamiento
-{json.dumps(metodos, indent=2, ensure_ascii=False)}
-
-## Volumen Recomendado (Abstracto)
-{json.dumps(volumen, indent=2, ensure_ascii=False)}
-
-## Intensidad Recomendada (Abstracta)
-{json.dumps(intensidad, indent=2, ensure_ascii=False)}
-
-## Estructura de Sesión
-{json.dumps(k1['reglas_diseno_sesion'], indent=2, ensure_ascii=False)}
-
-## Reglas de Seguridad
-{json.dumps(k1['reglas_seguridad_y_restricciones'], indent=2, ensure_ascii=False)}
-
-## Taxonomía de Patrones y Tipos
-- Patrones de Movimiento: {', '.join(k1['taxonomia']['patrones_movimiento'])}
-- Tipos de Ejercicio: {', '.join(k1['taxonomia']['tipos_ejercicio'])}
-"""
-    
-    return contexto
+    nivel = perfil_usuario.get('nivel_experiencia', NIVEL_POR_DEFECTO)
+    objetivo = perfil_usuario.get('objetivo_principal', OBJETIVO_POR_DEFECTO)
+    return get_k1_engine().contexto_e4(nivel, objetivo)
 
 # Función de utilidad para tests
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""
+LLM Gateway - Cliente OpenAI compartido para todo el backend
+
+- Un único AsyncOpenAI con pool httpx de conexiones keep-alive.
+- chat_completion() y stream_chat_completion() (deltas de texto para SSE).
+- Histogramas de latencia y tokens por operación (GET /api/admin/llm/metrics).
+
+Configuración: OPENAI_API_KEY, LLM_TIMEOUT_SECONDS, LLM_MAX_CONNECTIONS,
+LLM_MAX_RETRIES
+"""
+
+import os
+import time
+import bisect
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '120'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Límites superiores de los buckets de los histogramas
+LATENCY_BUCKETS_SECONDS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+class Histogram:
+    """Histograma acumulativo simple (buckets fijos + suma + contador)"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else None
+        }
+
+
+class OperationMetrics:
+    """Métricas de una operación (chat_training, follow_up_analysis, ...)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS_SECONDS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_seconds": self.latency.to_dict(),
+            "prompt_tokens": self.prompt_tokens.to_dict(),
+            "completion_tokens": self.completion_tokens.to_dict()
+        }
+
+
+_metrics: Dict[str, OperationMetrics] = {}
+
+
+def _record(operation: str, started: float, usage=None, error: bool = False):
+    metrics = _metrics.setdefault(operation, OperationMetrics())
+    elapsed = time.monotonic() - started
+    metrics.calls += 1
+    metrics.latency.observe(elapsed)
+    if error:
+        metrics.errors += 1
+        return
+    if usage is not None:
+        metrics.prompt_tokens.observe(usage.prompt_tokens or 0)
+        metrics.completion_tokens.observe(usage.completion_tokens or 0)
+        logger.info(
+            f"🤖 LLM {operation}: {elapsed:.1f}s | "
+            f"tokens {usage.prompt_tokens} in / {usage.completion_tokens} out"
+        )
+
+
+def get_llm_metrics() -> dict:
+    """Snapshot de los histogramas por operación"""
+    return {operation: metrics.to_dict() for operation, metrics in _metrics.items()}
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Devuelve el AsyncOpenAI compartido (se crea en el primer uso)"""
+    global _client
+
+    if _client is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY no configurada en el entorno")
+
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                )
+            )
+        )
+
+    return _client
+
+
+async def chat_completion(
+    messages: List[dict],
+    operation: str,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.7,
+    max_tokens: int = 4000
+) -> str:
+    """
+    Chat completion (no streaming) con el cliente compartido
+
+    Args:
+        messages: Mensajes en formato OpenAI
+        operation: Nombre de la operación para las métricas
+        model, temperature, max_tokens: Parámetros del modelo
+
+    Returns:
+        Contenido de la respuesta
+    """
+    started = time.monotonic()
+    try:
+        response = await get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    except Exception:
+        _record(operation, started, error=True)
+        raise
+
+    _record(operation, started, response.usage)
+    return response.choices[0].message.content
+
+
+async def stream_chat_completion(
+    messages: List[dict],
+    operation: str,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.7,
+    max_tokens: int = 4000
+) -> AsyncIterator[str]:
+    """
+    Chat completion en streaming: genera los fragmentos de texto según llegan
+    """
+    started = time.monotonic()
+    usage = None
+    try:
+        stream = await get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception:
+        _record(operation, started, error=True)
+        raise
+
+    _record(operation, started, usage)
+
+
+async def close_llm_gateway():
+    """Cierra el cliente compartido (shutdown del servidor)"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
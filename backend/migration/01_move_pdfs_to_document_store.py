@@ -0,0 +1,78 @@
+"""
+Script de migración - PDFs inline → document store
+
+Mueve los binarios guardados dentro de db.pdfs (campo file_data) al
+document store direccionado por contenido (document_store.py) y deja en
+el documento solo la referencia (blob_id, size).
+
+Idempotente: solo procesa documentos que todavía tienen file_data.
+
+Ejecución:
+    python /app/backend/migration/01_move_pdfs_to_document_store.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import get_web_db, close_client
+from document_store import put_bytes, DOCUMENT_STORE_DIR
+
+BATCH_SIZE = 50
+
+
+async def migrate_inline_pdfs():
+    db = get_web_db()
+
+    print("=" * 80)
+    print(" Migración de PDFs inline → document store")
+    print("=" * 80)
+    print(f"📁 Document store: {DOCUMENT_STORE_DIR}")
+    print()
+
+    pending = await db.pdfs.count_documents({"file_data": {"$exists": True}})
+    print(f"📊 PDFs con file_data inline: {pending}")
+
+    migrated = 0
+    migrated_bytes = 0
+
+    while True:
+        # Solo _id en el listado; los bytes se leen de uno en uno
+        batch = await db.pdfs.find(
+            {"file_data": {"$exists": True}},
+            {"_id": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        for item in batch:
+            pdf = await db.pdfs.find_one({"_id": item["_id"]}, {"file_data": 1})
+            data = bytes(pdf.get("file_data") or b"")
+            stored = await put_bytes(db, data)
+
+            await db.pdfs.update_one(
+                {"_id": item["_id"]},
+                {
+                    "$set": {
+                        "blob_id": stored["blob_id"],
+                        "size": stored["size"],
+                        "content_type": "application/pdf"
+                    },
+                    "$unset": {"file_data": ""}
+                }
+            )
+            migrated += 1
+            migrated_bytes += stored["size"]
+
+        print(f"   ✅ {migrated}/{pending} migrados")
+
+    print()
+    print(f"✅ Migración completada: {migrated} PDFs, {migrated_bytes / 1024 / 1024:.1f} MB fuera de MongoDB")
+    close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate_inline_pdfs())
@@ -0,0 +1,41 @@
+"""
+Script de migración - Backfill de review_queue
+
+Construye la cola de revisiones de seguimiento (review_queue.py) a partir
+de los clientes team con plan de nutrición y sus follow_up_submissions.
+
+Idempotente: se puede relanzar en cualquier momento (recalcula cada
+entrada y elimina las de clientes que ya no cumplen).
+
+Ejecución:
+    python /app/backend/migration/02_backfill_review_queue.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import get_web_db, close_client
+from review_queue import backfill_review_queue
+
+
+async def run_backfill():
+    db = get_web_db()
+
+    print("=" * 80)
+    print(" Backfill de review_queue")
+    print("=" * 80)
+    print()
+
+    result = await backfill_review_queue(db)
+
+    print(f"✅ Clientes en la cola: {result['queued']}")
+    print(f"🧹 Entradas obsoletas eliminadas: {result['removed']}")
+    close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_backfill())
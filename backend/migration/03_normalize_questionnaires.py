@@ -0,0 +1,43 @@
+"""
+Script de migración - Normalización de cuestionarios existentes
+
+Guarda la versión validada y adaptada a E.D.N.360 (questionnaire_pipeline.py)
+en los nutrition_questionnaire_submissions y follow_up_submissions que no
+la tienen o la tienen de otra ADAPTER_VERSION.
+
+Opcional: los jobs recalculan bajo demanda las entradas que falten. Sirve
+para no pagar ese coste en el primer job tras desplegar o tras subir
+ADAPTER_VERSION.
+
+Ejecución:
+    python /app/backend/migration/03_normalize_questionnaires.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import get_web_db, close_client
+from questionnaire_pipeline import ADAPTER_VERSION, backfill_normalized
+
+
+async def run_backfill():
+    db = get_web_db()
+
+    print("=" * 80)
+    print(f" Normalización de cuestionarios (ADAPTER_VERSION={ADAPTER_VERSION})")
+    print("=" * 80)
+    print()
+
+    result = await backfill_normalized(db)
+
+    print(f"✅ Cuestionarios iniciales normalizados: {result['initial']}")
+    print(f"✅ Follow-ups normalizados: {result['followup']}")
+    close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_backfill())
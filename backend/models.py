@@ -1086,6 +1086,10 @@ class GenerationJob(BaseModel):
     previous_nutrition_plan_id: Optional[str] = None  # Plan nutricional previo
     previous_training_plan_id: Optional[str] = None  # Plan de entrenamiento previo
     status: str = "pending"  # "pending" | "queued" | "running" | "completed" | "failed"
+    worker_id: Optional[str] = None  # Worker que reclamó el job (job_worker.py)
+    attempts: int = 0  # Número de veces que el job ha sido reclamado
+    lease_expires_at: Optional[datetime] = None  # Se renueva con heartbeat mientras se ejecuta
+    heartbeat_at: Optional[datetime] = None
     progress: GenerationJobProgress = Field(default_factory=lambda: GenerationJobProgress(
         phase="pending",
         completed_steps=0,
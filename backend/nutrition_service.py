@@ -6,7 +6,8 @@ import os
 import sys
 import json
 from pathlib import Path
-from openai import AsyncOpenAI
+
+from llm_gateway import chat_completion
 
 # Cargar variables de entorno manualmente
 env_path = Path(__file__).parent / '.env'
@@ -210,13 +211,9 @@ async def generate_nutrition_plan(client_data: dict) -> dict:
         if client_data.get('context_adicional'):
             agent_1_prompt += f"\n\n{client_data['context_adicional']}"
         
-        # Inicializar cliente de OpenAI
-        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-        
-        # AGENTE 1: Llamar a OpenAI GPT-4o-mini
-        response_1 = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        # AGENTE 1: Llamar a OpenAI GPT-4o-mini (cliente compartido del llm_gateway)
+        menu_from_agent_1 = await chat_completion(
+            [
                 {
                     "role": "system",
                     "content": "Eres un experto nutricionista. Sigue las instrucciones al pie de la letra."
@@ -226,12 +223,10 @@ async def generate_nutrition_plan(client_data: dict) -> dict:
                     "content": agent_1_prompt
                 }
             ],
-            temperature=0.7,
-            max_tokens=3000,
-            timeout=120
+            operation="nutrition_agent_1",
+            model="gpt-4o-mini",
+            max_tokens=3000
         )
-        
-        menu_from_agent_1 = response_1.choices[0].message.content
         print("✅ AGENTE 1 completado")
         
         # AGENTE 2: Verificar y corregir
@@ -242,9 +237,8 @@ async def generate_nutrition_plan(client_data: dict) -> dict:
         )
         
         # AGENTE 2: Llamar a OpenAI GPT-4o-mini
-        response_2 = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        final_plan = await chat_completion(
+            [
                 {
                     "role": "system",
                     "content": "Eres un verificador nutricional experto. Sigue las instrucciones al pie de la letra."
@@ -254,12 +248,10 @@ async def generate_nutrition_plan(client_data: dict) -> dict:
                     "content": agent_2_prompt
                 }
             ],
-            temperature=0.7,
-            max_tokens=3000,
-            timeout=120
+            operation="nutrition_agent_2",
+            model="gpt-4o-mini",
+            max_tokens=3000
         )
-        
-        final_plan = response_2.choices[0].message.content
         print("✅ AGENTE 2 completado - Plan VERIFICADO")
         
         return {
@@ -0,0 +1,185 @@
+"""
+PDF Render Service - Renderizado de PDFs fuera del event loop
+
+Renderiza con WeasyPrint en un pool de procesos con concurrencia y cola
+acotadas, y reutiliza PDFs ya renderizados del mismo usuario con el mismo
+contenido (db.pdfs.content_hash o un LRU en memoria).
+
+Configuración: PDF_RENDER_WORKERS, PDF_RENDER_MAX_QUEUE,
+PDF_MEMORY_CACHE_MAX_BYTES
+
+Uso:
+    content_hash = compute_pdf_content_hash("training", user_id, html)
+    pdf_bytes = await render_pdf(html, content_hash=content_hash, db=db, user_id=user_id)
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from document_store import read_bytes
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando cambien las plantillas HTML de los PDFs (invalida la cache)
+PDF_TEMPLATE_VERSION = "2025.01"
+
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '2'))
+PDF_RENDER_MAX_QUEUE = int(os.getenv('PDF_RENDER_MAX_QUEUE', '16'))
+PDF_MEMORY_CACHE_MAX_BYTES = int(os.getenv('PDF_MEMORY_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_render_semaphore: Optional[asyncio.Semaphore] = None
+_waiting = 0
+
+# content_hash → pdf bytes (LRU acotado por tamaño total)
+_memory_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_cache_bytes = 0
+
+
+class PDFRenderQueueFull(Exception):
+    """La cola de renderizado está llena (el endpoint debe responder 503)"""
+    pass
+
+
+def compute_pdf_content_hash(*parts) -> str:
+    """
+    Hash de lo que determina el PDF: tipo, usuario y el HTML completo que se
+    renderiza (no solo el texto del plan: la plantilla incluye nombre, fechas...).
+    Las fechas del HTML deben salir del documento (server._pdf_date), nunca de
+    datetime.now(), o el hash cambia cada día.
+    Incluye PDF_TEMPLATE_VERSION para invalidar la cache al cambiar plantillas.
+    """
+    hasher = hashlib.sha256(PDF_TEMPLATE_VERSION.encode("utf-8"))
+    for part in parts:
+        hasher.update(b"\x1f")
+        hasher.update(str(part).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _render_html_to_pdf(html: str) -> bytes:
+    """Se ejecuta en el proceso hijo"""
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if _executor is None and PDF_RENDER_WORKERS > 0:
+        _executor = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _render_semaphore
+    if _render_semaphore is None:
+        _render_semaphore = asyncio.Semaphore(max(PDF_RENDER_WORKERS, 1))
+    return _render_semaphore
+
+
+def _memory_cache_get(content_hash: str) -> Optional[bytes]:
+    pdf_bytes = _memory_cache.get(content_hash)
+    if pdf_bytes is not None:
+        _memory_cache.move_to_end(content_hash)
+    return pdf_bytes
+
+
+def _memory_cache_put(content_hash: str, pdf_bytes: bytes):
+    global _memory_cache_bytes
+    if len(pdf_bytes) > PDF_MEMORY_CACHE_MAX_BYTES:
+        return
+    if content_hash in _memory_cache:
+        _memory_cache_bytes -= len(_memory_cache.pop(content_hash))
+    _memory_cache[content_hash] = pdf_bytes
+    _memory_cache_bytes += len(pdf_bytes)
+    while _memory_cache_bytes > PDF_MEMORY_CACHE_MAX_BYTES:
+        _, evicted = _memory_cache.popitem(last=False)
+        _memory_cache_bytes -= len(evicted)
+
+
+async def find_cached_pdf(db, content_hash: str, user_id: Optional[str] = None) -> Optional[bytes]:
+    """
+    Busca bytes ya renderizados con el mismo hash (memoria y db.pdfs)
+
+    En db.pdfs solo se buscan los PDFs de user_id (sin user_id, solo memoria).
+    """
+    pdf_bytes = _memory_cache_get(content_hash)
+    if pdf_bytes is not None:
+        return pdf_bytes
+
+    if db is not None and user_id:
+        cached_doc = await db.pdfs.find_one(
+            {"user_id": user_id, "content_hash": content_hash, "blob_id": {"$exists": True}},
+            {"blob_id": 1}
+        )
+        if cached_doc:
+            pdf_bytes = await read_bytes(cached_doc["blob_id"])
+            if pdf_bytes is not None:
+                _memory_cache_put(content_hash, pdf_bytes)
+                return pdf_bytes
+
+    return None
+
+
+async def render_pdf(
+    html: str,
+    content_hash: Optional[str] = None,
+    db=None,
+    user_id: Optional[str] = None
+) -> bytes:
+    """
+    Renderiza HTML a PDF sin bloquear el event loop.
+
+    Args:
+        html: HTML completo del documento
+        content_hash: Hash de compute_pdf_content_hash (activa la cache)
+        db: BD Web, para reutilizar PDFs ya guardados en db.pdfs
+        user_id: Dueño del PDF (la búsqueda en db.pdfs se limita a sus PDFs)
+
+    Raises:
+        PDFRenderQueueFull: Si hay más de PDF_RENDER_MAX_QUEUE renders esperando
+    """
+    global _waiting
+
+    if content_hash:
+        cached = await find_cached_pdf(db, content_hash, user_id)
+        if cached is not None:
+            logger.info(f"♻️ PDF reutilizado desde cache (hash {content_hash[:12]})")
+            return cached
+
+    semaphore = _get_semaphore()
+    if semaphore.locked() and _waiting >= PDF_RENDER_MAX_QUEUE:
+        raise PDFRenderQueueFull(f"Cola de renderizado PDF llena ({_waiting} en espera)")
+
+    _waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting -= 1
+
+    try:
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        if executor is not None:
+            pdf_bytes = await loop.run_in_executor(executor, _render_html_to_pdf, html)
+        else:
+            pdf_bytes = await asyncio.to_thread(_render_html_to_pdf, html)
+    finally:
+        semaphore.release()
+
+    if content_hash:
+        _memory_cache_put(content_hash, pdf_bytes)
+
+    return pdf_bytes
+
+
+def shutdown_pdf_renderer():
+    """Cierra el pool de procesos (shutdown del servidor)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,207 @@
+"""
+Plan Translation - Traducción inglés → español de los planes de entrenamiento
+
+Traduce in place los strings de un plan con el diccionario de términos
+compilado en una sola regex (palabras completas, sin distinguir mayúsculas)
+y una caché LRU para los strings repetidos.
+
+Benchmark:
+    python /app/backend/bench_plan_translation.py
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict
+
+TRANSLATION_CACHE_SIZE = 8192
+
+# Diccionario de traducciones (inglés → español)
+TRAINING_TRANSLATIONS = {
+    # Tipos de entrenamiento
+    'full_body': 'Cuerpo Completo',
+    'upper_lower': 'Torso-Pierna',
+    'push_pull_legs': 'Empuje-Tirón-Pierna',
+    'bro_split': 'Rutina Weider',
+
+    # Focos/énfasis de sesiones
+    'upper_body': 'Tren Superior',
+    'lower_body': 'Tren Inferior',
+    'push': 'Empuje',
+    'pull': 'Tirón',
+    'push_focus': 'Énfasis Empuje',
+    'pull_focus': 'Énfasis Tirón',
+    'quad_focus': 'Énfasis Cuádriceps',
+    'hamstring_focus': 'Énfasis Isquios',
+    'push_emphasis': 'Énfasis Empuje',
+    'pull_emphasis': 'Énfasis Tirón',
+    'posterior_chain': 'Cadena Posterior',
+
+    # Grupos musculares principales
+    'Chest': 'Pecho',
+    'chest': 'Pecho',
+    'Back': 'Espalda',
+    'back': 'Espalda',
+    'Shoulders': 'Hombros',
+    'shoulders': 'Hombros',
+    'Triceps': 'Tríceps',
+    'triceps': 'Tríceps',
+    'Biceps': 'Bíceps',
+    'biceps': 'Bíceps',
+    'Quads': 'Cuádriceps',
+    'quads': 'Cuádriceps',
+    'Hamstrings': 'Isquiotibiales',
+    'hamstrings': 'Isquiotibiales',
+    'Glutes': 'Glúteos',
+    'glutes': 'Glúteos',
+    'Legs': 'Piernas',
+    'legs': 'Piernas',
+    'Arms': 'Brazos',
+    'arms': 'Brazos',
+    'core': 'Core',
+    'Core': 'Core',
+    'calves': 'Gemelos',
+
+    # Grupos musculares específicos
+    'front_delts': 'Deltoides Anterior',
+    'side_delts': 'Deltoides Lateral',
+    'rear_delts': 'Deltoides Posterior',
+    'upper_chest': 'Pecho Superior',
+    'lower_chest': 'Pecho Inferior',
+    'lats': 'Dorsales',
+    'upper_back': 'Espalda Superior',
+    'traps': 'Trapecios',
+    'lower_back': 'Lumbar',
+    'abs': 'Abdominales',
+    'obliques': 'Oblicuos',
+    'forearms': 'Antebrazos',
+    'abductors': 'Abductores',
+
+    # Frases de nombres de sesiones completas (más específicas primero)
+    'Chest & Triceps – Joint Friendly': 'Pecho y Tríceps - Amigable con Articulaciones',
+    'Back & Biceps – Supported Pulls': 'Espalda y Bíceps - Jalones Asistidos',
+    'Legs – Quads & Glutes Emphasis': 'Piernas - Énfasis Cuádriceps y Glúteos',
+    'Shoulders & Arms – Machine/Isolation Safe': 'Hombros y Brazos - Máquinas Seguras',
+    'Upper 1 – Push Emphasis': 'Tren Superior 1 - Énfasis Empuje',
+    'Upper 2 – Pull Emphasis': 'Tren Superior 2 - Énfasis Tirón',
+    'Lower 1 – Quad Emphasis': 'Tren Inferior 1 - Énfasis Cuádriceps',
+    'Lower 2 – Posterior Chain': 'Tren Inferior 2 - Cadena Posterior',
+
+    # Conectores y palabras comunes
+    '&': 'y',
+    'and': 'y',
+    'Emphasis': 'Énfasis',
+    'emphasis': 'Énfasis',
+    'Joint Friendly': 'Amigable con Articulaciones',
+    'Supported Pulls': 'Jalones Asistidos',
+    'Machine/Isolation Safe': 'Máquinas Seguras',
+    'Posterior Chain': 'Cadena Posterior',
+
+    # Términos técnicos en inglés que necesitan traducción
+    'ROM': 'Rango de Movimiento',
+    'Rear Delts': 'Deltoides Posteriores',
+    'rear delts': 'deltoides posteriores',
+    'Support': 'Soporte',
+    'support': 'soporte',
+    'Safety': 'Seguridad',
+    'safety': 'seguridad',
+    'Support Only': 'Solo Soporte',
+    'Support y Safety': 'Soporte y Seguridad',
+    'lateral_delts': 'Deltoides Laterales',
+    'upper_Espalda': 'Espalda Superior',
+    'Machine Énfasis': 'Énfasis en Máquinas',
+    'Cuff': 'Manguito Rotador',
+    'Joint Care': 'Cuidado Articular'
+}
+
+# Letra o dígito ("_" no cuenta: separa términos en snake_case)
+_ALNUM = r"[^\W_]"
+
+
+def _term_pattern(term: str) -> str:
+    pattern = re.escape(term)
+    if re.match(_ALNUM, term):
+        pattern = f"(?<!{_ALNUM})" + pattern
+    if re.match(_ALNUM, term[-1]):
+        pattern += f"(?!{_ALNUM})"
+    return pattern
+
+
+def _expand_chained_terms(translations: Dict[str, str]) -> Dict[str, str]:
+    """
+    Términos en minúsculas → traducción, resolviendo los encadenamientos
+
+    Con sustituciones secuenciales el término N se buscaba sobre el texto
+    ya traducido por los términos anteriores. Para cada término que
+    contiene la traducción de uno anterior se añade también la forma en
+    inglés original. Ante duplicados sin distinguir mayúsculas gana el
+    primero (como antes: 'Chest' ya había traducido también 'chest').
+    """
+    table: Dict[str, str] = {}
+    previous = []
+    for eng, esp in translations.items():
+        key = eng.lower()
+        table.setdefault(key, esp)
+        for prev_eng, prev_esp in previous:
+            prev_pattern = re.compile(_term_pattern(prev_esp.lower()))
+            if prev_pattern.search(key):
+                table.setdefault(prev_pattern.sub(lambda _: prev_eng.lower(), key), esp)
+        previous.append((eng, esp))
+    return table
+
+
+def compile_translations(translations: Dict[str, str]):
+    """
+    Compila el diccionario
+
+    Returns:
+        (regex, tabla {término en minúsculas: traducción})
+    """
+    table = _expand_chained_terms(translations)
+    terms = sorted(table, key=len, reverse=True)
+    regex = re.compile("|".join(_term_pattern(term) for term in terms), re.IGNORECASE)
+    return regex, table
+
+
+_REGEX, _TABLE = compile_translations(TRAINING_TRANSLATIONS)
+
+
+def _replace(match: re.Match) -> str:
+    return _TABLE[match.group(0).lower()]
+
+
+@lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def translate_text(text: str) -> str:
+    """Traduce un string en una sola pasada"""
+    return _REGEX.sub(_replace, text)
+
+
+def translate_plan_in_place(plan):
+    """
+    Traduce todos los strings del plan (valores, no claves) modificando
+    los dicts y listas existentes
+
+    Returns:
+        El mismo objeto (o el string traducido si plan es un string)
+    """
+    if isinstance(plan, str):
+        return translate_text(plan)
+
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            continue
+
+        for key, value in items:
+            if isinstance(value, str):
+                translated = translate_text(value)
+                if translated != value:
+                    node[key] = translated
+            elif isinstance(value, (dict, list)):
+                stack.append(value)
+
+    return plan
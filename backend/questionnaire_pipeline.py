@@ -0,0 +1,671 @@
+"""
+Questionnaire Pipeline - Validación y adaptación de cuestionarios en el envío
+
+Valida y adapta al formato E.D.N.360 cada cuestionario al enviarlo y guarda
+el resultado junto a las respuestas originales:
+
+    {
+        ...,
+        "responses": {...},                # intacto
+        "normalized": {
+            "version": ADAPTER_VERSION,
+            "is_valid": bool,
+            "errors": [...],
+            "adapted": {...},              # formato E.D.N.360
+            "base_submission_id": "...",   # solo follow-ups
+            "normalized_at": datetime
+        }
+    }
+
+get_normalized() devuelve la versión guardada y la recalcula si falta o es
+de otra ADAPTER_VERSION.
+
+⚠️ Cualquier cambio en validate_questionnaire_format o en
+adapt_questionnaire_for_edn360 debe subir ADAPTER_VERSION.
+"""
+
+import re
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+ADAPTER_VERSION = 1
+
+INITIAL_COLLECTION = "nutrition_questionnaire_submissions"
+FOLLOWUP_COLLECTION = "follow_up_submissions"
+
+
+def validate_questionnaire_format(submission: dict) -> tuple[bool, list[str], dict]:
+    """
+    Valida robustamente el formato del cuestionario antes de procesarlo.
+    
+    Args:
+        submission: Documento de la BD (debe contener '_id', 'user_id', 'responses', etc.)
+    
+    Returns:
+        (is_valid, errors, questionnaire_data)
+        
+    FORMATO ESPERADO EN MONGODB:
+    {
+        "_id": "string (timestamp único)",
+        "user_id": "string",
+        "responses": {
+            "nombre_completo": "string",
+            "email": "string",
+            "fecha_nacimiento": "string (YYYY-MM-DD)",
+            "sexo": "string (Hombre/Mujer)",
+            "peso": "string (e.g., '75')",
+            "altura_cm": "string (e.g., '175')",
+            "objetivo_fisico": "string",
+            ... (más campos)
+        },
+        "submitted_at": "datetime",
+        "plan_generated": "boolean"
+    }
+    """
+    errors = []
+    
+    # 1. Validar estructura del submission
+    if not isinstance(submission, dict):
+        errors.append(f"Submission debe ser un dict, recibido: {type(submission)}")
+        return False, errors, {}
+    
+    if "_id" not in submission:
+        errors.append("Campo '_id' ausente en submission")
+    
+    if "user_id" not in submission:
+        errors.append("Campo 'user_id' ausente en submission")
+    
+    # 2. Validar campo 'responses' - CRÍTICO
+    if "responses" not in submission:
+        errors.append("❌ CRÍTICO: Campo 'responses' ausente en submission. El cuestionario debe guardarse con estructura: {_id, user_id, responses: {...}, submitted_at, plan_generated}")
+        return False, errors, {}
+    
+    questionnaire_data = submission.get("responses", {})
+    
+    if not isinstance(questionnaire_data, dict):
+        errors.append(f"Campo 'responses' debe ser un dict, recibido: {type(questionnaire_data)}")
+        return False, errors, {}
+    
+    if len(questionnaire_data) == 0:
+        errors.append("Campo 'responses' está vacío")
+        return False, errors, {}
+    
+    # 3. Validar campos requeridos MÍNIMOS
+    required_fields = {
+        "nombre_completo": "Nombre completo del cliente",
+        "email": "Email del cliente",
+        "fecha_nacimiento": "Fecha de nacimiento (YYYY-MM-DD)",
+        "sexo": "Sexo (Hombre/Mujer)",
+        "peso": "Peso en kg",
+        "altura_cm": "Altura en cm",
+        "objetivo_fisico": "Objetivo principal del entrenamiento"
+    }
+    
+    missing_required = []
+    empty_required = []
+    
+    for field, description in required_fields.items():
+        if field not in questionnaire_data:
+            missing_required.append(f"{field} ({description})")
+        elif not questionnaire_data[field]:
+            empty_required.append(f"{field} ({description})")
+    
+    if missing_required:
+        errors.append(f"Campos requeridos ausentes: {', '.join(missing_required)}")
+    
+    if empty_required:
+        errors.append(f"Campos requeridos vacíos: {', '.join(empty_required)}")
+    
+    # 4. Validar formatos específicos
+    if "fecha_nacimiento" in questionnaire_data and questionnaire_data["fecha_nacimiento"]:
+        try:
+            datetime.strptime(str(questionnaire_data["fecha_nacimiento"]), "%Y-%m-%d")
+        except ValueError:
+            errors.append(f"fecha_nacimiento debe estar en formato YYYY-MM-DD, recibido: {questionnaire_data['fecha_nacimiento']}")
+    
+    if "sexo" in questionnaire_data and questionnaire_data["sexo"]:
+        sexo_normalized = str(questionnaire_data["sexo"]).lower().strip()
+        valid_sexo = ["hombre", "mujer", "masculino", "femenino", "male", "female", "m", "f"]
+        if sexo_normalized not in valid_sexo:
+            errors.append(f"sexo debe ser 'Hombre' o 'Mujer', recibido: '{questionnaire_data['sexo']}'")
+    
+    # 5. Validar campos numéricos
+    numeric_fields = {
+        "peso": "Peso",
+        "altura_cm": "Altura"
+    }
+    
+    for field, name in numeric_fields.items():
+        if field in questionnaire_data and questionnaire_data[field]:
+            try:
+                value = float(str(questionnaire_data[field]))
+                if value <= 0:
+                    errors.append(f"{name} debe ser un número positivo, recibido: {questionnaire_data[field]}")
+            except (ValueError, TypeError):
+                errors.append(f"{name} debe ser un número válido, recibido: '{questionnaire_data[field]}'")
+    
+    is_valid = len(errors) == 0
+    
+    if not is_valid:
+        logger.error(f"❌ Validación de cuestionario falló:")
+        for error in errors:
+            logger.error(f"   - {error}")
+    
+    return is_valid, errors, questionnaire_data
+
+
+def adapt_questionnaire_for_edn360(questionnaire_data: dict) -> dict:
+    """
+    Adapta el formato del cuestionario actual al formato esperado por E.D.N.360
+    Soporta tanto NutritionQuestionnaire como DiagnosisQuestionnaire
+    """
+    try:
+        adapted = {}
+        
+        # === CAMPOS BÁSICOS - REQUERIDOS por E1 ===
+        
+        # NOMBRE: Buscar nombre_completo (NutritionQuestionnaire) o nombre (DiagnosisQuestionnaire)
+        adapted["nombre"] = questionnaire_data.get("nombre_completo") or questionnaire_data.get("nombre", "Usuario")
+        
+        # EDAD: Calcular desde fecha_nacimiento o usar edad directa
+        if "fecha_nacimiento" in questionnaire_data and questionnaire_data["fecha_nacimiento"]:
+            try:
+                # Calcular edad desde fecha de nacimiento
+                fecha_nac = questionnaire_data["fecha_nacimiento"]
+                if isinstance(fecha_nac, str):
+                    # Formato esperado: YYYY-MM-DD
+                    birth_date = datetime.strptime(fecha_nac, "%Y-%m-%d")
+                    today = datetime.now()
+                    edad = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+                    adapted["edad"] = edad
+                else:
+                    adapted["edad"] = 30
+            except Exception as e:
+                logger.warning(f"⚠️ Error calculando edad desde fecha_nacimiento: {e}")
+                adapted["edad"] = questionnaire_data.get("edad", 30)
+        else:
+            # Usar edad directa
+            edad_str = questionnaire_data.get("edad", "30")
+            try:
+                adapted["edad"] = int(edad_str.split()[0]) if isinstance(edad_str, str) else int(edad_str)
+            except:
+                adapted["edad"] = 30
+        
+        # SEXO: Normalizar a minúsculas y mapear
+        sexo_raw = questionnaire_data.get("sexo", "hombre")
+        if isinstance(sexo_raw, str):
+            sexo_normalized = sexo_raw.lower().strip()
+            # Mapear HOMBRE/MUJER a hombre/mujer
+            if sexo_normalized in ["hombre", "masculino", "male", "m"]:
+                adapted["sexo"] = "hombre"
+            elif sexo_normalized in ["mujer", "femenino", "female", "f"]:
+                adapted["sexo"] = "mujer"
+            else:
+                adapted["sexo"] = sexo_normalized
+        else:
+            adapted["sexo"] = "hombre"
+        
+        # PESO: Buscar 'peso' (NutritionQuestionnaire) o 'peso_actual_kg' (otros)
+        peso = questionnaire_data.get("peso") or questionnaire_data.get("peso_actual_kg")
+        try:
+            adapted["peso_actual_kg"] = float(peso) if peso else 70
+        except (ValueError, TypeError):
+            adapted["peso_actual_kg"] = 70
+            logger.warning(f"⚠️ Peso inválido '{peso}', usando default 70kg")
+        
+        # ALTURA: Buscar 'altura_cm' (presente en ambos cuestionarios)
+        altura = questionnaire_data.get("altura_cm")
+        try:
+            adapted["altura_cm"] = float(altura) if altura else 170
+        except (ValueError, TypeError):
+            adapted["altura_cm"] = 170
+            logger.warning(f"⚠️ Altura inválida '{altura}', usando default 170cm")
+        
+        # === OBJETIVO ===
+        # Buscar en varios campos posibles
+        objetivo = (questionnaire_data.get("objetivo_principal") or 
+                   questionnaire_data.get("objetivo") or 
+                   questionnaire_data.get("objetivos_deseados") or "")
+        
+        if "adelgazar" in objetivo.lower() or "perder" in objetivo.lower() or "bajar" in objetivo.lower():
+            adapted["objetivo_principal"] = "perdida_grasa"
+        elif "ganar" in objetivo.lower() or "musculo" in objetivo.lower() or "volumen" in objetivo.lower():
+            adapted["objetivo_principal"] = "ganancia_muscular"
+        elif "definir" in objetivo.lower() or "recomposicion" in objetivo.lower():
+            adapted["objetivo_principal"] = "recomposicion"
+        else:
+            adapted["objetivo_principal"] = objetivo or "mejora_general"
+        
+        # === EXPERIENCIA DE ENTRENAMIENTO ===
+        # NutritionQuestionnaire tiene campos más detallados
+        entrenado_gym = questionnaire_data.get("entrenado_gimnasio", "")
+        nivel_deporte = questionnaire_data.get("nivel_deporte", "")
+        constante_deporte = questionnaire_data.get("constante_deporte", "")
+        tiempo_dedicaba = questionnaire_data.get("tiempo_dedicaba", "")
+        entrena = questionnaire_data.get("entrena", "")
+        
+        # Construir experiencia desde múltiples campos
+        experiencia_parts = []
+        
+        # Priorizar nivel declarado
+        if nivel_deporte:
+            experiencia_parts.append(f"Nivel: {nivel_deporte}")
+        
+        if entrenado_gym:
+            experiencia_parts.append(f"Gimnasio: {entrenado_gym}")
+        
+        # CRÍTICO: Si tiene "tiempo_dedicaba" con volumen alto, es avanzado
+        if tiempo_dedicaba:
+            experiencia_parts.append(f"Dedicación previa: {tiempo_dedicaba}")
+            # Detectar señales de nivel avanzado/profesional
+            tiempo_lower = tiempo_dedicaba.lower()
+            if any(indicator in tiempo_lower for indicator in ["3h", "3 h", "4h", "4 h", "5 días", "6 días", "profesional", "culturista", "competición"]):
+                if not any("avanzado" in part.lower() or "profesional" in part.lower() for part in experiencia_parts):
+                    experiencia_parts.insert(0, "⚠️ NIVEL REAL: AVANZADO/PROFESIONAL (según dedicación histórica)")
+        
+        if constante_deporte:
+            experiencia_parts.append(f"Constancia: {constante_deporte}")
+        
+        if entrena:
+            experiencia_parts.append(entrena)
+        
+        if experiencia_parts:
+            adapted["experiencia_entrenamiento"] = ". ".join(experiencia_parts)
+        else:
+            if "no" in entrena.lower() or "nunca" in entrena.lower():
+                adapted["experiencia_entrenamiento"] = "principiante absoluto, sin experiencia previa"
+            elif "gym" in entrena.lower() or "gimnasio" in entrena.lower():
+                adapted["experiencia_entrenamiento"] = "experiencia en gimnasio"
+            else:
+                adapted["experiencia_entrenamiento"] = "principiante"
+        
+        # === HISTORIAL DE ENTRENAMIENTO ===
+        intentos = questionnaire_data.get("intentos_previos", "")
+        constante_deporte = questionnaire_data.get("constante_deporte", "")
+        tiempo_dedicaba = questionnaire_data.get("tiempo_dedicaba", "")
+        
+        historial_parts = []
+        if intentos:
+            historial_parts.append(f"Intentos previos: {intentos}")
+        if constante_deporte:
+            historial_parts.append(f"Constancia: {constante_deporte}")
+        if tiempo_dedicaba:
+            historial_parts.append(f"Tiempo dedicado: {tiempo_dedicaba}")
+        
+        adapted["historial_entrenamiento"] = ". ".join(historial_parts) if historial_parts else "sin historial previo"
+        
+        # === LESIONES Y LIMITACIONES ===
+        # Recopilar de múltiples fuentes
+        lesiones_parts = []
+        
+        # Dificultades (DiagnosisQuestionnaire)
+        dificultades = questionnaire_data.get("dificultades", [])
+        if isinstance(dificultades, list):
+            lesiones_parts.extend(dificultades)
+        elif dificultades:
+            lesiones_parts.append(str(dificultades))
+        
+        dificultades_otro = questionnaire_data.get("dificultades_otro", "")
+        if dificultades_otro:
+            lesiones_parts.append(dificultades_otro)
+        
+        # Campos de salud del NutritionQuestionnaire
+        problemas_musculares = questionnaire_data.get("problemas_musculares", "")
+        hernias = questionnaire_data.get("hernias_protusiones", "")
+        artrosis = questionnaire_data.get("artrosis", "")
+        
+        if problemas_musculares and problemas_musculares.lower() not in ["no", "ninguno"]:
+            lesiones_parts.append(f"Problemas musculares: {problemas_musculares}")
+        if hernias and hernias.lower() not in ["no", "ninguno"]:
+            lesiones_parts.append(f"Hernias/protusiones: {hernias}")
+        if artrosis and artrosis.lower() not in ["no", "ninguno"]:
+            lesiones_parts.append(f"Artrosis: {artrosis}")
+        
+        lesiones_str = ", ".join(lesiones_parts) if lesiones_parts else "ninguna"
+        adapted["lesiones_previas"] = lesiones_str
+        adapted["limitaciones"] = lesiones_str
+        
+        # === DISPONIBILIDAD ===
+        # NutritionQuestionnaire tiene campos específicos
+        dias_semana_entrenar = questionnaire_data.get("dias_semana_entrenar", "")
+        tiempo_sesion = questionnaire_data.get("tiempo_sesion", "")
+        tiempo_semanal = questionnaire_data.get("tiempo_semanal", "")
+        
+        # Intentar extraer de los campos específicos primero
+        if dias_semana_entrenar:
+            try:
+                adapted["dias_semana"] = int(dias_semana_entrenar)
+            except (ValueError, TypeError):
+                adapted["dias_semana"] = 3
+        elif tiempo_semanal and ("días" in tiempo_semanal or "dias" in tiempo_semanal):
+            dias_match = re.search(r'(\d+)\s*d[íi]as?', tiempo_semanal, re.IGNORECASE)
+            adapted["dias_semana"] = int(dias_match.group(1)) if dias_match else 3
+        else:
+            adapted["dias_semana"] = 3
+        
+        if tiempo_sesion:
+            try:
+                # Puede venir como "60" o "60 min" o "60 minutos"
+                min_match = re.search(r'(\d+)', str(tiempo_sesion))
+                adapted["minutos_por_sesion"] = int(min_match.group(1)) if min_match else 60
+            except (ValueError, TypeError):
+                adapted["minutos_por_sesion"] = 60
+        elif tiempo_semanal and "min" in tiempo_semanal:
+            min_match = re.search(r'(\d+)\s*min', tiempo_semanal, re.IGNORECASE)
+            adapted["minutos_por_sesion"] = int(min_match.group(1)) if min_match else 60
+        else:
+            adapted["minutos_por_sesion"] = 60
+        
+        adapted["tiempo_disponible_semanal"] = f"{adapted['dias_semana']} días/semana, {adapted['minutos_por_sesion']} min/sesión"
+        
+        # === HORARIO DE ENTRENAMIENTO ===
+        horario_entrenar = questionnaire_data.get("entrena_manana_tarde", "")
+        if horario_entrenar:
+            if "mañana" in horario_entrenar.lower():
+                adapted["horario_preferido"] = "mañana"
+                adapted["horario_entrenamiento"] = "mañana"  # Para agentes de nutrición
+                adapted["hora_entreno"] = "08:00"  # Horario típico mañana
+            elif "tarde" in horario_entrenar.lower():
+                adapted["horario_preferido"] = "tarde"
+                adapted["horario_entrenamiento"] = "tarde"
+                adapted["hora_entreno"] = "18:00"  # Horario típico tarde
+            elif "noche" in horario_entrenar.lower():
+                adapted["horario_preferido"] = "noche"
+                adapted["horario_entrenamiento"] = "noche"
+                adapted["hora_entreno"] = "20:00"  # Horario típico noche
+            else:
+                adapted["horario_preferido"] = horario_entrenar
+                adapted["horario_entrenamiento"] = horario_entrenar
+                adapted["hora_entreno"] = "18:00"  # Default
+        else:
+            adapted["horario_preferido"] = "tarde"
+            adapted["horario_entrenamiento"] = "tarde"
+            adapted["hora_entreno"] = "18:00"
+        
+        # === HORARIOS DE COMIDAS ===
+        # Buscar horarios específicos en el cuestionario o usar defaults según horario de entreno
+        adapted["horario_desayuno"] = questionnaire_data.get("horario_desayuno", "08:00")
+        adapted["horario_comida"] = questionnaire_data.get("horario_comida", "14:00")
+        adapted["horario_cena"] = questionnaire_data.get("horario_cena", "21:00")
+        
+        # Número de comidas al día
+        num_comidas = questionnaire_data.get("comidas_dia", "") or questionnaire_data.get("numero_comidas", "")
+        try:
+            if isinstance(num_comidas, str):
+                # Extraer número de texto como "4 comidas" o "4"
+                match = re.search(r'(\d+)', num_comidas)
+                adapted["numero_comidas"] = int(match.group(1)) if match else 4
+            else:
+                adapted["numero_comidas"] = int(num_comidas) if num_comidas else 4
+        except (ValueError, TypeError):
+            adapted["numero_comidas"] = 4
+        
+        # === EQUIPO DISPONIBLE ===
+        gimnasio_campo = questionnaire_data.get("gimnasio", "")
+        material_casa_campo = questionnaire_data.get("material_casa", "")
+        
+        if gimnasio_campo and gimnasio_campo.lower() not in ["no", "ninguno"]:
+            adapted["equipo_disponible"] = f"Gym: {gimnasio_campo}"
+        elif material_casa_campo and material_casa_campo.lower() not in ["no", "ninguno"]:
+            adapted["equipo_disponible"] = f"Casa con equipo: {material_casa_campo}"
+        elif "gym" in entrena.lower() or "gimnasio" in entrena.lower():
+            adapted["equipo_disponible"] = "gym completo"
+        elif "casa" in entrena.lower():
+            adapted["equipo_disponible"] = "casa con equipo básico"
+        else:
+            adapted["equipo_disponible"] = "gym completo"
+        
+        # === NUTRICIÓN ACTUAL ===
+        alimentacion = questionnaire_data.get("alimentacion", "")
+        comidas_dia = questionnaire_data.get("comidas_dia", "")
+        
+        nutricion_parts = []
+        if alimentacion:
+            nutricion_parts.append(alimentacion)
+        if comidas_dia:
+            nutricion_parts.append(f"Comidas al día: {comidas_dia}")
+        
+        adapted["nutricion_actual"] = ". ".join(nutricion_parts) if nutricion_parts else "sin seguimiento específico"
+        
+        # === CONDICIONES DE SALUD ===
+        # Recopilar condiciones del NutritionQuestionnaire
+        condiciones = []
+        
+        salud_info = questionnaire_data.get("salud_info", "")
+        if salud_info:
+            condiciones.append(salud_info)
+        
+        # Campos específicos de salud
+        medicamentos = questionnaire_data.get("medicamentos", "")
+        enfermedad_cronica = questionnaire_data.get("enfermedad_cronica", "")
+        hipertension = questionnaire_data.get("hipertension", "")
+        diabetes = questionnaire_data.get("diabetes", "")
+        
+        if medicamentos and medicamentos.lower() not in ["no", "ninguno"]:
+            condiciones.append(f"Medicamentos: {medicamentos}")
+        if enfermedad_cronica and enfermedad_cronica.lower() not in ["no", "ninguno"]:
+            condiciones.append(f"Enfermedad crónica: {enfermedad_cronica}")
+        if hipertension and hipertension.lower() == "sí":
+            condiciones.append("Hipertensión")
+        if diabetes and diabetes.lower() == "sí":
+            condiciones.append("Diabetes")
+        
+        adapted["condiciones_salud"] = ", ".join(condiciones) if condiciones else "sin condiciones especiales"
+        
+        # === MOTIVACIÓN ===
+        por_que_ahora = questionnaire_data.get("por_que_ahora", "")
+        objetivo_entrenamiento = questionnaire_data.get("objetivo_entrenamiento", "")
+        
+        motivacion_parts = []
+        if por_que_ahora:
+            motivacion_parts.append(por_que_ahora)
+        if objetivo_entrenamiento:
+            motivacion_parts.append(objetivo_entrenamiento)
+        
+        adapted["motivacion"] = ". ".join(motivacion_parts) if motivacion_parts else "mejorar salud y físico"
+        adapted["nivel_compromiso"] = questionnaire_data.get("dispuesto_invertir", "") or questionnaire_data.get("nivel_compromiso", "medio")
+        
+        # === DATOS ADICIONALES ===
+        # Intentar extraer de campos específicos
+        horas_sueno = questionnaire_data.get("horas_sueno", "")
+        estres = questionnaire_data.get("estres_profesion", "")
+        
+        try:
+            adapted["sueno_promedio_h"] = int(horas_sueno) if horas_sueno else 7
+        except (ValueError, TypeError):
+            adapted["sueno_promedio_h"] = 7
+        
+        if estres:
+            if "alto" in estres.lower() or "mucho" in estres.lower():
+                adapted["estres_nivel"] = "alto"
+            elif "bajo" in estres.lower() or "poco" in estres.lower():
+                adapted["estres_nivel"] = "bajo"
+            else:
+                adapted["estres_nivel"] = "medio"
+        else:
+            adapted["estres_nivel"] = "medio"
+        
+        # Copiar todos los campos originales también
+        adapted["_original_questionnaire"] = questionnaire_data
+        
+        # === LOGGING DETALLADO ===
+        logger.info(f"✅ Cuestionario adaptado para E.D.N.360")
+        logger.info(f"   📋 CAMPOS CRÍTICOS (requeridos por E1):")
+        logger.info(f"      - nombre: {adapted['nombre']}")
+        logger.info(f"      - edad: {adapted['edad']}")
+        logger.info(f"      - sexo: {adapted['sexo']}")
+        logger.info(f"      - peso_actual_kg: {adapted['peso_actual_kg']}")
+        logger.info(f"      - altura_cm: {adapted['altura_cm']}")
+        logger.info(f"   🎯 Objetivo: {adapted['objetivo_principal']}")
+        logger.info(f"   📅 Disponibilidad: {adapted['dias_semana']} días x {adapted['minutos_por_sesion']} min")
+        logger.info(f"   ⏰ Horario entreno: {adapted['horario_entrenamiento']} ({adapted['hora_entreno']})")
+        logger.info(f"   🍽️ Comidas/día: {adapted['numero_comidas']}")
+        logger.info(f"   🏋️ Experiencia: {adapted['experiencia_entrenamiento'][:50]}...")
+        logger.info(f"   🏥 Lesiones: {adapted['lesiones_previas'][:50]}...")
+        
+        return adapted
+        
+    except Exception as e:
+        logger.error(f"❌ Error adaptando cuestionario: {e}")
+        logger.error(f"   Datos recibidos: {list(questionnaire_data.keys())}")
+        # Devolver datos mínimos para que no falle
+        return {
+            "nombre": questionnaire_data.get("nombre", "Usuario"),
+            "edad": 30,
+            "sexo": "hombre",
+            "peso_actual_kg": 70,
+            "altura_cm": 170,
+            "objetivo_principal": "mejora_general",
+            "experiencia_entrenamiento": "principiante",
+            "lesiones_previas": "ninguna",
+            "tiempo_disponible_semanal": "3 días, 60 min",
+            "dias_semana": 3,
+            "minutos_por_sesion": 60,
+            "equipo_disponible": "gym completo",
+            "_original_questionnaire": questionnaire_data
+        }
+
+
+# ============================================
+# NORMALIZACIÓN VERSIONADA
+# ============================================
+
+def _refresh_age(adapted: dict) -> dict:
+    """
+    La edad depende del día en que se lee, no del envío: se recalcula
+    desde fecha_nacimiento sobre una copia del payload guardado.
+    """
+    fecha_nac = (adapted.get("_original_questionnaire") or {}).get("fecha_nacimiento")
+    if not isinstance(fecha_nac, str) or not fecha_nac:
+        return adapted
+    try:
+        birth_date = datetime.strptime(fecha_nac, "%Y-%m-%d")
+    except ValueError:
+        return adapted
+    today = datetime.now()
+    edad = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    return {**adapted, "edad": edad}
+
+
+def _followup_responses(followup: dict) -> dict:
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in (followup.get("responses") or {}).items()
+    }
+
+
+def normalize_initial(submission: dict) -> dict:
+    """Valida y adapta un cuestionario inicial"""
+    is_valid, errors, questionnaire_data = validate_questionnaire_format(submission)
+    return {
+        "version": ADAPTER_VERSION,
+        "is_valid": is_valid,
+        "errors": errors,
+        "adapted": adapt_questionnaire_for_edn360(questionnaire_data),
+        "normalized_at": datetime.now(timezone.utc)
+    }
+
+
+def normalize_followup(followup: dict, initial_submission: Optional[dict]) -> dict:
+    """
+    Valida el cuestionario inicial (base del follow-up) y adapta la mezcla
+    inicial + respuestas del follow-up
+    """
+    if not initial_submission:
+        return {
+            "version": ADAPTER_VERSION,
+            "is_valid": False,
+            "errors": ["No se encontró cuestionario inicial para contexto del follow-up"],
+            "adapted": None,
+            "base_submission_id": None,
+            "normalized_at": datetime.now(timezone.utc)
+        }
+
+    is_valid, errors, questionnaire_data = validate_questionnaire_format(initial_submission)
+    merged_data = questionnaire_data.copy()
+    merged_data.update(_followup_responses(followup))
+
+    return {
+        "version": ADAPTER_VERSION,
+        "is_valid": is_valid,
+        "errors": errors,
+        "adapted": adapt_questionnaire_for_edn360(merged_data),
+        "base_submission_id": initial_submission.get("_id"),
+        "normalized_at": datetime.now(timezone.utc)
+    }
+
+
+async def _initial_submission_for(db, user_id: str) -> Optional[dict]:
+    """Cuestionario inicial (el más antiguo) del usuario"""
+    return await db[INITIAL_COLLECTION].find_one({"user_id": user_id}, sort=[("submitted_at", 1)])
+
+
+async def normalize_and_store(db, submission: dict, is_followup: bool) -> dict:
+    """Calcula la versión normalizada de un envío y la guarda en su documento"""
+    if is_followup:
+        entry = normalize_followup(submission, await _initial_submission_for(db, submission["user_id"]))
+        collection = FOLLOWUP_COLLECTION
+    else:
+        entry = normalize_initial(submission)
+        collection = INITIAL_COLLECTION
+
+    # No se toca el dict recibido: los endpoints lo reutilizan como raw_payload del drawer
+    await db[collection].update_one({"_id": submission["_id"]}, {"$set": {"normalized": entry}})
+    return entry
+
+
+async def normalize_and_store_safe(db, submission: dict, is_followup: bool):
+    """normalize_and_store para los endpoints de envío: si falla, el job lo recalculará"""
+    try:
+        await normalize_and_store(db, submission, is_followup)
+    except Exception as e:
+        logger.error(f"❌ Error normalizando cuestionario {submission.get('_id')}: {e}")
+
+
+def is_current(entry: Optional[dict]) -> bool:
+    return bool(entry) and entry.get("version") == ADAPTER_VERSION
+
+
+async def get_normalized(db, submission: dict, is_followup: bool) -> dict:
+    """
+    Versión normalizada de un envío (la guardada si es de la versión
+    actual; si no, se recalcula y se guarda)
+
+    Returns:
+        {"is_valid", "errors", "adapted", ...} con la edad al día
+    """
+    entry = submission.get("normalized")
+    if not is_current(entry):
+        logger.info(
+            f"♻️ Normalizando cuestionario {submission['_id']} "
+            f"(versión {entry.get('version') if entry else None} → {ADAPTER_VERSION})"
+        )
+        entry = await normalize_and_store(db, submission, is_followup)
+
+    if entry.get("adapted"):
+        entry = {**entry, "adapted": _refresh_age(entry["adapted"])}
+    return entry
+
+
+async def backfill_normalized(db) -> dict:
+    """
+    Normaliza los envíos sin versión normalizada o con una ADAPTER_VERSION
+    distinta de la actual
+
+    Returns:
+        {"initial": n, "followup": n}
+    """
+    stale = {"normalized.version": {"$ne": ADAPTER_VERSION}}
+    counts = {}
+    for collection, is_followup, label in (
+        (INITIAL_COLLECTION, False, "initial"),
+        (FOLLOWUP_COLLECTION, True, "followup")
+    ):
+        counts[label] = 0
+        async for submission in db[collection].find(stale):
+            await normalize_and_store(db, submission, is_followup)
+            counts[label] += 1
+    return counts
@@ -15,11 +15,9 @@ Referencia: DOCUMENTO_2_VFINAL_TO_BE_CLIENT_DRAWER.md
 Fase: FASE 0 (Base mínima)
 """
 
-import os
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
 
 from edn360_models.client_drawer import (
     ClientDrawer,
@@ -30,13 +28,10 @@ from edn360_models.client_drawer import (
     validate_drawer_structure
 )
 
-# Configuración
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-MONGO_EDN360_APP_DB_NAME = os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')
+from database import get_edn360_db
 
-# Cliente MongoDB para EDN360_APP
-client = AsyncIOMotorClient(MONGO_URL)
-db_edn360 = client[MONGO_EDN360_APP_DB_NAME]
+# BD EDN360_APP (cliente MongoDB compartido)
+db_edn360 = get_edn360_db()
 collection = db_edn360.client_drawers
 
 # Logger
@@ -15,21 +15,16 @@ Referencia: FASE 3 - Nuevo Orquestador EDN360 v1
 Fecha: Enero 2025
 """
 
-import os
 import logging
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from motor.motor_asyncio import AsyncIOMotorClient
 
 from edn360_models.edn360_snapshot import EDN360Snapshot
 
-# Configuración
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-MONGO_EDN360_APP_DB_NAME = os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')
+from database import get_edn360_db
 
-# Cliente MongoDB para BD EDN360_APP
-client_edn360 = AsyncIOMotorClient(MONGO_URL)
-db_edn360 = client_edn360[MONGO_EDN360_APP_DB_NAME]
+# BD EDN360_APP (cliente MongoDB compartido)
+db_edn360 = get_edn360_db()
 
 # Colección de snapshots
 snapshots_collection = db_edn360.edn360_snapshots
@@ -0,0 +1,181 @@
+"""
+Review Queue - Cola materializada de revisiones de seguimiento
+
+Cada cliente team con plan de nutrición tiene un documento en review_queue
+(_id = user_id) con la fecha de su último plan, due_at = plan + 30 días y el
+estado del seguimiento (pending / activated / completed). Se recalcula para
+ese cliente cuando cambia algo relevante:
+
+- se genera un plan nuevo (users.nutrition_plan)
+- el cliente envía un seguimiento (o el admin lo elimina)
+- el admin activa / desactiva el cuestionario de seguimiento
+- cambian los datos o la suscripción del cliente
+
+Backfill de datos existentes:
+    python /app/backend/migration/02_backfill_review_queue.py
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REVIEW_INTERVAL_DAYS = 30
+REVIEW_STATUSES = ("pending", "activated", "completed")
+
+# Los más urgentes primero (_id desempata para paginar de forma estable)
+REVIEW_QUEUE_SORT = [("due_at", 1), ("_id", 1)]
+
+# Clientes que deben tener entrada en la cola
+REVIEW_CANDIDATES_FILTER = {"subscription.plan": "team", "nutrition_plan": {"$exists": True}}
+
+
+def due_reviews_filter(now: datetime, status: Optional[str] = None) -> dict:
+    """Entradas con la revisión vencida (opcionalmente de un estado)"""
+    query = {"due_at": {"$lte": now}}
+    if status:
+        query["status"] = status
+    return query
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def refresh_review_entry(db, user_id: str) -> Optional[dict]:
+    """
+    Recalcula la entrada de la cola de un cliente
+
+    Si el cliente ya no es team o no tiene plan de nutrición, se elimina.
+
+    Returns:
+        La entrada actualizada (None si el cliente no entra en la cola)
+    """
+    user = await db.users.find_one(
+        {"_id": user_id},
+        {
+            "name": 1, "email": 1, "phone": 1, "subscription.plan": 1,
+            "nutrition_plan": 1, "followup_activated": 1, "followup_activated_at": 1
+        }
+    )
+    plan = (user or {}).get("nutrition_plan")
+    plan_date = plan.get("generated_at") if isinstance(plan, dict) else None
+
+    if not user or user.get("subscription", {}).get("plan") != "team" or not plan_date:
+        await db.review_queue.delete_one({"_id": user_id})
+        return None
+
+    plan_date = _as_utc(plan_date)
+    followups = await db.follow_up_submissions.find(
+        {"user_id": user_id, "submission_date": {"$gte": plan_date}},
+        {"submission_date": 1}
+    ).sort("submission_date", -1).limit(1).to_list(1)
+    last_followup = followups[0] if followups else None
+
+    if last_followup:
+        status, status_date = "completed", last_followup["submission_date"]
+    elif user.get("followup_activated"):
+        status, status_date = "activated", user.get("followup_activated_at")
+    else:
+        status, status_date = "pending", None
+
+    entry = {
+        "user_id": user_id,
+        "name": user.get("name", "Usuario"),
+        "email": user.get("email"),
+        "phone": user.get("phone"),
+        "last_plan_date": plan_date,
+        "due_at": plan_date + timedelta(days=REVIEW_INTERVAL_DAYS),
+        "status": status,
+        "status_date": status_date,
+        "followup_activated": user.get("followup_activated", False),
+        "last_followup_id": last_followup["_id"] if last_followup else None,
+        "updated_at": datetime.now(timezone.utc)
+    }
+    await db.review_queue.update_one({"_id": user_id}, {"$set": entry}, upsert=True)
+    return entry
+
+
+async def refresh_review_entry_safe(db, user_id: str):
+    """refresh_review_entry para los flujos de escritura: un fallo de la cola no rompe la petición"""
+    try:
+        await refresh_review_entry(db, user_id)
+    except Exception as e:
+        logger.error(f"❌ Error actualizando review_queue para {user_id}: {e}")
+
+
+async def get_review_queue(
+    db,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> dict:
+    """
+    Clientes con revisión vencida (>= 30 días desde el último plan),
+    los más urgentes primero.
+    """
+    now = datetime.now(timezone.utc)
+    query = due_reviews_filter(now, status)
+
+    entries = await db.review_queue.find(query).sort(
+        REVIEW_QUEUE_SORT
+    ).skip(skip).limit(limit).to_list(limit)
+    total = await db.review_queue.count_documents(query)
+
+    pending_reviews = []
+    for entry in entries:
+        last_plan_date = _as_utc(entry["last_plan_date"])
+        status_date = entry.get("status_date")
+        pending_reviews.append({
+            "user_id": entry["_id"],
+            "name": entry.get("name", "Usuario"),
+            "email": entry.get("email"),
+            "phone": entry.get("phone"),
+            "days_since_plan": (now - last_plan_date).days,
+            "last_plan_date": last_plan_date.isoformat(),
+            "status": entry["status"],
+            "status_date": status_date.isoformat() if status_date else None,
+            "followup_activated": entry.get("followup_activated", False),
+            "last_followup_id": entry.get("last_followup_id")
+        })
+
+    return {
+        "pending_reviews": pending_reviews,
+        "count": len(pending_reviews),
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "has_more": skip + len(pending_reviews) < total
+    }
+
+
+async def backfill_review_queue(db, concurrency: int = 8) -> dict:
+    """
+    Reconstruye la cola a partir de users y follow_up_submissions
+
+    Returns:
+        {"queued": n, "removed": n}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    user_ids = [
+        user["_id"] for user in await db.users.find(
+            REVIEW_CANDIDATES_FILTER,
+            {"_id": 1}
+        ).to_list(None)
+    ]
+
+    async def refresh(user_id):
+        async with semaphore:
+            return await refresh_review_entry(db, user_id)
+
+    results = await asyncio.gather(*(refresh(user_id) for user_id in user_ids))
+
+    # Entradas de clientes que ya no cumplen (p.ej. cambiaron de plan)
+    removed = await db.review_queue.delete_many({"_id": {"$nin": user_ids}})
+
+    return {
+        "queued": sum(1 for entry in results if entry),
+        "removed": removed.deleted_count
+    }
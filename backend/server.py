@@ -1,18 +1,18 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, Response, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
 import logging
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-import shutil
 import httpx
 import socketio
 import uuid
 import json
+import base64
 import asyncio
 
 from models import (
@@ -41,7 +41,13 @@ from models import (
 )
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    get_current_user_id, get_current_user_id_flexible
+    get_current_user_id, get_current_user_id_flexible,
+    check_session_not_revoked, revoke_session
+)
+from database import get_client, close_client
+from pdf_render_service import (
+    render_pdf, compute_pdf_content_hash, PDFRenderQueueFull,
+    shutdown_pdf_renderer
 )
 from email_utils import (
     send_session_created_email, 
@@ -51,6 +57,35 @@ from email_utils import (
     send_admin_session_cancelled_email,
     send_questionnaire_to_admin
 )
+from email_outbox import start_email_outbox, stop_email_outbox
+from document_store import put_bytes, put_upload, blob_response, delete_pdf_document
+from llm_gateway import chat_completion, stream_chat_completion, get_llm_metrics, close_llm_gateway
+from db_indexes import reconcile_indexes
+from job_queries import JOB_CLAIM_SORT, claimable_jobs_filter, jobs_created_since_filter
+from socket_chat import create_socket_server, register_chat_events, emit_new_message
+from client_purge import start_purge, wait_for_purge, get_purge_job, resume_stale_purges
+from review_queue import REVIEW_STATUSES, get_review_queue, refresh_review_entry_safe
+from questionnaire_pipeline import (
+    adapt_questionnaire_for_edn360 as _adapt_questionnaire_for_edn360,
+    get_normalized as get_normalized_questionnaire,
+    normalize_and_store_safe as normalize_questionnaire_safe
+)
+from plan_translation import translate_plan_in_place
+from job_state import JobStateWriter
+from job_events import (
+    JOB_STATUS_PROJECTION,
+    TERMINAL_EVENTS,
+    create_job_event_bus,
+    job_event,
+    log_event
+)
+from crm_listing import (
+    CrmListing, list_page, facet_counts, group_counts, DEFAULT_PAGE_SIZE as CRM_DEFAULT_PAGE_SIZE,
+    CLIENTS_LISTING, TEAM_CLIENTS_LISTING, PROSPECTS_LISTING, EXTERNAL_CLIENTS_LISTING, WAITLIST_LISTING
+)
+from conversation_store import (
+    append_message, get_history, mark_read, get_unread_summary
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -82,131 +117,10 @@ def _translate_training_plan_to_spanish(plan):
     """
     Traduce todos los términos de entrenamiento de inglés a español de España.
     Se aplica ANTES de guardar el plan en la base de datos.
-    """
-    # Diccionario de traducciones (inglés → español)
-    translations = {
-        # Tipos de entrenamiento
-        'full_body': 'Cuerpo Completo',
-        'upper_lower': 'Torso-Pierna',
-        'push_pull_legs': 'Empuje-Tirón-Pierna',
-        'bro_split': 'Rutina Weider',
-        
-        # Focos/énfasis de sesiones
-        'upper_body': 'Tren Superior',
-        'lower_body': 'Tren Inferior',
-        'push': 'Empuje',
-        'pull': 'Tirón',
-        'push_focus': 'Énfasis Empuje',
-        'pull_focus': 'Énfasis Tirón',
-        'quad_focus': 'Énfasis Cuádriceps',
-        'hamstring_focus': 'Énfasis Isquios',
-        'push_emphasis': 'Énfasis Empuje',
-        'pull_emphasis': 'Énfasis Tirón',
-        'posterior_chain': 'Cadena Posterior',
-        
-        # Grupos musculares principales
-        'Chest': 'Pecho',
-        'chest': 'Pecho',
-        'Back': 'Espalda',
-        'back': 'Espalda',
-        'Shoulders': 'Hombros',
-        'shoulders': 'Hombros',
-        'Triceps': 'Tríceps',
-        'triceps': 'Tríceps',
-        'Biceps': 'Bíceps',
-        'biceps': 'Bíceps',
-        'Quads': 'Cuádriceps',
-        'quads': 'Cuádriceps',
-        'Hamstrings': 'Isquiotibiales',
-        'hamstrings': 'Isquiotibiales',
-        'Glutes': 'Glúteos',
-        'glutes': 'Glúteos',
-        'Legs': 'Piernas',
-        'legs': 'Piernas',
-        'Arms': 'Brazos',
-        'arms': 'Brazos',
-        'core': 'Core',
-        'Core': 'Core',
-        'calves': 'Gemelos',
-        
-        # Grupos musculares específicos
-        'front_delts': 'Deltoides Anterior',
-        'side_delts': 'Deltoides Lateral',
-        'rear_delts': 'Deltoides Posterior',
-        'upper_chest': 'Pecho Superior',
-        'lower_chest': 'Pecho Inferior',
-        'lats': 'Dorsales',
-        'upper_back': 'Espalda Superior',
-        'traps': 'Trapecios',
-        'lower_back': 'Lumbar',
-        'abs': 'Abdominales',
-        'obliques': 'Oblicuos',
-        'forearms': 'Antebrazos',
-        'abductors': 'Abductores',
-        
-        # Frases de nombres de sesiones completas (más específicas primero)
-        'Chest & Triceps – Joint Friendly': 'Pecho y Tríceps - Amigable con Articulaciones',
-        'Back & Biceps – Supported Pulls': 'Espalda y Bíceps - Jalones Asistidos',
-        'Legs – Quads & Glutes Emphasis': 'Piernas - Énfasis Cuádriceps y Glúteos',
-        'Shoulders & Arms – Machine/Isolation Safe': 'Hombros y Brazos - Máquinas Seguras',
-        'Upper 1 – Push Emphasis': 'Tren Superior 1 - Énfasis Empuje',
-        'Upper 2 – Pull Emphasis': 'Tren Superior 2 - Énfasis Tirón',
-        'Lower 1 – Quad Emphasis': 'Tren Inferior 1 - Énfasis Cuádriceps',
-        'Lower 2 – Posterior Chain': 'Tren Inferior 2 - Cadena Posterior',
-        
-        # Conectores y palabras comunes
-        '&': 'y',
-        'and': 'y',
-        'Emphasis': 'Énfasis',
-        'emphasis': 'Énfasis',
-        'Joint Friendly': 'Amigable con Articulaciones',
-        'Supported Pulls': 'Jalones Asistidos',
-        'Machine/Isolation Safe': 'Máquinas Seguras',
-        'Posterior Chain': 'Cadena Posterior',
-        
-        # Términos técnicos en inglés que necesitan traducción
-        'ROM': 'Rango de Movimiento',
-        'Rear Delts': 'Deltoides Posteriores',
-        'rear delts': 'deltoides posteriores',
-        'Support': 'Soporte',
-        'support': 'soporte',
-        'Safety': 'Seguridad',
-        'safety': 'seguridad',
-        'Support Only': 'Solo Soporte',
-        'Support y Safety': 'Soporte y Seguridad',
-        'lateral_delts': 'Deltoides Laterales',
-        'upper_Espalda': 'Espalda Superior',
-        'Machine Énfasis': 'Énfasis en Máquinas',
-        'Cuff': 'Manguito Rotador',
-        'Joint Care': 'Cuidado Articular'
-    }
-    
-    def translate_text(text):
-        """Traduce un string aplicando todas las traducciones del diccionario"""
-        if not isinstance(text, str):
-            return text
-        
-        translated = text
-        for eng, esp in translations.items():
-            # Case-insensitive replacement
-            import re
-            pattern = re.compile(re.escape(eng), re.IGNORECASE)
-            translated = pattern.sub(esp, translated)
-        
-        return translated
-    
-    def translate_recursive(obj):
-        """Aplica traducción recursivamente a todo el plan"""
-        if isinstance(obj, dict):
-            return {key: translate_recursive(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [translate_recursive(item) for item in obj]
-        elif isinstance(obj, str):
-            return translate_text(obj)
-        else:
-            return obj
     
-    return translate_recursive(plan)
+    El plan se traduce in place (plan_translation.py) y se devuelve el mismo objeto.
+    """
+    return translate_plan_in_place(plan)
 
 
 # ==================== ENVIRONMENT VALIDATION ====================
@@ -220,9 +134,8 @@ if missing_vars:
 db_name = os.environ['DB_NAME']
 logger.info(f"🔧 Starting server with database: {db_name}")
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# MongoDB connection (cliente compartido con auth, repositories y services)
+client = get_client()
 db = client[db_name]
 
 # Create the main app without a prefix
@@ -237,7 +150,8 @@ async def create_pdf_document(
     content: bytes, 
     pdf_type: str, 
     related_id: str = None, 
-    filename: str = None
+    filename: str = None,
+    content_hash: str = None
 ):
     """
     Standardized PDF document creation for all AI-generated documents
@@ -249,6 +163,7 @@ async def create_pdf_document(
         pdf_type: Type of PDF ("nutrition", "training", "follow_up_analysis")
         related_id: ID of the source plan/analysis
         filename: Custom filename (auto-generated if None)
+        content_hash: Render cache key (see pdf_render_service.compute_pdf_content_hash)
     
     Returns:
         pdf_id: UUID of created PDF document
@@ -261,16 +176,22 @@ async def create_pdf_document(
     if not filename:
         filename = f"{pdf_type}_{user_id}_{current_time.strftime('%Y%m%d_%H%M%S')}.pdf"
     
+    # Binario en el document store (deduplicado por hash), no inline en db.pdfs
+    stored = await put_bytes(db, content)
+    
     pdf_doc = {
         "_id": pdf_id,
         "user_id": user_id,
         "title": title,
         "filename": filename,
-        "file_data": content,  # Always store binary data
+        "blob_id": stored["blob_id"],
+        "size": stored["size"],
+        "content_type": "application/pdf",
         "type": pdf_type,  # "nutrition", "training", "follow_up_analysis"
         "upload_date": current_time,  # Standardized date field
         "uploaded_by": "admin",
-        "related_id": related_id  # Link to source plan/analysis
+        "related_id": related_id,  # Link to source plan/analysis
+        "content_hash": content_hash  # Render cache key
     }
     
     await db.pdfs.insert_one(pdf_doc)
@@ -279,17 +200,30 @@ async def create_pdf_document(
     return pdf_id
 
 
+def _pdf_date(value, fmt: str = '%d/%m/%Y') -> str:
+    """
+    Fecha guardada en el plan/seguimiento (datetime o ISO) formateada para un PDF.
+    
+    Los PDFs muestran la fecha del documento y no la de hoy: así el HTML, y con él
+    su content_hash, no cambia de un día a otro y la cache de render se reutiliza.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            value = None
+    if not isinstance(value, datetime):
+        # Documentos antiguos sin fecha guardada
+        value = datetime.now(timezone.utc)
+    return value.strftime(fmt)
+
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Socket.IO setup for real-time chat
-sio = socketio.AsyncServer(
-    async_mode='asgi',
-    cors_allowed_origins='*',
-    logger=True,
-    engineio_logger=True
-)
+# (client manager en memoria o cola compartida según SOCKETIO_MESSAGE_QUEUE)
+sio = create_socket_server()
 socket_app = socketio.ASGIApp(sio, app)
 
 # Logging already configured at the top of the file
@@ -302,6 +236,7 @@ async def get_current_user(request: Request):
     user = await db.users.find_one({"_id": user_id})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    check_session_not_revoked(request, user)
     
     # Check if user is archived
     if user.get("status") == "archived":
@@ -751,8 +686,8 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     
     if session_token:
-        # Delete session from database
-        await db.user_sessions.delete_one({"session_token": session_token})
+        # Delete session from database (y revocarla en la cache de todos los workers)
+        await revoke_session(session_token)
     
     # Clear cookie
     response.delete_cookie(key="session_token", path="/")
@@ -803,8 +738,8 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     
     if session_token:
-        # Delete session from database
-        await db.user_sessions.delete_one({"session_token": session_token})
+        # Delete session from database (y revocarla en la cache de todos los workers)
+        await revoke_session(session_token)
     
     # Clear cookie
     response.delete_cookie(key="session_token", path="/")
@@ -896,32 +831,46 @@ async def get_user_dashboard(request: Request):
 
 # ==================== ADMIN ENDPOINTS ====================
 
+async def _crm_page(listing: CrmListing, extra_filter=None, search=None, limit=CRM_DEFAULT_PAGE_SIZE, cursor=None) -> dict:
+    try:
+        return await list_page(db, listing, extra_filter=extra_filter, search=search, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @api_router.get("/admin/clients")
-async def get_all_clients(request: Request):
+async def get_all_clients(
+    request: Request,
+    search: Optional[str] = None,
+    archived: Optional[bool] = None,
+    limit: int = CRM_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     admin = await require_admin(request)
     # Ya NO necesitamos filtrar "deleted" porque ahora es HARD DELETE
-    users = await db.users.find({
-        "role": "user"
-    }).to_list(1000)
+    extra_filter = None
+    if archived is not None:
+        extra_filter = {"subscription.archived": True} if archived else {"subscription.archived": {"$ne": True}}
+    page = await _crm_page(CLIENTS_LISTING, extra_filter, search, limit, cursor)
     
+    users = page["items"]
     for user in users:
-        user["id"] = str(user["_id"])
-        del user["_id"]  # Eliminar _id de MongoDB
-        if "password" in user:
-            del user["password"]
-    
-    # Calculate stats
-    total = len(users)
-    active = len([u for u in users if u.get("subscription", {}).get("payment_status") == "verified"])
-    pending = len([u for u in users if u.get("subscription", {}).get("payment_status") == "pending"])
+        user["id"] = str(user.pop("_id"))  # Eliminar _id de MongoDB
+    
+    # Stats de TODOS los clientes (no solo de la página) en una agregación,
+    # solo en la primera página: las siguientes (cursor) no las recalculan
+    stats = None
+    if not cursor:
+        stats = await facet_counts(db, "users", CLIENTS_LISTING.base_filter, {
+            "active": {"subscription.payment_status": "verified"},
+            "pending": {"subscription.payment_status": "pending"}
+        })
     
     return {
         "clients": users,
-        "stats": {
-            "total": total,
-            "active": active,
-            "pending": pending
-        }
+        "stats": stats,
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"]
     }
 
 
@@ -1176,11 +1125,12 @@ async def generate_training_plan(request: Request, background_tasks: BackgroundT
     
     FLUJO EVOLUTIVO CON STATE:
     1. Recibe user_id y current_questionnaire_id
-    2. Construye el objeto `state` con historial completo:
+    2. Construye el objeto `state` con historial acotado (training_state_builder):
        - initial_questionnaire: Primer cuestionario del usuario
-       - previous_followups: Todos los seguimientos anteriores (excepto el actual)
-       - previous_plans: Todos los planes generados previamente
-       - last_plan: El plan más reciente
+       - previous_followups: Últimos seguimientos anteriores (ventana)
+       - previous_plans: Digests de los planes previos (ventana)
+       - last_plan: El plan más reciente (completo)
+       - history_summary: Métricas clave por mes
     3. Construye el objeto `input` con el cuestionario actual
     4. Llama al workflow con input + state
     5. Guarda snapshot y plan en BD
@@ -1334,66 +1284,16 @@ async def generate_training_plan(request: Request, background_tasks: BackgroundT
             )
         
         # ============================================
-        # PASO 3: RECUPERAR PLANES PREVIOS
+        # PASO 3-4: CONSTRUIR OBJETO STATE (acotado)
         # ============================================
+        # Digests incrementales de planes previos + último plan completo +
+        # ventana de seguimientos, dentro de un presupuesto de tamaño
+        # (ver services/training_state_builder.py)
         try:
-            edn360_db = client[os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')]
-            
-            # Recuperar todos los planes del usuario ordenados por fecha
-            all_plans_cursor = edn360_db.training_plans_v2.find(
-                {"user_id": user_id},
-                {"_id": 1, "created_at": 1, "plan": 1}
-            ).sort("created_at", 1)  # Ascendente (más antiguo → más reciente)
-            
-            all_plans = await all_plans_cursor.to_list(length=100)
-            
-            # Si se seleccionó un previous_training_plan_id en la UI,
-            # usar solo los planes hasta ese ID (inclusive)
-            if previous_training_plan_id:
-                logger.info(f"📋 Filtrando planes hasta: {previous_training_plan_id}")
-                
-                # Buscar el plan seleccionado
-                selected_plan_index = -1
-                for i, plan in enumerate(all_plans):
-                    plan_id = str(plan.get("_id", ""))
-                    # También verificar formato "edn360_{i}_{created_at}"
-                    if plan_id == previous_training_plan_id or plan.get("created_at") == previous_training_plan_id:
-                        selected_plan_index = i
-                        break
-                
-                if selected_plan_index >= 0:
-                    # Incluir todos los planes hasta el seleccionado (inclusive)
-                    previous_plans = all_plans[:selected_plan_index + 1]
-                    last_plan = previous_plans[-1] if previous_plans else None
-                    logger.info(f"✅ Planes filtrados hasta índice {selected_plan_index}: {len(previous_plans)} planes")
-                else:
-                    logger.warning(f"⚠️ Plan seleccionado {previous_training_plan_id} no encontrado, usando todos los planes")
-                    previous_plans = all_plans
-                    last_plan = previous_plans[-1] if previous_plans else None
-            else:
-                # No se seleccionó plan previo en UI
-                # CASO A: Si no hay planes, esto es el primer plan
-                previous_plans = all_plans
-                last_plan = previous_plans[-1] if previous_plans else None
+            from services.edn360_input_builder import _build_user_profile
+            from services.training_state_builder import build_training_state, serialize_questionnaire
             
-            logger.info(
-                f"✅ Planes previos recuperados | "
-                f"Total en BD: {len(all_plans)} | "
-                f"Previous plans en STATE: {len(previous_plans)} | "
-                f"Has last_plan: {bool(last_plan)}"
-            )
-        
-        except Exception as e:
-            logger.warning(f"⚠️ Error recuperando planes previos: {e}")
-            previous_plans = []
-            last_plan = None
-        
-        # ============================================
-        # PASO 4: CONSTRUIR OBJETO STATE
-        # ============================================
-        try:
             # Construir el user_profile
-            from services.edn360_input_builder import _build_user_profile
             user_profile = await _build_user_profile(user_id)
             
             if not user_profile:
@@ -1405,27 +1305,17 @@ async def generate_training_plan(request: Request, background_tasks: BackgroundT
                     }
                 )
             
-            # Función helper para serializar cuestionarios
-            def serialize_questionnaire(q):
-                return {
-                    "submission_id": q.submission_id,
-                    "submitted_at": q.submitted_at.isoformat() if hasattr(q.submitted_at, 'isoformat') else str(q.submitted_at),
-                    "source": q.source,
-                    "payload": _serialize_datetime_fields(q.raw_payload)
-                }
-            
-            # Construir el objeto state
-            state = {
-                "initial_questionnaire": serialize_questionnaire(initial_questionnaire),
-                "previous_followups": [serialize_questionnaire(q) for q in previous_followups],
-                "previous_plans": previous_plans,
-                "last_plan": last_plan
-            }
+            state, state_metrics = await build_training_state(
+                user_id,
+                initial_questionnaire,
+                previous_followups,
+                previous_training_plan_id=previous_training_plan_id
+            )
             
             logger.info(
                 f"✅ Objeto STATE construido | "
-                f"Has initial: True | Previous followups: {len(previous_followups)} | "
-                f"Previous plans: {len(previous_plans)} | Has last_plan: {bool(last_plan)}"
+                f"Has initial: True | Previous followups: {state_metrics['followups_in_state']} | "
+                f"Previous plans: {len(state['previous_plans'])} | Has last_plan: {bool(state['last_plan'])}"
             )
         
         except HTTPException:
@@ -1481,7 +1371,8 @@ async def generate_training_plan(request: Request, background_tasks: BackgroundT
             "user_id": user_id,
             "status": "generating",
             "created_at": datetime.now(timezone.utc).isoformat(),
-            "plan": None
+            "plan": None,
+            "state_metrics": state_metrics
         }
         await edn360_db.training_plans_v2.insert_one(initial_plan_doc)
         
@@ -1501,6 +1392,7 @@ async def generate_training_plan(request: Request, background_tasks: BackgroundT
         return {
             "plan_id": plan_id,
             "status": "generating",
+            "state_metrics": state_metrics,
             "message": "El plan se está generando. Consulta el status con GET /api/admin/users/{user_id}/training-plans/latest"
         }
     
@@ -1658,16 +1550,22 @@ async def _generate_plan_background(plan_id: str, user_id: str, workflow_input:
         edn360_db = client[os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')]
         last_plan = state.get("last_plan")
         
-        await edn360_db.training_plans_v2.update_one(
+        saved_plan = await edn360_db.training_plans_v2.find_one_and_update(
             {"id": plan_id},
             {"$set": {
                 "status": "draft",
                 "plan": _serialize_datetime_fields(training_program),
                 "is_evolutionary": bool(last_plan),
                 "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
+            }},
+            return_document=ReturnDocument.AFTER
         )
         
+        # Digest para el STATE de la próxima generación (sin releer el plan)
+        if saved_plan:
+            from services.training_state_builder import record_plan_digest
+            await record_plan_digest(user_id, saved_plan)
+        
         logger.info(f"✅ [Background] Plan generado y guardado | plan_id: {plan_id} | title: {training_program.get('title', 'N/A')}")
     
     except Exception as e:
@@ -2969,9 +2867,13 @@ async def download_training_plan_pdf(user_id: str, request: Request):
         # Generar HTML del plan (igual que el email)
         html_content = _generate_training_plan_email_html(plan_doc, user)
         
-        # Convertir HTML a PDF usando weasyprint (más confiable que pdfkit)
-        from weasyprint import HTML
-        pdf_bytes = HTML(string=html_content).write_pdf()
+        # Convertir HTML a PDF (pool de procesos + cache por contenido)
+        pdf_bytes = await render_pdf(
+            html_content,
+            content_hash=compute_pdf_content_hash("training_download", user_id, html_content),
+            db=db,
+            user_id=user_id
+        )
         
         logger.info(f"✅ Usuario descargó PDF del plan | user_id: {user_id}")
         
@@ -2987,6 +2889,9 @@ async def download_training_plan_pdf(user_id: str, request: Request):
     except HTTPException:
         raise
     
+    except PDFRenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
     except Exception as e:
         logger.error(f"❌ Error generando PDF: {e}")
         import traceback
@@ -3083,85 +2988,94 @@ async def unarchive_client(user_id: str, request: Request):
     return {"success": True, "message": "Client unarchived successfully"}
 
 
+PURGE_SYNC_WAIT_SECONDS = float(os.getenv('PURGE_SYNC_WAIT_SECONDS', '10'))
+
+
+def _purge_job_response(job: dict) -> dict:
+    """Estado público de un job de purge (deleted_data con las claves de siempre)"""
+    deleted = job.get("deleted", {})
+    deleted_data = {label.split(":", 1)[1] if label.startswith("web:") else label: count
+                    for label, count in deleted.items()}
+    # Claves que muestra el panel de admin
+    deleted_data["questionnaire_submissions"] = deleted_data.get("nutrition_questionnaire_submissions", 0)
+    for key in ("nutrition_plans", "forms", "pdfs", "messages", "alerts", "sessions"):
+        deleted_data.setdefault(key, 0)
+    
+    return _serialize_datetime_fields({
+        "job_id": job["_id"],
+        "user_id": job["user_id"],
+        "status": job["status"],
+        "progress": job.get("progress"),
+        "deleted_data": deleted_data,
+        "bytes_reclaimed": job.get("bytes_reclaimed", 0),
+        "errors": job.get("errors"),
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at")
+    })
+
+
 @api_router.delete("/admin/delete-client/{user_id}")
-async def delete_client(user_id: str, request: Request):
+async def delete_client(user_id: str, request: Request, response: Response):
+    """
+    HARD DELETE de un cliente y TODOS sus datos (BD Web + edn360_app).
+    
+    Lanza un job de purge (client_purge.py) y espera hasta
+    PURGE_SYNC_WAIT_SECONDS: si termina devuelve el resumen; si no,
+    responde 202 con el job_id para consultar GET /admin/purge-jobs/{job_id}.
+    """
     admin = await require_admin(request)
     
-    # Get user info before deleting
-    user = await db.users.find_one({"_id": user_id})
+    user = await db.users.find_one({"_id": user_id}, {"email": 1})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     logger.info(f"🗑️ HARD DELETE iniciado para usuario: {user.get('email')} por admin: {admin['email']}")
     
-    # HARD DELETE COMPLETO - Borrar de TODAS las colecciones
-    
-    # 1. Borrar TODOS los planes de nutrición
-    nutrition_plans_deleted = await db.nutrition_plans.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {nutrition_plans_deleted.deleted_count} planes de nutrición eliminados")
-    
-    # 2. Borrar TODAS las respuestas del cuestionario
-    questionnaire_submissions_deleted = await db.nutrition_questionnaire_submissions.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {questionnaire_submissions_deleted.deleted_count} respuestas de cuestionario eliminadas")
-    
-    # 3. Borrar formularios
-    forms_deleted = await db.forms.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {forms_deleted.deleted_count} formularios eliminados")
-    
-    # 4. Borrar alertas
-    alerts_deleted = await db.alerts.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {alerts_deleted.deleted_count} alertas eliminadas")
-    
-    # 5. Borrar mensajes
-    messages_deleted = await db.messages.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {messages_deleted.deleted_count} mensajes eliminados")
-    
-    # 6. Borrar sesiones
-    sessions_deleted = await db.sessions.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {sessions_deleted.deleted_count} sesiones eliminadas")
-    
-    # 7. Borrar PDFs del filesystem y database
-    # Exclude file_data from PDFs to avoid serialization issues
-    pdfs = await db.pdfs.find(
-        {"user_id": user_id},
-        {"file_data": 0}
-    ).to_list(100)
-    for pdf in pdfs:
-        file_path = Path(pdf["file_path"])
-        if file_path.exists():
-            file_path.unlink()
-    pdfs_deleted = await db.pdfs.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {pdfs_deleted.deleted_count} PDFs eliminados")
-    
-    # 8. Borrar prospectos si existen
-    prospects_deleted = await db.prospects.delete_many({"user_id": user_id})
-    logger.info(f"  ✅ {prospects_deleted.deleted_count} prospectos eliminados")
+    job_id = await start_purge(
+        db,
+        client[os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')],
+        user_id,
+        requested_by=admin["email"]
+    )
+    job = await wait_for_purge(db, job_id, PURGE_SYNC_WAIT_SECONDS)
+    result = _purge_job_response(job)
     
-    # 9. FINALMENTE borrar el usuario
-    user_deleted = await db.users.delete_one({"_id": user_id})
-    logger.info(f"  ✅ Usuario eliminado de la base de datos")
+    if job["status"] == "failed":
+        raise HTTPException(
+            status_code=500,
+            detail=f"Borrado incompleto (job {job_id}): {', '.join(job.get('errors', {}))}"
+        )
     
-    if user_deleted.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
+    if job["status"] != "completed":
+        response.status_code = 202
+        return {
+            "success": True,
+            "message": "Borrado en curso",
+            "status_url": f"/api/admin/purge-jobs/{job_id}",
+            **result
+        }
     
     logger.info(f"✅ HARD DELETE COMPLETO para {user['email']} - TODOS los datos eliminados permanentemente")
     
     return {
         "success": True, 
         "message": "Cliente y TODOS sus datos eliminados permanentemente. Si se vuelve a registrar, comenzará desde cero.",
-        "deleted_data": {
-            "nutrition_plans": nutrition_plans_deleted.deleted_count,
-            "questionnaire_submissions": questionnaire_submissions_deleted.deleted_count,
-            "forms": forms_deleted.deleted_count,
-            "alerts": alerts_deleted.deleted_count,
-            "messages": messages_deleted.deleted_count,
-            "sessions": sessions_deleted.deleted_count,
-            "pdfs": pdfs_deleted.deleted_count,
-            "prospects": prospects_deleted.deleted_count
-        }
+        **result
     }
 
 
+@api_router.get("/admin/purge-jobs/{job_id}")
+async def get_purge_job_status(job_id: str, request: Request):
+    """Progreso de un job de purge (delete-client)"""
+    await require_admin(request)
+    
+    job = await get_purge_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    
+    return _purge_job_response(job)
+
+
 # ==================== FORM ENDPOINTS ====================
 
 
@@ -3206,6 +3120,7 @@ async def admin_update_user(user_id: str, user_update: AdminUserUpdate, request:
     if result.matched_count > 0:
         # Get updated user
         updated_user = await db.users.find_one({"_id": user_id})
+        await refresh_review_entry_safe(db, user_id)
         
         return {
             "success": True,
@@ -3408,18 +3323,8 @@ async def upload_pdf(
     type: str = Form(...)
 ):
     admin = await require_admin(request)
-    # Create uploads directory
-    upload_dir = Path("/app/backend/uploads")
-    upload_dir.mkdir(exist_ok=True)
-    
-    # Generate filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{user_id}_{timestamp}_{file.filename}"
-    file_path = upload_dir / filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save file (streaming al document store, deduplicado por hash)
+    stored = await put_upload(db, file)
     
     # Save to database
     pdf_dict = {
@@ -3427,7 +3332,10 @@ async def upload_pdf(
         "user_id": user_id,
         "title": title,
         "type": type,
-        "file_path": str(file_path),
+        "filename": file.filename,
+        "blob_id": stored["blob_id"],
+        "size": stored["size"],
+        "content_type": file.content_type or "application/pdf",
         "uploaded_by": "admin",  # Mark as uploaded by admin
         "upload_date": datetime.now(timezone.utc),
         "created_at": datetime.now(timezone.utc)
@@ -3452,18 +3360,8 @@ async def user_upload_document(
     user = await get_current_user(request)
     user_id = user["_id"]
     
-    # Create uploads directory
-    upload_dir = Path("/app/backend/uploads")
-    upload_dir.mkdir(exist_ok=True)
-    
-    # Generate filename
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    filename = f"{user_id}_{timestamp}_{file.filename}"
-    file_path = upload_dir / filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save file (streaming al document store, deduplicado por hash)
+    stored = await put_upload(db, file)
     
     # Save to database
     pdf_dict = {
@@ -3471,7 +3369,10 @@ async def user_upload_document(
         "user_id": user_id,
         "title": title,
         "type": type,
-        "file_path": str(file_path),
+        "filename": file.filename,
+        "blob_id": stored["blob_id"],
+        "size": stored["size"],
+        "content_type": file.content_type or "application/pdf",
         "uploaded_by": "user",  # Mark as uploaded by user
         "upload_date": datetime.now(timezone.utc),
         "created_at": datetime.now(timezone.utc)
@@ -3491,7 +3392,7 @@ async def delete_pdf(pdf_id: str, request: Request):
     user = await get_current_user(request)
     
     # Get PDF details
-    pdf = await db.pdfs.find_one({"_id": pdf_id})
+    pdf = await db.pdfs.find_one({"_id": pdf_id}, {"file_data": 0})
     if not pdf:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -3502,14 +3403,8 @@ async def delete_pdf(pdf_id: str, request: Request):
     if user["role"] != "admin" and pdf["user_id"] != user["_id"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Delete file from filesystem if it exists (for backwards compatibility)
-    if pdf.get("file_path"):
-        file_path = Path(pdf["file_path"])
-        if file_path.exists():
-            file_path.unlink()
-    
-    # Delete from database (file_data is stored in MongoDB)
-    await db.pdfs.delete_one({"_id": pdf_id})
+    # Delete from database + document store (o fichero legacy)
+    await delete_pdf_document(db, pdf_id)
     
     logger.info(f"✅ PDF deleted: {pdf_id} by {user['email']}")
     
@@ -3521,7 +3416,7 @@ async def download_pdf(pdf_id: str, request: Request):
     from fastapi.responses import Response
     
     user = await get_current_user(request)
-    pdf = await db.pdfs.find_one({"_id": pdf_id})
+    pdf = await db.pdfs.find_one({"_id": pdf_id}, {"file_data": 0})
     
     if not pdf:
         raise HTTPException(status_code=404, detail="PDF not found")
@@ -3530,11 +3425,22 @@ async def download_pdf(pdf_id: str, request: Request):
     if pdf["user_id"] != user["_id"] and user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # New structure: file_data stored in MongoDB
-    if pdf.get("file_data"):
-        filename = pdf.get("filename", f"{pdf.get('title', 'document')}.pdf")
+    filename = pdf.get("filename") or f"{pdf.get('title', 'document')}.pdf"
+    
+    # Document store: streaming con soporte de Range
+    if pdf.get("blob_id"):
+        return blob_response(
+            request,
+            pdf["blob_id"],
+            filename,
+            media_type=pdf.get("content_type", "application/pdf")
+        )
+    
+    # Backwards compatibility: file_data inline en MongoDB (PDFs no migrados)
+    legacy = await db.pdfs.find_one({"_id": pdf_id}, {"file_data": 1})
+    if legacy and legacy.get("file_data"):
         return Response(
-            content=pdf["file_data"],
+            content=legacy["file_data"],
             media_type="application/pdf",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
@@ -3596,19 +3502,47 @@ async def get_unread_count(request: Request):
 
 # ==================== MESSAGE/CHAT ENDPOINTS ====================
 
+@api_router.get("/messages/unread")
+async def get_unread_messages(request: Request):
+    """
+    Mensajes sin leer (contadores incrementales de conversations).
+    Cliente: {"count"}. Admin: {"count", "conversations"}.
+    """
+    current_user = await get_current_user(request)
+    if current_user["role"] == "admin":
+        return await get_unread_summary(db)
+    return await get_unread_summary(db, current_user["_id"])
+
+
 @api_router.get("/messages/{user_id}")
-async def get_messages(user_id: str, request: Request):
+async def get_messages(
+    user_id: str,
+    request: Request,
+    limit: int = 50,
+    before: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """
+    Historial paginado de la conversación (orden cronológico ascendente).
+    
+    - Sin cursor: últimos `limit` mensajes (y marca la conversación como leída)
+    - before=<next_cursor>: página anterior ("cargar más antiguos")
+    - since=<newest_cursor>: solo los mensajes nuevos (al reconectar)
+    """
     current_user = await get_current_user(request)
     # Admin can view any user's messages, users can only view their own
     if current_user["role"] != "admin" and current_user["_id"] != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    messages = await db.messages.find({"user_id": user_id}).sort("timestamp", 1).to_list(1000)
+    try:
+        page = await get_history(db, user_id, limit=limit, before=before, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    for message in messages:
-        message["id"] = str(message["_id"])
+    if not before:
+        await mark_read(db, user_id, reader_is_admin=current_user["role"] == "admin")
     
-    return {"messages": messages}
+    return page
 
 
 @api_router.post("/messages/send")
@@ -3620,21 +3554,23 @@ async def send_message(message_data: MessageCreate, request: Request):
     else:
         user_id = current_user["_id"]  # User sends to own conversation
     
-    message_dict = {
-        "_id": str(datetime.now(timezone.utc).timestamp()).replace(".", ""),
-        "user_id": user_id,
-        "sender_id": current_user["_id"],
-        "sender_name": current_user["name"],
-        "message": message_data.message,
-        "is_admin": current_user["role"] == "admin",
-        "timestamp": datetime.now(timezone.utc),
-        "created_at": datetime.now(timezone.utc)
-    }
+    message = await append_message(
+        db,
+        user_id,
+        sender_id=current_user["_id"],
+        sender_name=current_user["name"],
+        text=message_data.message,
+        is_admin=current_user["role"] == "admin"
+    )
     
-    await db.messages.insert_one(message_dict)
-    message_dict["id"] = message_dict["_id"]
+    # Tiempo real para el otro lado (el mensaje ya está guardado: si el
+    # emit falla, lo recupera el delta since al reconectar)
+    try:
+        await emit_new_message(sio, message)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo emitir el mensaje {message['id']} por Socket.IO: {e}")
     
-    return message_dict
+    return message
 
 
 # ==================== SESSION/CALENDAR ENDPOINTS ====================
@@ -3879,27 +3815,51 @@ async def submit_questionnaire(questionnaire: QuestionnaireSubmit):
 # ==================== CRM PROSPECTOS ENDPOINTS ====================
 
 @api_router.get("/admin/prospects")
-async def get_prospects(request: Request, stage: Optional[str] = None):
+async def get_prospects(
+    request: Request,
+    stage: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = CRM_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """Get all prospects from questionnaire responses"""
     await require_admin(request)
     
     try:
         # Build query
-        query = {"converted_to_client": False}
-        if stage:
-            query["stage_name"] = stage
-        
-        # Get all prospects
-        prospects = await db.questionnaire_responses.find(query).sort("submitted_at", -1).to_list(length=1000)
+        extra_filter = {"stage_name": stage} if stage else None
+        page = await _crm_page(PROSPECTS_LISTING, extra_filter, search, limit, cursor)
         
         # Convert to response format
-        prospects_list = []
-        for p in prospects:
+        prospects_list = page["items"]
+        for p in prospects_list:
             p["id"] = p["_id"]
-            prospects_list.append(p)
         
-        return {"prospects": prospects_list, "total": len(prospects_list)}
+        # Totales solo en la primera página: total del filtro completo y
+        # prospectos por etapa (sin filtros)
+        total = None
+        stage_counts = None
+        if not cursor:
+            total = len(prospects_list)
+            if page["has_more"]:
+                count_filter = {**PROSPECTS_LISTING.base_filter, **(extra_filter or {})}
+                if search:
+                    count_filter["$text"] = {"$search": search}
+                total = await db.questionnaire_responses.count_documents(count_filter)
+            stage_counts = await group_counts(
+                db, PROSPECTS_LISTING.collection, PROSPECTS_LISTING.base_filter, "stage_name"
+            )
+        
+        return {
+            "prospects": prospects_list,
+            "total": total,
+            "stage_counts": stage_counts,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"]
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching prospects: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener prospectos")
@@ -4567,22 +4527,38 @@ async def convert_prospect(prospect_id: str, request: Request, target_crm: dict)
 
 # ==================== TEAM CLIENTS CRM ENDPOINTS ====================
 
+def _team_status_filter(status: str) -> dict:
+    """client_status, o payment_status si el cliente no tiene client_status"""
+    without_client_status = {"$in": [None, ""]}
+    if status == "active":
+        derived = {"client_status": without_client_status, "subscription.payment_status": "verified"}
+    elif status == "pending":
+        derived = {"client_status": without_client_status, "subscription.payment_status": {"$ne": "verified"}}
+    else:
+        return {"client_status": status}
+    return {"$or": [{"client_status": status}, derived]}
+
+
 @api_router.get("/admin/team-clients")
-async def get_team_clients(request: Request, status: Optional[str] = None):
+async def get_team_clients(
+    request: Request,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = CRM_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """Get all team clients (ONLY registered users, NO prospects)"""
     await require_admin(request)
     
     try:
-        # Solo obtener usuarios registrados (role=user) que tengan plan team
-        users = await db.users.find({
-            "role": "user",
-            "subscription.plan": "team"
-        }).to_list(length=1000)
+        # Solo usuarios registrados (role=user) con plan team, ordenados por created_at en MongoDB
+        extra_filter = _team_status_filter(status) if status else None
+        page = await _crm_page(TEAM_CLIENTS_LISTING, extra_filter, search, limit, cursor)
         
         # Formatear lista
         clients_list = []
         
-        for user in users:
+        for user in page["items"]:
             # Determinar el status del cliente (puede venir de client_status o del payment_status)
             client_status = user.get("client_status")
             if not client_status:
@@ -4602,11 +4578,24 @@ async def get_team_clients(request: Request, status: Optional[str] = None):
                 "subscription": user.get("subscription", {})
             })
         
-        # Sort by created_at
-        clients_list.sort(key=lambda x: x.get("created_at") or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+        # Stats de todos los clientes equipo, solo en la primera página
+        stats = None
+        if not cursor:
+            stats = await facet_counts(db, TEAM_CLIENTS_LISTING.collection, TEAM_CLIENTS_LISTING.base_filter, {
+                status_name: _team_status_filter(status_name)
+                for status_name in ("active", "pending", "inactive")
+            })
         
-        return {"clients": clients_list, "total": len(clients_list)}
+        return {
+            "clients": clients_list,
+            "total": len(clients_list),
+            "stats": stats,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"]
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching team clients: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener clientes")
@@ -4837,24 +4826,44 @@ async def move_team_client(client_id: str, request: Request, target_data: dict):
 # ==================== EXTERNAL CLIENTS CRM ENDPOINTS ====================
 
 @api_router.get("/admin/external-clients")
-async def get_external_clients(request: Request, status: Optional[str] = None):
+async def get_external_clients(
+    request: Request,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = CRM_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """Get all external clients"""
     await require_admin(request)
     
     try:
-        query = {"moved_to_team": {"$ne": True}}
-        if status:
-            query["status"] = status
-        
-        clients = await db.external_clients.find(query).sort("created_at", -1).to_list(length=1000)
+        extra_filter = {"status": status} if status else None
+        page = await _crm_page(EXTERNAL_CLIENTS_LISTING, extra_filter, search, limit, cursor)
         
-        clients_list = []
-        for client in clients:
+        clients_list = page["items"]
+        for client in clients_list:
             client["id"] = client["_id"]
-            clients_list.append(client)
         
-        return {"clients": clients_list, "total": len(clients_list)}
+        # Stats de todos los clientes externos, solo en la primera página
+        stats = None
+        if not cursor:
+            now = datetime.now(timezone.utc)
+            stats = await facet_counts(db, EXTERNAL_CLIENTS_LISTING.collection, EXTERNAL_CLIENTS_LISTING.base_filter, {
+                "active": {"status": "active"},
+                "paused": {"status": "paused"},
+                "renewals": {"next_payment_date": {"$gte": now, "$lte": now + timedelta(days=7)}}
+            })
+        
+        return {
+            "clients": clients_list,
+            "total": len(clients_list),
+            "stats": stats,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"]
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching external clients: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener clientes externos")
@@ -5240,147 +5249,8 @@ async def move_external_client(client_id: str, request: Request, target_data: di
 
 # ==================== SOCKET.IO EVENTS ====================
 
-# Store connected users: {user_id: sid}
-connected_users = {}
-
-@sio.event
-async def connect(sid, environ):
-    """Handle client connection"""
-    logger.info(f"Client connected: {sid}")
-    await sio.emit('connected', {'status': 'connected'}, room=sid)
-
-
-@sio.event
-async def disconnect(sid):
-    """Handle client disconnection"""
-    # Remove user from connected users
-    user_id_to_remove = None
-    for user_id, socket_id in connected_users.items():
-        if socket_id == sid:
-            user_id_to_remove = user_id
-            break
-    
-    if user_id_to_remove:
-        del connected_users[user_id_to_remove]
-    
-    logger.info(f"Client disconnected: {sid}")
-
-
-@sio.event
-async def authenticate(sid, data):
-    """Authenticate user via session_token or JWT"""
-    try:
-        token = data.get('token')
-        if not token:
-            await sio.emit('auth_error', {'message': 'No token provided'}, room=sid)
-            return
-        
-        # Try to get user from session_token first
-        session = await db.user_sessions.find_one({"session_token": token})
-        if session and session["expires_at"] > datetime.now(timezone.utc):
-            user_id = session["user_id"]
-        else:
-            # Fallback to JWT
-            try:
-                from auth import decode_token
-                user_id = decode_token(token)
-            except:
-                await sio.emit('auth_error', {'message': 'Invalid token'}, room=sid)
-                return
-        
-        # Store the connection
-        connected_users[user_id] = sid
-        
-        # Get user data
-        user = await db.users.find_one({"_id": user_id})
-        if user:
-            await sio.emit('authenticated', {
-                'user_id': user_id,
-                'name': user.get('name'),
-                'role': user.get('role')
-            }, room=sid)
-            logger.info(f"User {user_id} authenticated on socket {sid}")
-    except Exception as e:
-        logger.error(f"Authentication error: {e}")
-        await sio.emit('auth_error', {'message': str(e)}, room=sid)
-
-
-@sio.event
-async def send_message(sid, data):
-    """Handle incoming chat messages"""
-    try:
-        # Find which user this socket belongs to
-        sender_id = None
-        for user_id, socket_id in connected_users.items():
-            if socket_id == sid:
-                sender_id = user_id
-                break
-        
-        if not sender_id:
-            await sio.emit('error', {'message': 'Not authenticated'}, room=sid)
-            return
-        
-        # Get sender info
-        sender = await db.users.find_one({"_id": sender_id})
-        if not sender:
-            await sio.emit('error', {'message': 'User not found'}, room=sid)
-            return
-        
-        # Determine recipient (for admin-client chat)
-        recipient_id = data.get('user_id') if sender['role'] == 'admin' else sender_id
-        message_text = data.get('message')
-        
-        if not message_text:
-            await sio.emit('error', {'message': 'Message is required'}, room=sid)
-            return
-        
-        # Save message to database
-        message_dict = {
-            "_id": str(datetime.now(timezone.utc).timestamp()).replace(".", ""),
-            "user_id": recipient_id,
-            "sender_id": sender_id,
-            "sender_name": sender.get('name'),
-            "message": message_text,
-            "is_admin": sender['role'] == 'admin',
-            "timestamp": datetime.now(timezone.utc),
-            "created_at": datetime.now(timezone.utc)
-        }
-        
-        await db.messages.insert_one(message_dict)
-        message_dict["id"] = message_dict["_id"]
-        
-        # Send to sender
-        await sio.emit('new_message', message_dict, room=sid)
-        
-        # Send to recipient if they're online
-        if sender['role'] == 'admin':
-            # Admin sending to user
-            if recipient_id in connected_users:
-                await sio.emit('new_message', message_dict, room=connected_users[recipient_id])
-        else:
-            # User sending to admin - find admin's socket
-            admins = await db.users.find({"role": "admin"}).to_list(10)
-            for admin in admins:
-                if admin["_id"] in connected_users:
-                    await sio.emit('new_message', message_dict, room=connected_users[admin["_id"]])
-        
-        logger.info(f"Message from {sender_id} to {recipient_id}: {message_text}")
-    
-    except Exception as e:
-        logger.error(f"Error sending message: {e}")
-        await sio.emit('error', {'message': str(e)}, room=sid)
-
-
-@sio.event
-async def join_chat(sid, data):
-    """Join a specific chat room (for admin viewing client chats)"""
-    try:
-        user_id = data.get('user_id')
-        if user_id:
-            await sio.enter_room(sid, f"chat_{user_id}")
-            logger.info(f"Socket {sid} joined chat_{user_id}")
-    except Exception as e:
-        logger.error(f"Error joining chat: {e}")
+# connect / disconnect / authenticate / send_message / join_chat
+register_chat_events(sio, db)
 
 # ==================== ROOT ENDPOINT ====================
 
@@ -5642,95 +5512,190 @@ async def update_reminder_config(config: ReminderConfig, request: Request):
         raise HTTPException(status_code=500, detail="Error al actualizar configuración")
 
 
+CLIENT_RISK_LEVELS = ("red", "yellow")
+
+
+def _is_date_before(field: str, cutoff: datetime) -> dict:
+    """Expresión de agregación: el campo es una fecha <= cutoff (null/ausente → False)"""
+    return {"$and": [
+        {"$eq": [{"$type": field}, "date"]},
+        {"$lte": [field, cutoff]}
+    ]}
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 @api_router.get("/admin/clients-at-risk")
-async def get_clients_at_risk(request: Request):
-    """Get list of clients that need attention based on risk indicators"""
+async def get_clients_at_risk(
+    request: Request,
+    risk_level: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50
+):
+    """
+    Get list of clients that need attention based on risk indicators
+
+    El nivel de riesgo se calcula en una única agregación ($lookup de la última
+    sesión y de los formularios pendientes), en lugar de 2 consultas por cliente.
+    Soporta filtro por risk_level (red/yellow) y paginación (skip/limit).
+    """
     await require_admin(request)
     
+    if risk_level and risk_level not in CLIENT_RISK_LEVELS:
+        raise HTTPException(status_code=400, detail="risk_level debe ser 'red' o 'yellow'")
+    skip = max(skip, 0)
+    limit = min(max(limit, 1), 500)
+    
     try:
         # Get reminder config
         config = await db.reminder_config.find_one({"_id": "default"})
         inactive_days_threshold = config.get("inactive_alert_days", 7) if config else 7
         form_days_threshold = config.get("form_reminder_days", 3) if config else 3
         
-        # Get all active clients (not archived)
-        clients = await db.users.find({
-            "role": "user",
-            "subscription.archived": {"$ne": True}
-        }).to_list(length=1000)
-        
-        at_risk_clients = []
         now = datetime.now(timezone.utc)
+        red_cutoff = now - timedelta(days=14)
+        inactive_cutoff = now - timedelta(days=inactive_days_threshold)
+        no_session_cutoff = now - timedelta(days=7)
+        form_red_cutoff = now - timedelta(days=7)
+        form_yellow_cutoff = now - timedelta(days=form_days_threshold)
+        
+        def any_form_before(cutoff: datetime) -> dict:
+            return {"$anyElementTrue": [{"$map": {
+                "input": "$pending_forms",
+                "as": "form",
+                "in": _is_date_before("$$form.sent_date", cutoff)
+            }}]}
+        
+        pipeline = [
+            # Active clients (not archived)
+            {"$match": {"role": "user", "subscription.archived": {"$ne": True}}},
+            {"$project": {"name": 1, "username": 1, "email": 1, "created_at": 1}},
+            {"$lookup": {
+                "from": "sessions",
+                "let": {"uid": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$user_id", "$$uid"]}}},
+                    {"$sort": {"date": -1}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 0, "date": 1}}
+                ],
+                "as": "last_session"
+            }},
+            {"$lookup": {
+                "from": "forms",
+                "let": {"uid": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$user_id", "$$uid"]},
+                        {"$eq": ["$completed", False]}
+                    ]}}},
+                    {"$project": {"_id": 0, "sent_date": 1}}
+                ],
+                "as": "pending_forms"
+            }},
+            {"$addFields": {
+                "has_session": {"$gt": [{"$size": "$last_session"}, 0]},
+                "last_session_date": {"$arrayElemAt": ["$last_session.date", 0]}
+            }},
+            {"$addFields": {
+                "risk_level": {"$switch": {
+                    "branches": [
+                        {
+                            "case": {"$or": [
+                                _is_date_before("$last_session_date", red_cutoff),
+                                any_form_before(form_red_cutoff)
+                            ]},
+                            "then": "red"
+                        },
+                        {
+                            "case": {"$or": [
+                                _is_date_before("$last_session_date", inactive_cutoff),
+                                {"$and": [
+                                    {"$not": ["$has_session"]},
+                                    _is_date_before("$created_at", no_session_cutoff)
+                                ]},
+                                any_form_before(form_yellow_cutoff)
+                            ]},
+                            "then": "yellow"
+                        }
+                    ],
+                    "default": "green"
+                }}
+            }},
+            {"$match": {"risk_level": {"$in": list(CLIENT_RISK_LEVELS)}}},
+            {"$facet": {
+                "counts": [{"$group": {"_id": "$risk_level", "count": {"$sum": 1}}}],
+                "page": [
+                    {"$match": {"risk_level": risk_level} if risk_level else {}},
+                    # Sort by risk level (red first, then yellow)
+                    {"$addFields": {
+                        "risk_rank": {"$cond": [{"$eq": ["$risk_level", "red"]}, 0, 1]},
+                        "client_name": {"$ifNull": ["$name", "$username"]}
+                    }},
+                    {"$sort": {"risk_rank": 1, "client_name": 1, "_id": 1}},
+                    {"$skip": skip},
+                    {"$limit": limit}
+                ]
+            }}
+        ]
+        
+        result = await db.users.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        facet = result[0] if result else {"counts": [], "page": []}
+        counts = {item["_id"]: item["count"] for item in facet["counts"]}
         
-        for client in clients:
+        # Motivos legibles solo para la página devuelta
+        at_risk_clients = []
+        for client in facet["page"]:
             risk_reasons = []
-            risk_level = "green"
             days_inactive = None
             pending_forms_days = None
             last_activity = None
             
-            # Check last session
-            last_session = await db.sessions.find_one(
-                {"user_id": client["_id"]},
-                sort=[("date", -1)]
-            )
-            
-            if last_session and last_session.get("date"):
-                days_since_session = (now - last_session["date"]).days
-                if days_since_session >= 14:
-                    risk_reasons.append(f"{days_since_session} días sin sesión")
-                    risk_level = "red"
-                    days_inactive = days_since_session
-                    last_activity = last_session["date"]
-                elif days_since_session >= inactive_days_threshold:
+            last_session_date = client.get("last_session_date")
+            if last_session_date:
+                days_since_session = (now - _as_utc(last_session_date)).days
+                if days_since_session >= inactive_days_threshold or days_since_session >= 14:
                     risk_reasons.append(f"{days_since_session} días sin sesión")
-                    risk_level = "yellow" if risk_level == "green" else risk_level
                     days_inactive = days_since_session
-                    last_activity = last_session["date"]
-            elif not last_session:
+                    last_activity = last_session_date
+            elif not client.get("has_session"):
                 # New client with no sessions yet
-                days_since_registration = (now - client["created_at"]).days
-                if days_since_registration >= 7:
+                if client.get("created_at") and (now - _as_utc(client["created_at"])).days >= 7:
                     risk_reasons.append("Sin sesiones registradas")
-                    risk_level = "yellow" if risk_level == "green" else risk_level
-            
-            # Check pending forms
-            pending_forms = await db.forms.find({
-                "user_id": client["_id"],
-                "completed": False
-            }).to_list(length=1000)
             
-            for form in pending_forms:
-                days_pending = (now - form["sent_date"]).days
-                if days_pending >= 7:
-                    risk_reasons.append(f"Formulario pendiente {days_pending} días")
-                    risk_level = "red"
-                    pending_forms_days = days_pending
-                elif days_pending >= form_days_threshold:
+            for form in client.get("pending_forms", []):
+                if not form.get("sent_date"):
+                    continue
+                days_pending = (now - _as_utc(form["sent_date"])).days
+                if days_pending >= form_days_threshold or days_pending >= 7:
                     risk_reasons.append(f"Formulario pendiente {days_pending} días")
-                    risk_level = "yellow" if risk_level == "green" else risk_level
                     pending_forms_days = days_pending
             
-            # Only include clients with yellow or red risk
-            if risk_level in ["yellow", "red"]:
-                at_risk_clients.append({
-                    "client_id": client["_id"],
-                    "client_name": client.get("name", client["username"]),
-                    "client_email": client["email"],
-                    "risk_level": risk_level,
-                    "risk_reasons": risk_reasons,
-                    "days_inactive": days_inactive,
-                    "pending_forms_days": pending_forms_days,
-                    "last_activity_date": last_activity
-                })
+            at_risk_clients.append({
+                "client_id": client["_id"],
+                "client_name": client["client_name"],
+                "client_email": client.get("email"),
+                "risk_level": client["risk_level"],
+                "risk_reasons": risk_reasons,
+                "days_inactive": days_inactive,
+                "pending_forms_days": pending_forms_days,
+                "last_activity_date": last_activity
+            })
         
-        # Sort by risk level (red first, then yellow)
-        at_risk_clients.sort(key=lambda x: (0 if x["risk_level"] == "red" else 1, x["client_name"]))
+        total_red = counts.get("red", 0)
+        total_yellow = counts.get("yellow", 0)
+        total = counts.get(risk_level, 0) if risk_level else total_red + total_yellow
         
         return {
             "clients_at_risk": at_risk_clients,
-            "total_red": len([c for c in at_risk_clients if c["risk_level"] == "red"]),
-            "total_yellow": len([c for c in at_risk_clients if c["risk_level"] == "yellow"])
+            "total_red": total_red,
+            "total_yellow": total_yellow,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "has_more": skip + len(at_risk_clients) < total
         }
     except Exception as e:
         logger.error(f"Error getting clients at risk: {e}")
@@ -5844,6 +5809,9 @@ async def submit_nutrition_questionnaire(questionnaire: NutritionQuestionnaireSu
         await db.nutrition_questionnaire_submissions.insert_one(submission_doc)
         logger.info(f"✅ Cuestionario guardado en BD Web: {submission_id} (user_id: {user_id})")
         
+        # Validación + adaptación E.D.N.360 una sola vez (la leen los jobs)
+        await normalize_questionnaire_safe(db, submission_doc, is_followup=False)
+        
         # ============================================
         # 2. DUAL-WRITE A CLIENT_DRAWERS (best effort)
         # ============================================
@@ -5918,7 +5886,6 @@ async def admin_generate_nutrition_plan(
         # Intentar buscar en cuestionarios de nutrición primero
         submission = await db.nutrition_questionnaire_submissions.find_one({"_id": submission_id})
         is_followup = False
-        context_data = None
         
         if not submission:
             # Si no está en cuestionarios de nutrición, buscar en follow-ups
@@ -5931,28 +5898,7 @@ async def admin_generate_nutrition_plan(
         if submission["user_id"] != user_id:
             raise HTTPException(status_code=403, detail="El cuestionario no pertenece a este usuario")
         
-        # Si es un followup, obtener el cuestionario inicial para contexto base
-        if is_followup:
-            logger.info(f"📋 Generando desde follow-up, obteniendo cuestionario inicial para contexto")
-            initial_submission = await db.nutrition_questionnaire_submissions.find_one(
-                {"user_id": user_id},
-                sort=[("submitted_at", 1)]
-            )
-            
-            if not initial_submission:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No se encontró cuestionario inicial para contexto"
-                )
-            
-            questionnaire_data = initial_submission["responses"]
-            # Serializar datetime fields del followup antes de usar
-            submission_serialized = _serialize_datetime_fields(submission)
-            context_data = {
-                "followup_responses": submission_serialized.get("responses", {}),
-                "ai_analysis": submission_serialized.get("ai_analysis", "")
-            }
-        else:
+        if not is_followup:
             # Si regenerate=True, eliminar planes existentes de este mes
             if regenerate and submission.get("plan_generated"):
                 now = datetime.now(timezone.utc)
@@ -5978,9 +5924,14 @@ async def admin_generate_nutrition_plan(
             
             if submission.get("plan_generated") and not regenerate:
                 raise HTTPException(status_code=400, detail="Ya existe un plan generado para este cuestionario")
-            
-            # Obtener datos del cuestionario
-            questionnaire_data = submission["responses"]
+        
+        # Cuestionario en formato E.D.N.360 (precalculado en el envío)
+        # Si es followup, es la mezcla del inicial con las actualizaciones del followup
+        normalized = await get_normalized_questionnaire(db, submission, is_followup)
+        if not normalized["adapted"]:
+            raise HTTPException(status_code=404, detail="No se encontró cuestionario inicial para contexto")
+        adapted_questionnaire = normalized["adapted"]
+        questionnaire_data = adapted_questionnaire.get("_original_questionnaire") or submission["responses"]
         
         # Obtener mes y año actual
         now = datetime.now(timezone.utc)
@@ -6030,9 +5981,6 @@ async def admin_generate_nutrition_plan(
                 }
             logger.info(f"✅ Plan de entrenamiento encontrado ({training_plan['_id']}). Sincronizando con nutrición.")
         
-        # Adaptar cuestionario al formato E.D.N.360
-        adapted_questionnaire = _adapt_questionnaire_for_edn360(questionnaire_data)
-        
         # Obtener plan nutricional previo si se especificó (para progresión)
         previous_nutrition_plan = None
         if previous_nutrition_plan_id:
@@ -6265,7 +6213,7 @@ async def delete_nutrition_plan(user_id: str, plan_id: str, request: Request):
         
         # Eliminar el PDF asociado si existe
         if plan.get("pdf_id"):
-            await db.pdfs.delete_one({"_id": plan["pdf_id"]})
+            await delete_pdf_document(db, plan["pdf_id"])
             logger.info(f"PDF eliminado: {plan['pdf_id']}")
         
         # Eliminar el plan de nutrición
@@ -6280,6 +6228,7 @@ async def delete_nutrition_plan(user_id: str, plan_id: str, request: Request):
                 {"_id": user_id},
                 {"$unset": {"nutrition_plan": ""}}
             )
+            await refresh_review_entry_safe(db, user_id)
             logger.info(f"Referencia al plan eliminada del usuario {user_id}")
         
         logger.info(f"✅ Plan de nutrición {plan_id} eliminado completamente por admin")
@@ -6323,8 +6272,6 @@ async def generate_nutrition_pdf(user_id: str, plan_id: str = None, request: Req
     try:
         # Generar PDF usando markdown2pdf o similar
         import markdown
-        from weasyprint import HTML
-        import tempfile
         
         # Contenido del plan verificado
         plan_content = plan.get("plan_verificado", "")
@@ -6396,7 +6343,7 @@ async def generate_nutrition_pdf(user_id: str, plan_id: str = None, request: Req
             <div class="header">
                 <h1>Plan de Nutrición Personalizado</h1>
                 <p><strong>{user.get('name', user.get('username'))}</strong></p>
-                <p>Generado: {datetime.now(timezone.utc).strftime('%d/%m/%Y')}</p>
+                <p>Generado: {_pdf_date(plan.get('generated_at'))}</p>
             </div>
             {html_content}
             <div class="footer">
@@ -6408,8 +6355,9 @@ async def generate_nutrition_pdf(user_id: str, plan_id: str = None, request: Req
         </html>
         """
         
-        # Generate PDF content
-        pdf_content = HTML(string=full_html).write_pdf()
+        # Generate PDF content (pool de procesos + cache por contenido)
+        content_hash = compute_pdf_content_hash("nutrition", user_id, full_html)
+        pdf_content = await render_pdf(full_html, content_hash=content_hash, db=db, user_id=user_id)
         
         # Create standardized PDF document
         month_names = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", 
@@ -6423,7 +6371,8 @@ async def generate_nutrition_pdf(user_id: str, plan_id: str = None, request: Req
             content=pdf_content,
             pdf_type="nutrition",
             related_id=plan["_id"],
-            filename=pdf_filename
+            filename=pdf_filename,
+            content_hash=content_hash
         )
         
         # Actualizar el plan en la colección marcando PDF generado
@@ -6446,6 +6395,8 @@ async def generate_nutrition_pdf(user_id: str, plan_id: str = None, request: Req
             "filename": pdf_filename
         }
         
+    except PDFRenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error generando PDF de nutrición: {e}")
         raise HTTPException(
@@ -6761,501 +6712,7 @@ async def _adapt_followup_for_edn360(followup_data: dict, user_id: str) -> dict:
         return _adapt_questionnaire_for_edn360(followup_data)
 
 
-def _validate_questionnaire_format(submission: dict) -> tuple[bool, list[str], dict]:
-    """
-    Valida robustamente el formato del cuestionario antes de procesarlo.
-    
-    Args:
-        submission: Documento de la BD (debe contener '_id', 'user_id', 'responses', etc.)
-    
-    Returns:
-        (is_valid, errors, questionnaire_data)
-        
-    FORMATO ESPERADO EN MONGODB:
-    {
-        "_id": "string (timestamp único)",
-        "user_id": "string",
-        "responses": {
-            "nombre_completo": "string",
-            "email": "string",
-            "fecha_nacimiento": "string (YYYY-MM-DD)",
-            "sexo": "string (Hombre/Mujer)",
-            "peso": "string (e.g., '75')",
-            "altura_cm": "string (e.g., '175')",
-            "objetivo_fisico": "string",
-            ... (más campos)
-        },
-        "submitted_at": "datetime",
-        "plan_generated": "boolean"
-    }
-    """
-    errors = []
-    
-    # 1. Validar estructura del submission
-    if not isinstance(submission, dict):
-        errors.append(f"Submission debe ser un dict, recibido: {type(submission)}")
-        return False, errors, {}
-    
-    if "_id" not in submission:
-        errors.append("Campo '_id' ausente en submission")
-    
-    if "user_id" not in submission:
-        errors.append("Campo 'user_id' ausente en submission")
-    
-    # 2. Validar campo 'responses' - CRÍTICO
-    if "responses" not in submission:
-        errors.append("❌ CRÍTICO: Campo 'responses' ausente en submission. El cuestionario debe guardarse con estructura: {_id, user_id, responses: {...}, submitted_at, plan_generated}")
-        return False, errors, {}
-    
-    questionnaire_data = submission.get("responses", {})
-    
-    if not isinstance(questionnaire_data, dict):
-        errors.append(f"Campo 'responses' debe ser un dict, recibido: {type(questionnaire_data)}")
-        return False, errors, {}
-    
-    if len(questionnaire_data) == 0:
-        errors.append("Campo 'responses' está vacío")
-        return False, errors, {}
-    
-    # 3. Validar campos requeridos MÍNIMOS
-    required_fields = {
-        "nombre_completo": "Nombre completo del cliente",
-        "email": "Email del cliente",
-        "fecha_nacimiento": "Fecha de nacimiento (YYYY-MM-DD)",
-        "sexo": "Sexo (Hombre/Mujer)",
-        "peso": "Peso en kg",
-        "altura_cm": "Altura en cm",
-        "objetivo_fisico": "Objetivo principal del entrenamiento"
-    }
-    
-    missing_required = []
-    empty_required = []
-    
-    for field, description in required_fields.items():
-        if field not in questionnaire_data:
-            missing_required.append(f"{field} ({description})")
-        elif not questionnaire_data[field]:
-            empty_required.append(f"{field} ({description})")
-    
-    if missing_required:
-        errors.append(f"Campos requeridos ausentes: {', '.join(missing_required)}")
-    
-    if empty_required:
-        errors.append(f"Campos requeridos vacíos: {', '.join(empty_required)}")
-    
-    # 4. Validar formatos específicos
-    if "fecha_nacimiento" in questionnaire_data and questionnaire_data["fecha_nacimiento"]:
-        try:
-            datetime.strptime(str(questionnaire_data["fecha_nacimiento"]), "%Y-%m-%d")
-        except ValueError:
-            errors.append(f"fecha_nacimiento debe estar en formato YYYY-MM-DD, recibido: {questionnaire_data['fecha_nacimiento']}")
-    
-    if "sexo" in questionnaire_data and questionnaire_data["sexo"]:
-        sexo_normalized = str(questionnaire_data["sexo"]).lower().strip()
-        valid_sexo = ["hombre", "mujer", "masculino", "femenino", "male", "female", "m", "f"]
-        if sexo_normalized not in valid_sexo:
-            errors.append(f"sexo debe ser 'Hombre' o 'Mujer', recibido: '{questionnaire_data['sexo']}'")
-    
-    # 5. Validar campos numéricos
-    numeric_fields = {
-        "peso": "Peso",
-        "altura_cm": "Altura"
-    }
-    
-    for field, name in numeric_fields.items():
-        if field in questionnaire_data and questionnaire_data[field]:
-            try:
-                value = float(str(questionnaire_data[field]))
-                if value <= 0:
-                    errors.append(f"{name} debe ser un número positivo, recibido: {questionnaire_data[field]}")
-            except (ValueError, TypeError):
-                errors.append(f"{name} debe ser un número válido, recibido: '{questionnaire_data[field]}'")
-    
-    is_valid = len(errors) == 0
-    
-    if not is_valid:
-        logger.error(f"❌ Validación de cuestionario falló:")
-        for error in errors:
-            logger.error(f"   - {error}")
-    
-    return is_valid, errors, questionnaire_data
-
-
-def _adapt_questionnaire_for_edn360(questionnaire_data: dict) -> dict:
-    """
-    Adapta el formato del cuestionario actual al formato esperado por E.D.N.360
-    Soporta tanto NutritionQuestionnaire como DiagnosisQuestionnaire
-    """
-    try:
-        from datetime import datetime
-        adapted = {}
-        
-        # === CAMPOS BÁSICOS - REQUERIDOS por E1 ===
-        
-        # NOMBRE: Buscar nombre_completo (NutritionQuestionnaire) o nombre (DiagnosisQuestionnaire)
-        adapted["nombre"] = questionnaire_data.get("nombre_completo") or questionnaire_data.get("nombre", "Usuario")
-        
-        # EDAD: Calcular desde fecha_nacimiento o usar edad directa
-        if "fecha_nacimiento" in questionnaire_data and questionnaire_data["fecha_nacimiento"]:
-            try:
-                # Calcular edad desde fecha de nacimiento
-                fecha_nac = questionnaire_data["fecha_nacimiento"]
-                if isinstance(fecha_nac, str):
-                    # Formato esperado: YYYY-MM-DD
-                    birth_date = datetime.strptime(fecha_nac, "%Y-%m-%d")
-                    today = datetime.now()
-                    edad = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-                    adapted["edad"] = edad
-                else:
-                    adapted["edad"] = 30
-            except Exception as e:
-                logger.warning(f"⚠️ Error calculando edad desde fecha_nacimiento: {e}")
-                adapted["edad"] = questionnaire_data.get("edad", 30)
-        else:
-            # Usar edad directa
-            edad_str = questionnaire_data.get("edad", "30")
-            try:
-                adapted["edad"] = int(edad_str.split()[0]) if isinstance(edad_str, str) else int(edad_str)
-            except:
-                adapted["edad"] = 30
-        
-        # SEXO: Normalizar a minúsculas y mapear
-        sexo_raw = questionnaire_data.get("sexo", "hombre")
-        if isinstance(sexo_raw, str):
-            sexo_normalized = sexo_raw.lower().strip()
-            # Mapear HOMBRE/MUJER a hombre/mujer
-            if sexo_normalized in ["hombre", "masculino", "male", "m"]:
-                adapted["sexo"] = "hombre"
-            elif sexo_normalized in ["mujer", "femenino", "female", "f"]:
-                adapted["sexo"] = "mujer"
-            else:
-                adapted["sexo"] = sexo_normalized
-        else:
-            adapted["sexo"] = "hombre"
-        
-        # PESO: Buscar 'peso' (NutritionQuestionnaire) o 'peso_actual_kg' (otros)
-        peso = questionnaire_data.get("peso") or questionnaire_data.get("peso_actual_kg")
-        try:
-            adapted["peso_actual_kg"] = float(peso) if peso else 70
-        except (ValueError, TypeError):
-            adapted["peso_actual_kg"] = 70
-            logger.warning(f"⚠️ Peso inválido '{peso}', usando default 70kg")
-        
-        # ALTURA: Buscar 'altura_cm' (presente en ambos cuestionarios)
-        altura = questionnaire_data.get("altura_cm")
-        try:
-            adapted["altura_cm"] = float(altura) if altura else 170
-        except (ValueError, TypeError):
-            adapted["altura_cm"] = 170
-            logger.warning(f"⚠️ Altura inválida '{altura}', usando default 170cm")
-        
-        # === OBJETIVO ===
-        # Buscar en varios campos posibles
-        objetivo = (questionnaire_data.get("objetivo_principal") or 
-                   questionnaire_data.get("objetivo") or 
-                   questionnaire_data.get("objetivos_deseados") or "")
-        
-        if "adelgazar" in objetivo.lower() or "perder" in objetivo.lower() or "bajar" in objetivo.lower():
-            adapted["objetivo_principal"] = "perdida_grasa"
-        elif "ganar" in objetivo.lower() or "musculo" in objetivo.lower() or "volumen" in objetivo.lower():
-            adapted["objetivo_principal"] = "ganancia_muscular"
-        elif "definir" in objetivo.lower() or "recomposicion" in objetivo.lower():
-            adapted["objetivo_principal"] = "recomposicion"
-        else:
-            adapted["objetivo_principal"] = objetivo or "mejora_general"
-        
-        # === EXPERIENCIA DE ENTRENAMIENTO ===
-        # NutritionQuestionnaire tiene campos más detallados
-        entrenado_gym = questionnaire_data.get("entrenado_gimnasio", "")
-        nivel_deporte = questionnaire_data.get("nivel_deporte", "")
-        constante_deporte = questionnaire_data.get("constante_deporte", "")
-        tiempo_dedicaba = questionnaire_data.get("tiempo_dedicaba", "")
-        entrena = questionnaire_data.get("entrena", "")
-        
-        # Construir experiencia desde múltiples campos
-        experiencia_parts = []
-        
-        # Priorizar nivel declarado
-        if nivel_deporte:
-            experiencia_parts.append(f"Nivel: {nivel_deporte}")
-        
-        if entrenado_gym:
-            experiencia_parts.append(f"Gimnasio: {entrenado_gym}")
-        
-        # CRÍTICO: Si tiene "tiempo_dedicaba" con volumen alto, es avanzado
-        if tiempo_dedicaba:
-            experiencia_parts.append(f"Dedicación previa: {tiempo_dedicaba}")
-            # Detectar señales de nivel avanzado/profesional
-            tiempo_lower = tiempo_dedicaba.lower()
-            if any(indicator in tiempo_lower for indicator in ["3h", "3 h", "4h", "4 h", "5 días", "6 días", "profesional", "culturista", "competición"]):
-                if not any("avanzado" in part.lower() or "profesional" in part.lower() for part in experiencia_parts):
-                    experiencia_parts.insert(0, "⚠️ NIVEL REAL: AVANZADO/PROFESIONAL (según dedicación histórica)")
-        
-        if constante_deporte:
-            experiencia_parts.append(f"Constancia: {constante_deporte}")
-        
-        if entrena:
-            experiencia_parts.append(entrena)
-        
-        if experiencia_parts:
-            adapted["experiencia_entrenamiento"] = ". ".join(experiencia_parts)
-        else:
-            if "no" in entrena.lower() or "nunca" in entrena.lower():
-                adapted["experiencia_entrenamiento"] = "principiante absoluto, sin experiencia previa"
-            elif "gym" in entrena.lower() or "gimnasio" in entrena.lower():
-                adapted["experiencia_entrenamiento"] = "experiencia en gimnasio"
-            else:
-                adapted["experiencia_entrenamiento"] = "principiante"
-        
-        # === HISTORIAL DE ENTRENAMIENTO ===
-        intentos = questionnaire_data.get("intentos_previos", "")
-        constante_deporte = questionnaire_data.get("constante_deporte", "")
-        tiempo_dedicaba = questionnaire_data.get("tiempo_dedicaba", "")
-        
-        historial_parts = []
-        if intentos:
-            historial_parts.append(f"Intentos previos: {intentos}")
-        if constante_deporte:
-            historial_parts.append(f"Constancia: {constante_deporte}")
-        if tiempo_dedicaba:
-            historial_parts.append(f"Tiempo dedicado: {tiempo_dedicaba}")
-        
-        adapted["historial_entrenamiento"] = ". ".join(historial_parts) if historial_parts else "sin historial previo"
-        
-        # === LESIONES Y LIMITACIONES ===
-        # Recopilar de múltiples fuentes
-        lesiones_parts = []
-        
-        # Dificultades (DiagnosisQuestionnaire)
-        dificultades = questionnaire_data.get("dificultades", [])
-        if isinstance(dificultades, list):
-            lesiones_parts.extend(dificultades)
-        elif dificultades:
-            lesiones_parts.append(str(dificultades))
-        
-        dificultades_otro = questionnaire_data.get("dificultades_otro", "")
-        if dificultades_otro:
-            lesiones_parts.append(dificultades_otro)
-        
-        # Campos de salud del NutritionQuestionnaire
-        problemas_musculares = questionnaire_data.get("problemas_musculares", "")
-        hernias = questionnaire_data.get("hernias_protusiones", "")
-        artrosis = questionnaire_data.get("artrosis", "")
-        
-        if problemas_musculares and problemas_musculares.lower() not in ["no", "ninguno"]:
-            lesiones_parts.append(f"Problemas musculares: {problemas_musculares}")
-        if hernias and hernias.lower() not in ["no", "ninguno"]:
-            lesiones_parts.append(f"Hernias/protusiones: {hernias}")
-        if artrosis and artrosis.lower() not in ["no", "ninguno"]:
-            lesiones_parts.append(f"Artrosis: {artrosis}")
-        
-        lesiones_str = ", ".join(lesiones_parts) if lesiones_parts else "ninguna"
-        adapted["lesiones_previas"] = lesiones_str
-        adapted["limitaciones"] = lesiones_str
-        
-        # === DISPONIBILIDAD ===
-        # NutritionQuestionnaire tiene campos específicos
-        dias_semana_entrenar = questionnaire_data.get("dias_semana_entrenar", "")
-        tiempo_sesion = questionnaire_data.get("tiempo_sesion", "")
-        tiempo_semanal = questionnaire_data.get("tiempo_semanal", "")
-        
-        # Intentar extraer de los campos específicos primero
-        import re
-        if dias_semana_entrenar:
-            try:
-                adapted["dias_semana"] = int(dias_semana_entrenar)
-            except (ValueError, TypeError):
-                adapted["dias_semana"] = 3
-        elif tiempo_semanal and ("días" in tiempo_semanal or "dias" in tiempo_semanal):
-            dias_match = re.search(r'(\d+)\s*d[íi]as?', tiempo_semanal, re.IGNORECASE)
-            adapted["dias_semana"] = int(dias_match.group(1)) if dias_match else 3
-        else:
-            adapted["dias_semana"] = 3
-        
-        if tiempo_sesion:
-            try:
-                # Puede venir como "60" o "60 min" o "60 minutos"
-                min_match = re.search(r'(\d+)', str(tiempo_sesion))
-                adapted["minutos_por_sesion"] = int(min_match.group(1)) if min_match else 60
-            except (ValueError, TypeError):
-                adapted["minutos_por_sesion"] = 60
-        elif tiempo_semanal and "min" in tiempo_semanal:
-            min_match = re.search(r'(\d+)\s*min', tiempo_semanal, re.IGNORECASE)
-            adapted["minutos_por_sesion"] = int(min_match.group(1)) if min_match else 60
-        else:
-            adapted["minutos_por_sesion"] = 60
-        
-        adapted["tiempo_disponible_semanal"] = f"{adapted['dias_semana']} días/semana, {adapted['minutos_por_sesion']} min/sesión"
-        
-        # === HORARIO DE ENTRENAMIENTO ===
-        horario_entrenar = questionnaire_data.get("entrena_manana_tarde", "")
-        if horario_entrenar:
-            if "mañana" in horario_entrenar.lower():
-                adapted["horario_preferido"] = "mañana"
-                adapted["horario_entrenamiento"] = "mañana"  # Para agentes de nutrición
-                adapted["hora_entreno"] = "08:00"  # Horario típico mañana
-            elif "tarde" in horario_entrenar.lower():
-                adapted["horario_preferido"] = "tarde"
-                adapted["horario_entrenamiento"] = "tarde"
-                adapted["hora_entreno"] = "18:00"  # Horario típico tarde
-            elif "noche" in horario_entrenar.lower():
-                adapted["horario_preferido"] = "noche"
-                adapted["horario_entrenamiento"] = "noche"
-                adapted["hora_entreno"] = "20:00"  # Horario típico noche
-            else:
-                adapted["horario_preferido"] = horario_entrenar
-                adapted["horario_entrenamiento"] = horario_entrenar
-                adapted["hora_entreno"] = "18:00"  # Default
-        else:
-            adapted["horario_preferido"] = "tarde"
-            adapted["horario_entrenamiento"] = "tarde"
-            adapted["hora_entreno"] = "18:00"
-        
-        # === HORARIOS DE COMIDAS ===
-        # Buscar horarios específicos en el cuestionario o usar defaults según horario de entreno
-        adapted["horario_desayuno"] = questionnaire_data.get("horario_desayuno", "08:00")
-        adapted["horario_comida"] = questionnaire_data.get("horario_comida", "14:00")
-        adapted["horario_cena"] = questionnaire_data.get("horario_cena", "21:00")
-        
-        # Número de comidas al día
-        num_comidas = questionnaire_data.get("comidas_dia", "") or questionnaire_data.get("numero_comidas", "")
-        try:
-            if isinstance(num_comidas, str):
-                # Extraer número de texto como "4 comidas" o "4"
-                import re
-                match = re.search(r'(\d+)', num_comidas)
-                adapted["numero_comidas"] = int(match.group(1)) if match else 4
-            else:
-                adapted["numero_comidas"] = int(num_comidas) if num_comidas else 4
-        except (ValueError, TypeError):
-            adapted["numero_comidas"] = 4
-        
-        # === EQUIPO DISPONIBLE ===
-        gimnasio_campo = questionnaire_data.get("gimnasio", "")
-        material_casa_campo = questionnaire_data.get("material_casa", "")
-        
-        if gimnasio_campo and gimnasio_campo.lower() not in ["no", "ninguno"]:
-            adapted["equipo_disponible"] = f"Gym: {gimnasio_campo}"
-        elif material_casa_campo and material_casa_campo.lower() not in ["no", "ninguno"]:
-            adapted["equipo_disponible"] = f"Casa con equipo: {material_casa_campo}"
-        elif "gym" in entrena.lower() or "gimnasio" in entrena.lower():
-            adapted["equipo_disponible"] = "gym completo"
-        elif "casa" in entrena.lower():
-            adapted["equipo_disponible"] = "casa con equipo básico"
-        else:
-            adapted["equipo_disponible"] = "gym completo"
-        
-        # === NUTRICIÓN ACTUAL ===
-        alimentacion = questionnaire_data.get("alimentacion", "")
-        comidas_dia = questionnaire_data.get("comidas_dia", "")
-        
-        nutricion_parts = []
-        if alimentacion:
-            nutricion_parts.append(alimentacion)
-        if comidas_dia:
-            nutricion_parts.append(f"Comidas al día: {comidas_dia}")
-        
-        adapted["nutricion_actual"] = ". ".join(nutricion_parts) if nutricion_parts else "sin seguimiento específico"
-        
-        # === CONDICIONES DE SALUD ===
-        # Recopilar condiciones del NutritionQuestionnaire
-        condiciones = []
-        
-        salud_info = questionnaire_data.get("salud_info", "")
-        if salud_info:
-            condiciones.append(salud_info)
-        
-        # Campos específicos de salud
-        medicamentos = questionnaire_data.get("medicamentos", "")
-        enfermedad_cronica = questionnaire_data.get("enfermedad_cronica", "")
-        hipertension = questionnaire_data.get("hipertension", "")
-        diabetes = questionnaire_data.get("diabetes", "")
-        
-        if medicamentos and medicamentos.lower() not in ["no", "ninguno"]:
-            condiciones.append(f"Medicamentos: {medicamentos}")
-        if enfermedad_cronica and enfermedad_cronica.lower() not in ["no", "ninguno"]:
-            condiciones.append(f"Enfermedad crónica: {enfermedad_cronica}")
-        if hipertension and hipertension.lower() == "sí":
-            condiciones.append("Hipertensión")
-        if diabetes and diabetes.lower() == "sí":
-            condiciones.append("Diabetes")
-        
-        adapted["condiciones_salud"] = ", ".join(condiciones) if condiciones else "sin condiciones especiales"
-        
-        # === MOTIVACIÓN ===
-        por_que_ahora = questionnaire_data.get("por_que_ahora", "")
-        objetivo_entrenamiento = questionnaire_data.get("objetivo_entrenamiento", "")
-        
-        motivacion_parts = []
-        if por_que_ahora:
-            motivacion_parts.append(por_que_ahora)
-        if objetivo_entrenamiento:
-            motivacion_parts.append(objetivo_entrenamiento)
-        
-        adapted["motivacion"] = ". ".join(motivacion_parts) if motivacion_parts else "mejorar salud y físico"
-        adapted["nivel_compromiso"] = questionnaire_data.get("dispuesto_invertir", "") or questionnaire_data.get("nivel_compromiso", "medio")
-        
-        # === DATOS ADICIONALES ===
-        # Intentar extraer de campos específicos
-        horas_sueno = questionnaire_data.get("horas_sueno", "")
-        estres = questionnaire_data.get("estres_profesion", "")
-        
-        try:
-            adapted["sueno_promedio_h"] = int(horas_sueno) if horas_sueno else 7
-        except (ValueError, TypeError):
-            adapted["sueno_promedio_h"] = 7
-        
-        if estres:
-            if "alto" in estres.lower() or "mucho" in estres.lower():
-                adapted["estres_nivel"] = "alto"
-            elif "bajo" in estres.lower() or "poco" in estres.lower():
-                adapted["estres_nivel"] = "bajo"
-            else:
-                adapted["estres_nivel"] = "medio"
-        else:
-            adapted["estres_nivel"] = "medio"
-        
-        # Copiar todos los campos originales también
-        adapted["_original_questionnaire"] = questionnaire_data
-        
-        # === LOGGING DETALLADO ===
-        logger.info(f"✅ Cuestionario adaptado para E.D.N.360")
-        logger.info(f"   📋 CAMPOS CRÍTICOS (requeridos por E1):")
-        logger.info(f"      - nombre: {adapted['nombre']}")
-        logger.info(f"      - edad: {adapted['edad']}")
-        logger.info(f"      - sexo: {adapted['sexo']}")
-        logger.info(f"      - peso_actual_kg: {adapted['peso_actual_kg']}")
-        logger.info(f"      - altura_cm: {adapted['altura_cm']}")
-        logger.info(f"   🎯 Objetivo: {adapted['objetivo_principal']}")
-        logger.info(f"   📅 Disponibilidad: {adapted['dias_semana']} días x {adapted['minutos_por_sesion']} min")
-        logger.info(f"   ⏰ Horario entreno: {adapted['horario_entrenamiento']} ({adapted['hora_entreno']})")
-        logger.info(f"   🍽️ Comidas/día: {adapted['numero_comidas']}")
-        logger.info(f"   🏋️ Experiencia: {adapted['experiencia_entrenamiento'][:50]}...")
-        logger.info(f"   🏥 Lesiones: {adapted['lesiones_previas'][:50]}...")
-        
-        return adapted
-        
-    except Exception as e:
-        logger.error(f"❌ Error adaptando cuestionario: {e}")
-        logger.error(f"   Datos recibidos: {list(questionnaire_data.keys())}")
-        # Devolver datos mínimos para que no falle
-        return {
-            "nombre": questionnaire_data.get("nombre", "Usuario"),
-            "edad": 30,
-            "sexo": "hombre",
-            "peso_actual_kg": 70,
-            "altura_cm": 170,
-            "objetivo_principal": "mejora_general",
-            "experiencia_entrenamiento": "principiante",
-            "lesiones_previas": "ninguna",
-            "tiempo_disponible_semanal": "3 días, 60 min",
-            "dias_semana": 3,
-            "minutos_por_sesion": 60,
-            "equipo_disponible": "gym completo",
-            "_original_questionnaire": questionnaire_data
-        }
-
-def _format_edn360_nutrition_as_text(edn360_data: dict, user_name: str = "Cliente", numero_mes: int = None) -> str:
+def _format_edn360_nutrition_as_text(edn360_data: dict, user_name: str = "Cliente", numero_mes: int = None) -> str:
     """
     Convierte el plan E.D.N.360 de nutrición en texto profesional para enviar al cliente
     """
@@ -8025,9 +7482,8 @@ async def _integrate_template_blocks(
     
     # Import new templates (Fase 6)
     try:
-        from templates.block_a_warmup import generate_warmup_block
-        from templates.block_c_core import generate_core_block
-        from templates.block_d_cardio import generate_cardio_block
+        # Bloques memorizados (templates.block_cache): solo lectura, thaw() para copiarlos
+        from templates.block_cache import get_warmup_block, get_core_block, get_cardio_block, thaw
         logger.info("✅ Nuevos templates A, C, D importados correctamente")
     except ImportError as e:
         logger.error(f"❌ Error importando templates: {e}")
@@ -8083,7 +7539,7 @@ async def _integrate_template_blocks(
         
         # BLOCK A - Warmup
         try:
-            block_a_data = generate_warmup_block(
+            block_a_data = get_warmup_block(
                 training_focus=training_focus,
                 nivel=nivel,
                 injuries=injuries,
@@ -8107,7 +7563,7 @@ async def _integrate_template_blocks(
         
         # BLOCK C - Core
         try:
-            block_c_data = generate_core_block(
+            block_c_data = get_core_block(
                 nivel=nivel,
                 objetivo=objetivo,
                 volumen_bloque_b=volumen_b,
@@ -8121,7 +7577,7 @@ async def _integrate_template_blocks(
         
         # BLOCK D - Cardio
         try:
-            block_d_data = generate_cardio_block(
+            block_d_data = get_cardio_block(
                 objetivo=objetivo,
                 nivel=nivel,
                 volumen_bloque_b=volumen_b,
@@ -8137,11 +7593,11 @@ async def _integrate_template_blocks(
         # ============================================
         # BLOQUE B: FUERZA (DEL E4) - ENRIQUECIDO
         # ============================================
-        from exercise_catalog_loader import get_exercise_by_code, get_variants_by_code, load_exercise_catalog
+        from exercise_catalog_loader import get_exercise_by_code
+        from exercise_code_resolver import get_exercise_code_resolver
         
-        # Cargar todos los códigos del catálogo para fuzzy matching
-        full_catalog = load_exercise_catalog()
-        all_catalog_codes = [ex['exercise_code'] for ex in full_catalog]
+        # Resolver de códigos E4 → catálogo (índice de trigramas + memo persistente)
+        code_resolver = get_exercise_code_resolver()
         
         def format_exercise_name(exercise_code: str) -> str:
             """Formatea exercise_code a nombre legible en español"""
@@ -8178,77 +7634,6 @@ async def _integrate_template_blocks(
             formatted = ' '.join(word.capitalize() for word in formatted.split())
             return formatted
         
-        def map_generic_to_catalog_code(generic_code: str, catalog_all_codes: list) -> str:
-            """
-            Mapea códigos genéricos de E4 a códigos específicos del catálogo.
-            
-            Estrategia:
-            1. Normalizar código (lowercase, sin tildes)
-            2. Mapeo manual explícito para códigos legacy (prioridad alta)
-            3. Fuzzy matching como fallback para planes antiguos
-            
-            NOTA: E4 v2 CANÓNICO ya está 100% alineado con el catálogo backend.
-            Este mapeo se mantiene solo para retrocompatibilidad con planes antiguos.
-            """
-            # Normalizar código de entrada
-            normalized_code = generic_code.lower().strip()
-            
-            # MAPEO MANUAL EXPLÍCITO (prioridad)
-            manual_mapping = {
-                # Press variants
-                'press_mancuernas': 'press_suelo_mancuernas',
-                'press_polea': 'press_pecho_cable',
-                'fonds_triceps_suelo': 'fondos_triceps_suelo_pies_elevados',
-                
-                # Aperturas
-                'aperturas_polea': 'aperturas_medias_poleas',
-                
-                # Jalones y remos
-                'jalon_supino_maquina': 'jalon_agarre_supino',
-                'remo_bajo_maquina': 'remo_bajo_agarre_neutro',
-                'jalon_banda': 'jalon_banda_elastica',
-                
-                # Dominadas
-                'dominadas': 'dominadas_barra_fija',
-                
-                # Curl
-                'curl_biceps': 'curl_biceps_barra',
-                
-                # Piernas
-                'sentadilla_barra': 'sentadilla_barra_high_bar',
-                'hip_thrust_smith': 'hip_thrust_maquina_smith',
-                'sentadilla_bulgara': 'sentadilla_bulgara_peso_corporal',
-                'peso_muerto_smith': 'peso_muerto_rumano_smith',
-                'gemelos': 'gemelos_de_pie_unipodal',
-                
-                # Elevaciones
-                'elevaciones_laterales_maquina': 'elevaciones_laterales_maquina_convergente',
-                
-                # Core
-                'core_antiextension': 'plancha_frontal',
-                'core_antirotacion': 'plancha_lateral',
-            }
-            
-            # 1. Intento con mapeo manual (solo para códigos legacy)
-            if normalized_code in manual_mapping:
-                return manual_mapping[normalized_code]
-            
-            # 2. Fuzzy matching (fallback para planes antiguos)
-            # E4 v2 CANÓNICO ya genera códigos perfectos, esto solo aplica a planes legacy
-            from difflib import get_close_matches
-            
-            # Buscar match cercano en catálogo (threshold 0.6 = 60% similitud)
-            close_matches = get_close_matches(normalized_code, catalog_all_codes, n=1, cutoff=0.6)
-            
-            if close_matches:
-                matched_code = close_matches[0]
-                logger.info(f"  🔍 Fuzzy match (legacy): {generic_code} → {matched_code}")
-                return matched_code
-            
-            # 3. Si no hay match, devolver el código normalizado (será enriquecido con fallback)
-            logger.warning(f"  ⚠️ Sin match para: {generic_code} (normalizado: {normalized_code})")
-            return normalized_code
-        
         all_exercises = []
         exercise_counter = 1
         
@@ -8262,8 +7647,8 @@ async def _integrate_template_blocks(
                 if exercise_types and len(exercise_types) > 0:
                     exercise_code = exercise_types[0]
                     
-                    # Mapear código genérico a código del catálogo (con fuzzy matching)
-                    catalog_code = map_generic_to_catalog_code(exercise_code, all_catalog_codes)
+                    # Mapear código genérico a código del catálogo (mapeo legacy / fuzzy matching)
+                    catalog_code = code_resolver.resolve(exercise_code)
                     exercise_copy['exercise_code'] = catalog_code
                     
                     # Buscar en catálogo enriquecido
@@ -8336,14 +7721,19 @@ async def _integrate_template_blocks(
                 'id': 'D',
                 'nombre': block_d_data.get('block_name', 'Cardio'),
                 'tipo': 'cardio',
-                'recomendaciones': block_d_data.get('recommendations', []),
-                'general_notes': block_d_data.get('general_notes', [])
+                # Copias: el bloque cacheado se comparte entre sesiones y planes
+                'recomendaciones': thaw(block_d_data.get('recommendations', [])),
+                'general_notes': thaw(block_d_data.get('general_notes', []))
             }
         }
         
         session_number += 1
         logger.info(f"✅ Sesión '{session.get('name')}': Bloques A, B, C, D integrados con nuevos templates")
     
+    # Persistir las resoluciones de códigos nuevas (solo escribe si las hubo)
+    from exercise_code_resolver import get_exercise_code_resolver
+    get_exercise_code_resolver().save_memo()
+    
     return plan_data
 
 
@@ -8445,38 +7835,15 @@ async def admin_generate_training_plan(
             if submission["user_id"] != user_id:
                 raise HTTPException(status_code=403, detail="El cuestionario no pertenece a este usuario")
             
-            questionnaire_data = submission["responses"]
-            context_data = None
-            
         elif source_type == "followup":
             # Generar desde follow-up
-            followup = await db.follow_up_submissions.find_one({"_id": source_id})
+            submission = await db.follow_up_submissions.find_one({"_id": source_id})
             
-            if not followup:
+            if not submission:
                 raise HTTPException(status_code=404, detail="Follow-up no encontrado")
             
-            if followup["user_id"] != user_id:
+            if submission["user_id"] != user_id:
                 raise HTTPException(status_code=403, detail="El follow-up no pertenece a este usuario")
-            
-            # Obtener cuestionario inicial
-            initial_submission = await db.nutrition_questionnaire_submissions.find_one(
-                {"user_id": user_id},
-                sort=[("submitted_at", 1)]
-            )
-            
-            if not initial_submission:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No se encontró cuestionario inicial para contexto"
-                )
-            
-            questionnaire_data = initial_submission["responses"]
-            # Serializar datetime fields del followup antes de usar
-            followup_serialized = _serialize_datetime_fields(followup)
-            context_data = {
-                "followup_responses": followup_serialized.get("responses", {}),
-                "ai_analysis": followup_serialized.get("ai_analysis", "")
-            }
         else:
             raise HTTPException(status_code=400, detail="source_type debe ser 'initial' o 'followup'")
         
@@ -8507,16 +7874,15 @@ async def admin_generate_training_plan(
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        # Adaptar cuestionario al formato E.D.N.360
-        # Si es followup, mezclar datos del inicial con actualizaciones del followup
-        if source_type == "followup" and context_data:
-            # Combinar datos base del inicial con actualizaciones del followup
-            merged_data = questionnaire_data.copy()
-            merged_data.update(context_data.get("followup_responses", {}))
-            adapted_questionnaire = _adapt_questionnaire_for_edn360(merged_data)
+        # Cuestionario en formato E.D.N.360 (precalculado en el envío)
+        # Si es followup, es la mezcla del inicial con las actualizaciones del followup
+        normalized = await get_normalized_questionnaire(db, submission, is_followup=source_type == "followup")
+        if not normalized["adapted"]:
+            raise HTTPException(status_code=404, detail="No se encontró cuestionario inicial para contexto")
+        adapted_questionnaire = normalized["adapted"]
+        questionnaire_data = adapted_questionnaire.get("_original_questionnaire") or submission["responses"]
+        if source_type == "followup":
             logger.info(f"📋 Usando datos combinados: cuestionario inicial + actualizaciones de follow-up")
-        else:
-            adapted_questionnaire = _adapt_questionnaire_for_edn360(questionnaire_data)
         
         # Obtener plan previo si se especificó (para progresión)
         previous_plan_data = None
@@ -8683,14 +8049,22 @@ async def get_user_training_plans(user_id: str, request: Request):
         {"user_id": user_id}
     ).sort("generated_at", -1).to_list(length=1000)
     
-    # Obtener información de PDFs asociados y convertir _id a id
+    # Obtener información de PDFs asociados (una sola consulta) y convertir _id a id
+    pdf_ids = [plan["pdf_id"] for plan in plans if plan.get("pdf_id")]
+    pdfs_by_id = {}
+    if pdf_ids:
+        pdfs = await db.pdfs.find(
+            {"_id": {"$in": pdf_ids}},
+            {"filename": 1, "file_path": 1}
+        ).to_list(length=len(pdf_ids))
+        pdfs_by_id = {pdf["_id"]: pdf for pdf in pdfs}
+    
     for plan in plans:
         plan["id"] = str(plan["_id"])  # Convert _id to id for frontend
-        if plan.get("pdf_id"):
-            pdf = await db.pdfs.find_one({"_id": plan["pdf_id"]})
-            if pdf:
-                plan["pdf_filename"] = pdf.get("filename")
-                plan["pdf_url"] = pdf.get("file_path")
+        pdf = pdfs_by_id.get(plan.get("pdf_id"))
+        if pdf:
+            plan["pdf_filename"] = pdf.get("filename")
+            plan["pdf_url"] = pdf.get("file_path")
     
     return {
         "success": True,
@@ -8748,8 +8122,8 @@ async def delete_training_plan(user_id: str, plan_id: str, request: Request = No
         
         # Eliminar PDF asociado si existe
         if plan.get("pdf_id"):
-            pdf_result = await db.pdfs.delete_one({"_id": plan["pdf_id"]})
-            logger.info(f"🗑️ PDF asociado eliminado: {pdf_result.deleted_count} documento(s)")
+            await delete_pdf_document(db, plan["pdf_id"])
+            logger.info(f"🗑️ PDF asociado eliminado: {plan['pdf_id']}")
         
         # Eliminar el plan de entrenamiento
         result = await db.training_plans.delete_one({"_id": plan_id})
@@ -8793,9 +8167,6 @@ async def generate_training_pdf(user_id: str, plan_id: str, request: Request = N
         raise HTTPException(status_code=404, detail="Plan de entrenamiento no encontrado")
     
     try:
-        from weasyprint import HTML
-        import io
-        
         # Get plan content with proper fallback chain
         plan_content = plan.get("plain_text_content", "") or plan.get("plan_text", "")
         
@@ -8950,14 +8321,15 @@ async def generate_training_pdf(user_id: str, plan_id: str, request: Request = N
             </div>
             <div class="footer">
                 <p>Jorge Calcerrada - Entrenador Personal</p>
-                <p>Plan generado el {datetime.now(timezone.utc).strftime('%d/%m/%Y')}</p>
+                <p>Plan generado el {_pdf_date(plan.get('generated_at') or plan.get('created_at'))}</p>
             </div>
         </body>
         </html>
         """
         
-        # Generate PDF content
-        pdf_content = HTML(string=html_template).write_pdf()
+        # Generate PDF content (pool de procesos + cache por contenido)
+        content_hash = compute_pdf_content_hash("training", user_id, html_template)
+        pdf_content = await render_pdf(html_template, content_hash=content_hash, db=db, user_id=user_id)
         
         # Create standardized PDF document
         pdf_title = f"Plan de Entrenamiento - {month_names[month]} {year}"
@@ -8969,7 +8341,8 @@ async def generate_training_pdf(user_id: str, plan_id: str, request: Request = N
             content=pdf_content,
             pdf_type="training",
             related_id=plan_id,
-            filename=pdf_filename
+            filename=pdf_filename,
+            content_hash=content_hash
         )
         
         # Actualizar plan con referencia al PDF (intentar ambas colecciones)
@@ -9005,6 +8378,8 @@ async def generate_training_pdf(user_id: str, plan_id: str, request: Request = N
             "filename": pdf_filename
         }
         
+    except PDFRenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error generando PDF de entrenamiento: {e}")
         raise HTTPException(
@@ -9258,7 +8633,8 @@ from google_calendar_service import (
     create_calendar_event,
     list_upcoming_events,
     delete_calendar_event,
-    update_calendar_event
+    update_calendar_event,
+    shutdown_calendar_executor
 )
 from fastapi.responses import RedirectResponse
 
@@ -9345,21 +8721,30 @@ async def create_event(request: Request, event_data: dict):
         start_dt = datetime.fromisoformat(event_data["start"].replace('Z', '+00:00'))
         end_dt = datetime.fromisoformat(event_data["end"].replace('Z', '+00:00'))
         
-        # Crear evento
+        # Sesión recurrente: un evento con regla semanal de repeat_weeks
+        repeat_weeks = int(event_data.get("repeat_weeks") or 1)
+        if repeat_weeks < 1 or repeat_weeks > 52:
+            raise HTTPException(status_code=400, detail="repeat_weeks debe estar entre 1 y 52")
+        
         result = await create_calendar_event(
             tokens=tokens,
+            admin_key=admin_email,
             summary=event_data["title"],
             start_datetime=start_dt,
             end_datetime=end_dt,
             attendee_email=client_email,
-            description=event_data.get("description")
+            description=event_data.get("description"),
+            repeat_weeks=repeat_weeks
         )
         
         # Actualizar tokens si se refrescaron
         if result.get("updated_tokens"):
             await db.calendar_config.update_one(
                 {"admin_email": admin_email},
-                {"$set": {"google_tokens": result["updated_tokens"]}}
+                {"$set": {
+                    "google_tokens.access_token": result["updated_tokens"]["access_token"],
+                    "google_tokens.refresh_token": result["updated_tokens"]["refresh_token"]
+                }}
             )
         
         return {
@@ -9368,6 +8753,8 @@ async def create_event(request: Request, event_data: dict):
             "html_link": result["event"].get("htmlLink")
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating calendar event: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -9386,7 +8773,7 @@ async def get_upcoming_events(request: Request):
             return {"connected": False, "events": []}
         
         tokens = config["google_tokens"]
-        events = await list_upcoming_events(tokens, max_results=30)
+        events = await list_upcoming_events(tokens, admin_email, max_results=30)
         
         return {
             "connected": True,
@@ -9411,7 +8798,7 @@ async def delete_event(request: Request, event_id: str):
             raise HTTPException(status_code=400, detail="Calendar not connected")
         
         tokens = config["google_tokens"]
-        success = await delete_calendar_event(tokens, event_id)
+        success = await delete_calendar_event(tokens, admin_email, event_id)
         
         if success:
             return {"success": True}
@@ -9440,6 +8827,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Has-More", "X-Total-Count"],
 )
 
 
@@ -9658,6 +9046,7 @@ async def submit_follow_up(follow_up: FollowUpSubmit, request: Request):
         
         await db.follow_up_submissions.insert_one(follow_up_doc)
         logger.info(f"✅ Follow-up guardado en BD Web: {follow_up_id} (user_id: {user_id})")
+        await normalize_questionnaire_safe(db, follow_up_doc, is_followup=True)
         
         # Desactivar el botón de seguimiento después de completar
         await db.users.update_one(
@@ -9670,6 +9059,7 @@ async def submit_follow_up(follow_up: FollowUpSubmit, request: Request):
                 }
             }
         )
+        await refresh_review_entry_safe(db, user_id)
         
         # Crear alerta para el admin
         admin_user = await db.users.find_one({"role": "admin"})
@@ -9965,20 +9355,9 @@ Genera el análisis en español, con formato markdown para facilitar la lectura.
         
         logger.info(f"Generating AI analysis for follow-up {followup_id} of user {user_id}")
         
-        # Llamar a la IA usando OpenAI directamente
-        from openai import AsyncOpenAI
-        import os
-        
-        # Obtener la clave de OpenAI
-        openai_key = os.environ.get('OPENAI_API_KEY')
-        
-        # Crear el cliente de OpenAI
-        client = AsyncOpenAI(api_key=openai_key)
-        
-        # Llamar a la API de OpenAI GPT-4o
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        # Llamar a la IA (cliente OpenAI compartido del llm_gateway)
+        ai_analysis = await chat_completion(
+            [
                 {
                     "role": "system",
                     "content": "Eres un entrenador personal experto analizando el progreso de un cliente después de seguir un plan de nutrición."
@@ -9988,13 +9367,10 @@ Genera el análisis en español, con formato markdown para facilitar la lectura.
                     "content": prompt
                 }
             ],
-            temperature=0.7,
-            max_tokens=2000,
-            timeout=120
+            operation="follow_up_analysis",
+            max_tokens=2000
         )
         
-        ai_analysis = response.choices[0].message.content
-        
         # Guardar el análisis en el seguimiento
         await db.follow_up_submissions.update_one(
             {"_id": followup_id},
@@ -10168,6 +9544,7 @@ async def generate_plan_from_follow_up(user_id: str, followup_id: str, request:
                 }
             }
         )
+        await refresh_review_entry_safe(db, user_id)
         
         # Actualizar el seguimiento con el ID del nuevo plan
         await db.follow_up_submissions.update_one(
@@ -10489,7 +9866,7 @@ async def generate_followup_analysis_pdf(user_id: str, followup_id: str, request
             
             <div class="client-info">
                 <strong>Cliente:</strong> {user.get('name', 'Cliente')}<br>
-                <strong>Fecha de análisis:</strong> {datetime.now(timezone.utc).strftime("%d de %B de %Y")}
+                <strong>Fecha de análisis:</strong> {_pdf_date(follow_up.get("updated_at"), "%d de %B de %Y")}
             </div>
             
             <div class="content">
@@ -10504,14 +9881,9 @@ async def generate_followup_analysis_pdf(user_id: str, followup_id: str, request
         </html>
         """
         
-        # Generar PDF usando WeasyPrint
-        from weasyprint import HTML
-        import io
-        
-        pdf_buffer = io.BytesIO()
-        HTML(string=html_template).write_pdf(pdf_buffer)
-        pdf_buffer.seek(0)
-        pdf_content = pdf_buffer.read()
+        # Generar PDF (pool de procesos + cache por contenido)
+        content_hash = compute_pdf_content_hash("follow_up_analysis", user_id, html_template)
+        pdf_content = await render_pdf(html_template, content_hash=content_hash, db=db, user_id=user_id)
         
         # Guardar el PDF en la base de datos
         pdf_id = str(datetime.now(timezone.utc).timestamp()).replace('.', '')
@@ -10524,7 +9896,8 @@ async def generate_followup_analysis_pdf(user_id: str, followup_id: str, request
             content=pdf_content,
             pdf_type="follow_up_analysis",
             related_id=followup_id,
-            filename=f"{pdf_title}.pdf"
+            filename=f"{pdf_title}.pdf",
+            content_hash=content_hash
         )
         
         logger.info(f"Follow-up analysis PDF generated: {pdf_id} for user {user_id}")
@@ -10537,6 +9910,8 @@ async def generate_followup_analysis_pdf(user_id: str, followup_id: str, request
         
     except HTTPException:
         raise
+    except PDFRenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating follow-up analysis PDF: {e}")
         raise HTTPException(
@@ -10546,67 +9921,23 @@ async def generate_followup_analysis_pdf(user_id: str, followup_id: str, request
 
 
 @api_router.get("/admin/pending-reviews")
-async def get_pending_reviews(request: Request):
+async def get_pending_reviews(
+    request: Request,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+):
     """
     Admin obtiene lista de clientes que necesitan revisión de seguimiento
-    (>= 30 días desde último plan y no han completado seguimiento)
+    (>= 30 días desde último plan), servida desde review_queue
     """
     await require_admin(request)
     
+    if status and status not in REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status debe ser uno de: {', '.join(REVIEW_STATUSES)}")
+    
     try:
-        pending_reviews = []
-        
-        # Obtener todos los clientes team con plan de nutrición
-        team_clients = await db.users.find({
-            "subscription.plan": "team",
-            "nutrition_plan": {"$exists": True}
-        }).to_list(1000)
-        
-        for client in team_clients:
-            # Calcular días desde el último plan
-            if client.get("nutrition_plan") and client["nutrition_plan"].get("generated_at"):
-                plan_date = client["nutrition_plan"]["generated_at"]
-                days_since_plan = (datetime.now(timezone.utc) - plan_date).days
-                
-                if days_since_plan >= 30:
-                    # Verificar si tiene seguimiento completado reciente
-                    recent_followup = await db.follow_up_submissions.find_one({
-                        "user_id": client["_id"],
-                        "submission_date": {"$gte": plan_date}
-                    })
-                    
-                    # Determinar estado
-                    if recent_followup:
-                        status = "completed"
-                        status_date = recent_followup["submission_date"]
-                    elif client.get("followup_activated"):
-                        status = "activated"
-                        status_date = client.get("followup_activated_at")
-                    else:
-                        status = "pending"
-                        status_date = None
-                    
-                    pending_reviews.append({
-                        "user_id": client["_id"],
-                        "name": client.get("name", "Usuario"),
-                        "email": client.get("email"),
-                        "phone": client.get("phone"),
-                        "days_since_plan": days_since_plan,
-                        "last_plan_date": plan_date.isoformat(),
-                        "status": status,
-                        "status_date": status_date.isoformat() if status_date else None,
-                        "followup_activated": client.get("followup_activated", False),
-                        "last_followup_id": recent_followup["_id"] if recent_followup else None
-                    })
-        
-        # Ordenar por días transcurridos (más urgentes primero)
-        pending_reviews.sort(key=lambda x: x["days_since_plan"], reverse=True)
-        
-        return {
-            "pending_reviews": pending_reviews,
-            "count": len(pending_reviews)
-        }
-        
+        return await get_review_queue(db, status=status, skip=max(skip, 0), limit=max(1, min(limit, 500)))
     except Exception as e:
         logger.error(f"Error getting pending reviews: {e}")
         raise HTTPException(status_code=500, detail=f"Error al obtener revisiones pendientes: {str(e)}")
@@ -10636,6 +9967,7 @@ async def activate_followup(user_id: str, request: Request):
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         logger.info(f"Follow-up activated for user {user_id} by admin")
+        await refresh_review_entry_safe(db, user_id)
         
         return {
             "success": True,
@@ -10672,6 +10004,7 @@ async def deactivate_followup(user_id: str, request: Request):
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         logger.info(f"Follow-up deactivated for user {user_id} by admin")
+        await refresh_review_entry_safe(db, user_id)
         
         return {
             "success": True,
@@ -10891,6 +10224,7 @@ async def get_checkout_status(
             )
             
             logger.info(f"Payment succeeded and subscription activated for user {transaction['user_id']}")
+            await refresh_review_entry_safe(db, transaction["user_id"])
         
         return {
             "session_id": session_id,
@@ -11332,55 +10666,191 @@ async def get_financial_overview(
         raise HTTPException(status_code=500, detail=f"Error al obtener métricas financieras: {str(e)}")
 
 
+def _encode_payments_cursor(date_value: str, item_id: str) -> str:
+    raw = json.dumps([date_value, item_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_payments_cursor(cursor: str) -> tuple:
+    try:
+        date_value, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(date_value), str(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def _parse_day(value: Optional[str], field: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} debe ser una fecha ISO (YYYY-MM-DD)")
+
+
+def _payments_match(date_field: str, id_field: str, date_from: Optional[str], date_to: Optional[str],
+                    after: Optional[tuple]) -> dict:
+    """
+    Filtro de rango de fechas + keyset (date, id) descendente.
+    Las fechas de pagos son strings ISO, comparables lexicográficamente.
+    """
+    match = {}
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lt"] = date_to
+    if date_range:
+        match[date_field] = date_range
+    if after:
+        after_date, after_id = after
+        match["$or"] = [
+            {date_field: {"$lt": after_date}},
+            {date_field: after_date, id_field: {"$lt": after_id}}
+        ]
+    return match
+
+
 @api_router.get("/admin/all-payments")
 async def get_all_payments(
     current_user_id: str = Depends(get_current_user_id),
     status: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    include_manual: bool = False
 ):
     """
     Obtiene todos los pagos del sistema para el admin con filtros opcionales
+
+    - Paginación por cursor (keyset sobre fecha + id): usar next_cursor de la respuesta
+    - date_from / date_to: rango de fechas (YYYY-MM-DD, ambos inclusive)
+    - include_manual: mezcla payment_transactions y manual_payments en un único
+      listado ordenado por fecha (los pagos manuales cuentan como succeeded)
     """
     try:
         # Verificar que es admin (_id es un string)
-        user = await db.users.find_one({"_id": current_user_id})
+        user = await db.users.find_one({"_id": current_user_id}, {"role": 1})
         if not user or user.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Acceso denegado")
         
+        limit = min(max(limit, 1), 1000)
+        after = _decode_payments_cursor(cursor) if cursor else None
+        
+        start_day = _parse_day(date_from, "date_from")
+        end_day = _parse_day(date_to, "date_to")
+        range_from = start_day.date().isoformat() if start_day else None
+        range_to = (end_day + timedelta(days=1)).date().isoformat() if end_day else None
+        
         # Construir query con filtros
-        query = {}
+        query = _payments_match("created_at", "transaction_id", range_from, range_to, after)
         if status:
             query["payment_status"] = status
         
-        # Obtener pagos
-        payments_cursor = db.payment_transactions.find(query).sort("created_at", -1).limit(limit)
-        payments = await payments_cursor.to_list(length=limit)
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"created_at": -1, "transaction_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {
+                "_id": 0,
+                "source": "stripe",
+                "transaction_id": 1,
+                "date": "$created_at",
+                "amount": 1,
+                "currency": 1,
+                "status": "$payment_status",
+                "user_id": 1,
+                "user_email": 1,
+                "session_id": 1,
+                "subscription_id": 1
+            }}
+        ]
+        
+        # Los pagos manuales no tienen estado: solo entran si no se filtra o se filtra por succeeded
+        if include_manual and status in (None, "succeeded"):
+            pipeline.append({"$unionWith": {
+                "coll": "manual_payments",
+                "pipeline": [
+                    {"$match": _payments_match("fecha", "_id", range_from, range_to, after)},
+                    {"$sort": {"fecha": -1, "_id": -1}},
+                    {"$limit": limit + 1},
+                    {"$project": {
+                        "_id": 0,
+                        "source": "manual",
+                        "transaction_id": "$_id",
+                        "date": "$fecha",
+                        "amount": 1,
+                        "currency": "EUR",
+                        "status": "succeeded",
+                        "concepto": 1,
+                        "metodo_pago": 1,
+                        "notas": 1
+                    }}
+                ]
+            }})
+            pipeline.extend([
+                {"$sort": {"date": -1, "transaction_id": -1}},
+                {"$limit": limit + 1}
+            ])
+        
+        payments = await db.payment_transactions.aggregate(pipeline).to_list(length=limit + 1)
+        has_more = len(payments) > limit
+        payments = payments[:limit]
+        
+        # Enriquecer con datos de usuario (una sola consulta $in)
+        user_ids = list({p["user_id"] for p in payments if p.get("user_id")})
+        users_by_id = {}
+        if user_ids:
+            users = await db.users.find({"_id": {"$in": user_ids}}, {"name": 1}).to_list(length=len(user_ids))
+            users_by_id = {u["_id"]: u for u in users}
         
-        # Enriquecer con datos de usuario
         enriched_payments = []
         for payment in payments:
-            # Buscar usuario
-            user_data = await db.users.find_one({"_id": payment["user_id"]})
-            
-            payment_item = {
-                "transaction_id": payment["transaction_id"],
-                "date": payment["created_at"],
-                "amount": payment["amount"],
-                "currency": payment["currency"],
-                "status": payment["payment_status"],
-                "user_name": user_data.get("name", "Usuario Desconocido") if user_data else "Usuario Desconocido",
-                "user_email": payment["user_email"],
-                "session_id": payment.get("session_id"),
-                "subscription_id": payment.get("subscription_id")
-            }
+            if payment["source"] == "manual":
+                payment_item = {
+                    "transaction_id": payment["transaction_id"],
+                    "source": "manual",
+                    "date": payment.get("date"),
+                    "amount": payment.get("amount"),
+                    "currency": payment["currency"],
+                    "status": payment["status"],
+                    "user_name": payment.get("concepto", ""),
+                    "user_email": None,
+                    "metodo_pago": payment.get("metodo_pago"),
+                    "notas": payment.get("notas", "")
+                }
+            else:
+                user_data = users_by_id.get(payment.get("user_id"))
+                payment_item = {
+                    "transaction_id": payment["transaction_id"],
+                    "source": "stripe",
+                    "date": payment["date"],
+                    "amount": payment["amount"],
+                    "currency": payment["currency"],
+                    "status": payment["status"],
+                    "user_name": user_data.get("name", "Usuario Desconocido") if user_data else "Usuario Desconocido",
+                    "user_email": payment.get("user_email"),
+                    "session_id": payment.get("session_id"),
+                    "subscription_id": payment.get("subscription_id")
+                }
             enriched_payments.append(payment_item)
         
+        next_cursor = None
+        if has_more and enriched_payments:
+            last = enriched_payments[-1]
+            next_cursor = _encode_payments_cursor(str(last["date"]), str(last["transaction_id"]))
+        
         return {
             "payments": enriched_payments,
             "count": len(enriched_payments),
-            "filter_applied": status if status else "none"
+            "filter_applied": status if status else "none",
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting all payments: {e}")
         raise HTTPException(status_code=500, detail=f"Error al obtener pagos: {str(e)}")
@@ -11631,40 +11101,11 @@ async def get_exercise_stats(request: Request):
         raise HTTPException(status_code=500, detail="Error al obtener estadísticas de ejercicios")
 
 
-# ==================== TRAINING PLAN CHAT ENDPOINT ====================
+# ==================== TRAINING / NUTRITION PLAN CHAT ENDPOINTS ====================
+# Las llamadas al LLM van por llm_gateway (AsyncOpenAI compartido). Cada chat
+# tiene una variante /stream que envía la respuesta por SSE según se genera.
 
-@api_router.post("/training-plan/chat", response_model=TrainingPlanChatResponse)
-async def chat_about_training_plan(chat_request: TrainingPlanChatRequest, request: Request):
-    """
-    Chat with AI to modify an existing training plan
-    """
-    current_user = await get_current_user(request)
-    
-    try:
-        # Get the training plan
-        plan = await db.training_plans.find_one({"_id": chat_request.plan_id})
-        
-        if not plan:
-            raise HTTPException(status_code=404, detail="Plan de entrenamiento no encontrado")
-        
-        # Verify user has access (admin or owner)
-        if current_user.get("role") != "admin" and plan.get("user_id") != current_user.get("_id"):
-            raise HTTPException(status_code=403, detail="No tienes permiso para modificar este plan")
-        
-        # Get chat history if exists
-        chat_history = plan.get("chat_history", [])
-        
-        # Prepare context for AI
-        current_plan_content = plan.get("plan_final", "")
-        
-        # Call OpenAI to process the modification request
-        from openai import OpenAI
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        messages = [
-            {
-                "role": "system",
-                "content": """Eres un entrenador personal experto que ayuda a ajustar planes de entrenamiento.
+TRAINING_CHAT_SYSTEM_PROMPT = """Eres un entrenador personal experto que ayuda a ajustar planes de entrenamiento.
 
 Tu misión es:
 1. Entender la petición del entrenador
@@ -11677,138 +11118,8 @@ REGLAS:
 - Mantener el formato del plan original
 - Solo modificar lo que se solicita
 - Asegurar que los cambios tengan sentido técnicamente"""
-            },
-            {
-                "role": "user",
-                "content": f"""PLAN ACTUAL:
-{current_plan_content}
-
-PETICIÓN DEL ENTRENADOR:
-{chat_request.user_message}
-
-Por favor:
-1. Modifica el plan según la petición
-2. Devuelve el plan COMPLETO modificado
-3. Explica brevemente qué cambiaste"""
-            }
-        ]
-        
-        # Add chat history
-        for msg in chat_history[-5:]:  # Last 5 messages for context
-            messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=4000,
-            timeout=120
-        )
-        
-        ai_response = response.choices[0].message.content
-        
-        # Check if AI modified the plan (look for plan structure in response)
-        updated_plan = None
-        if "🏋️" in ai_response or "PROGRAMA" in ai_response or "PLAN DE ENTRENAMIENTO" in ai_response:
-            # AI returned a modified plan
-            updated_plan = ai_response
-            
-            # Update the plan in database
-            await db.training_plans.update_one(
-                {"_id": chat_request.plan_id},
-                {
-                    "$set": {
-                        "plan_final": updated_plan,
-                        "last_modified": datetime.now(timezone.utc).isoformat()
-                    },
-                    "$push": {
-                        "chat_history": {
-                            "$each": [
-                                {
-                                    "role": "user",
-                                    "content": chat_request.user_message,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                },
-                                {
-                                    "role": "assistant",
-                                    "content": ai_response,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-                            ]
-                        }
-                    }
-                }
-            )
-            
-            logger.info(f"✅ Training plan {chat_request.plan_id} modified via chat")
-        else:
-            # AI just answered without modifying plan
-            await db.training_plans.update_one(
-                {"_id": chat_request.plan_id},
-                {
-                    "$push": {
-                        "chat_history": {
-                            "$each": [
-                                {
-                                    "role": "user",
-                                    "content": chat_request.user_message,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                },
-                                {
-                                    "role": "assistant",
-                                    "content": ai_response,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-                            ]
-                        }
-                    }
-                }
-            )
-        
-        return TrainingPlanChatResponse(
-            assistant_message=ai_response,
-            updated_plan=updated_plan
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in training plan chat: {e}")
-        raise HTTPException(status_code=500, detail=f"Error procesando chat: {str(e)}")
 
-
-# ==================== NUTRITION PLAN CHAT ENDPOINT ====================
-
-@api_router.post("/nutrition-plan/chat", response_model=NutritionPlanChatResponse)
-async def chat_about_nutrition_plan(chat_request: NutritionPlanChatRequest, request: Request):
-    """
-    Chat with AI to modify an existing nutrition plan
-    """
-    current_user = await get_current_user(request)
-    
-    try:
-        # Get the nutrition plan
-        plan = await db.nutrition_plans.find_one({"_id": chat_request.plan_id})
-        
-        if not plan:
-            raise HTTPException(status_code=404, detail="Plan de nutrición no encontrado")
-        
-        # Verify user has access (admin or owner)
-        if current_user.get("role") != "admin" and plan.get("user_id") != current_user.get("_id"):
-            raise HTTPException(status_code=403, detail="No tienes permiso para modificar este plan")
-        
-        # Get chat history if exists
-        chat_history = plan.get("chat_history", [])
-        
-        # Prepare context for AI - try plan_text first, fallback to plan_verificado
-        current_plan_content = plan.get("plan_text") or plan.get("plan_verificado", "")
-        
-        # Call OpenAI to process the modification request
-        from openai import OpenAI
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        messages = [
-            {
-                "role": "system",
-                "content": """Eres un nutricionista profesional experto que ayuda a ajustar planes de nutrición.
+NUTRITION_CHAT_SYSTEM_PROMPT = """Eres un nutricionista profesional experto que ayuda a ajustar planes de nutrición.
 
 Tu misión es:
 1. Entender la petición del nutricionista
@@ -11823,106 +11134,268 @@ REGLAS:
 - Asegurar que los cambios tengan sentido nutricional
 - Mantener equilibrio de macronutrientes cuando sea posible
 - Considerar alergias y preferencias del cliente"""
-            },
-            {
-                "role": "user",
-                "content": f"""PLAN ACTUAL:
-{current_plan_content}
 
-PETICIÓN DEL NUTRICIONISTA:
-{chat_request.user_message}
 
-Por favor:
-1. Modifica el plan según la petición
-2. Devuelve el plan COMPLETO modificado
+def _chat_history_entries(user_message: str, ai_response: str) -> list:
+    return [
+        {
+            "role": "user",
+            "content": user_message,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        },
+        {
+            "role": "assistant",
+            "content": ai_response,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    ]
+
+
+async def _load_chat_plan(collection, plan_id: str, current_user: dict, not_found_detail: str) -> dict:
+    """Carga el plan del chat y verifica acceso (admin o propietario)"""
+    plan = await collection.find_one({"_id": plan_id})
+    
+    if not plan:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    
+    # Verify user has access (admin or owner)
+    if current_user.get("role") != "admin" and plan.get("user_id") != current_user.get("_id"):
+        raise HTTPException(status_code=403, detail="No tienes permiso para modificar este plan")
+    
+    return plan
+
+
+def _training_chat_messages(plan: dict, user_message: str) -> list:
+    # Prepare context for AI
+    current_plan_content = plan.get("plan_final", "")
+    
+    messages = [
+        {"role": "system", "content": TRAINING_CHAT_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"""PLAN ACTUAL:
+{current_plan_content}
+
+PETICIÓN DEL ENTRENADOR:
+{user_message}
+
+Por favor:
+1. Modifica el plan según la petición
+2. Devuelve el plan COMPLETO modificado
 3. Explica brevemente qué cambiaste"""
-            }
-        ]
+        }
+    ]
+    
+    # Add chat history
+    for msg in plan.get("chat_history", [])[-5:]:  # Last 5 messages for context
+        messages.append({"role": msg["role"], "content": msg["content"]})
+    
+    return messages
+
+
+async def _save_training_chat(plan_id: str, user_message: str, ai_response: str) -> Optional[str]:
+    """Guarda el intercambio y, si la IA devolvió un plan, lo aplica. Devuelve el plan actualizado."""
+    update = {"$push": {"chat_history": {"$each": _chat_history_entries(user_message, ai_response)}}}
+    
+    # Check if AI modified the plan (look for plan structure in response)
+    updated_plan = None
+    if "🏋️" in ai_response or "PROGRAMA" in ai_response or "PLAN DE ENTRENAMIENTO" in ai_response:
+        # AI returned a modified plan
+        updated_plan = ai_response
+        update["$set"] = {
+            "plan_final": updated_plan,
+            "last_modified": datetime.now(timezone.utc).isoformat()
+        }
+    
+    await db.training_plans.update_one({"_id": plan_id}, update)
+    
+    if updated_plan:
+        logger.info(f"✅ Training plan {plan_id} modified via chat")
+    
+    return updated_plan
+
+
+def _nutrition_chat_messages(plan: dict, user_message: str) -> list:
+    # Prepare context for AI - try plan_text first, fallback to plan_verificado
+    current_plan_content = plan.get("plan_text") or plan.get("plan_verificado", "")
+    
+    messages = [
+        {"role": "system", "content": NUTRITION_CHAT_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"""PLAN ACTUAL:
+{current_plan_content}
+
+PETICIÓN DEL NUTRICIONISTA:
+{user_message}
+
+Por favor:
+1. Modifica el plan según la petición
+2. Devuelve el plan COMPLETO modificado
+3. Explica brevemente qué cambiaste"""
+        }
+    ]
+    
+    # Add chat history
+    for msg in plan.get("chat_history", [])[-5:]:  # Last 5 messages for context
+        messages.append({"role": msg["role"], "content": msg["content"]})
+    
+    return messages
+
+
+async def _save_nutrition_chat(plan_id: str, user_message: str, ai_response: str) -> Optional[str]:
+    """Guarda el intercambio y, si la IA devolvió un plan, lo aplica. Devuelve el plan actualizado."""
+    update = {"$push": {"chat_history": {"$each": _chat_history_entries(user_message, ai_response)}}}
+    
+    # Check if AI modified the plan (look for plan structure in response)
+    updated_plan = None
+    if "🥗" in ai_response or "PLAN DE NUTRICIÓN" in ai_response or "PROGRAMA NUTRICIONAL" in ai_response or "DESAYUNO" in ai_response:
+        # AI returned a modified plan - update both plan_verificado and plan_text
+        updated_plan = ai_response
+        update["$set"] = {
+            "plan_verificado": updated_plan,
+            "plan_text": updated_plan,
+            "last_modified": datetime.now(timezone.utc).isoformat(),
+            "edited": True
+        }
+    
+    await db.nutrition_plans.update_one({"_id": plan_id}, update)
+    
+    if updated_plan:
+        logger.info(f"✅ Nutrition plan {plan_id} modified via chat")
+    
+    return updated_plan
+
+
+def _sse_chat_response(messages: list, operation: str, save_chat, plan_id: str, user_message: str):
+    """
+    Respuesta SSE: eventos {"delta": "..."} según llega el texto y un evento
+    final {"done": true, "updated_plan": ...} tras guardar el intercambio.
+    """
+    async def event_stream():
+        parts = []
+        try:
+            async for delta in stream_chat_completion(messages, operation):
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+            
+            updated_plan = await save_chat(plan_id, user_message, "".join(parts))
+            yield f"data: {json.dumps({'done': True, 'updated_plan': updated_plan}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in {operation} stream: {e}")
+            yield f"data: {json.dumps({'error': f'Error procesando chat: {str(e)}'}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@api_router.post("/training-plan/chat", response_model=TrainingPlanChatResponse)
+async def chat_about_training_plan(chat_request: TrainingPlanChatRequest, request: Request):
+    """
+    Chat with AI to modify an existing training plan
+    """
+    current_user = await get_current_user(request)
+    
+    try:
+        plan = await _load_chat_plan(
+            db.training_plans, chat_request.plan_id, current_user, "Plan de entrenamiento no encontrado"
+        )
+        
+        # Call OpenAI to process the modification request
+        ai_response = await chat_completion(
+            _training_chat_messages(plan, chat_request.user_message),
+            operation="chat_training_plan",
+            max_tokens=4000
+        )
         
-        # Add chat history
-        for msg in chat_history[-5:]:  # Last 5 messages for context
-            messages.append({"role": msg["role"], "content": msg["content"]})
+        updated_plan = await _save_training_chat(chat_request.plan_id, chat_request.user_message, ai_response)
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=4000,
-            timeout=120
+        return TrainingPlanChatResponse(
+            assistant_message=ai_response,
+            updated_plan=updated_plan
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in training plan chat: {e}")
+        raise HTTPException(status_code=500, detail=f"Error procesando chat: {str(e)}")
+
+
+@api_router.post("/training-plan/chat/stream")
+async def chat_about_training_plan_stream(chat_request: TrainingPlanChatRequest, request: Request):
+    """
+    Igual que /training-plan/chat pero devuelve la respuesta en streaming (SSE)
+    """
+    current_user = await get_current_user(request)
+    plan = await _load_chat_plan(
+        db.training_plans, chat_request.plan_id, current_user, "Plan de entrenamiento no encontrado"
+    )
+    
+    return _sse_chat_response(
+        _training_chat_messages(plan, chat_request.user_message),
+        "chat_training_plan",
+        _save_training_chat,
+        chat_request.plan_id,
+        chat_request.user_message
+    )
+
+
+@api_router.post("/nutrition-plan/chat", response_model=NutritionPlanChatResponse)
+async def chat_about_nutrition_plan(chat_request: NutritionPlanChatRequest, request: Request):
+    """
+    Chat with AI to modify an existing nutrition plan
+    """
+    current_user = await get_current_user(request)
+    
+    try:
+        plan = await _load_chat_plan(
+            db.nutrition_plans, chat_request.plan_id, current_user, "Plan de nutrición no encontrado"
         )
         
-        ai_response = response.choices[0].message.content
+        # Call OpenAI to process the modification request
+        ai_response = await chat_completion(
+            _nutrition_chat_messages(plan, chat_request.user_message),
+            operation="chat_nutrition_plan",
+            max_tokens=4000
+        )
         
-        # Check if AI modified the plan (look for plan structure in response)
-        updated_plan = None
-        if "🥗" in ai_response or "PLAN DE NUTRICIÓN" in ai_response or "PROGRAMA NUTRICIONAL" in ai_response or "DESAYUNO" in ai_response:
-            # AI returned a modified plan
-            updated_plan = ai_response
-            
-            # Update the plan in database - update both plan_verificado and plan_text
-            await db.nutrition_plans.update_one(
-                {"_id": chat_request.plan_id},
-                {
-                    "$set": {
-                        "plan_verificado": updated_plan,
-                        "plan_text": updated_plan,
-                        "last_modified": datetime.now(timezone.utc).isoformat(),
-                        "edited": True
-                    },
-                    "$push": {
-                        "chat_history": {
-                            "$each": [
-                                {
-                                    "role": "user",
-                                    "content": chat_request.user_message,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                },
-                                {
-                                    "role": "assistant",
-                                    "content": ai_response,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-                            ]
-                        }
-                    }
-                }
-            )
-            
-            logger.info(f"✅ Nutrition plan {chat_request.plan_id} modified via chat")
-        else:
-            # AI just answered without modifying plan
-            await db.nutrition_plans.update_one(
-                {"_id": chat_request.plan_id},
-                {
-                    "$push": {
-                        "chat_history": {
-                            "$each": [
-                                {
-                                    "role": "user",
-                                    "content": chat_request.user_message,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                },
-                                {
-                                    "role": "assistant",
-                                    "content": ai_response,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-                            ]
-                        }
-                    }
-                }
-            )
+        updated_plan = await _save_nutrition_chat(chat_request.plan_id, chat_request.user_message, ai_response)
         
         return NutritionPlanChatResponse(
             assistant_message=ai_response,
             updated_plan=updated_plan
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in nutrition plan chat: {e}")
         raise HTTPException(status_code=500, detail=f"Error procesando chat: {str(e)}")
 
 
+@api_router.post("/nutrition-plan/chat/stream")
+async def chat_about_nutrition_plan_stream(chat_request: NutritionPlanChatRequest, request: Request):
+    """
+    Igual que /nutrition-plan/chat pero devuelve la respuesta en streaming (SSE)
+    """
+    current_user = await get_current_user(request)
+    plan = await _load_chat_plan(
+        db.nutrition_plans, chat_request.plan_id, current_user, "Plan de nutrición no encontrado"
+    )
+    
+    return _sse_chat_response(
+        _nutrition_chat_messages(plan, chat_request.user_message),
+        "chat_nutrition_plan",
+        _save_nutrition_chat,
+        chat_request.plan_id,
+        chat_request.user_message
+    )
+
+
 # ==================== ENDPOINTS PARA SELECTORES ====================
 
 @api_router.get("/admin/users/{user_id}/questionnaires")
@@ -12208,6 +11681,9 @@ async def delete_follow_up_submission(followup_id: str, request: Request):
                     logger.info(f"✅ Seguimiento eliminado del client_drawer: {followup_id}")
                 else:
                     logger.warning(f"⚠️ No se encontró el seguimiento en client_drawer o ya no existía")
+                
+                # El estado de la revisión depende del último seguimiento
+                await refresh_review_entry_safe(db, user_id)
             
             return {"message": "Seguimiento eliminado exitosamente"}
         
@@ -12557,13 +12033,6 @@ PLAN DE ENTRENAMIENTO NUEVO (Mes {new_training.get('month')}/{new_training.get('
         
         # FASE 3: Generar informe inteligente con LLM
         
-        from openai import AsyncOpenAI
-        
-        # Usar OpenAI API key
-        openai_key = os.environ.get("OPENAI_API_KEY")
-        if not openai_key:
-            raise ValueError("OPENAI_API_KEY no configurada en el entorno")
-        
         # Prompt del sistema basado en tu documento
         system_message = f"""Eres un entrenador profesional y nutricionista experto generando un informe de seguimiento personalizado.
 
@@ -12621,23 +12090,15 @@ Genera el informe de seguimiento completo siguiendo la estructura obligatoria.
         try:
             logger.info("🤖 Generando informe con LLM...")
             
-            # Inicializar cliente de OpenAI
-            client = AsyncOpenAI(api_key=openai_key)
-            
-            # Crear solicitud a GPT-4o
-            completion = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            # Solicitud a GPT-4o (cliente OpenAI compartido del llm_gateway)
+            report_text = await chat_completion(
+                [
                     {"role": "system", "content": system_message},
                     {"role": "user", "content": user_prompt_text}
                 ],
-                temperature=0.7,
-                max_tokens=3000,
-                timeout=120
+                operation="follow_up_report",
+                max_tokens=3000
             )
-            
-            # Obtener respuesta
-            report_text = completion.choices[0].message.content
             logger.info("✅ Informe inteligente generado exitosamente")
             
         except Exception as e:
@@ -12745,9 +12206,19 @@ async def submit_waitlist(lead_data: WaitlistLeadSubmit):
 
 
 @api_router.get("/admin/waitlist/all", response_model=List[WaitlistLeadResponse])
-async def get_all_waitlist_leads(request: Request):
+async def get_all_waitlist_leads(
+    request: Request,
+    response: Response,
+    search: Optional[str] = None,
+    limit: int = CRM_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """
-    Obtener todos los leads de waitlist (solo admin)
+    Obtener los leads de waitlist (solo admin)
+    
+    La respuesta sigue siendo una lista; la paginación va en las cabeceras
+    X-Next-Cursor / X-Has-More, y el total (solo en la primera página) en
+    X-Total-Count.
     """
     current_user = await get_current_user(request)
     
@@ -12755,11 +12226,11 @@ async def get_all_waitlist_leads(request: Request):
         raise HTTPException(status_code=403, detail="No autorizado")
     
     try:
-        leads = await db.waitlist_leads.find().sort("submitted_at", -1).to_list(length=1000)
+        page = await _crm_page(WAITLIST_LISTING, search=search, limit=limit, cursor=cursor)
         
         # Formatear para respuesta
         leads_response = []
-        for lead in leads:
+        for lead in page["items"]:
             leads_response.append({
                 "id": lead["_id"],
                 "nombre_apellidos": lead.get("nombre_apellidos"),
@@ -12779,8 +12250,20 @@ async def get_all_waitlist_leads(request: Request):
                 "notas_admin": lead.get("notas_admin", [])
             })
         
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        response.headers["X-Has-More"] = "true" if page["has_more"] else "false"
+        if not cursor:
+            total = len(leads_response)
+            if page["has_more"]:
+                count_filter = {"$text": {"$search": search.strip()}} if search and search.strip() else {}
+                total = await db.waitlist_leads.count_documents(count_filter)
+            response.headers["X-Total-Count"] = str(total)
+        
         return leads_response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching waitlist leads: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener leads")
@@ -13458,28 +12941,16 @@ Si requiere cambios, genera el plan modificado en formato JSON."""
 
 Analiza la solicitud y genera el plan modificado o responde la pregunta."""
         
-        # Ejecutar LLM
-        from openai import AsyncOpenAI
-        
-        openai_key = os.environ.get("OPENAI_API_KEY")
-        if not openai_key:
-            raise ValueError("OPENAI_API_KEY no configurada en el entorno")
-        
-        client = AsyncOpenAI(api_key=openai_key)
-        
-        completion = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        # Ejecutar LLM (cliente OpenAI compartido del llm_gateway)
+        ai_response = await chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": full_message}
             ],
-            temperature=0.7,
-            max_tokens=4000,
-            timeout=120
+            operation="chat_modify_edn360_plan",
+            max_tokens=4000
         )
         
-        ai_response = completion.choices[0].message.content
-        
         # Intentar detectar si hay modificaciones en la respuesta
         modifications_made = False
         modified_plan = None
@@ -13559,8 +13030,32 @@ Analiza la solicitud y genera el plan modificado o responde la pregunta."""
 # GENERATION JOBS - Sistema Asíncrono de Generación de Planes con Estabilización
 # ============================================================================
 
+# Lease de un job reclamado por un worker (se renueva con heartbeat)
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '120'))
+# Intentos máximos antes de dejar de re-reclamar un job con lease expirado
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+# Los workers solo reclaman jobs con el orquestador E1-E9 / N0-N8 conectado.
+# Mientras siga desactivado (migración a client_drawer) los jobs quedan en cola.
+JOB_GENERATION_ENABLED = os.environ.get('JOB_GENERATION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# Eventos de progreso de los jobs (GET /jobs/{job_id}/events). Con
+# JOB_EVENTS_URL=redis://... los eventos publicados en job_worker.py llegan a la API
+job_event_bus = create_job_event_bus()
+
 # ========== HELPER FUNCTIONS ==========
 
+def _get_edn360_orchestrator():
+    """Orquestador E.D.N.360 (E1-E9 / N0-N8) de los generation_jobs"""
+    try:
+        from edn360.orchestrator import EDN360Orchestrator
+    except ImportError as e:
+        raise RuntimeError(
+            "Orquestador E.D.N.360 no disponible (edn360.orchestrator desactivado "
+            "durante la migración a client_drawer)"
+        ) from e
+    return EDN360Orchestrator()
+
+
 async def add_job_log(job_id: str, event: str, details: str = ""):
     """Añade un evento al log del job"""
     log_entry = {
@@ -13572,45 +13067,75 @@ async def add_job_log(job_id: str, event: str, details: str = ""):
         {"_id": job_id},
         {"$push": {"execution_log": log_entry}}
     )
+    try:
+        await job_event_bus.publish(job_id, log_event(job_id, log_entry))
+    except Exception as e:
+        logger.warning(f"⚠️ Job {job_id}: no se pudo publicar el evento {event}: {e}")
 
-async def update_job_progress(job_id: str, phase: str, current_agent: str, completed: int, total: int, message: str):
-    """Actualiza el progreso del job después de cada agente REAL"""
-    percentage = int((completed / total) * 100)
+async def claim_generation_job(worker_id: str, job_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Reclama un job de forma ATÓMICA (find_one_and_update) para un worker.
     
-    await db.generation_jobs.update_one(
-        {"_id": job_id},
+    Candidatos:
+    - Jobs en "pending" (o "queued", estado legacy)
+    - Jobs en "running" cuyo lease ha expirado (worker caído) y que no
+      han agotado JOB_MAX_ATTEMPTS
+    
+    Solo un worker puede ganar la actualización, por lo que no hay
+    doble ejecución aunque varios workers consulten a la vez.
+    
+    Returns:
+        Documento del job ya marcado como "running", o None si no hay candidatos
+    """
+    now = datetime.now(timezone.utc)
+    
+    return await db.generation_jobs.find_one_and_update(
+        claimable_jobs_filter(now, JOB_MAX_ATTEMPTS, job_id),
         {
             "$set": {
-                "progress.phase": phase,
-                "progress.current_agent": current_agent,
-                "progress.completed_steps": completed,
-                "progress.total_steps": total,
-                "progress.percentage": percentage,
-                "progress.message": message
-            }
-        }
+                "status": "running",
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "heartbeat_at": now,
+                "started_at": now,
+                "execution_log": []  # Inicializar log
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=JOB_CLAIM_SORT,
+        return_document=ReturnDocument.AFTER
     )
-    
-    logger.info(f"  📊 Progreso actualizado: {current_agent} completado ({percentage}%)")
 
-async def check_job_concurrency(job_id: str) -> bool:
-    """
-    Verifica si hay espacio para ejecutar el job.
-    Límite: 2 jobs simultáneos en "running"
-    Si no hay espacio, marca el job como "queued"
+async def renew_job_lease(job_id: str, worker_id: str) -> bool:
     """
-    running_jobs = await db.generation_jobs.count_documents({"status": "running"})
+    Renueva el lease de un job en ejecución (heartbeat).
     
-    if running_jobs >= 2:
-        logger.info(f"⏳ Job {job_id} en cola (2 jobs ya en ejecución)")
-        await db.generation_jobs.update_one(
-            {"_id": job_id},
-            {"$set": {"status": "queued"}}
-        )
-        await add_job_log(job_id, "queued", f"{running_jobs} jobs en ejecución")
-        return False
-    
-    return True
+    Returns:
+        False si el job ya no pertenece a este worker (lease perdido)
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.generation_jobs.update_one(
+        {"_id": job_id, "worker_id": worker_id, "status": "running"},
+        {
+            "$set": {
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "heartbeat_at": now
+            }
+        }
+    )
+    return result.matched_count > 0
+
+async def _job_lease_heartbeat(job_id: str, worker_id: str):
+    """Mantiene vivo el lease mientras el job se ejecuta"""
+    interval = max(JOB_LEASE_SECONDS / 3, 1)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await renew_job_lease(job_id, worker_id):
+                logger.warning(f"⚠️ Job {job_id}: lease perdido por worker {worker_id}")
+                return
+        except Exception as e:
+            logger.error(f"❌ Error renovando lease del job {job_id}: {e}")
 
 async def execute_with_retry(func, max_retries=2, *args, **kwargs):
     """
@@ -13645,46 +13170,56 @@ async def execute_with_retry(func, max_retries=2, *args, **kwargs):
     
     raise last_error
 
-async def process_generation_job(job_id: str):
+async def process_generation_job(job_id: str, worker_id: Optional[str] = None):
     """
     Procesa un job de generación en background con estabilización.
     
     MEJORAS IMPLEMENTADAS:
-    - ✅ Control de concurrencia (máx 2 jobs simultáneos)
+    - ✅ Claim atómico del job (sin doble ejecución); la concurrencia la
+      determina el número de workers de job_worker.py
+    - ✅ Lease + heartbeat mientras el job se ejecuta
     - ✅ Progreso REAL después de cada agente
     - ✅ Retry automático (2 reintentos con delays 10s, 30s)
     - ✅ Logging de eventos
     - ✅ Timeout será manejado por watchdog externo
+    
+    Args:
+        job_id: ID del job
+        worker_id: Worker que ya reclamó el job. Si es None (ejecución
+            directa desde scripts), el job se reclama aquí.
     """
     retry_count = 0
+    heartbeat_task = None
+    state = JobStateWriter(db.generation_jobs, job_id, publish=job_event_bus.publish)
     
     try:
-        # Cargar el job
-        job = await db.generation_jobs.find_one({"_id": job_id})
-        if not job:
-            logger.error(f"❌ Job {job_id} no encontrado")
-            return
-        
-        logger.info(f"🚀 Iniciando procesamiento de job {job_id} (type: {job['type']})")
+        # 1️⃣ CLAIM ATÓMICO (pending → running)
+        if worker_id is None:
+            worker_id = f"direct-{os.getpid()}"
+            job = await claim_generation_job(worker_id, job_id=job_id)
+            if not job:
+                logger.info(f"⏭️ Job {job_id} no disponible (ya reclamado o inexistente)")
+                return
+        else:
+            job = await db.generation_jobs.find_one({"_id": job_id, "worker_id": worker_id})
+            if not job:
+                logger.error(f"❌ Job {job_id} no encontrado para worker {worker_id}")
+                return
         
-        # 1️⃣ CONTROL DE CONCURRENCIA
-        can_run = await check_job_concurrency(job_id)
-        if not can_run:
-            # Job marcado como "queued", salir
-            return
+        logger.info(f"🚀 Iniciando procesamiento de job {job_id} (type: {job['type']}, worker: {worker_id})")
         
-        # 2️⃣ CAMBIAR STATUS A RUNNING + LOG
-        await db.generation_jobs.update_one(
-            {"_id": job_id},
-            {
-                "$set": {
-                    "status": "running",
-                    "started_at": datetime.now(timezone.utc),
-                    "execution_log": []  # Inicializar log
-                }
-            }
+        # 2️⃣ HEARTBEAT + LOG
+        # El estado (progreso, tokens, log) se acumula en memoria y se
+        # escribe con un solo update por fase (state.flush())
+        heartbeat_task = asyncio.create_task(_job_lease_heartbeat(job_id, worker_id))
+        state = JobStateWriter(
+            db.generation_jobs,
+            job_id,
+            token_usage=job.get("token_usage"),
+            progress=job.get("progress"),
+            publish=job_event_bus.publish
         )
-        await add_job_log(job_id, "started", f"Iniciando generación (mode: {job['type']})")
+        state.log("started", f"Iniciando generación (mode: {job['type']}, worker: {worker_id})")
         
         # Obtener datos necesarios
         user_id = job["user_id"]
@@ -13699,7 +13234,6 @@ async def process_generation_job(job_id: str):
         # Obtener cuestionario
         submission = await db.nutrition_questionnaire_submissions.find_one({"_id": submission_id})
         is_followup = False
-        context_data = None
         
         if not submission:
             # Buscar en follow-ups
@@ -13709,29 +13243,15 @@ async def process_generation_job(job_id: str):
             if not submission:
                 raise Exception(f"Cuestionario {submission_id} no encontrado en nutrition_questionnaire_submissions ni follow_up_submissions")
         
-        # VALIDACIÓN ROBUSTA DEL CUESTIONARIO
-        logger.info(f"🔍 Validando formato del cuestionario {submission_id}")
-        
-        submission_to_validate = submission
-        
-        # Si es followup, obtener cuestionario inicial para validar
-        if is_followup:
-            logger.info(f"📋 Detectado follow-up, obteniendo cuestionario inicial para validación")
-            initial_submission = await db.nutrition_questionnaire_submissions.find_one(
-                {"user_id": user_id},
-                sort=[("submitted_at", 1)]
-            )
-            
-            if not initial_submission:
-                raise Exception("No se encontró cuestionario inicial para contexto del follow-up")
-            
-            submission_to_validate = initial_submission
-        
-        # Validar el formato del cuestionario
-        is_valid, validation_errors, questionnaire_data = _validate_questionnaire_format(submission_to_validate)
+        # VALIDACIÓN + ADAPTACIÓN (precalculadas en el envío; se recalculan
+        # solo si cambió ADAPTER_VERSION). En follow-ups se valida el
+        # cuestionario inicial y se adapta la mezcla inicial + follow-up.
+        logger.info(f"🔍 Cargando cuestionario normalizado {submission_id}")
+        normalized = await get_normalized_questionnaire(db, submission, is_followup)
+        is_valid = normalized["is_valid"]
         
         if not is_valid:
-            error_msg = "❌ FORMATO DE CUESTIONARIO INVÁLIDO:\n" + "\n".join(f"  • {e}" for e in validation_errors)
+            error_msg = "❌ FORMATO DE CUESTIONARIO INVÁLIDO:\n" + "\n".join(f"  • {e}" for e in normalized["errors"])
             error_msg += "\n\n📋 FORMATO ESPERADO: El cuestionario debe guardarse en MongoDB con estructura:\n"
             error_msg += "{\n"
             error_msg += "  '_id': 'timestamp_unico',\n"
@@ -13755,30 +13275,16 @@ async def process_generation_job(job_id: str):
         
         logger.info(f"✅ Cuestionario validado correctamente")
         
-        # Si es followup, combinar con datos del follow-up
-        if is_followup:
-            submission_serialized = _serialize_datetime_fields(submission)
-            context_data = {
-                "followup_responses": submission_serialized.get("responses", {}),
-                "ai_analysis": submission_serialized.get("ai_analysis", "")
-            }
-            
-            # Combinar datos
-            merged_data = questionnaire_data.copy()
-            merged_data.update(context_data.get("followup_responses", {}))
-            adapted_questionnaire = _adapt_questionnaire_for_edn360(merged_data)
-        else:
-            # Usar datos validados directamente
-            adapted_questionnaire = _adapt_questionnaire_for_edn360(questionnaire_data)
+        adapted_questionnaire = normalized["adapted"]
+        questionnaire_data = adapted_questionnaire["_original_questionnaire"]
         
         # Obtener fecha actual
         now = datetime.now(timezone.utc)
         current_month = now.month
         current_year = now.year
         
-        # Importar orquestador
-        # ⚠️ DESACTIVADO: from edn360.orchestrator import EDN360Orchestrator
-        # ⚠️ DESACTIVADO: orchestrator = EDN360Orchestrator()
+        # Importar orquestador (RuntimeError explícito si no está disponible)
+        orchestrator = _get_edn360_orchestrator()
         
         result_data = {
             "training_plan_id": None,
@@ -13791,23 +13297,19 @@ async def process_generation_job(job_id: str):
             logger.info("🏋️ Fase TRAINING: Ejecutando agentes E1-E9")
             
             # Actualizar progreso
-            await db.generation_jobs.update_one(
-                {"_id": job_id},
-                {
-                    "$set": {
-                        "progress.phase": "training",
-                        "progress.current_agent": "E1",
-                        "progress.message": "Iniciando análisis del perfil del cliente (E1)"
-                    }
-                }
-            )
+            state.set({
+                "progress.phase": "training",
+                "progress.current_agent": "E1",
+                "progress.message": "Iniciando análisis del perfil del cliente (E1)"
+            })
             
             # Obtener plan de entrenamiento previo si existe
             previous_training_plan = None
             if job.get("previous_training_plan_id"):
                 previous_training_plan = await db.training_plans.find_one({"_id": job["previous_training_plan_id"]})
             
-            await add_job_log(job_id, "training_started", "Iniciando pipeline E1-E9")
+            state.log("training_started", "Iniciando pipeline E1-E9")
+            await state.flush()
             
             # 3️⃣ EJECUTAR PIPELINE CON RETRY
             async def run_training_pipeline():
@@ -13827,51 +13329,15 @@ async def process_generation_job(job_id: str):
             total_steps = 9 if job_type == "training" else 18
             
             if executions:
-                for idx, execution in enumerate(executions):
-                    agent_id = execution.get("agent_id", f"E{idx+1}")
-                    completed = idx + 1
-                    
-                    # Capturar tokens del agente
-                    token_usage = execution.get("token_usage")
-                    if token_usage:
-                        await db.generation_jobs.update_one(
-                            {"_id": job_id},
-                            {
-                                "$inc": {
-                                    "token_usage.total_prompt_tokens": token_usage.get("prompt_tokens", 0),
-                                    "token_usage.total_completion_tokens": token_usage.get("completion_tokens", 0),
-                                    "token_usage.total_tokens": token_usage.get("total_tokens", 0)
-                                },
-                                "$set": {
-                                    f"token_usage.by_agent.{agent_id}": token_usage
-                                }
-                            }
-                        )
-                    
-                    await update_job_progress(
-                        job_id,
-                        "training",
-                        agent_id,
-                        completed,
-                        total_steps,
-                        f"Agente {agent_id} completado"
-                    )
-                    await add_job_log(job_id, "agent_completed", f"{agent_id} ejecutado exitosamente")
+                state.record_executions(executions, "training", "E", 1, 0, total_steps)
             else:
                 # Fallback si no hay executions
                 for i in range(1, 10):
                     agent_name = f"E{i}"
-                    await update_job_progress(
-                        job_id,
-                        "training",
-                        agent_name,
-                        i,
-                        total_steps,
-                        f"Agente {agent_name} completado"
-                    )
+                    state.progress("training", agent_name, i, total_steps, f"Agente {agent_name} completado")
             
             if retry_count > 0:
-                await add_job_log(job_id, "retry_success", f"Pipeline completado después de {retry_count} reintento(s)")
+                state.log("retry_success", f"Pipeline completado después de {retry_count} reintento(s)")
             
             # Guardar plan de entrenamiento
             planes_previos_count = await db.training_plans.count_documents({"user_id": user_id})
@@ -13922,7 +13388,8 @@ async def process_generation_job(job_id: str):
             await db.training_plans.insert_one(training_plan_doc)
             result_data["training_plan_id"] = plan_id
             
-            await add_job_log(job_id, "training_completed", f"Plan de entrenamiento generado: {plan_id}")
+            state.log("training_completed", f"Plan de entrenamiento generado: {plan_id}")
+            await state.flush()
             logger.info(f"✅ Plan de entrenamiento generado: {plan_id}")
         
         if job_type == "nutrition" or job_type == "full":
@@ -13930,16 +13397,11 @@ async def process_generation_job(job_id: str):
             logger.info("🥗 Fase NUTRITION: Ejecutando agentes N0-N8")
             
             # Actualizar progreso
-            await db.generation_jobs.update_one(
-                {"_id": job_id},
-                {
-                    "$set": {
-                        "progress.phase": "nutrition",
-                        "progress.current_agent": "N0",
-                        "progress.message": "Iniciando análisis nutricional (N0)"
-                    }
-                }
-            )
+            state.set({
+                "progress.phase": "nutrition",
+                "progress.current_agent": "N0",
+                "progress.message": "Iniciando análisis nutricional (N0)"
+            })
             
             # Obtener plan de entrenamiento para sincronizar
             training_plan_for_sync = None
@@ -13964,7 +13426,8 @@ async def process_generation_job(job_id: str):
             if job.get("previous_nutrition_plan_id"):
                 previous_nutrition_plan = await db.nutrition_plans.find_one({"_id": job["previous_nutrition_plan_id"]})
             
-            await add_job_log(job_id, "nutrition_started", "Iniciando pipeline N0-N8")
+            state.log("nutrition_started", "Iniciando pipeline N0-N8")
+            await state.flush()
             
             # EJECUTAR PIPELINE CON RETRY
             async def run_nutrition_pipeline():
@@ -13985,53 +13448,15 @@ async def process_generation_job(job_id: str):
             total_steps = 18 if job_type == "full" else 9
             
             if executions_nutrition:
-                for idx, execution in enumerate(executions_nutrition):
-                    agent_id = execution.get("agent_id", f"N{idx}")
-                    completed = base_steps + idx + 1
-                    
-                    # Capturar tokens del agente
-                    token_usage = execution.get("token_usage")
-                    if token_usage:
-                        await db.generation_jobs.update_one(
-                            {"_id": job_id},
-                            {
-                                "$inc": {
-                                    "token_usage.total_prompt_tokens": token_usage.get("prompt_tokens", 0),
-                                    "token_usage.total_completion_tokens": token_usage.get("completion_tokens", 0),
-                                    "token_usage.total_tokens": token_usage.get("total_tokens", 0)
-                                },
-                                "$set": {
-                                    f"token_usage.by_agent.{agent_id}": token_usage
-                                }
-                            }
-                        )
-                    
-                    await update_job_progress(
-                        job_id,
-                        "nutrition",
-                        agent_id,
-                        completed,
-                        total_steps,
-                        f"Agente {agent_id} completado"
-                    )
-                    await add_job_log(job_id, "agent_completed", f"{agent_id} ejecutado exitosamente")
+                state.record_executions(executions_nutrition, "nutrition", "N", 0, base_steps, total_steps)
             else:
                 # Fallback
                 for i in range(9):
                     agent_name = f"N{i}"
-                    completed = base_steps + i + 1
-                    
-                    await update_job_progress(
-                        job_id,
-                        "nutrition",
-                        agent_name,
-                        completed,
-                        total_steps,
-                        f"Agente {agent_name} completado"
-                    )
+                    state.progress("nutrition", agent_name, base_steps + i + 1, total_steps, f"Agente {agent_name} completado")
             
             if nutrition_retry_count > 0:
-                await add_job_log(job_id, "retry_success", f"Pipeline nutrition completado después de {nutrition_retry_count} reintento(s)")
+                state.log("retry_success", f"Pipeline nutrition completado después de {nutrition_retry_count} reintento(s)")
             
             # Guardar plan de nutrición
             nutrition_planes_count = await db.nutrition_plans.count_documents({"user_id": user_id})
@@ -14077,36 +13502,29 @@ async def process_generation_job(job_id: str):
                     {"$set": {"plan_generated": True}}
                 )
             
+            await state.flush()
             logger.info(f"✅ Plan de nutrición generado: {nutrition_plan_id}")
         
         # ===== 5️⃣ JOB COMPLETADO =====
-        await db.generation_jobs.update_one(
-            {"_id": job_id},
-            {
-                "$set": {
-                    "status": "completed",
-                    "progress.phase": "completed",
-                    "progress.percentage": 100,
-                    "progress.message": "Generación completada exitosamente",
-                    "result": result_data,
-                    "completed_at": datetime.now(timezone.utc),
-                    "retry_count": retry_count
-                }
-            }
-        )
-        
-        await add_job_log(job_id, "completed", f"Job finalizado exitosamente. Planes generados: {result_data}")
+        state.set({
+            "status": "completed",
+            "progress.phase": "completed",
+            "progress.percentage": 100,
+            "progress.message": "Generación completada exitosamente",
+            "result": result_data,
+            "completed_at": datetime.now(timezone.utc),
+            "retry_count": retry_count
+        })
+        state.log("completed", f"Job finalizado exitosamente. Planes generados: {result_data}")
+        await state.flush()
         
-        # Obtener token usage final para log
-        final_job = await db.generation_jobs.find_one({"_id": job_id})
-        if final_job and "token_usage" in final_job:
-            usage = final_job["token_usage"]
-            logger.info(
-                f"💰 JOB {job_id} – tokens: "
-                f"prompt={usage.get('total_prompt_tokens', 0)}, "
-                f"completion={usage.get('total_completion_tokens', 0)}, "
-                f"total={usage.get('total_tokens', 0)}"
-            )
+        usage = state.token_totals
+        logger.info(
+            f"💰 JOB {job_id} – tokens: "
+            f"prompt={usage['total_prompt_tokens']}, "
+            f"completion={usage['total_completion_tokens']}, "
+            f"total={usage['total_tokens']}"
+        )
         
         logger.info(f"✅ Job {job_id} completado exitosamente")
         
@@ -14119,110 +13537,20 @@ async def process_generation_job(job_id: str):
         if "timeout" in error_str or "time" in error_str:
             error_type = "timeout"
         
-        # Actualizar job con error
-        await db.generation_jobs.update_one(
-            {"_id": job_id},
-            {
-                "$set": {
-                    "status": "failed",
-                    "error_message": str(e),
-                    "error_reason": error_type,
-                    "completed_at": datetime.now(timezone.utc),
-                    "retry_count": retry_count
-                }
-            }
-        )
-        
-        await add_job_log(job_id, "failed", f"Error: {str(e)}")
-
-
-# ========== WATCHDOG DE TIMEOUT ==========
-
-async def job_timeout_watchdog():
-    """
-    1️⃣ TIMEOUT WATCHDOG
-    Revisa jobs en "running" por más de 30 minutos y los marca como failed.
-    Se ejecuta cada 5 minutos.
-    """
-    # Delay inicial para permitir que el servidor arranque completamente
-    await asyncio.sleep(10)
-    
-    timeout_minutes = 30
-    
-    while True:
-        try:
-            cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=timeout_minutes)
-            
-            # Buscar jobs en running que empezaron hace más de 30 minutos
-            stuck_jobs = await db.generation_jobs.find({
-                "status": "running",
-                "started_at": {"$lt": cutoff_time}
-            }).to_list(length=100)
-            
-            for job in stuck_jobs:
-                job_id = job["_id"]
-                logger.warning(f"⚠️ Watchdog: Job {job_id} excedió timeout de {timeout_minutes} min")
-                
-                # Marcar como failed con timeout
-                await db.generation_jobs.update_one(
-                    {"_id": job_id},
-                    {
-                        "$set": {
-                            "status": "failed",
-                            "error_message": f"Job excedió timeout de {timeout_minutes} minutos",
-                            "error_reason": "timeout",
-                            "completed_at": datetime.now(timezone.utc)
-                        }
-                    }
-                )
-                
-                try:
-                    await add_job_log(job_id, "timeout", f"Job marcado como failed por timeout ({timeout_minutes} min)")
-                except:
-                    pass  # Si falla el log, no bloquear
-            
-            if stuck_jobs:
-                logger.info(f"✅ Watchdog: {len(stuck_jobs)} job(s) marcado(s) como failed por timeout")
-            
-        except Exception as e:
-            logger.error(f"❌ Error en watchdog de timeout: {e}")
-        
-        # Esperar 5 minutos antes de la próxima revisión
-        await asyncio.sleep(300)
-
-async def process_queued_jobs():
-    """
-    4️⃣ PROCESADOR DE COLA
-    Revisa jobs en "queued" y los procesa si hay espacio.
-    Se ejecuta cada 30 segundos.
-    """
-    # Delay inicial para permitir que el servidor arranque completamente
-    await asyncio.sleep(15)
+        # Actualizar job con error (incluye lo acumulado en la fase en curso)
+        state.set({
+            "status": "failed",
+            "error_message": str(e),
+            "error_reason": error_type,
+            "completed_at": datetime.now(timezone.utc),
+            "retry_count": retry_count
+        })
+        state.log("failed", f"Error: {str(e)}")
+        await state.flush()
     
-    while True:
-        try:
-            # Contar jobs en running
-            running_count = await db.generation_jobs.count_documents({"status": "running"})
-            
-            if running_count < 2:
-                # Hay espacio, buscar jobs en cola
-                queued_jobs = await db.generation_jobs.find(
-                    {"status": "queued"}
-                ).sort("created_at", 1).limit(2 - running_count).to_list(length=10)
-                
-                for job in queued_jobs:
-                    job_id = job["_id"]
-                    logger.info(f"🚀 Procesando job de cola: {job_id}")
-                    
-                    # Lanzar procesamiento
-                    asyncio.create_task(process_generation_job(job_id))
-                    await asyncio.sleep(1)  # Pequeño delay entre jobs
-        
-        except Exception as e:
-            logger.error(f"❌ Error en procesador de cola: {e}")
-        
-        # Esperar 30 segundos antes de la próxima revisión
-        await asyncio.sleep(30)
+    finally:
+        if heartbeat_task:
+            heartbeat_task.cancel()
 
 
 @api_router.post("/admin/users/{user_id}/plans/generate_async")
@@ -14246,17 +13574,14 @@ async def generate_plans_async(
         today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
         
         # Contar jobs creados hoy
-        jobs_today = await db.generation_jobs.count_documents({
-            "user_id": user_id,
-            "created_at": {"$gte": today_start}
-        })
+        jobs_today = await db.generation_jobs.count_documents(
+            jobs_created_since_filter(user_id, today_start)
+        )
         
         # Contar jobs FULL creados hoy
-        full_jobs_today = await db.generation_jobs.count_documents({
-            "user_id": user_id,
-            "type": "full",
-            "created_at": {"$gte": today_start}
-        })
+        full_jobs_today = await db.generation_jobs.count_documents(
+            jobs_created_since_filter(user_id, today_start, "full")
+        )
         
         # Aplicar límites
         if request_data.mode == "full" and full_jobs_today >= 5:
@@ -14352,33 +13677,37 @@ async def generate_plans_async(
         raise HTTPException(status_code=500, detail=f"Error creando job: {str(e)}")
 
 
+def _job_status_payload(job: dict) -> dict:
+    """Respuesta de estado de un job (documento proyectado con JOB_STATUS_PROJECTION)"""
+    job_serialized = _serialize_datetime_fields(job)
+    return {
+        "job_id": job_serialized["_id"],
+        "user_id": job_serialized["user_id"],
+        "type": job_serialized["type"],
+        "status": job_serialized["status"],
+        "progress": job_serialized["progress"],
+        "result": job_serialized["result"],
+        "error_message": job_serialized.get("error_message"),
+        "created_at": job_serialized["created_at"],
+        "started_at": job_serialized.get("started_at"),
+        "completed_at": job_serialized.get("completed_at")
+    }
+
+
 @api_router.get("/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """
     Consulta el estado de un job de generación.
     Endpoint público (no requiere autenticación) para simplificar polling.
+    No devuelve execution_log ni token_usage (proyección).
     """
     try:
-        job = await db.generation_jobs.find_one({"_id": job_id})
+        job = await db.generation_jobs.find_one({"_id": job_id}, JOB_STATUS_PROJECTION)
         
         if not job:
             raise HTTPException(status_code=404, detail="Job no encontrado")
         
-        # Serializar datetime fields
-        job_serialized = _serialize_datetime_fields(job)
-        
-        return {
-            "job_id": job_serialized["_id"],
-            "user_id": job_serialized["user_id"],
-            "type": job_serialized["type"],
-            "status": job_serialized["status"],
-            "progress": job_serialized["progress"],
-            "result": job_serialized["result"],
-            "error_message": job_serialized.get("error_message"),
-            "created_at": job_serialized["created_at"],
-            "started_at": job_serialized.get("started_at"),
-            "completed_at": job_serialized.get("completed_at")
-        }
+        return _job_status_payload(job)
         
     except HTTPException:
         raise
@@ -14387,6 +13716,104 @@ async def get_job_status(job_id: str):
         raise HTTPException(status_code=500, detail=f"Error consultando job: {str(e)}")
 
 
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Stream SSE del progreso de un job (sustituye al polling de GET /jobs/{job_id}).
+    
+    Eventos (data: JSON con "type"):
+    - snapshot: estado completo al conectar y cada job_event_bus.resync_seconds sin eventos
+    - progress / agent_completed / log
+    - completed / failed: último evento, el stream se cierra
+    
+    Sin JOB_EVENTS_URL (bus en memoria) los eventos de job_worker.py no
+    llegan y cada suscriptor relee el job de Mongo cada
+    JOB_STREAM_POLL_SECONDS (3 s): la misma carga que el polling. La
+    reducción solo se nota con el bus de Redis.
+    """
+    async def snapshot():
+        job = await db.generation_jobs.find_one({"_id": job_id}, JOB_STATUS_PROJECTION)
+        return job_event("snapshot", job_id, job=_job_status_payload(job)) if job else None
+    
+    if not await db.generation_jobs.find_one({"_id": job_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    
+    def sse(event: dict) -> str:
+        return f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+    
+    async def event_stream():
+        # La suscripción vive dentro del generador: si el cliente se
+        # desconecta antes de empezar o a mitad, se libera al cerrarlo.
+        # Snapshot DESPUÉS de suscribirse para no perder eventos intermedios
+        async with job_event_bus.subscribe(job_id) as queue:
+            first = await snapshot()
+            if not first:
+                return
+            yield sse(first)
+            if first["job"]["status"] in TERMINAL_EVENTS:
+                return
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), job_event_bus.resync_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Respaldo: el bus puede no llegar al worker (bus en memoria)
+                    event = await snapshot()
+                    if not event:
+                        return
+                    yield sse(event)
+                    if event["job"]["status"] in TERMINAL_EVENTS:
+                        return
+                    continue
+                
+                yield sse(event)
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@api_router.get("/admin/jobs/workers")
+async def get_job_workers(request: Request):
+    """
+    Métricas por worker de job_worker.py (throughput, jobs completados/fallidos).
+    Los workers publican sus métricas en la colección job_workers.
+    """
+    await require_admin(request)
+    
+    workers = await db.job_workers.find({}).sort("_id", 1).to_list(length=200)
+    stale_cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+    
+    for worker in workers:
+        last_seen = worker.get("last_seen")
+        if last_seen and last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        worker["alive"] = bool(last_seen and last_seen >= stale_cutoff)
+        worker["worker_id"] = worker.pop("_id")
+    
+    return {
+        "workers": _serialize_datetime_fields(workers),
+        "total_workers": len(workers),
+        "alive_workers": sum(1 for w in workers if w["alive"])
+    }
+
+
+@api_router.get("/admin/llm/metrics")
+async def get_llm_gateway_metrics(request: Request):
+    """
+    Histogramas de latencia y tokens por operación del llm_gateway
+    (desde el arranque de este proceso).
+    """
+    await require_admin(request)
+    return {"operations": get_llm_metrics()}
+
+
 
 
 # Include the router in the main app (moved to end to include all endpoints)
@@ -14403,11 +13830,22 @@ async def startup_db_verification():
         await db.command('ping')
         logger.info(f"✅ Successfully connected to database: {db_name}")
         
-        # WATCHDOGS DESHABILITADOS - Causan bloqueo del event loop durante generación
-        # TODO: Migrar a worker separado (Celery/RQ) para jobs en background
-        # asyncio.create_task(job_timeout_watchdog())
-        # asyncio.create_task(process_queued_jobs())
-        logger.info("⚠️ Job watchdogs deshabilitados (causan bloqueo del event loop)")
+        # Índices declarados en db_indexes.WEB_INDEXES (solo crea los que faltan)
+        await reconcile_indexes(db)
+        await start_email_outbox()
+        await job_event_bus.start()
+        
+        # Purges de clientes interrumpidos por un reinicio (lease expirado)
+        await resume_stale_purges(db, client[os.getenv('MONGO_EDN360_APP_DB_NAME', 'edn360_app')])
+        
+        # Precálculo opcional de los bloques A/C/D (TEMPLATE_CACHE_WARM)
+        from templates.block_cache import TEMPLATE_CACHE_WARM, warm_template_cache
+        if TEMPLATE_CACHE_WARM:
+            await asyncio.to_thread(warm_template_cache)
+        
+        # Los jobs de generación (y su watchdog de timeout) se ejecutan en
+        # job_worker.py, fuera del proceso de la API
+        logger.info("ℹ️ Jobs de generación delegados a job_worker.py")
         
     except Exception as e:
         logger.error(f"❌ CRITICAL: Failed to connect to database {db_name}: {e}")
@@ -14436,4 +13874,9 @@ async def startup_fase3_indexes():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await stop_email_outbox()
+    await job_event_bus.close()
+    await close_llm_gateway()
+    shutdown_pdf_renderer()
+    shutdown_calendar_executor()
+    close_client()
\ No newline at end of file
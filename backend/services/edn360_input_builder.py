@@ -16,7 +16,6 @@ import os
 import logging
 from typing import Optional
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
 
 from edn360_models.edn360_input import (
     EDN360Input,
@@ -26,14 +25,13 @@ from edn360_models.edn360_input import (
     EDN360NoQuestionnaireError
 )
 from repositories.client_drawer_repository import get_drawer_by_user_id
+from database import get_client
 
 # Configuración
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
 MONGO_WEB_DB_NAME = os.getenv('MONGO_WEB_DB_NAME', 'test_database')
 
-# Cliente MongoDB para BD Web
-client_web = AsyncIOMotorClient(MONGO_URL)
-db_web = client_web[MONGO_WEB_DB_NAME]
+# BD Web (cliente MongoDB compartido)
+db_web = get_client()[MONGO_WEB_DB_NAME]
 
 # Logger
 logger = logging.getLogger(__name__)
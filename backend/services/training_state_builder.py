@@ -0,0 +1,345 @@
+"""
+Training State Builder - STATE acotado para el workflow evolutivo de entrenamiento
+
+Construye el STATE que recibe el workflow:
+- initial_questionnaire: completo (lo usan las plantillas de bloques)
+- previous_followups: los últimos TRAINING_STATE_WINDOW seguimientos
+- previous_plans: digests de los planes (título, objetivo, sesiones y
+  códigos de ejercicio), mantenidos en edn360_app.training_state_summaries
+- last_plan: el único plan completo (el más reciente o el seleccionado)
+- history_summary: métricas clave por mes y lo que quedó fuera de la ventana
+
+Si supera TRAINING_STATE_MAX_BYTES se recortan primero los datos más antiguos.
+
+Configuración: TRAINING_STATE_WINDOW, TRAINING_STATE_MAX_BYTES
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from database import get_edn360_db
+
+logger = logging.getLogger(__name__)
+
+TRAINING_STATE_WINDOW = int(os.getenv('TRAINING_STATE_WINDOW', '6'))
+TRAINING_STATE_MAX_BYTES = int(os.getenv('TRAINING_STATE_MAX_BYTES', '120000'))
+
+# Aproximación habitual para texto JSON: ~4 bytes por token
+BYTES_PER_TOKEN = 4
+
+# Métricas por mes extraídas de los cuestionarios (clave en el resumen → ruta en el payload)
+MONTHLY_METRIC_PATHS = {
+    "peso": [("measurements", "peso"), ("responses", "peso"), ("peso",)],
+    "grasa_corporal": [("measurements", "grasa_corporal"), ("responses", "grasa_corporal")],
+    "masa_muscular": [("measurements", "masa_muscular")],
+    "cintura": [("measurements", "circunferencia_cintura"), ("responses", "cintura")],
+    "constancia_entrenamiento": [("adherence", "constancia_entrenamiento")],
+    "seguimiento_alimentacion": [("adherence", "seguimiento_alimentacion")],
+    "molestias": [("changes_perceived", "molestias_dolor_lesion")],
+}
+
+
+# ============================================
+# SERIALIZACIÓN
+# ============================================
+
+def _serialize(data):
+    """datetime → ISO string (recursivo)"""
+    if isinstance(data, datetime):
+        return data.isoformat()
+    elif isinstance(data, dict):
+        return {key: _serialize(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [_serialize(item) for item in data]
+    return data
+
+
+def _iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def serialize_questionnaire(q) -> dict:
+    """SharedQuestionnaire → dict JSON-safe para el workflow"""
+    return {
+        "submission_id": q.submission_id,
+        "submitted_at": _iso(q.submitted_at),
+        "source": q.source,
+        "payload": _serialize(q.raw_payload)
+    }
+
+
+def state_size_bytes(state: dict) -> int:
+    return len(json.dumps(state, default=str, ensure_ascii=False).encode("utf-8"))
+
+
+# ============================================
+# DIGESTS DE PLANES (incrementales)
+# ============================================
+
+def _plan_version(plan_ref: dict) -> str:
+    """Identifica la versión de un plan: cambia si se edita"""
+    return _iso(plan_ref.get("last_edited_at") or plan_ref.get("updated_at") or plan_ref.get("created_at")) or ""
+
+
+def digest_training_plan(plan_doc: dict) -> dict:
+    """
+    Resumen compacto de un plan de training_plans_v2
+
+    Mantiene lo que el workflow necesita para evolucionar el plan
+    (estructura, objetivo y ejercicios usados) sin notas ni bloques.
+    """
+    plan = plan_doc.get("plan") or {}
+    sessions = []
+    for session in plan.get("sessions", []) or []:
+        exercise_codes = []
+        for block in session.get("blocks", []) or []:
+            for exercise in block.get("exercises", []) or []:
+                types = exercise.get("exercise_types") or []
+                code = exercise.get("exercise_code") or (types[0] if types else None)
+                if code:
+                    exercise_codes.append(code)
+        sessions.append({
+            "name": session.get("name"),
+            "focus": session.get("focus"),
+            "exercises": exercise_codes
+        })
+
+    return {
+        "plan_id": str(plan_doc.get("_id", "")),
+        "created_at": _iso(plan_doc.get("created_at")),
+        "version": _plan_version(plan_doc),
+        "title": plan.get("title"),
+        "goal": plan.get("goal"),
+        "training_type": plan.get("training_type"),
+        "days_per_week": plan.get("days_per_week"),
+        "session_duration_min": plan.get("session_duration_min"),
+        "weeks": plan.get("weeks"),
+        "sessions": sessions
+    }
+
+
+async def record_plan_digest(user_id: str, plan_doc: dict):
+    """
+    Guarda/actualiza el digest de un plan en training_state_summaries
+    (llamar al guardar un plan; si no se llama, el builder lo recalcula)
+    """
+    digest = digest_training_plan(plan_doc)
+    await get_edn360_db().training_state_summaries.update_one(
+        {"_id": user_id},
+        {
+            "$set": {
+                f"plan_digests.{digest['plan_id']}": digest,
+                "updated_at": datetime.now(timezone.utc)
+            }
+        },
+        upsert=True
+    )
+
+
+async def get_plan_digests(user_id: str, plan_refs: list) -> list:
+    """
+    Digests de los planes indicados (en el orden de plan_refs)
+
+    Solo lee de BD el campo `plan` de los planes sin digest o editados
+    desde el último digest.
+    """
+    if not plan_refs:
+        return []
+
+    edn360_db = get_edn360_db()
+    summary = await edn360_db.training_state_summaries.find_one({"_id": user_id}, {"plan_digests": 1}) or {}
+    digests = summary.get("plan_digests", {})
+
+    stale_ids = [
+        ref["_id"] for ref in plan_refs
+        if digests.get(str(ref["_id"]), {}).get("version") != _plan_version(ref)
+    ]
+
+    if stale_ids:
+        stale_plans = await edn360_db.training_plans_v2.find(
+            {"_id": {"$in": stale_ids}},
+            {"_id": 1, "created_at": 1, "updated_at": 1, "last_edited_at": 1, "plan": 1}
+        ).to_list(length=len(stale_ids))
+
+        updates = {}
+        for plan_doc in stale_plans:
+            digest = digest_training_plan(plan_doc)
+            digests[digest["plan_id"]] = digest
+            updates[f"plan_digests.{digest['plan_id']}"] = digest
+
+        if updates:
+            updates["updated_at"] = datetime.now(timezone.utc)
+            await edn360_db.training_state_summaries.update_one(
+                {"_id": user_id}, {"$set": updates}, upsert=True
+            )
+        logger.info(f"🧾 Digests de planes actualizados: {len(updates) - 1 if updates else 0} (user {user_id})")
+
+    return [digests[str(ref["_id"])] for ref in plan_refs if str(ref["_id"]) in digests]
+
+
+# ============================================
+# MÉTRICAS MENSUALES
+# ============================================
+
+def _get_path(payload: dict, path: tuple):
+    value = payload
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def summarize_monthly_metrics(questionnaires: list) -> dict:
+    """
+    Métricas clave por mes (YYYY-MM) a partir de los cuestionarios.
+    Si hay varios en el mismo mes, prevalece el más reciente.
+    """
+    monthly = {}
+    for q in sorted(questionnaires, key=lambda q: q.submitted_at):
+        month = _iso(q.submitted_at)[:7]
+        payload = q.raw_payload or {}
+        metrics = monthly.setdefault(month, {})
+        for metric, paths in MONTHLY_METRIC_PATHS.items():
+            for path in paths:
+                value = _get_path(payload, path)
+                if value not in (None, ""):
+                    metrics[metric] = value
+                    break
+    return {month: metrics for month, metrics in monthly.items() if metrics}
+
+
+# ============================================
+# BUILDER
+# ============================================
+
+def _trim_to_budget(state: dict, max_bytes: int) -> bool:
+    """Recorta el STATE hasta caber en max_bytes. Devuelve True si recortó."""
+    summary = state["history_summary"]
+    trimmed = False
+
+    while state_size_bytes(state) > max_bytes:
+        if state["previous_followups"]:
+            state["previous_followups"].pop(0)
+            summary["omitted_followups"] += 1
+        elif state["previous_plans"]:
+            state["previous_plans"].pop(0)
+            summary["omitted_plans"] += 1
+        elif summary["monthly_metrics"]:
+            oldest_month = min(summary["monthly_metrics"])
+            del summary["monthly_metrics"][oldest_month]
+        else:
+            # Solo quedan initial_questionnaire y last_plan (siempre se envían)
+            break
+        trimmed = True
+
+    return trimmed
+
+
+async def build_training_state(
+    user_id: str,
+    initial_questionnaire,
+    previous_followups: list,
+    previous_training_plan_id: Optional[str] = None,
+    window: int = TRAINING_STATE_WINDOW,
+    max_bytes: int = TRAINING_STATE_MAX_BYTES
+) -> tuple:
+    """
+    Construye el STATE del workflow evolutivo de entrenamiento
+
+    Args:
+        user_id: ID del usuario
+        initial_questionnaire: SharedQuestionnaire más antiguo
+        previous_followups: SharedQuestionnaires entre el inicial y el actual
+        previous_training_plan_id: Plan seleccionado en la UI (se usan los planes hasta él)
+        window: Número de seguimientos / digests incluidos
+        max_bytes: Presupuesto de tamaño del STATE serializado
+
+    Returns:
+        (state, metrics) - metrics incluye state_bytes y state_tokens_est
+    """
+    started = time.perf_counter()
+    edn360_db = get_edn360_db()
+
+    # Referencias de planes: solo metadatos, sin el campo `plan`
+    plan_refs = await edn360_db.training_plans_v2.find(
+        {"user_id": user_id, "plan": {"$ne": None}},
+        {"_id": 1, "created_at": 1, "updated_at": 1, "last_edited_at": 1}
+    ).sort("created_at", 1).to_list(length=None)
+    total_plans = len(plan_refs)
+
+    # Si se seleccionó un plan previo en la UI, usar solo los planes hasta él (inclusive)
+    if previous_training_plan_id:
+        selected_index = next(
+            (
+                i for i, ref in enumerate(plan_refs)
+                if str(ref.get("_id", "")) == previous_training_plan_id
+                or ref.get("created_at") == previous_training_plan_id
+            ),
+            -1
+        )
+        if selected_index >= 0:
+            plan_refs = plan_refs[:selected_index + 1]
+        else:
+            logger.warning(f"⚠️ Plan seleccionado {previous_training_plan_id} no encontrado, usando todos los planes")
+
+    # Único plan completo: el último
+    last_plan = None
+    if plan_refs:
+        last_plan = await edn360_db.training_plans_v2.find_one(
+            {"_id": plan_refs[-1]["_id"]},
+            {"_id": 1, "created_at": 1, "plan": 1}
+        )
+        if last_plan:
+            last_plan["_id"] = str(last_plan["_id"])
+            last_plan = _serialize(last_plan)
+
+    # Digests de los planes anteriores al último, dentro de la ventana
+    window = max(window, 0)
+    digest_refs = plan_refs[:-1][-window:] if window else []
+    previous_plans = await get_plan_digests(user_id, digest_refs)
+
+    windowed_followups = previous_followups[-window:] if window else []
+
+    state = {
+        "initial_questionnaire": serialize_questionnaire(initial_questionnaire),
+        "previous_followups": [serialize_questionnaire(q) for q in windowed_followups],
+        "previous_plans": previous_plans,
+        "last_plan": last_plan,
+        "history_summary": {
+            "total_plans": total_plans,
+            "total_followups": len(previous_followups),
+            "omitted_plans": max(len(plan_refs) - 1, 0) - len(previous_plans),
+            "omitted_followups": len(previous_followups) - len(windowed_followups),
+            "monthly_metrics": summarize_monthly_metrics([initial_questionnaire, *previous_followups])
+        }
+    }
+
+    trimmed = _trim_to_budget(state, max_bytes)
+    state_bytes = state_size_bytes(state)
+
+    metrics = {
+        "state_bytes": state_bytes,
+        "state_tokens_est": state_bytes // BYTES_PER_TOKEN,
+        "plans_in_state": len(state["previous_plans"]) + (1 if last_plan else 0),
+        "followups_in_state": len(state["previous_followups"]),
+        "total_plans": total_plans,
+        "total_followups": len(previous_followups),
+        "trimmed_to_budget": trimmed,
+        "build_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+    logger.info(
+        f"📦 STATE construido | user {user_id} | {state_bytes} bytes (~{metrics['state_tokens_est']} tokens) | "
+        f"planes {metrics['plans_in_state']}/{total_plans} | "
+        f"seguimientos {metrics['followups_in_state']}/{len(previous_followups)}"
+        f"{' | recortado al presupuesto' if trimmed else ''}"
+    )
+
+    return state, metrics
@@ -0,0 +1,220 @@
+"""
+Socket Chat - Chat admin ↔ cliente en tiempo real (Socket.IO)
+
+- La identidad (user_id, name, role) vive en la sesión del socket.
+- Cada socket entra en la room user_<id> y, si es admin, en "admins"; los
+  mensajes se emiten a [user_<cliente>, admins].
+- Con SOCKETIO_MESSAGE_QUEUE (redis:// o amqp://) los emits se reparten
+  entre todos los workers; sin ella, AsyncManager en memoria.
+
+Con varios workers y transporte polling el balanceador debe usar sticky
+sessions (requisito de Socket.IO).
+
+Configuración: SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL
+"""
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+import socketio
+
+from conversation_store import append_message
+
+logger = logging.getLogger(__name__)
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'edn360-socketio')
+
+ADMINS_ROOM = "admins"
+
+
+def user_room(user_id: str) -> str:
+    """Room con todas las pestañas abiertas de un usuario"""
+    return f"user_{user_id}"
+
+
+def chat_room(user_id: str) -> str:
+    """Room de la conversación de un cliente (admins que la tienen abierta)"""
+    return f"chat_{user_id}"
+
+
+def create_client_manager(url: Optional[str] = None) -> socketio.AsyncManager:
+    """
+    Client manager según la URL de la cola (None → SOCKETIO_MESSAGE_QUEUE)
+
+    Sin URL devuelve el AsyncManager en memoria (un solo proceso).
+    """
+    url = SOCKETIO_MESSAGE_QUEUE if url is None else url
+
+    if not url:
+        return socketio.AsyncManager()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info(f"📡 Socket.IO con cola Redis (canal {SOCKETIO_CHANNEL})")
+        return socketio.AsyncRedisManager(url, channel=SOCKETIO_CHANNEL)
+    if url.startswith(("amqp://", "amqps://")):
+        logger.info(f"📡 Socket.IO con cola AMQP (canal {SOCKETIO_CHANNEL})")
+        return socketio.AsyncAioPikaManager(url, channel=SOCKETIO_CHANNEL)
+
+    raise ValueError(f"SOCKETIO_MESSAGE_QUEUE no soportada: {url}")
+
+
+def create_socket_server(client_manager: Optional[socketio.AsyncManager] = None) -> socketio.AsyncServer:
+    """AsyncServer ASGI con el client manager indicado (o el de la configuración)"""
+    return socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins='*',
+        client_manager=client_manager or create_client_manager(),
+        logger=True,
+        engineio_logger=True
+    )
+
+
+async def _resolve_token(db, token: str) -> Optional[str]:
+    """user_id de un session_token vigente o de un JWT (None si no es válido)"""
+    session = await db.user_sessions.find_one({"session_token": token}, {"user_id": 1, "expires_at": 1})
+    if session:
+        expires_at = session["expires_at"]
+        # Motor devuelve datetimes naive (UTC) salvo con tz_aware=True
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at > datetime.now(timezone.utc):
+            return session["user_id"]
+
+    try:
+        from auth import decode_token
+        return decode_token(token)
+    except Exception:
+        return None
+
+
+def _socket_payload(message: dict) -> dict:
+    """Mensaje con las fechas en ISO (Socket.IO serializa con json estándar)"""
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in message.items()
+    }
+
+
+async def emit_new_message(sio: socketio.AsyncServer, message: dict):
+    """
+    Una sola emisión de new_message: pestañas del cliente, su room de chat
+    y todos los admins (la lista de rooms se deduplica por sid)
+    """
+    recipient_id = message["user_id"]
+    await sio.emit(
+        'new_message',
+        _socket_payload(message),
+        room=[user_room(recipient_id), chat_room(recipient_id), ADMINS_ROOM]
+    )
+
+
+def register_chat_events(sio: socketio.AsyncServer, db):
+    """Registra los eventos del chat en el servidor Socket.IO"""
+
+    @sio.event
+    async def connect(sid, environ):
+        """Handle client connection"""
+        logger.info(f"Client connected: {sid}")
+        await sio.emit('connected', {'status': 'connected'}, room=sid)
+
+    @sio.event
+    async def disconnect(sid):
+        """Handle client disconnection (las rooms y la sesión se liberan solas)"""
+        logger.info(f"Client disconnected: {sid}")
+
+    @sio.event
+    async def authenticate(sid, data):
+        """Authenticate user via session_token or JWT"""
+        try:
+            token = data.get('token')
+            if not token:
+                await sio.emit('auth_error', {'message': 'No token provided'}, room=sid)
+                return
+
+            user_id = await _resolve_token(db, token)
+            if not user_id:
+                await sio.emit('auth_error', {'message': 'Invalid token'}, room=sid)
+                return
+
+            user = await db.users.find_one({"_id": user_id}, {"name": 1, "role": 1})
+            if not user:
+                await sio.emit('auth_error', {'message': 'User not found'}, room=sid)
+                return
+
+            # Re-autenticación con otro usuario en el mismo socket
+            previous = await sio.get_session(sid)
+            if previous.get('user_id') and previous['user_id'] != user_id:
+                await sio.leave_room(sid, user_room(previous['user_id']))
+                await sio.leave_room(sid, ADMINS_ROOM)
+
+            identity = {'user_id': user_id, 'name': user.get('name'), 'role': user.get('role')}
+            await sio.save_session(sid, identity)
+            await sio.enter_room(sid, user_room(user_id))
+            if identity['role'] == 'admin':
+                await sio.enter_room(sid, ADMINS_ROOM)
+
+            await sio.emit('authenticated', identity, room=sid)
+            logger.info(f"User {user_id} authenticated on socket {sid}")
+        except Exception as e:
+            logger.error(f"Authentication error: {e}")
+            await sio.emit('auth_error', {'message': str(e)}, room=sid)
+
+    @sio.event
+    async def send_message(sid, data):
+        """Handle incoming chat messages"""
+        try:
+            sender = await sio.get_session(sid)
+            sender_id = sender.get('user_id')
+            if not sender_id:
+                await sio.emit('error', {'message': 'Not authenticated'}, room=sid)
+                return
+
+            is_admin = sender['role'] == 'admin'
+
+            # Determine recipient (for admin-client chat)
+            recipient_id = data.get('user_id') if is_admin else sender_id
+            message_text = data.get('message')
+
+            if not recipient_id:
+                await sio.emit('error', {'message': 'user_id is required'}, room=sid)
+                return
+            if not message_text:
+                await sio.emit('error', {'message': 'Message is required'}, room=sid)
+                return
+
+            message_dict = await append_message(
+                db,
+                recipient_id,
+                sender_id=sender_id,
+                sender_name=sender.get('name'),
+                text=message_text,
+                is_admin=is_admin
+            )
+
+            # Incluye las pestañas del remitente
+            await emit_new_message(sio, message_dict)
+
+            logger.info(f"Message from {sender_id} to {recipient_id}")
+
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
+            await sio.emit('error', {'message': str(e)}, room=sid)
+
+    @sio.event
+    async def join_chat(sid, data):
+        """Join a specific chat room (for admin viewing client chats)"""
+        try:
+            identity = await sio.get_session(sid)
+            user_id = data.get('user_id')
+            if not user_id or not identity.get('user_id'):
+                return
+            # Un cliente solo puede unirse a su propia conversación
+            if identity['role'] != 'admin' and user_id != identity['user_id']:
+                await sio.emit('error', {'message': 'Not allowed'}, room=sid)
+                return
+            await sio.enter_room(sid, chat_room(user_id))
+            logger.info(f"Socket {sid} joined {chat_room(user_id)}")
+        except Exception as e:
+            logger.error(f"Error joining chat: {e}")
@@ -16,7 +16,6 @@ Fecha: Diciembre 2025
 from typing import Dict, List, Optional
 from exercise_catalog_loader import (
     filter_exercises,
-    check_health_safety,
     enrich_exercise_with_variant
 )
 
@@ -141,13 +140,11 @@ def generate_warmup_block(
                 movement_pattern=pattern,
                 difficulty="principiante" if nivel == "principiante" else "intermedio",
                 environment=environment,
-                usable_for_plans=True
+                usable_for_plans=True,
+                # Filtrar por seguridad si hay lesiones
+                safe_for=["shoulder"] if "shoulder" in injuries else None
             )
             
-            # Filtrar por seguridad si hay lesiones
-            if "shoulder" in injuries:
-                candidates = [ex for ex in candidates if check_health_safety(ex, 'shoulder') == 'seguro']
-            
             if candidates:
                 # Tomar el primero que sea bodyweight o banda si es posible
                 for ex in candidates:
@@ -170,12 +167,10 @@ def generate_warmup_block(
             movement_pattern="core_antirotacion",
             difficulty="principiante",
             environment=environment,
-            usable_for_plans=True
+            usable_for_plans=True,
+            safe_for=["low_back"] if "low_back" in injuries else None
         )
         
-        if "low_back" in injuries:
-            core_exercises = [ex for ex in core_exercises if check_health_safety(ex, 'low_back') == 'seguro']
-        
         if core_exercises:
             activation_exercises.append({
                 "exercise_code": core_exercises[0]['exercise_code'],
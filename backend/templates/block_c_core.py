@@ -21,7 +21,6 @@ Fecha: Diciembre 2025
 from typing import Dict, List, Optional
 from exercise_catalog_loader import (
     filter_exercises,
-    check_health_safety,
     enrich_exercise_with_variant
 )
 
@@ -94,13 +93,11 @@ def generate_core_block(
         movement_pattern="core_antirotacion",
         difficulty=nivel if nivel != "avanzado" else "intermedio",  # Avanzados pueden hacer intermedios
         environment=environment,
-        usable_for_plans=True
+        usable_for_plans=True,
+        # Filtrar por seguridad lumbar
+        safe_for=["low_back"] if has_back_injury else None
     )
     
-    # Filtrar por seguridad lumbar
-    if has_back_injury:
-        antirot_exercises = [ex for ex in antirot_exercises if check_health_safety(ex, 'low_back') == 'seguro']
-    
     # Priorizar bird_dog (clásico y seguro)
     antirot_selected = None
     for ex in antirot_exercises:
@@ -131,12 +128,10 @@ def generate_core_block(
             movement_pattern="core_antiextension",
             difficulty="principiante" if nivel == "principiante" else "intermedio",
             environment=environment,
-            usable_for_plans=True
+            usable_for_plans=True,
+            safe_for=["low_back"] if has_back_injury else None
         )
         
-        if has_back_injury:
-            antiext_exercises = [ex for ex in antiext_exercises if check_health_safety(ex, 'low_back') == 'seguro']
-        
         # Priorizar plancha frontal
         antiext_selected = None
         for ex in antiext_exercises:
@@ -0,0 +1,186 @@
+"""
+Block Cache - Bloques A, C, D memorizados
+==========================================
+Caché LRU sobre los templates paramétricos de bloques A/C/D
+
+Los bloques se guardan congelados (MappingProxyType y tuplas) porque se
+comparten entre sesiones y planes: thaw() devuelve una copia mutable.
+warm_template_cache() precalcula las combinaciones que usa
+_integrate_template_blocks.
+
+Configuración: TEMPLATE_CACHE_SIZE, TEMPLATE_CACHE_WARM,
+TEMPLATE_WARM_DURATIONS
+
+Benchmark:
+    python /app/backend/bench_template_blocks.py
+"""
+
+import os
+import time
+import logging
+from functools import lru_cache
+from itertools import combinations, product
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from templates.block_a_warmup import generate_warmup_block
+from templates.block_c_core import generate_core_block
+from templates.block_d_cardio import generate_cardio_block
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', '1024'))
+TEMPLATE_CACHE_WARM = os.getenv('TEMPLATE_CACHE_WARM', 'false').lower() in ('1', 'true', 'yes')
+TEMPLATE_WARM_DURATIONS = tuple(
+    int(value) for value in os.getenv('TEMPLATE_WARM_DURATIONS', '45,60,75,90').split(',') if value.strip()
+)
+
+# Valores que usa _integrate_template_blocks (para el precálculo)
+WARM_FOCUS = ('upper', 'lower', 'full_body')
+WARM_VOLUMENES_B = ('bajo', 'medio', 'alto')
+WARM_INJURIES = ('shoulder', 'low_back')
+WARM_ENVIRONMENTS = ('gym',)
+WARM_DIAS = (2, 3, 4, 5, 6)
+
+
+def freeze(value: Any) -> Any:
+    """Copia inmutable (dict → MappingProxyType, list → tuple)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Copia mutable de un bloque congelado (o de cualquier dict/list)"""
+    if isinstance(value, (MappingProxyType, dict)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _injury_key(injuries: Optional[List[str]]) -> Tuple[str, ...]:
+    return tuple(sorted(set(injuries or ())))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _warmup_block(training_focus, nivel, injuries, environment, session_duration_min) -> Mapping:
+    return freeze(generate_warmup_block(
+        training_focus=training_focus,
+        nivel=nivel,
+        injuries=list(injuries),
+        environment=environment,
+        session_duration_min=session_duration_min
+    ))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _core_block(nivel, objetivo, volumen_bloque_b, injuries, environment) -> Mapping:
+    return freeze(generate_core_block(
+        nivel=nivel,
+        objetivo=objetivo,
+        volumen_bloque_b=volumen_bloque_b,
+        injuries=list(injuries),
+        environment=environment
+    ))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _cardio_block(objetivo, nivel, volumen_bloque_b, injuries, dias_por_semana) -> Mapping:
+    # generate_cardio_block no usa session_duration_min: fuera de la clave
+    return freeze(generate_cardio_block(
+        objetivo=objetivo,
+        nivel=nivel,
+        volumen_bloque_b=volumen_bloque_b,
+        injuries=list(injuries),
+        dias_por_semana=dias_por_semana
+    ))
+
+
+def get_warmup_block(
+    training_focus: str,
+    nivel: str = "intermedio",
+    injuries: Optional[List[str]] = None,
+    environment: str = "gym",
+    session_duration_min: int = 60
+) -> Mapping:
+    """Block A memorizado (solo lectura; thaw() para modificarlo)"""
+    return _warmup_block(training_focus, nivel, _injury_key(injuries), environment, session_duration_min)
+
+
+def get_core_block(
+    nivel: str = "intermedio",
+    objetivo: str = "hipertrofia",
+    volumen_bloque_b: str = "medio",
+    injuries: Optional[List[str]] = None,
+    environment: str = "gym"
+) -> Mapping:
+    """Block C memorizado (solo lectura; thaw() para modificarlo)"""
+    return _core_block(nivel, objetivo, volumen_bloque_b, _injury_key(injuries), environment)
+
+
+def get_cardio_block(
+    objetivo: str = "hipertrofia",
+    nivel: str = "intermedio",
+    volumen_bloque_b: str = "medio",
+    injuries: Optional[List[str]] = None,
+    session_duration_min: int = 60,
+    dias_por_semana: int = 4
+) -> Mapping:
+    """Block D memorizado (solo lectura; thaw() para modificarlo)"""
+    return _cardio_block(objetivo, nivel, volumen_bloque_b, _injury_key(injuries), dias_por_semana)
+
+
+def template_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Aciertos / fallos / tamaño de cada caché de bloques"""
+    stats = {}
+    for name, cached in (('A', _warmup_block), ('C', _core_block), ('D', _cardio_block)):
+        info = cached.cache_info()
+        stats[name] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+    return stats
+
+
+def clear_template_cache():
+    for cached in (_warmup_block, _core_block, _cardio_block):
+        cached.cache_clear()
+
+
+def warm_template_cache(durations: Tuple[int, ...] = TEMPLATE_WARM_DURATIONS) -> int:
+    """
+    Precalcula los bloques de todas las combinaciones que genera
+    _integrate_template_blocks (niveles y objetivos de la taxonomía K1).
+
+    Returns:
+        Número de bloques precalculados
+    """
+    from k1_knowledge_base import get_taxonomia
+
+    taxonomia = get_taxonomia()
+    niveles = taxonomia['niveles_usuario']
+    objetivos = taxonomia['objetivos_principales']
+    injury_sets = [
+        list(combo) for size in range(len(WARM_INJURIES) + 1) for combo in combinations(WARM_INJURIES, size)
+    ]
+
+    start = time.perf_counter()
+    count = 0
+    for focus, nivel, injuries, environment, duration in product(
+        WARM_FOCUS, niveles, injury_sets, WARM_ENVIRONMENTS, durations
+    ):
+        get_warmup_block(focus, nivel, injuries, environment, duration)
+        count += 1
+    for nivel, objetivo, volumen_b, injuries, environment in product(
+        niveles, objetivos, WARM_VOLUMENES_B, injury_sets, WARM_ENVIRONMENTS
+    ):
+        get_core_block(nivel, objetivo, volumen_b, injuries, environment)
+        count += 1
+    for objetivo, nivel, volumen_b, injuries, dias in product(
+        objetivos, niveles, WARM_VOLUMENES_B, injury_sets, WARM_DIAS
+    ):
+        get_cardio_block(objetivo, nivel, volumen_b, injuries, dias_por_semana=dias)
+        count += 1
+
+    logger.info(f"🔥 Caché de bloques A/C/D precalculada: {count} bloques en {(time.perf_counter() - start) * 1000:.0f} ms")
+    return count
@@ -0,0 +1,147 @@
+"""
+Test de cobertura de índices (explain-plan regression)
+
+Las consultas salen de db_indexes.hot_queries(), construidas con los
+mismos filtros que usan los endpoints.
+
+- Sin Mongo: cada consulta caliente tiene un índice declarado en
+  db_indexes.WEB_INDEXES que la cubre (find_unindexed_queries).
+- Con Mongo: crea una BD temporal, siembra documentos, reconcilia los
+  índices y ejecuta explain() sobre cada consulta.
+
+FALLA si alguna consulta caliente se queda sin índice o cae en COLLSCAN
+(p.ej. porque se añadió un endpoint con una consulta nueva sin declarar
+su índice, o se cambió la forma de una consulta existente).
+
+Ejecución:
+    python /app/backend/test_index_coverage.py
+    pytest backend/test_index_coverage.py
+
+El test de explain requiere MongoDB en MONGO_URL (default:
+mongodb://localhost:27017); sin él se salta con el motivo. La BD temporal
+se borra al terminar.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+# pymongo/motor son dependencias del backend (requirements.txt)
+from motor import motor_asyncio
+
+from db_indexes import WEB_INDEXES, hot_queries, find_unindexed_queries, reconcile_indexes, explain_hot_queries
+
+MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
+SEED_DOCS_PER_COLLECTION = 200
+
+
+def _seed_value(field: str, i: int):
+    """Valor de ejemplo según el nombre del campo"""
+    base = datetime.now(timezone.utc)
+    if field in ("date", "timestamp", "fecha", "next_attempt_at") or field.endswith(("_at", "_date")):
+        return base - timedelta(hours=i)
+    if field == "completed":
+        return i % 2 == 0
+    if field == "role":
+        return "admin" if i == 0 else "user"
+    if field == "subscription.plan":
+        return "team" if i % 3 == 0 else "basic"
+    return f"{field}_{i % 20}"
+
+
+def _seed_document(collection_name: str, i: int) -> dict:
+    """Documento con todos los campos indexados de la colección"""
+    doc = {"_id": f"{collection_name}_{i}"}
+    for spec in WEB_INDEXES[collection_name]:
+        for field, _ in spec.keys:
+            if field == "_id":
+                continue
+            value = _seed_value(field, i)
+            if "." in field:
+                parent, child = field.split(".", 1)
+                doc.setdefault(parent, {})[child] = value
+            else:
+                doc[field] = value
+    return doc
+
+
+async def run_index_coverage() -> list:
+    """
+    Siembra una BD temporal y devuelve las consultas que hacen COLLSCAN
+    """
+    client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    db_name = f"index_coverage_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+
+    try:
+        try:
+            await client.admin.command('ping')
+        except Exception as e:
+            pytest.skip(f"MongoDB no disponible en {MONGO_URL}: {e}")
+
+        print(f"🌱 Sembrando {SEED_DOCS_PER_COLLECTION} documentos en {len(WEB_INDEXES)} colecciones...")
+        for collection_name in WEB_INDEXES:
+            docs = [_seed_document(collection_name, i) for i in range(SEED_DOCS_PER_COLLECTION)]
+            await db[collection_name].insert_many(docs)
+
+        report = await reconcile_indexes(db)
+        assert not report["errors"], f"Errores creando índices: {report['errors']}"
+        print(f"✅ Índices creados: {len(report['created'])}")
+
+        # Segunda pasada: ya no debe crear nada
+        report = await reconcile_indexes(db)
+        assert not report["created"], f"reconcile_indexes no es idempotente: {report['created']}"
+
+        results = await explain_hot_queries(db)
+        for result in results:
+            status = "❌ COLLSCAN" if result["collscan"] else "✅ IXSCAN"
+            print(f"   {status}  {result['collection']:40} {result['description']}")
+
+        return [result for result in results if result["collscan"]]
+
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+def test_hot_queries_have_declared_index():
+    """Cada consulta caliente tiene un índice declarado (no necesita Mongo)"""
+    unindexed = find_unindexed_queries()
+    assert not unindexed, "Consultas sin índice declarado: " + ", ".join(
+        f"{collection} ({description})" for collection, _, _, description in unindexed
+    )
+
+
+def test_hot_queries_use_indexes():
+    """Ninguna consulta caliente puede hacer COLLSCAN"""
+    collscans = asyncio.run(run_index_coverage())
+    assert not collscans, "Consultas sin índice: " + ", ".join(
+        f"{r['collection']} ({r['description']})" for r in collscans
+    )
+
+
+if __name__ == "__main__":
+    print("="*80)
+    print(" TEST: Cobertura de índices (explain)")
+    print("="*80)
+    print()
+
+    total = len(hot_queries())
+    unindexed = find_unindexed_queries()
+    for collection, _, _, description in unindexed:
+        print(f"❌ Sin índice declarado: {collection} ({description})")
+
+    collscans = asyncio.run(run_index_coverage())
+    print()
+    if unindexed or collscans:
+        print(f"❌ {len(unindexed)}/{total} sin índice declarado, {len(collscans)}/{total} hacen COLLSCAN")
+        sys.exit(1)
+    print(f"✅ {total} consultas calientes usan índice")
@@ -0,0 +1,196 @@
+"""
+Test del chat en tiempo real (socket_chat)
+
+Monta el servidor con create_socket_server y el AsyncManager en memoria,
+conecta sockets sin transporte real y comprueba:
+- _resolve_token con expires_at naive (como lo devuelve Motor)
+- Fan-out a todas las pestañas del cliente y a los admins, y a nadie más
+- Identidad tomada de la sesión del socket, no de los datos del evento
+
+Ejecución:
+    pytest backend/test_socket_chat.py
+"""
+
+import asyncio
+import inspect
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+socketio = pytest.importorskip("socketio")
+
+import socket_chat
+from socket_chat import create_socket_server, register_chat_events, _resolve_token
+
+NAMESPACE = "/"
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def find_one(self, query, projection=None):
+        for doc in self.docs:
+            if all(doc.get(key) == value for key, value in query.items()):
+                return doc
+        return None
+
+
+class _FakeDB:
+    def __init__(self, users, sessions):
+        self.users = _Collection(users)
+        self.user_sessions = _Collection(sessions)
+
+
+def _make_db():
+    expires = datetime.utcnow() + timedelta(days=1)  # naive, como Motor
+    users = [
+        {"_id": "admin1", "name": "Admin", "role": "admin"},
+        {"_id": "client1", "name": "Cliente 1", "role": "client"},
+        {"_id": "client2", "name": "Cliente 2", "role": "client"},
+    ]
+    sessions = [
+        {"session_token": f"tok-{user['_id']}", "user_id": user["_id"], "expires_at": expires}
+        for user in users
+    ]
+    return _FakeDB(users, sessions)
+
+
+def _decode(packet):
+    """(evento, datos) de un paquete enviado por el manager"""
+    data = packet.data
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    if isinstance(data, str):
+        data = json.loads(data[data.index("["):])
+    return data[0], (data[1] if len(data) > 1 else None)
+
+
+class _Harness:
+    """Servidor Socket.IO con sesiones y envíos en memoria"""
+
+    def __init__(self, monkeypatch, db):
+        self.sio = create_socket_server(socketio.AsyncManager())
+        register_chat_events(self.sio, db)
+        self.eio_sessions = {}
+        self.sent = []  # (eio_sid, evento, datos)
+
+        async def get_eio_session(eio_sid):
+            return self.eio_sessions.setdefault(eio_sid, {})
+
+        async def send(eio_sid, packet):
+            event, data = _decode(packet)
+            self.sent.append((eio_sid, event, data))
+
+        monkeypatch.setattr(self.sio.eio, "get_session", get_eio_session)
+        monkeypatch.setattr(self.sio, "_send_packet", send, raising=False)
+        monkeypatch.setattr(self.sio, "_send_eio_packet", send, raising=False)
+
+        self._message_seq = 0
+
+        async def fake_append_message(db, user_id, sender_id, sender_name, text, is_admin):
+            self._message_seq += 1
+            return {
+                "_id": f"{user_id}-{self._message_seq}",
+                "user_id": user_id,
+                "sender_id": sender_id,
+                "sender_name": sender_name,
+                "message": text,
+                "is_admin": is_admin,
+                "timestamp": datetime.now(timezone.utc),
+            }
+
+        monkeypatch.setattr(socket_chat, "append_message", fake_append_message)
+
+    async def connect(self, eio_sid: str) -> str:
+        sid = self.sio.manager.connect(eio_sid, NAMESPACE)
+        if inspect.isawaitable(sid):
+            sid = await sid
+        return sid
+
+    async def trigger(self, event: str, sid: str, data=None):
+        handler = self.sio.handlers[NAMESPACE][event]
+        await handler(sid, data)
+        await asyncio.sleep(0)  # el manager puede enviar en tasks
+
+    def received(self, event: str) -> dict:
+        """{eio_sid: [datos]} de los envíos de un evento"""
+        result = {}
+        for eio_sid, sent_event, data in self.sent:
+            if sent_event == event:
+                result.setdefault(eio_sid, []).append(data)
+        return result
+
+
+async def _connect_all(harness):
+    sockets = {
+        "client1-tab1": ("client1", await harness.connect("eio-client1-tab1")),
+        "client1-tab2": ("client1", await harness.connect("eio-client1-tab2")),
+        "client2": ("client2", await harness.connect("eio-client2")),
+        "admin": ("admin1", await harness.connect("eio-admin")),
+    }
+    for user_id, sid in sockets.values():
+        await harness.trigger("authenticate", sid, {"token": f"tok-{user_id}"})
+    assert not harness.received("auth_error")
+    harness.sent.clear()
+    return {name: sid for name, (_, sid) in sockets.items()}
+
+
+def test_resolve_token_accepts_naive_expires_at():
+    """Motor devuelve expires_at naive: no debe romper la comparación"""
+    db = _make_db()
+    assert asyncio.run(_resolve_token(db, "tok-client1")) == "client1"
+
+    db.user_sessions.docs[1]["expires_at"] = datetime.utcnow() - timedelta(minutes=1)
+    assert asyncio.run(_resolve_token(db, "tok-client1")) is None
+
+
+def test_message_fans_out_to_all_tabs_and_admins(monkeypatch):
+    """Un mensaje llega a todas las pestañas del cliente y a los admins, una vez"""
+    async def scenario():
+        harness = _Harness(monkeypatch, _make_db())
+        sids = await _connect_all(harness)
+
+        await harness.trigger("send_message", sids["client1-tab1"], {"message": "Hola"})
+
+        received = harness.received("new_message")
+        assert set(received) == {"eio-client1-tab1", "eio-client1-tab2", "eio-admin"}
+        assert all(len(messages) == 1 for messages in received.values())
+        assert received["eio-admin"][0]["user_id"] == "client1"
+        assert isinstance(received["eio-admin"][0]["timestamp"], str)
+
+    asyncio.run(scenario())
+
+
+def test_identity_comes_from_socket_session(monkeypatch):
+    """El remitente y el destinatario salen de la sesión, no de los datos del evento"""
+    async def scenario():
+        harness = _Harness(monkeypatch, _make_db())
+        sids = await _connect_all(harness)
+
+        # Un cliente no puede escribir en la conversación de otro
+        await harness.trigger("send_message", sids["client2"], {"message": "Hola", "user_id": "client1"})
+        received = harness.received("new_message")
+        assert set(received) == {"eio-client2", "eio-admin"}
+        assert received["eio-admin"][0]["sender_id"] == "client2"
+        assert received["eio-admin"][0]["user_id"] == "client2"
+
+        # ... ni unirse a su room
+        harness.sent.clear()
+        await harness.trigger("join_chat", sids["client2"], {"user_id": "client1"})
+        assert "eio-client2" in harness.received("error")
+
+        # El admin sí elige el destinatario
+        harness.sent.clear()
+        await harness.trigger("send_message", sids["admin"], {"message": "Respuesta", "user_id": "client1"})
+        received = harness.received("new_message")
+        assert set(received) == {"eio-client1-tab1", "eio-client1-tab2", "eio-admin"}
+        assert received["eio-client1-tab1"][0]["is_admin"] is True
+
+    asyncio.run(scenario())
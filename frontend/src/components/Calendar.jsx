@@ -4,6 +4,7 @@ import { format, parse, startOfWeek, getDay } from 'date-fns';
 import { es } from 'date-fns/locale';
 import 'react-big-calendar/lib/css/react-big-calendar.css';
 import axios from 'axios';
+import { useCursorList, useDebouncedValue } from '../lib/pagination';
 import { Button } from './ui/button';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogDescription } from './ui/dialog';
 import { Input } from './ui/input';
@@ -44,7 +45,7 @@ const messages = {
 
 export const AdminCalendar = () => {
   const [events, setEvents] = useState([]);
-  const [clients, setClients] = useState([]);
+  const [clientSearch, setClientSearch] = useState('');
   const [loading, setLoading] = useState(true);
   const [showCreateModal, setShowCreateModal] = useState(false);
   const [showEditModal, setShowEditModal] = useState(false);
@@ -60,23 +61,19 @@ export const AdminCalendar = () => {
 
   const token = localStorage.getItem('token');
 
+  // Clientes del selector: solo con el modal abierto, buscando en el servidor
+  const debouncedClientSearch = useDebouncedValue(clientSearch);
+  const { items: clients, hasMore: moreClients } = useCursorList(`${API}/admin/clients`, {
+    token,
+    itemsKey: 'clients',
+    params: { search: debouncedClientSearch.trim() },
+    enabled: showCreateModal
+  });
+
   useEffect(() => {
-    fetchClients();
     fetchSessions();
   }, []);
 
-  const fetchClients = async () => {
-    try {
-      const response = await axios.get(`${API}/admin/clients`, {
-        headers: { Authorization: `Bearer ${token}` },
-        withCredentials: true
-      });
-      setClients(response.data.clients);
-    } catch (error) {
-      console.error('Error fetching clients:', error);
-    }
-  };
-
   const fetchSessions = async () => {
     try {
       setLoading(true);
@@ -217,6 +214,13 @@ export const AdminCalendar = () => {
           <form onSubmit={handleCreateSession} className="space-y-4">
             <div>
               <Label htmlFor="client">Cliente</Label>
+              <Input
+                id="client-search"
+                placeholder="Buscar cliente por nombre o email..."
+                value={clientSearch}
+                onChange={(e) => setClientSearch(e.target.value)}
+                className="mb-2"
+              />
               <Select value={formData.user_id} onValueChange={(value) => setFormData({...formData, user_id: value})}>
                 <SelectTrigger>
                   <SelectValue placeholder="Selecciona un cliente" />
@@ -229,6 +233,9 @@ export const AdminCalendar = () => {
                   ))}
                 </SelectContent>
               </Select>
+              {moreClients && (
+                <p className="text-xs text-gray-500 mt-1">Hay más clientes: escribe para buscar</p>
+              )}
             </div>
             
             <div>
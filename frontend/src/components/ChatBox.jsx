@@ -3,6 +3,7 @@ import { Button } from './ui/button';
 import { Input } from './ui/input';
 import { Send, User } from 'lucide-react';
 import axios from 'axios';
+import { io } from 'socket.io-client';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -11,25 +12,76 @@ const ChatBox = ({ userId, isAdmin = false }) => {
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(true);
+  // Cursor de la página anterior (el backend devuelve los últimos mensajes)
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const lastMessageIdRef = useRef(null);
+  // Cursor del mensaje más nuevo recibido por REST (delta since al reconectar)
+  const newestCursorRef = useRef(null);
 
   useEffect(() => {
     loadMessages();
   }, [userId]);
 
   useEffect(() => {
-    scrollToBottom();
+    // Tiempo real por Socket.IO; al reconectar se pide solo el delta
+    const socket = io(BACKEND_URL, { transports: ['websocket', 'polling'] });
+    let authenticatedBefore = false;
+
+    socket.on('connect', () => {
+      socket.emit('authenticate', { token: localStorage.getItem('token') });
+    });
+    socket.on('authenticated', () => {
+      socket.emit('join_chat', { user_id: userId });
+      if (authenticatedBefore) {
+        loadNewMessages();
+      }
+      authenticatedBefore = true;
+    });
+    socket.on('new_message', (msg) => {
+      if (msg.user_id === userId) {
+        mergeMessages([msg]);
+      }
+    });
+
+    return () => socket.disconnect();
+  }, [userId]);
+
+  useEffect(() => {
+    // Solo bajar al final cuando llega un mensaje nuevo, no al cargar antiguos
+    const lastId = messages.length ? messages[messages.length - 1].id : null;
+    if (lastId !== lastMessageIdRef.current) {
+      lastMessageIdRef.current = lastId;
+      scrollToBottom();
+    }
   }, [messages]);
 
+  const fetchMessages = (params = {}) => {
+    const token = localStorage.getItem('token');
+    return axios.get(`${API}/messages/${userId}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      },
+      params
+    });
+  };
+
+  // Añade los mensajes que no estén ya (el socket y el REST pueden repetirlos)
+  const mergeMessages = (incoming) => {
+    setMessages((current) => {
+      const known = new Set(current.map((msg) => msg.id));
+      const fresh = incoming.filter((msg) => !known.has(msg.id));
+      return fresh.length ? [...current, ...fresh] : current;
+    });
+  };
+
   const loadMessages = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/messages/${userId}`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      });
+      const response = await fetchMessages();
       setMessages(response.data.messages || []);
+      setOlderCursor(response.data.has_more ? response.data.next_cursor : null);
+      newestCursorRef.current = response.data.newest_cursor || null;
       setLoading(false);
     } catch (error) {
       console.error('Error loading messages:', error);
@@ -37,6 +89,40 @@ const ChatBox = ({ userId, isAdmin = false }) => {
     }
   };
 
+  const loadNewMessages = async () => {
+    if (!newestCursorRef.current) {
+      loadMessages();
+      return;
+    }
+
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const response = await fetchMessages({ since: newestCursorRef.current });
+        mergeMessages(response.data.messages || []);
+        newestCursorRef.current = response.data.newest_cursor || newestCursorRef.current;
+        hasMore = response.data.has_more;
+      }
+    } catch (error) {
+      console.error('Error loading new messages:', error);
+    }
+  };
+
+  const loadOlderMessages = async () => {
+    if (!olderCursor || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const response = await fetchMessages({ before: olderCursor });
+      setMessages((current) => [...(response.data.messages || []), ...current]);
+      setOlderCursor(response.data.has_more ? response.data.next_cursor : null);
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -55,7 +141,7 @@ const ChatBox = ({ userId, isAdmin = false }) => {
         }
       });
 
-      setMessages([...messages, response.data]);
+      mergeMessages([response.data]);
       setNewMessage('');
     } catch (error) {
       console.error('Error sending message:', error);
@@ -77,6 +163,18 @@ const ChatBox = ({ userId, isAdmin = false }) => {
     <div className="flex flex-col h-full">
       {/* Messages */}
       <div className="flex-1 overflow-y-auto p-4 space-y-4" style={{ maxHeight: '500px' }}>
+        {olderCursor && (
+          <div className="text-center">
+            <Button
+              variant="ghost"
+              size="sm"
+              onClick={loadOlderMessages}
+              disabled={loadingOlder}
+            >
+              {loadingOlder ? 'Cargando...' : 'Cargar mensajes anteriores'}
+            </Button>
+          </div>
+        )}
         {messages.length === 0 ? (
           <div className="text-center text-gray-500 py-12">
             <p>No hay mensajes aún</p>
@@ -15,10 +15,14 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Clientes por página (el backend pagina y filtra por nivel)
+const PAGE_SIZE = 50;
 
 export const ClientsAtRisk = ({ token, onClientSelect }) => {
   const [clientsAtRisk, setClientsAtRisk] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [hasMore, setHasMore] = useState(false);
   const [filterLevel, setFilterLevel] = useState('all');
   const [stats, setStats] = useState({ total_red: 0, total_yellow: 0 });
 
@@ -27,19 +31,29 @@ export const ClientsAtRisk = ({ token, onClientSelect }) => {
     // Refresh every 5 minutes
     const interval = setInterval(loadClientsAtRisk, 5 * 60 * 1000);
     return () => clearInterval(interval);
-  }, []);
+  }, [filterLevel]);
+
+  const fetchPage = async (skip) => {
+    const response = await axios.get(`${API}/admin/clients-at-risk`, {
+      headers: { Authorization: `Bearer ${token}` },
+      withCredentials: true,
+      params: {
+        skip,
+        limit: PAGE_SIZE,
+        ...(filterLevel !== 'all' ? { risk_level: filterLevel } : {})
+      }
+    });
+    setStats({
+      total_red: response.data.total_red || 0,
+      total_yellow: response.data.total_yellow || 0
+    });
+    setHasMore(Boolean(response.data.has_more));
+    return response.data.clients_at_risk || [];
+  };
 
   const loadClientsAtRisk = async () => {
     try {
-      const response = await axios.get(`${API}/admin/clients-at-risk`, {
-        headers: { Authorization: `Bearer ${token}` },
-        withCredentials: true
-      });
-      setClientsAtRisk(response.data.clients_at_risk || []);
-      setStats({
-        total_red: response.data.total_red || 0,
-        total_yellow: response.data.total_yellow || 0
-      });
+      setClientsAtRisk(await fetchPage(0));
       setLoading(false);
     } catch (error) {
       console.error('Error loading clients at risk:', error);
@@ -47,9 +61,17 @@ export const ClientsAtRisk = ({ token, onClientSelect }) => {
     }
   };
 
-  const filteredClients = filterLevel === 'all' 
-    ? clientsAtRisk 
-    : clientsAtRisk.filter(c => c.risk_level === filterLevel);
+  const loadMoreClients = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(clientsAtRisk.length);
+      setClientsAtRisk((current) => [...current, ...page]);
+    } catch (error) {
+      console.error('Error loading clients at risk:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const getRiskIcon = (level) => {
     switch(level) {
@@ -145,7 +167,7 @@ export const ClientsAtRisk = ({ token, onClientSelect }) => {
           size="sm"
           onClick={() => setFilterLevel('all')}
         >
-          Todos ({clientsAtRisk.length})
+          Todos ({stats.total_red + stats.total_yellow})
         </Button>
         <Button
           variant={filterLevel === 'red' ? 'default' : 'outline'}
@@ -167,7 +189,7 @@ export const ClientsAtRisk = ({ token, onClientSelect }) => {
 
       {/* Clients List */}
       <div className="space-y-3">
-        {filteredClients.map(client => (
+        {clientsAtRisk.map(client => (
           <Card 
             key={client.client_id} 
             className={`border-2 ${
@@ -229,7 +251,20 @@ export const ClientsAtRisk = ({ token, onClientSelect }) => {
           </Card>
         ))}
 
-        {filteredClients.length === 0 && (
+        {hasMore && (
+          <div className="text-center">
+            <Button
+              size="sm"
+              variant="outline"
+              onClick={loadMoreClients}
+              disabled={loadingMore}
+            >
+              {loadingMore ? 'Cargando...' : 'Cargar más clientes'}
+            </Button>
+          </div>
+        )}
+
+        {clientsAtRisk.length === 0 && (
           <Card>
             <CardContent className="pt-12 pb-12 text-center">
               <CheckCircle className="h-16 w-16 text-green-400 mx-auto mb-4" />
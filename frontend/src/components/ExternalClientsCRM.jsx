@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { Button } from './ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Input } from './ui/input';
@@ -28,6 +28,7 @@ import {
   Users
 } from 'lucide-react';
 import axios from 'axios';
+import { useCursorList, useDebouncedValue } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -35,7 +36,6 @@ const API = `${BACKEND_URL}/api`;
 const WEEK_OPTIONS = [4, 8, 12, 16, 20, 24];
 
 export const ExternalClientsCRM = ({ token }) => {
-  const [clients, setClients] = useState([]);
   const [selectedClient, setSelectedClient] = useState(null);
   const [showDetail, setShowDetail] = useState(false);
   const [showCreateModal, setShowCreateModal] = useState(false);
@@ -78,22 +78,21 @@ export const ExternalClientsCRM = ({ token }) => {
     weeks_completed: 0
   });
 
-  useEffect(() => {
-    loadClients();
-  }, []);
-
-  const loadClients = async (status = null) => {
-    try {
-      const params = status ? `?status=${status}` : '';
-      const response = await axios.get(`${API}/admin/external-clients${params}`, {
-        headers: { Authorization: `Bearer ${token}` },
-        withCredentials: true
-      });
-      setClients(response.data.clients || []);
-    } catch (error) {
-      console.error('Error loading external clients:', error);
-    }
-  };
+  // Búsqueda y filtro de estado en el servidor, por páginas
+  const debouncedSearch = useDebouncedValue(searchTerm);
+  const {
+    items: clients,
+    firstPage,
+    hasMore,
+    loadingMore,
+    loadMore,
+    reload: loadClients
+  } = useCursorList(`${API}/admin/external-clients`, {
+    token,
+    itemsKey: 'clients',
+    params: { search: debouncedSearch.trim(), status: filterStatus }
+  });
+  const stats = firstPage?.data?.stats || { total: 0, active: 0, paused: 0, renewals: 0 };
 
   const loadClientDetail = async (clientId) => {
     try {
@@ -125,7 +124,7 @@ export const ExternalClientsCRM = ({ token }) => {
         amount_paid: '',
         notes: ''
       });
-      loadClients(filterStatus);
+      loadClients();
       alert('Cliente creado exitosamente');
     } catch (error) {
       alert('Error al crear cliente');
@@ -142,7 +141,7 @@ export const ExternalClientsCRM = ({ token }) => {
         headers: { Authorization: `Bearer ${token}` },
         withCredentials: true
       });
-      loadClients(filterStatus);
+      loadClients();
       if (showDetail && selectedClient?.id === clientId) {
         setShowDetail(false);
         setSelectedClient(null);
@@ -177,7 +176,7 @@ export const ExternalClientsCRM = ({ token }) => {
       });
       setShowEditModal(false);
       setClientToEdit(null);
-      loadClients(filterStatus);
+      loadClients();
       if (showDetail && selectedClient?.id === clientToEdit.id) {
         loadClientDetail(clientToEdit.id);
       }
@@ -280,7 +279,7 @@ export const ExternalClientsCRM = ({ token }) => {
           withCredentials: true
         }
       );
-      loadClients(filterStatus);
+      loadClients();
       if (selectedClient && selectedClient.id === clientId) {
         loadClientDetail(clientId);
       }
@@ -308,20 +307,13 @@ export const ExternalClientsCRM = ({ token }) => {
       setShowMoveModal(false);
       setClientToMove(null);
       setShowDetail(false);
-      loadClients(filterStatus);
+      loadClients();
       alert(`Cliente movido a ${targetCRM === 'team' ? 'Clientes Equipo' : 'otro CRM'} exitosamente`);
     } catch (error) {
       alert('Error al mover cliente');
     }
   };
 
-  const filteredClients = clients.filter(c => {
-    const matchesSearch = c.nombre?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         c.email?.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesStatus = !filterStatus || c.status === filterStatus;
-    return matchesSearch && matchesStatus;
-  });
-
   const getStatusColor = (status) => {
     switch(status) {
       case 'active': return 'bg-green-100 text-green-800 border-green-300';
@@ -387,10 +379,7 @@ export const ExternalClientsCRM = ({ token }) => {
               <Filter className="absolute left-3 top-3 h-4 w-4 text-gray-400" />
               <select
                 value={filterStatus}
-                onChange={(e) => {
-                  setFilterStatus(e.target.value);
-                  loadClients(e.target.value || null);
-                }}
+                onChange={(e) => setFilterStatus(e.target.value)}
                 className="w-full border rounded-md px-10 py-2"
               >
                 <option value="">Todos los estados</option>
@@ -408,7 +397,7 @@ export const ExternalClientsCRM = ({ token }) => {
         <Card>
           <CardContent className="pt-6">
             <div className="text-center">
-              <p className="text-2xl font-bold">{clients.length}</p>
+              <p className="text-2xl font-bold">{stats.total}</p>
               <p className="text-sm text-gray-600">Total Clientes</p>
             </div>
           </CardContent>
@@ -417,7 +406,7 @@ export const ExternalClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-green-600">
-                {clients.filter(c => c.status === 'active').length}
+                {stats.active}
               </p>
               <p className="text-sm text-gray-600">Activos</p>
             </div>
@@ -427,7 +416,7 @@ export const ExternalClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-yellow-600">
-                {clients.filter(c => c.status === 'paused').length}
+                {stats.paused}
               </p>
               <p className="text-sm text-gray-600">Pausados</p>
             </div>
@@ -437,7 +426,7 @@ export const ExternalClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-orange-600">
-                {clients.filter(c => isRenewalClose(c)).length}
+                {stats.renewals}
               </p>
               <p className="text-sm text-gray-600">Próximas Renovaciones</p>
             </div>
@@ -448,7 +437,7 @@ export const ExternalClientsCRM = ({ token }) => {
       {/* Clients Table */}
       <Card>
         <CardHeader>
-          <CardTitle>Lista de Clientes Externos ({filteredClients.length})</CardTitle>
+          <CardTitle>Lista de Clientes Externos ({clients.length}{hasMore ? '+' : ''})</CardTitle>
         </CardHeader>
         <CardContent>
           <div className="overflow-x-auto">
@@ -465,7 +454,7 @@ export const ExternalClientsCRM = ({ token }) => {
                 </tr>
               </thead>
               <tbody>
-                {filteredClients.map(client => {
+                {clients.map(client => {
                   const progress = calculateProgress(client);
                   const renewalClose = isRenewalClose(client);
                   
@@ -541,11 +530,18 @@ export const ExternalClientsCRM = ({ token }) => {
                 })}
               </tbody>
             </table>
-            {filteredClients.length === 0 && (
+            {clients.length === 0 && (
               <div className="text-center py-8 text-gray-500">
                 No hay clientes para mostrar
               </div>
             )}
+            {hasMore && (
+              <div className="text-center pt-4">
+                <Button size="sm" variant="outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Cargando...' : 'Cargar más clientes'}
+                </Button>
+              </div>
+            )}
           </div>
         </CardContent>
       </Card>
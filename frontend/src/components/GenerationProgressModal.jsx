@@ -10,38 +10,88 @@ const GenerationProgressModal = ({ jobId, onComplete, onError, onClose }) => {
   useEffect(() => {
     if (!jobId) return;
 
-    // Polling interval: cada 3 segundos
-    const pollInterval = setInterval(async () => {
-      try {
-        const response = await axios.get(`${API}/api/jobs/${jobId}`);
-        const job = response.data;
-        
-        setJobStatus(job);
-
-        // Si el job está completado
-        if (job.status === 'completed') {
+    let finished = false;
+    let source = null;
+    let pollInterval = null;
+
+    const finish = (job) => {
+      if (finished) return;
+      if (job.status === 'completed') {
+        finished = true;
+        setTimeout(() => {
+          onComplete(job.result);
+        }, 1000); // Dar 1 segundo para ver el 100%
+      }
+      if (job.status === 'failed') {
+        finished = true;
+        setError(job.error_message);
+        onError(job.error_message);
+      }
+      if (finished) {
+        if (source) source.close();
+        if (pollInterval) clearInterval(pollInterval);
+      }
+    };
+
+    // Respaldo: polling cada 3 segundos si el stream no está disponible
+    const startPolling = () => {
+      pollInterval = setInterval(async () => {
+        try {
+          const response = await axios.get(`${API}/api/jobs/${jobId}`);
+          setJobStatus(response.data);
+          finish(response.data);
+        } catch (err) {
+          console.error('Error polling job status:', err);
           clearInterval(pollInterval);
-          setTimeout(() => {
-            onComplete(job.result);
-          }, 1000); // Dar 1 segundo para ver el 100%
+          setError('Error al consultar el estado del job');
+          onError('Error al consultar el estado del job');
         }
+      }, 3000);
+    };
+
+    // Stream SSE: el backend empuja el progreso en cuanto cambia
+    source = new EventSource(`${API}/api/jobs/${jobId}/events`);
+
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+
+      if (event.type === 'snapshot') {
+        setJobStatus(event.job);
+        finish(event.job);
+      } else if (event.type === 'progress') {
+        setJobStatus((prev) => ({
+          ...prev,
+          progress: event.progress,
+          status: event.status || prev?.status
+        }));
+      } else if (event.type === 'completed') {
+        setJobStatus((prev) => ({
+          ...prev,
+          status: 'completed',
+          result: event.result,
+          progress: { ...prev?.progress, percentage: 100 }
+        }));
+        finish({ status: 'completed', result: event.result });
+      } else if (event.type === 'failed') {
+        setJobStatus((prev) => ({ ...prev, status: 'failed', error_message: event.error_message }));
+        finish({ status: 'failed', error_message: event.error_message });
+      }
+    };
 
-        // Si el job falló
-        if (job.status === 'failed') {
-          clearInterval(pollInterval);
-          setError(job.error_message);
-          onError(job.error_message);
-        }
-      } catch (err) {
-        console.error('Error polling job status:', err);
-        clearInterval(pollInterval);
-        setError('Error al consultar el estado del job');
-        onError('Error al consultar el estado del job');
+    source.onerror = () => {
+      // El servidor cierra el stream tras el evento final
+      source.close();
+      if (!finished && !pollInterval) {
+        startPolling();
       }
-    }, 3000);
+    };
 
     // Cleanup
-    return () => clearInterval(pollInterval);
+    return () => {
+      finished = true;
+      if (source) source.close();
+      if (pollInterval) clearInterval(pollInterval);
+    };
   }, [jobId, onComplete, onError]);
 
   if (!jobStatus) {
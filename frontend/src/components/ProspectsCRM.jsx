@@ -25,12 +25,12 @@ import {
   Users
 } from 'lucide-react';
 import axios from 'axios';
+import { useCursorList, useDebouncedValue } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 export const ProspectsCRM = ({ token }) => {
-  const [prospects, setProspects] = useState([]);
   const [stages, setStages] = useState([]);
   const [selectedProspect, setSelectedProspect] = useState(null);
   const [showDetail, setShowDetail] = useState(false);
@@ -42,25 +42,27 @@ export const ProspectsCRM = ({ token }) => {
   const [newNote, setNewNote] = useState('');
   const [loading, setLoading] = useState(false);
 
+  // Búsqueda y filtro de etapa en el servidor, por páginas
+  const debouncedSearch = useDebouncedValue(searchTerm);
+  const {
+    items: prospects,
+    firstPage,
+    hasMore,
+    loadingMore,
+    loadMore,
+    reload: loadProspects
+  } = useCursorList(`${API}/admin/prospects`, {
+    token,
+    itemsKey: 'prospects',
+    params: { search: debouncedSearch.trim(), stage: filterStage }
+  });
+  const totalProspects = firstPage?.data?.total ?? prospects.length;
+  const stageCounts = firstPage?.data?.stage_counts || {};
+
   useEffect(() => {
-    loadProspects();
     loadStages();
   }, []);
 
-  const loadProspects = async (stage = null) => {
-    try {
-      const params = stage ? `?stage=${stage}` : '';
-      const response = await axios.get(`${API}/admin/prospects${params}`, {
-        headers: { Authorization: `Bearer ${token}` },
-        withCredentials: true
-      });
-      setProspects(response.data.prospects || []);
-    } catch (error) {
-      console.error('Error loading prospects:', error);
-      setProspects([]); // Set empty array on error
-    }
-  };
-
   const loadStages = async () => {
     try {
       const response = await axios.get(`${API}/admin/prospect-stages`, {
@@ -96,7 +98,7 @@ export const ProspectsCRM = ({ token }) => {
           withCredentials: true
         }
       );
-      loadProspects(filterStage);
+      loadProspects();
       if (selectedProspect && selectedProspect.id === prospectId) {
         loadProspectDetail(prospectId);
       }
@@ -183,7 +185,7 @@ export const ProspectsCRM = ({ token }) => {
       );
       alert('✅ Informe generado correctamente');
       await loadProspectDetail(prospectId);
-      await loadProspects(filterStage || null);
+      await loadProspects();
     } catch (error) {
       alert(`❌ Error al generar informe: ${error.response?.data?.detail || error.message}`);
     } finally {
@@ -209,7 +211,7 @@ export const ProspectsCRM = ({ token }) => {
       );
       alert('✅ Informe regenerado correctamente');
       await loadProspectDetail(prospectId);
-      await loadProspects(filterStage || null);
+      await loadProspects();
     } catch (error) {
       alert(`❌ Error al regenerar informe: ${error.response?.data?.detail || error.message}`);
     } finally {
@@ -253,7 +255,7 @@ export const ProspectsCRM = ({ token }) => {
         headers: { Authorization: `Bearer ${token}` },
         withCredentials: true
       });
-      loadProspects(filterStage);
+      loadProspects();
       if (showDetail && selectedProspect?.id === prospectId) {
         setShowDetail(false);
         setSelectedProspect(null);
@@ -282,20 +284,13 @@ export const ProspectsCRM = ({ token }) => {
       );
       setShowConvertModal(false);
       setProspectToConvert(null);
-      loadProspects(filterStage);
+      loadProspects();
       alert(`Prospecto convertido a ${targetCRM === 'team' ? 'Cliente Equipo' : 'Cliente Externo'} exitosamente`);
     } catch (error) {
       alert('Error al convertir prospecto');
     }
   };
 
-  const filteredProspects = (prospects || []).filter(p => {
-    const matchesSearch = p.nombre.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         p.email.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesStage = !filterStage || p.stage_name === filterStage;
-    return matchesSearch && matchesStage;
-  });
-
   return (
     <div className="space-y-6">
       {/* Header */}
@@ -330,10 +325,7 @@ export const ProspectsCRM = ({ token }) => {
               <Filter className="absolute left-3 top-3 h-4 w-4 text-gray-400" />
               <select
                 value={filterStage}
-                onChange={(e) => {
-                  setFilterStage(e.target.value);
-                  loadProspects(e.target.value || null);
-                }}
+                onChange={(e) => setFilterStage(e.target.value)}
                 className="w-full border rounded-md px-10 py-2"
               >
                 <option value="">Todas las etapas</option>
@@ -351,13 +343,13 @@ export const ProspectsCRM = ({ token }) => {
         <Card>
           <CardContent className="pt-6">
             <div className="text-center">
-              <p className="text-2xl font-bold">{prospects.length}</p>
+              <p className="text-2xl font-bold">{totalProspects}</p>
               <p className="text-sm text-gray-600">Total Prospectos</p>
             </div>
           </CardContent>
         </Card>
         {stages.slice(0, 3).map(stage => {
-          const count = prospects.filter(p => p.stage_name === stage.name).length;
+          const count = stageCounts[stage.name] || 0;
           return (
             <Card key={stage.id}>
               <CardContent className="pt-6">
@@ -374,7 +366,7 @@ export const ProspectsCRM = ({ token }) => {
       {/* Prospects Table */}
       <Card>
         <CardHeader>
-          <CardTitle>Lista de Prospectos ({filteredProspects.length})</CardTitle>
+          <CardTitle>Lista de Prospectos ({prospects.length}{hasMore ? '+' : ''})</CardTitle>
         </CardHeader>
         <CardContent>
           <div className="overflow-x-auto">
@@ -390,7 +382,7 @@ export const ProspectsCRM = ({ token }) => {
                 </tr>
               </thead>
               <tbody>
-                {filteredProspects.map(prospect => (
+                {prospects.map(prospect => (
                   <tr key={prospect.id} className="border-b hover:bg-gray-50">
                     <td className="p-3 font-medium">{prospect.nombre}</td>
                     <td className="p-3 text-sm">{prospect.email}</td>
@@ -459,11 +451,18 @@ export const ProspectsCRM = ({ token }) => {
                 ))}
               </tbody>
             </table>
-            {filteredProspects.length === 0 && (
+            {prospects.length === 0 && (
               <div className="text-center py-8 text-gray-500">
                 No hay prospectos para mostrar
               </div>
             )}
+            {hasMore && (
+              <div className="text-center pt-4">
+                <Button size="sm" variant="outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Cargando...' : 'Cargar más prospectos'}
+                </Button>
+              </div>
+            )}
           </div>
         </CardContent>
       </Card>
@@ -726,7 +725,7 @@ export const ProspectsCRM = ({ token }) => {
           onClose={() => setShowStageManager(false)}
           onUpdate={() => {
             loadStages();
-            loadProspects(filterStage);
+            loadProspects();
           }}
           token={token}
         />
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { Button } from './ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Input } from './ui/input';
@@ -25,12 +25,12 @@ import {
   Trash2
 } from 'lucide-react';
 import axios from 'axios';
+import { useCursorList, useDebouncedValue } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 export const TeamClientsCRM = ({ token }) => {
-  const [clients, setClients] = useState([]);
   const [selectedClient, setSelectedClient] = useState(null);
   const [showDetail, setShowDetail] = useState(false);
   const [showMoveModal, setShowMoveModal] = useState(false);
@@ -42,22 +42,21 @@ export const TeamClientsCRM = ({ token }) => {
   const [showNutritionModal, setShowNutritionModal] = useState(false);
   const [loadingNutrition, setLoadingNutrition] = useState(false);
 
-  useEffect(() => {
-    loadClients();
-  }, []);
-
-  const loadClients = async (status = null) => {
-    try {
-      const params = status ? `?status=${status}` : '';
-      const response = await axios.get(`${API}/admin/team-clients${params}`, {
-        headers: { Authorization: `Bearer ${token}` },
-        withCredentials: true
-      });
-      setClients(response.data.clients || []);
-    } catch (error) {
-      console.error('Error loading team clients:', error);
-    }
-  };
+  // Búsqueda y filtro de estado en el servidor, por páginas
+  const debouncedSearch = useDebouncedValue(searchTerm);
+  const {
+    items: clients,
+    firstPage,
+    hasMore,
+    loadingMore,
+    loadMore,
+    reload: loadClients
+  } = useCursorList(`${API}/admin/team-clients`, {
+    token,
+    itemsKey: 'clients',
+    params: { search: debouncedSearch.trim(), status: filterStatus }
+  });
+  const stats = firstPage?.data?.stats || { total: 0, active: 0, pending: 0, inactive: 0 };
 
   const loadClientDetail = async (clientId) => {
     try {
@@ -120,7 +119,7 @@ export const TeamClientsCRM = ({ token }) => {
           withCredentials: true
         }
       );
-      loadClients(filterStatus);
+      loadClients();
       if (selectedClient && selectedClient.id === clientId) {
         loadClientDetail(clientId);
       }
@@ -148,7 +147,7 @@ export const TeamClientsCRM = ({ token }) => {
       setShowMoveModal(false);
       setClientToMove(null);
       setShowDetail(false);
-      loadClients(filterStatus);
+      loadClients();
       alert(`Cliente movido a ${targetCRM === 'external' ? 'Clientes Externos' : 'otro CRM'} exitosamente`);
     } catch (error) {
       alert('Error al mover cliente');
@@ -165,7 +164,7 @@ export const TeamClientsCRM = ({ token }) => {
         headers: { Authorization: `Bearer ${token}` },
         withCredentials: true
       });
-      loadClients(filterStatus);
+      loadClients();
       if (showDetail && selectedClient?.id === clientId) {
         setShowDetail(false);
         setSelectedClient(null);
@@ -176,13 +175,6 @@ export const TeamClientsCRM = ({ token }) => {
     }
   };
 
-  const filteredClients = clients.filter(c => {
-    const matchesSearch = c.nombre?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         c.email?.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesStatus = !filterStatus || c.status === filterStatus;
-    return matchesSearch && matchesStatus;
-  });
-
   const getStatusColor = (status) => {
     switch(status) {
       case 'active': return 'bg-green-100 text-green-800 border-green-300';
@@ -228,10 +220,7 @@ export const TeamClientsCRM = ({ token }) => {
               <Filter className="absolute left-3 top-3 h-4 w-4 text-gray-400" />
               <select
                 value={filterStatus}
-                onChange={(e) => {
-                  setFilterStatus(e.target.value);
-                  loadClients(e.target.value || null);
-                }}
+                onChange={(e) => setFilterStatus(e.target.value)}
                 className="w-full border rounded-md px-10 py-2"
               >
                 <option value="">Todos los estados</option>
@@ -249,7 +238,7 @@ export const TeamClientsCRM = ({ token }) => {
         <Card>
           <CardContent className="pt-6">
             <div className="text-center">
-              <p className="text-2xl font-bold">{clients.length}</p>
+              <p className="text-2xl font-bold">{stats.total}</p>
               <p className="text-sm text-gray-600">Total Clientes</p>
             </div>
           </CardContent>
@@ -258,7 +247,7 @@ export const TeamClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-green-600">
-                {clients.filter(c => c.status === 'active').length}
+                {stats.active}
               </p>
               <p className="text-sm text-gray-600">Activos</p>
             </div>
@@ -268,7 +257,7 @@ export const TeamClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-yellow-600">
-                {clients.filter(c => c.status === 'pending').length}
+                {stats.pending}
               </p>
               <p className="text-sm text-gray-600">Pendientes</p>
             </div>
@@ -278,7 +267,7 @@ export const TeamClientsCRM = ({ token }) => {
           <CardContent className="pt-6">
             <div className="text-center">
               <p className="text-2xl font-bold text-gray-600">
-                {clients.filter(c => c.status === 'inactive').length}
+                {stats.inactive}
               </p>
               <p className="text-sm text-gray-600">Inactivos</p>
             </div>
@@ -289,7 +278,7 @@ export const TeamClientsCRM = ({ token }) => {
       {/* Clients Table */}
       <Card>
         <CardHeader>
-          <CardTitle>Lista de Clientes Equipo ({filteredClients.length})</CardTitle>
+          <CardTitle>Lista de Clientes Equipo ({clients.length}{hasMore ? '+' : ''})</CardTitle>
         </CardHeader>
         <CardContent>
           <div className="overflow-x-auto">
@@ -306,7 +295,7 @@ export const TeamClientsCRM = ({ token }) => {
                 </tr>
               </thead>
               <tbody>
-                {filteredClients.map(client => (
+                {clients.map(client => (
                   <tr key={client.id} className="border-b hover:bg-gray-50">
                     <td className="p-3 font-medium">{client.nombre || client.username}</td>
                     <td className="p-3 text-sm">{client.email}</td>
@@ -368,11 +357,18 @@ export const TeamClientsCRM = ({ token }) => {
                 ))}
               </tbody>
             </table>
-            {filteredClients.length === 0 && (
+            {clients.length === 0 && (
               <div className="text-center py-8 text-gray-500">
                 No hay clientes para mostrar
               </div>
             )}
+            {hasMore && (
+              <div className="text-center pt-4">
+                <Button size="sm" variant="outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Cargando...' : 'Cargar más clientes'}
+                </Button>
+              </div>
+            )}
           </div>
         </CardContent>
       </Card>
@@ -0,0 +1,122 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import axios from 'axios';
+
+// Elementos por página en los listados del CRM
+export const CRM_PAGE_SIZE = 50;
+
+const compactParams = (params) => Object.fromEntries(
+  Object.entries(params || {}).filter(([, value]) => value !== undefined && value !== null && value !== '')
+);
+
+/**
+ * Una página de un listado del CRM.
+ *
+ * El backend pagina por keyset: las respuestas objeto traen
+ * next_cursor / has_more y las respuestas lista (waitlist) llevan el
+ * cursor en la cabecera X-Next-Cursor.
+ *
+ * @returns {Promise<{items: Array, nextCursor: string|null, data: any, headers: object}>}
+ */
+export async function fetchPage(url, config = {}, itemsKey = null, cursor = null) {
+  const params = compactParams({
+    limit: CRM_PAGE_SIZE,
+    ...(config.params || {}),
+    ...(cursor ? { cursor } : {})
+  });
+  const response = await axios.get(url, { ...config, params });
+  const data = response.data;
+
+  if (Array.isArray(data)) {
+    return { items: data, nextCursor: response.headers['x-next-cursor'] || null, data, headers: response.headers };
+  }
+  return {
+    items: data[itemsKey] || [],
+    nextCursor: data.has_more ? data.next_cursor : null,
+    data,
+    headers: response.headers
+  };
+}
+
+/**
+ * Valor que solo cambia tras `delay` ms sin cambios (búsqueda en el
+ * servidor mientras se escribe).
+ */
+export function useDebouncedValue(value, delay = 300) {
+  const [debounced, setDebounced] = useState(value);
+
+  useEffect(() => {
+    const timeout = setTimeout(() => setDebounced(value), delay);
+    return () => clearTimeout(timeout);
+  }, [value, delay]);
+
+  return debounced;
+}
+
+/**
+ * Listado del CRM paginado bajo demanda.
+ *
+ * Carga la primera página al montar y cada vez que cambian `params`
+ * (búsqueda, filtros); loadMore() añade la página siguiente. Las respuestas
+ * de una búsqueda anterior que lleguen tarde se descartan.
+ *
+ * firstPage es la respuesta de la primera página: los totales y stats del
+ * listado solo vienen en ella. loaded pasa a true tras la primera carga
+ * (con o sin error).
+ */
+export function useCursorList(url, { token, itemsKey = null, params = {}, enabled = true } = {}) {
+  const [items, setItems] = useState([]);
+  const [firstPage, setFirstPage] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [loaded, setLoaded] = useState(false);
+  const requestId = useRef(0);
+  const paramsKey = JSON.stringify(compactParams(params));
+
+  const requestConfig = useCallback(() => ({
+    headers: { Authorization: `Bearer ${token}` },
+    withCredentials: true,
+    params: JSON.parse(paramsKey)
+  }), [token, paramsKey]);
+
+  const reload = useCallback(async () => {
+    const id = ++requestId.current;
+    setLoading(true);
+    try {
+      const page = await fetchPage(url, requestConfig(), itemsKey);
+      if (id !== requestId.current) return;
+      setItems(page.items);
+      setFirstPage(page);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error(`Error loading ${url}:`, error);
+    } finally {
+      if (id === requestId.current) {
+        setLoading(false);
+        setLoaded(true);
+      }
+    }
+  }, [url, itemsKey, requestConfig]);
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor) return;
+    const id = requestId.current;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(url, requestConfig(), itemsKey, nextCursor);
+      if (id !== requestId.current) return;
+      setItems((current) => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error(`Error loading ${url}:`, error);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [url, itemsKey, requestConfig, nextCursor]);
+
+  useEffect(() => {
+    if (enabled) reload();
+  }, [enabled, reload]);
+
+  return { items, setItems, firstPage, hasMore: Boolean(nextCursor), loading, loaded, loadingMore, reload, loadMore };
+}
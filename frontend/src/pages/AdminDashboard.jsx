@@ -18,6 +18,7 @@ import {
 import TrainingPlanChatDialog from '../components/TrainingPlanChatDialog';
 import NutritionPlanChatDialog from '../components/NutritionPlanChatDialog';
 import axios from 'axios';
+import { useCursorList, useDebouncedValue } from '../lib/pagination';
 import { 
   Users, 
   LogOut,
@@ -67,15 +68,29 @@ const API = `${BACKEND_URL}/api`;
 const AdminDashboard = () => {
   const { user, logout, isAdmin, token } = useAuth();
   const navigate = useNavigate();
-  const [clients, setClients] = useState([]);
-  const [stats, setStats] = useState({ total: 0, active: 0, pending: 0 });
   const [selectedClient, setSelectedClient] = useState(null);
   const [selectedClientDetails, setSelectedClientDetails] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [showChat, setShowChat] = useState(false);
-  const [loading, setLoading] = useState(true);
   const [loadingClientData, setLoadingClientData] = useState(false); // NEW: Prevent flickering during client data load
   const [showArchived, setShowArchived] = useState(false);
+  // Clientes paginados: búsqueda y archivados se filtran en el servidor
+  const debouncedSearch = useDebouncedValue(searchTerm);
+  const {
+    items: clients,
+    firstPage: clientsFirstPage,
+    hasMore: hasMoreClients,
+    loaded: clientsLoaded,
+    loadingMore: loadingMoreClients,
+    reload: loadClients,
+    loadMore: loadMoreClients
+  } = useCursorList(`${API}/admin/clients`, {
+    token,
+    itemsKey: 'clients',
+    params: { search: debouncedSearch.trim(), archived: showArchived },
+    enabled: isAdmin()
+  });
+  const stats = clientsFirstPage?.data?.stats || { total: 0, active: 0, pending: 0 };
   const [showEditModal, setShowEditModal] = useState(false);
   const [userToEdit, setUserToEdit] = useState(null);
   const [activeView, setActiveView] = useState('clients'); // clients, prospects, team-clients, external-clients, calendar
@@ -178,10 +193,21 @@ const AdminDashboard = () => {
 
 
   // Waitlist states
-  const [waitlistLeads, setWaitlistLeads] = useState([]);
   const [selectedLead, setSelectedLead] = useState(null);
-  const [loadingWaitlist, setLoadingWaitlist] = useState(false);
-  const [waitlistCount, setWaitlistCount] = useState(0);
+  const {
+    items: waitlistLeads,
+    firstPage: waitlistFirstPage,
+    hasMore: hasMoreWaitlist,
+    loading: loadingWaitlist,
+    loadingMore: loadingMoreWaitlist,
+    reload: loadWaitlistLeads,
+    loadMore: loadMoreWaitlist
+  } = useCursorList(`${API}/admin/waitlist/all`, {
+    token,
+    enabled: activeView === 'waitlist'
+  });
+  // Total de la waitlist: cabecera X-Total-Count de la primera página
+  const waitlistCount = Number(waitlistFirstPage?.headers?.['x-total-count']) || waitlistLeads.length;
   const [newLeadNote, setNewLeadNote] = useState('');
 
   // Manual Payments (Caja A/B)
@@ -220,7 +246,6 @@ const AdminDashboard = () => {
       navigate('/dashboard');
       return;
     }
-    loadClients();
     loadTemplates();
     loadAllTags();
   }, [isAdmin, navigate]);
@@ -1136,17 +1161,30 @@ const AdminDashboard = () => {
     }
   };
 
+  // Todas las revisiones vencidas (el backend pagina con skip/limit)
+  const fetchAllPendingReviews = async () => {
+    let reviews = [];
+    let hasMore = true;
+    while (hasMore) {
+      const response = await axios.get(`${API}/admin/pending-reviews`, {
+        headers: { Authorization: `Bearer ${token}` },
+        withCredentials: true,
+        params: { skip: reviews.length, limit: 500 }
+      });
+      const page = response.data.pending_reviews || [];
+      reviews = reviews.concat(page);
+      hasMore = Boolean(response.data.has_more) && page.length > 0;
+    }
+    return reviews;
+  };
+
   useEffect(() => {
     // Load pending reviews when navigating to that view
     if (activeView === 'pending-reviews') {
       const fetchPendingReviews = async () => {
         setLoadingPendingReviews(true);
         try {
-          const response = await axios.get(`${API}/admin/pending-reviews`, {
-            headers: { Authorization: `Bearer ${token}` },
-            withCredentials: true
-          });
-          setPendingReviews(response.data.pending_reviews || []);
+          setPendingReviews(await fetchAllPendingReviews());
         } catch (error) {
           console.error('Error loading pending reviews:', error);
           setPendingReviews([]);
@@ -1169,10 +1207,6 @@ const AdminDashboard = () => {
 
 
   useEffect(() => {
-    // Load waitlist data when navigating to waitlist view
-    if (activeView === 'waitlist') {
-      loadWaitlistLeads();
-    }
     // Load manual payments when navigating to finances
     if (activeView === 'finances') {
       loadManualPayments();
@@ -1181,25 +1215,6 @@ const AdminDashboard = () => {
 
 
 
-  const loadClients = async () => {
-    try {
-      // Use clients endpoint to show web-registered clients
-      const response = await axios.get(`${API}/admin/clients`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        },
-        withCredentials: true
-      });
-      setClients(response.data.clients || []);
-      // Use stats from backend
-      setStats(response.data.stats || { total: 0, active: 0, pending: 0 });
-      setLoading(false);
-    } catch (error) {
-      console.error('Error loading clients:', error);
-      setLoading(false);
-    }
-  };
-
   const loadClientDetails = async (userId) => {
     try {
       const response = await axios.get(`${API}/admin/clients/${userId}`, {
@@ -1311,11 +1326,7 @@ const AdminDashboard = () => {
       // Reload pending reviews to update status
       setLoadingPendingReviews(true);
       try {
-        const response = await axios.get(`${API}/admin/pending-reviews`, {
-          headers: { Authorization: `Bearer ${token}` },
-          withCredentials: true
-        });
-        setPendingReviews(response.data.pending_reviews || []);
+        setPendingReviews(await fetchAllPendingReviews());
       } catch (error) {
         console.error('Error reloading pending reviews:', error);
       } finally {
@@ -1635,20 +1646,6 @@ const AdminDashboard = () => {
     navigate('/');
   };
 
-  const filteredClients = clients.filter(client => {
-    const matchesSearch = client.name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      client.email?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      client.username?.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    // Show archived clients only when showArchived is true
-    // Show non-archived clients (including those without archived field) when showArchived is false
-    if (showArchived) {
-      return matchesSearch && client.subscription?.archived === true;
-    } else {
-      return matchesSearch && client.subscription?.archived !== true;
-    }
-  });
-
   const handleSendForm = async () => {
     if (!selectedClient || !formData.title || !formData.url) {
       alert('Por favor completa todos los campos');
@@ -1848,6 +1845,14 @@ const AdminDashboard = () => {
         }
       });
       
+      // Borrado grande: sigue en segundo plano
+      if (response.status === 202) {
+        alert(`⏳ Borrado en curso (${response.data.progress?.done || 0}/${response.data.progress?.total || '?'}).\nEl cliente desaparecerá de la lista al terminar.`);
+        setSelectedClient(null);
+        loadClients();
+        return;
+      }
+      
       // Mostrar resumen de lo eliminado
       const deleted = response.data.deleted_data;
       alert(
@@ -1859,7 +1864,8 @@ const AdminDashboard = () => {
         `- PDFs: ${deleted.pdfs}\n` +
         `- Mensajes: ${deleted.messages}\n` +
         `- Alertas: ${deleted.alerts}\n` +
-        `- Sesiones: ${deleted.sessions}`
+        `- Sesiones: ${deleted.sessions}\n` +
+        `- Espacio liberado: ${(response.data.bytes_reclaimed / 1024 / 1024).toFixed(1)} MB`
       );
       
       setSelectedClient(null);
@@ -1905,7 +1911,7 @@ const AdminDashboard = () => {
     }
   };
 
-  if (loading) {
+  if (!clientsLoaded) {
     return (
       <div className="min-h-screen flex items-center justify-center">
         <div className="text-center">
@@ -1944,21 +1950,6 @@ const AdminDashboard = () => {
   };
 
 
-  const loadWaitlistLeads = async () => {
-    setLoadingWaitlist(true);
-    try {
-      const response = await axios.get(`${API}/admin/waitlist/all`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setWaitlistLeads(response.data || []);
-      setWaitlistCount(response.data?.length || 0);
-    } catch (error) {
-      console.error('Error loading waitlist leads:', error);
-    } finally {
-      setLoadingWaitlist(false);
-    }
-  };
-
   const updateLeadStatus = async (lead, newStatus) => {
     const leadId = lead._id || lead.id;
     try {
@@ -2410,9 +2401,12 @@ const AdminDashboard = () => {
                                     const client = clients.find(c => c.id === review.user_id);
                                     if (client) {
                                       setSelectedClient(client);
-                                      setActiveView('clients');
-                                      // TODO: Auto-open followups tab
+                                    } else {
+                                      // Cliente fuera de las páginas cargadas
+                                      loadClientDetails(review.user_id);
                                     }
+                                    setActiveView('clients');
+                                    // TODO: Auto-open followups tab
                                   }}
                                 >
                                   Ver Respuestas
@@ -2600,6 +2594,13 @@ const AdminDashboard = () => {
                         ))}
                       </tbody>
                     </table>
+                    {hasMoreWaitlist && (
+                      <div className="text-center pt-4">
+                        <Button size="sm" variant="outline" onClick={loadMoreWaitlist} disabled={loadingMoreWaitlist}>
+                          {loadingMoreWaitlist ? 'Cargando...' : 'Cargar más leads'}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
               </CardContent>
@@ -2888,7 +2889,7 @@ const AdminDashboard = () => {
                 </CardHeader>
                 <CardContent>
                   <div className="space-y-2 max-h-[600px] overflow-y-auto">
-                    {filteredClients.map((client) => (
+                    {clients.map((client) => (
                       <div
                         key={client.id}
                         onClick={() => setSelectedClient(client)}
@@ -2942,6 +2943,13 @@ const AdminDashboard = () => {
                         )}
                       </div>
                     ))}
+                    {hasMoreClients && (
+                      <div className="text-center pt-2">
+                        <Button size="sm" variant="outline" onClick={loadMoreClients} disabled={loadingMoreClients}>
+                          {loadingMoreClients ? 'Cargando...' : 'Cargar más clientes'}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 </CardContent>
               </Card>